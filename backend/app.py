@@ -1,18 +1,31 @@
-from fastapi import FastAPI, HTTPException, Depends, Header
-from fastapi.responses import JSONResponse, FileResponse, RedirectResponse
+from fastapi import FastAPI, HTTPException, Depends, Header, Request
+from fastapi.responses import JSONResponse, FileResponse, RedirectResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
 from openai import OpenAI
+import asyncio
 import json
+import logging
 import os
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional, Tuple
 from dotenv import load_dotenv
 import utils
 import pdf_generator
 import pdf_generator_analysis
 import pdf_generator_validation
+import pdf_generator_bundle
+import payment_cache
+import entitlements
+import document_store
+import render_pool
+import pdf_cache
+import pdf_preview_cache
+import pdf_profiles
+import html_preview
+from app_logging import get_logger
+from request_decompression import DecompressRequestMiddleware
 import stripe
 import firebase_admin
 from firebase_admin import credentials, auth
@@ -20,6 +33,8 @@ from firebase_admin import credentials, auth
 # Carica variabili d'ambiente
 load_dotenv()
 
+logger = get_logger(__name__)
+
 # Inizializza Firebase Admin SDK
 firebase_initialized = False
 try:
@@ -31,12 +46,12 @@ try:
             cred = credentials.Certificate(cred_dict)
             firebase_admin.initialize_app(cred)
             firebase_initialized = True
-            print("✅ Firebase Admin inizializzato con credenziali da variabile d'ambiente")
-            print(f"   Project ID: {cred_dict.get('project_id', 'N/A')}")
+            logger.info("✅ Firebase Admin inizializzato con credenziali da variabile d'ambiente",
+                        project_id=cred_dict.get('project_id', 'N/A'))
         except json.JSONDecodeError as e:
-            print(f"❌ ERRORE: FIREBASE_CREDENTIALS_JSON non è un JSON valido: {e}")
+            logger.error("❌ ERRORE: FIREBASE_CREDENTIALS_JSON non è un JSON valido: %s", e)
         except Exception as e:
-            print(f"❌ ERRORE nell'inizializzazione Firebase Admin da JSON: {e}")
+            logger.error("❌ ERRORE nell'inizializzazione Firebase Admin da JSON: %s", e)
     else:
         # Prova a caricare da file (per sviluppo locale)
         cred_path = os.getenv("FIREBASE_CREDENTIALS_PATH", "firebase-credentials.json")
@@ -45,17 +60,15 @@ try:
                 cred = credentials.Certificate(cred_path)
                 firebase_admin.initialize_app(cred)
                 firebase_initialized = True
-                print(f"✅ Firebase Admin inizializzato con credenziali da {cred_path}")
+                logger.info("✅ Firebase Admin inizializzato con credenziali da %s", cred_path)
             except Exception as e:
-                print(f"❌ ERRORE nell'inizializzazione Firebase Admin da file: {e}")
+                logger.error("❌ ERRORE nell'inizializzazione Firebase Admin da file: %s", e)
         else:
-            print("⚠️ ATTENZIONE: Firebase Admin non configurato. L'autenticazione non funzionerà.")
-            print("   Configura FIREBASE_CREDENTIALS_JSON o FIREBASE_CREDENTIALS_PATH")
+            logger.warning("⚠️ ATTENZIONE: Firebase Admin non configurato. L'autenticazione non funzionerà. "
+                           "Configura FIREBASE_CREDENTIALS_JSON o FIREBASE_CREDENTIALS_PATH")
 except Exception as e:
-    print(f"⚠️ ERRORE nell'inizializzazione Firebase Admin: {e}")
-    import traceback
-    traceback.print_exc()
-    print("   L'autenticazione potrebbe non funzionare correttamente")
+    logger.exception("⚠️ ERRORE nell'inizializzazione Firebase Admin: %s. "
+                     "L'autenticazione potrebbe non funzionare correttamente", e)
 
 app = FastAPI(title="GetBusinessPlan API", version="1.0.0")
 
@@ -66,7 +79,7 @@ security = HTTPBearer(auto_error=False)
 async def verify_firebase_token(credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)):
     """Verifica il token Firebase e restituisce l'utente autenticato"""
     if not credentials:
-        print("❌ verify_firebase_token: Nessun token fornito")
+        logger.info("❌ verify_firebase_token: Nessun token fornito")
         raise HTTPException(
             status_code=401,
             detail="Token di autenticazione richiesto. Effettua il login per continuare."
@@ -78,27 +91,24 @@ async def verify_firebase_token(credentials: Optional[HTTPAuthorizationCredentia
     try:
         firebase_admin.get_app()
     except ValueError:
-        print("❌ ERRORE CRITICO: Firebase Admin non inizializzato!")
+        logger.error("❌ ERRORE CRITICO: Firebase Admin non inizializzato!")
         raise HTTPException(
             status_code=500,
             detail="Errore di configurazione del server. Contatta il supporto."
         )
     
     if not token or len(token) < 10:
-        print(f"❌ verify_firebase_token: Token non valido (lunghezza: {len(token) if token else 0})")
+        logger.info("❌ verify_firebase_token: Token non valido", lunghezza=len(token) if token else 0)
         raise HTTPException(
             status_code=401,
             detail="Token non valido. Effettua nuovamente il login."
         )
     
-    print(f"🔍 Verifica token Firebase (lunghezza: {len(token)}, preview: {token[:20]}...)")
-    
     # Verifica che Firebase Admin sia inizializzato
     try:
         app = firebase_admin.get_app()
-        print(f"✅ Firebase Admin app trovata: {app.name}")
     except ValueError as e:
-        print(f"❌ ERRORE: Firebase Admin app non trovata: {e}")
+        logger.error("❌ ERRORE: Firebase Admin app non trovata: %s", e)
         raise HTTPException(
             status_code=500,
             detail="Errore di configurazione del server. Firebase Admin non inizializzato."
@@ -106,13 +116,8 @@ async def verify_firebase_token(credentials: Optional[HTTPAuthorizationCredentia
     
     try:
         # Verifica il token con Firebase Admin
-        print("🔄 Chiamata auth.verify_id_token...")
         decoded_token = auth.verify_id_token(token, check_revoked=False)
-        print(f"✅ Token verificato con successo!")
-        print(f"   Email: {decoded_token.get('email', 'N/A')}")
-        print(f"   UID: {decoded_token.get('uid', 'N/A')}")
-        print(f"   Project ID (aud): {decoded_token.get('aud', 'N/A')}")
-        print(f"   Issuer: {decoded_token.get('iss', 'N/A')}")
+        logger.debug("✅ Token verificato", uid=decoded_token.get('uid', 'N/A'), aud=decoded_token.get('aud', 'N/A'))
         
         # Verifica che il project ID corrisponda (opzionale, per debug)
         try:
@@ -122,32 +127,34 @@ async def verify_firebase_token(credentials: Optional[HTTPAuthorizationCredentia
                 expected_project_id = app.credential.project_id
                 token_project_id = decoded_token.get('aud')
                 if expected_project_id and token_project_id and expected_project_id != token_project_id:
-                    print(f"⚠️ ATTENZIONE: Project ID mismatch! Token: {token_project_id}, Config: {expected_project_id}")
+                    logger.warning("⚠️ ATTENZIONE: Project ID mismatch! Token: %s, Config: %s", token_project_id, expected_project_id)
         except:
             pass
         
         return decoded_token
     except ValueError as e:
-        print(f"❌ Errore verifica token Firebase (ValueError): {e}")
+        logger.info("❌ Errore verifica token Firebase (ValueError): %s", e)
         raise HTTPException(
             status_code=401,
             detail="Token non valido. Effettua nuovamente il login."
         )
     except firebase_admin.exceptions.InvalidArgumentError as e:
-        print(f"❌ Errore verifica token Firebase (InvalidArgumentError): {e}")
+        logger.info("❌ Errore verifica token Firebase (InvalidArgumentError): %s", e)
         raise HTTPException(
             status_code=401,
             detail="Token non valido. Effettua nuovamente il login."
         )
     except Exception as e:
-        print(f"❌ Errore verifica token Firebase (generico): {type(e).__name__}: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ Errore verifica token Firebase (generico): %s: %s", type(e).__name__, e)
         raise HTTPException(
             status_code=401,
             detail="Token non valido o scaduto. Effettua nuovamente il login."
         )
 
+# Body JSON compressi (Content-Encoding: gzip/deflate) con limite sulla dimensione decompressa.
+# Registrato prima di CORS così anche le risposte di errore ricevono gli header CORS.
+app.add_middleware(DecompressRequestMiddleware)
+
 # CORS - in produzione, specifica i domini
 app.add_middleware(
     CORSMiddleware,
@@ -164,7 +171,7 @@ if not OPENAI_API_KEY:
 
 # Verifica formato base della chiave (deve iniziare con sk-)
 if not OPENAI_API_KEY.startswith("sk-"):
-    print("⚠️ ATTENZIONE: La chiave API potrebbe non essere valida (dovrebbe iniziare con 'sk-')")
+    logger.warning("⚠️ ATTENZIONE: La chiave API potrebbe non essere valida (dovrebbe iniziare con 'sk-')")
 
 client = OpenAI(api_key=OPENAI_API_KEY)
 
@@ -176,7 +183,7 @@ STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET", "")
 if STRIPE_SECRET_KEY:
     stripe.api_key = STRIPE_SECRET_KEY
 else:
-    print("⚠️ ATTENZIONE: STRIPE_SECRET_KEY non configurata. Il pagamento non funzionerà.")
+    logger.warning("⚠️ ATTENZIONE: STRIPE_SECRET_KEY non configurata. Il pagamento non funzionerà.")
 
 # Prezzi (in centesimi di euro) - usati come fallback se Price ID non configurati
 PRICE_BUSINESS_PLAN = int(os.getenv("PRICE_BUSINESS_PLAN_CENTS", "1999"))  # 19.99€ default
@@ -196,17 +203,37 @@ class BusinessPlanRequest(BaseModel):
     horizonMonths: int = 24
 
 class PDFRequest(BaseModel):
-    businessPlanJson: dict
+    businessPlanJson: Optional[dict] = None  # JSON completo (client che non usano documentId)
+    documentId: Optional[str] = None  # id restituito da /api/generate-business-plan
+    paymentSessionId: Optional[str] = None
+    profile: Optional[str] = None  # "screen" (default), "print" o "archive"
 
 class MarketAnalysisRequest(BaseModel):
     formData: dict
     analysisType: str = "deep"  # "standard" o "deep"
 
 class PDFAnalysisRequest(BaseModel):
-    marketAnalysisJson: dict
+    marketAnalysisJson: Optional[dict] = None
+    documentId: Optional[str] = None  # id restituito da /api/generate-market-analysis
+    paymentSessionId: Optional[str] = None
+    profile: Optional[str] = None  # "screen" (default), "print" o "archive"
 
 class PDFValidationRequest(BaseModel):
-    validationJson: dict
+    validationJson: Optional[dict] = None
+    documentId: Optional[str] = None  # id restituito da /api/validate-idea
+    paymentSessionId: Optional[str] = None
+    profile: Optional[str] = None  # "screen" (default), "print" o "archive"
+
+class PreviewRequest(BaseModel):
+    businessPlanJson: Optional[dict] = None
+    documentId: Optional[str] = None  # id restituito da /api/generate-business-plan
+
+class PDFPreviewRequest(BaseModel):
+    documentType: str = "business-plan"  # "business-plan", "market-analysis" o "validate-idea"
+    documentId: Optional[str] = None  # id restituito dall'endpoint di generazione (niente JSON inline: endpoint senza login)
+
+class PDFBundleRequest(BaseModel):
+    sessionIds: List[str]  # acquisti da includere (una sessione con upsell copre due documenti)
 
 class SuggestionRequest(BaseModel):
     questionId: str
@@ -229,6 +256,205 @@ class VerifyPaymentRequest(BaseModel):
 class ValidateIdeaRequest(BaseModel):
     formData: dict
 
+async def get_paid_session(session_id: str) -> Optional[dict]:
+    """Restituisce le info della sessione pagata (cache locale, poi Stripe) o None se non pagata"""
+    # SQLite e Stripe sono sincroni: le chiamate vanno in un thread per non bloccare l'event loop
+    info = await asyncio.to_thread(payment_cache.get_paid_session, session_id)
+    if info is not None:
+        return info
+    session = await asyncio.to_thread(stripe.checkout.Session.retrieve, session_id)
+    return await asyncio.to_thread(payment_cache.record_stripe_session, session)
+
+async def require_paid_session(session_id: Optional[str]):
+    """Solleva 402 se la sessione indicata non risulta pagata"""
+    if not session_id or not STRIPE_SECRET_KEY:
+        return
+    try:
+        if await get_paid_session(session_id) is None:
+            raise HTTPException(status_code=402, detail="Pagamento non completato")
+    except stripe.error.StripeError as e:
+        raise HTTPException(status_code=402, detail=f"Errore verifica pagamento: {str(e)}")
+
+# Nomi file con cui vengono scaricati i PDF, per tipo di documento
+PDF_FILENAMES = {
+    "business-plan": "business-plan.pdf",
+    "market-analysis": "analisi-mercato.pdf",
+    "validate-idea": "validazione-idea.pdf",
+    "bundle": "pacchetto-documenti.pdf",
+}
+
+async def resolve_pdf_document(inline_json: Optional[dict], document_id: Optional[str],
+                               payment_session_id: Optional[str]) -> Tuple[dict, str, Optional[str]]:
+    """Restituisce (json, digest, session_id) dal document store (letto fuori dall'event loop) o dal JSON inviato dal client"""
+    if document_id:
+        document = await asyncio.to_thread(document_store.load, document_id)
+        if document is None:
+            raise HTTPException(status_code=404, detail="Documento non trovato")
+        return document, document_id, payment_session_id
+    
+    if inline_json is None:
+        raise HTTPException(status_code=400, detail="Specifica documentId oppure il JSON del documento")
+    
+    # Il sessionId può arrivare anche dentro il JSON (retrocompatibilità)
+    session_id = payment_session_id or inline_json.get('_payment_session_id')
+    # Rimuovi il campo temporaneo dal JSON prima di generare il PDF
+    pdf_json = {k: v for k, v in inline_json.items() if k != '_payment_session_id'}
+    return pdf_json, entitlements.json_digest(pdf_json), session_id
+
+def resolve_pdf_profile(profile: Optional[str]) -> str:
+    """Profilo di output richiesto dal client (400 se sconosciuto)"""
+    try:
+        return pdf_profiles.resolve(profile)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def get_entitled_pdf(session_id: Optional[str], user: dict, document_type: str, json_digest: str) -> Optional[Path]:
+    """Restituisce il PDF già renderizzato per la stessa sessione e lo stesso JSON, se esiste"""
+    if not session_id:
+        return None
+    entitlement = entitlements.get(session_id, document_type)
+    if entitlements.is_owned_by_other(entitlement, user.get('uid')):
+        raise HTTPException(status_code=403, detail="Questo acquisto è associato a un altro account")
+    if entitlement and entitlement['json_digest'] == json_digest:
+        return entitlements.artifact_path(entitlement['pdf_digest'])
+    return None
+
+def record_entitled_pdf(session_id: Optional[str], user: dict, document_type: str, json_digest: str,
+                        pdf_bytes: Optional[bytes]):
+    """Collega sessione, utente, JSON e PDF renderizzato nel ledger delle entitlement
+    (pdf_bytes None: registra solo la proprietà; JSON e artifact restano quelli già registrati)"""
+    if not session_id:
+        return
+    if pdf_bytes is None:
+        entitlements.record(session_id, document_type, uid=user.get('uid'))
+        return
+    entitlements.record(
+        session_id, document_type,
+        uid=user.get('uid'),
+        json_digest=json_digest,
+        pdf_digest=entitlements.store_artifact(pdf_bytes)
+    )
+
+class PinnedFileResponse(FileResponse):
+    """FileResponse di un PDF pinnato in cache: il pin si rilascia sempre, anche se il client
+    si disconnette o l'invio fallisce (i BackgroundTask in quei casi non vengono eseguiti)"""
+    
+    def __init__(self, path, pinned_key: str, **kwargs):
+        super().__init__(path, **kwargs)
+        self.pinned_key = pinned_key
+    
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            pdf_cache.release(self.pinned_key)
+
+def pdf_response(pdf, filename: str, headers: Optional[dict] = None, pinned_key: Optional[str] = None,
+                 disposition: str = "attachment"):
+    """Risposta PDF dai byte renderizzati in memoria o da un file già su disco.
+    pinned_key: PDF in cache pinnato, rilasciato al termine dell'invio (completo o interrotto).
+    disposition: "attachment" (download) o "inline" (visualizzazione nel browser)"""
+    if isinstance(pdf, bytes):
+        # Response con body in memoria: Content-Length calcolato sui byte
+        return Response(
+            content=pdf,
+            media_type="application/pdf",
+            headers={"Content-Disposition": f'{disposition}; filename="{filename}"', **(headers or {})}
+        )
+    if pinned_key:
+        return PinnedFileResponse(pdf, pinned_key, media_type="application/pdf", filename=filename,
+                                  headers=headers, content_disposition_type=disposition)
+    return FileResponse(pdf, media_type="application/pdf", filename=filename, headers=headers,
+                        content_disposition_type=disposition)
+
+# Anteprime PDF per tipo di documento: copertina, indice ed executive summary con watermark, senza grafici
+PDF_PREVIEW_RENDERERS = {
+    "business-plan": pdf_generator.render_preview_from_json,
+    "market-analysis": pdf_generator_analysis.render_preview_from_market_analysis,
+    "validate-idea": pdf_generator_validation.render_preview_from_validation,
+}
+
+# Render in corso per chiave di cache: richieste concorrenti dello stesso documento condividono il rendering
+_inflight_renders = {}
+
+async def render_and_cache_pdf(key: str, pdf_json, render, profile: str) -> bytes:
+    """Rendering condiviso dalle richieste in attesa: solo chi lo esegue salva il PDF in cache"""
+    pdf_bytes = await render(pdf_json, profile)
+    await asyncio.to_thread(pdf_cache.put, key, pdf_bytes)
+    return pdf_bytes
+
+def shared_render(key: str, document_type: str, profile: str, start):
+    """Rendering in corso per la chiave, avviato con start() se non c'è: le richieste concorrenti lo condividono"""
+    task = _inflight_renders.get(key)
+    if task is None:
+        logger.info("=== INIZIO GENERAZIONE PDF %s ===", document_type, profilo=profile)
+        task = asyncio.ensure_future(start())
+        _inflight_renders[key] = task
+        task.add_done_callback(lambda _: _inflight_renders.pop(key, None))
+    return asyncio.shield(task)
+
+async def get_or_render_pdf(document_type: str, pdf_json: dict, json_digest: str, render,
+                            profile: str = pdf_profiles.DEFAULT_PROFILE) -> Tuple[object, Optional[str]]:
+    """Restituisce (pdf, pinned_key): il path in cache pinnato se già renderizzato per questo
+    digest, profilo e versione del renderer, altrimenti i byte del nuovo rendering (salvati in cache)"""
+    key = pdf_cache.cache_key(document_type, json_digest, profile)
+    cached_path = await asyncio.to_thread(pdf_cache.acquire, key)
+    if cached_path is not None:
+        return cached_path, key
+    
+    pdf_bytes = await shared_render(key, document_type, profile,
+                                    lambda: render_and_cache_pdf(key, pdf_json, render, profile))
+    return pdf_bytes, None
+
+async def render_and_cache_preview(key: str, preview_json: dict, render, profile: str) -> bytes:
+    """Rendering di un'anteprima salvato nella cache delle anteprime (non in quella dei PDF a pagamento)"""
+    pdf_bytes = await render(preview_json, profile)
+    pdf_preview_cache.put(key, pdf_bytes)
+    return pdf_bytes
+
+async def get_or_render_preview(document_type: str, preview_json: dict, json_digest: str, render) -> bytes:
+    """Byte dell'anteprima dalla cache in memoria delle anteprime o da un nuovo rendering"""
+    profile = pdf_profiles.DEFAULT_PROFILE
+    key = pdf_cache.cache_key(document_type, json_digest, profile)
+    pdf_bytes = pdf_preview_cache.get(key)
+    if pdf_bytes is not None:
+        return pdf_bytes
+    return await shared_render(key, document_type, profile,
+                               lambda: render_and_cache_preview(key, preview_json, render, profile))
+
+async def serve_pdf(document_type: str, pdf_json: dict, json_digest: str, session_id: Optional[str], user: dict,
+                    render, filename: str, headers: Optional[dict] = None,
+                    profile: str = pdf_profiles.DEFAULT_PROFILE):
+    """Flusso comune degli endpoint PDF: artifact già acquistato, cache dei render, nuovo rendering.
+    L'artifact dell'acquisto è sempre il PDF nel profilo di default; gli altri profili passano dalla cache."""
+    # Re-download dello stesso documento: riusa il PDF già renderizzato
+    entitled_path = await asyncio.to_thread(get_entitled_pdf, session_id, user, document_type, json_digest)
+    is_default_profile = profile == pdf_profiles.DEFAULT_PROFILE
+    if entitled_path is not None and is_default_profile:
+        return pdf_response(entitled_path, filename, headers)
+    
+    pdf, pinned_key = await get_or_render_pdf(document_type, pdf_json, json_digest, render, profile)
+    try:
+        if session_id:
+            pdf_bytes = None
+            if is_default_profile:
+                pdf_bytes = pdf if isinstance(pdf, bytes) else await asyncio.to_thread(pdf.read_bytes)
+            await asyncio.to_thread(record_entitled_pdf, session_id, user, document_type, json_digest, pdf_bytes)
+        return pdf_response(pdf, filename, headers, pinned_key)
+    except BaseException:
+        if pinned_key:
+            pdf_cache.release(pinned_key)
+        raise
+
+@app.on_event("startup")
+async def start_render_pool():
+    # Avvia e scalda i worker di rendering PDF prima delle prime richieste
+    render_pool.start()
+
+@app.on_event("shutdown")
+async def stop_render_pool():
+    render_pool.shutdown()
+
 @app.get("/")
 @app.head("/")
 async def root():
@@ -267,7 +493,7 @@ async def test_firebase():
     try:
         # Verifica che Firebase Admin sia inizializzato
         app = firebase_admin.get_app()
-        print(f"✅ Firebase Admin app trovata: {app.name}")
+        logger.info("✅ Firebase Admin app trovata: %s", app.name)
         
         # Prova a ottenere informazioni sul progetto
         project_id = None
@@ -446,9 +672,9 @@ async def generate_business_plan(request: BusinessPlanRequest):
     """Genera il business plan chiamando OpenAI"""
     import datetime
     start_time = datetime.datetime.now()
-    print(f"=== INIZIO GENERAZIONE BUSINESS PLAN ===")
-    print(f"Timestamp: {start_time.isoformat()}")
-    print(f"Dati ricevuti: {len(str(request.formData))} caratteri")
+    logger.info("=== INIZIO GENERAZIONE BUSINESS PLAN ===")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Dati ricevuti: %d caratteri", len(str(request.formData)))
     
     try:
         # Carica il prompt template
@@ -457,12 +683,12 @@ async def generate_business_plan(request: BusinessPlanRequest):
             # Prova nella directory parent
             prompt_path = Path(__file__).parent.parent / "prompt.json"
         
-        print(f"Caricamento prompt da: {prompt_path}")
+        logger.debug("Caricamento prompt da: %s", prompt_path)
         with open(prompt_path, "r", encoding="utf-8") as f:
             prompt_config = json.load(f)
         
         model_name = prompt_config.get('model', 'N/A')
-        print(f"Modello configurato: {model_name}")
+        logger.debug("Modello configurato: %s", model_name)
         
         # Verifica se il modello è valido (lista modelli comuni)
         valid_models = [
@@ -470,8 +696,8 @@ async def generate_business_plan(request: BusinessPlanRequest):
             'o1-preview', 'o1-mini', 'gpt-4o-2024-08-06', 'gpt-4-turbo-2024-04-09'
         ]
         if not any(model_name.startswith(vm.split('-')[0]) for vm in valid_models):
-            print(f"⚠️ ATTENZIONE: Il modello '{model_name}' potrebbe non essere valido")
-            print(f"Modelli suggeriti: {', '.join(valid_models[:3])}")
+            logger.warning("⚠️ ATTENZIONE: Il modello '%s' potrebbe non essere valido (suggeriti: %s)",
+                           model_name, ', '.join(valid_models[:3]))
         
         # Prepara i dati utente
         user_data_json = utils.prepare_user_input_json(request.formData)
@@ -512,10 +738,7 @@ async def generate_business_plan(request: BusinessPlanRequest):
         
         # Chiama OpenAI
         openai_start = datetime.datetime.now()
-        print(f"Chiamata OpenAI con modello {request_body['model']}...")
-        print(f"Timestamp inizio OpenAI: {openai_start.isoformat()}")
-        print(f"Request body keys: {list(request_body.keys())}")
-        print(f"Numero messaggi: {len(request_body.get('messages', []))}")
+        logger.info("Chiamata OpenAI con modello %s", request_body['model'], messaggi=len(request_body.get('messages', [])))
         
         try:
             # Chiamata OpenAI sincrona (il client OpenAI gestisce già il timeout interno)
@@ -538,21 +761,17 @@ async def generate_business_plan(request: BusinessPlanRequest):
                     )
             openai_end = datetime.datetime.now()
             openai_elapsed = (openai_end - openai_start).total_seconds()
-            print(f"Timestamp fine OpenAI: {openai_end.isoformat()}")
-            print(f"Tempo chiamata OpenAI: {openai_elapsed:.2f} secondi ({openai_elapsed/60:.2f} minuti)")
             if response.choices and len(response.choices) > 0:
                 content = response.choices[0].message.content
-                print(f"Risposta ricevuta, lunghezza: {len(str(content)) if content else 0}")
+                logger.info("Risposta OpenAI ricevuta in %.2f secondi", openai_elapsed,
+                            lunghezza=len(str(content)) if content else 0)
             else:
-                print("ATTENZIONE: Risposta OpenAI senza choices")
+                logger.warning("ATTENZIONE: Risposta OpenAI senza choices (%.2f secondi)", openai_elapsed)
         except Exception as openai_error:
             openai_end = datetime.datetime.now()
             openai_elapsed = (openai_end - openai_start).total_seconds()
-            print(f"ERRORE OpenAI dopo {openai_elapsed:.2f} secondi")
-            print(f"Tipo errore: {type(openai_error).__name__}")
-            print(f"Messaggio errore: {str(openai_error)}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("ERRORE OpenAI dopo %.2f secondi: %s: %s",
+                             openai_elapsed, type(openai_error).__name__, openai_error)
             # Restituisci un errore più dettagliato
             error_detail = f"Errore OpenAI: {str(openai_error)}"
             if "model" in str(openai_error).lower() or "invalid" in str(openai_error).lower():
@@ -575,30 +794,28 @@ async def generate_business_plan(request: BusinessPlanRequest):
         # Valida la qualità del business plan
         is_valid, validation_report = utils.validate_business_plan_quality(business_plan_json)
         if not is_valid:
-            print("⚠️ ATTENZIONE: Il business plan non rispetta tutti i requisiti minimi di qualità")
-            print(f"Avvisi: {len(validation_report['warnings'])}")
-            for warning in validation_report['warnings']:
-                print(f"  - {warning}")
+            logger.warning("⚠️ ATTENZIONE: Il business plan non rispetta tutti i requisiti minimi di qualità: %s",
+                           "; ".join(validation_report['warnings']), avvisi=len(validation_report['warnings']))
         else:
-            print("✅ Validazione qualità: tutti i requisiti minimi rispettati")
+            logger.info("✅ Validazione qualità: tutti i requisiti minimi rispettati")
         
         end_time = datetime.datetime.now()
         elapsed = (end_time - start_time).total_seconds()
-        print(f"=== FINE GENERAZIONE BUSINESS PLAN ===")
-        print(f"Tempo totale: {elapsed:.2f} secondi ({elapsed/60:.2f} minuti)")
-        print(f"Timestamp fine: {end_time.isoformat()}")
+        logger.info("=== FINE GENERAZIONE BUSINESS PLAN === Tempo totale: %.2f secondi", elapsed)
+        
+        # Salva il documento lato server: i PDF potranno essere richiesti per id
+        document_id = await asyncio.to_thread(document_store.save, business_plan_json)
         
         return JSONResponse(content={
             "success": True,
             "json": business_plan_json,
+            "documentId": document_id,
             "generation_time_seconds": elapsed,
             "validation": validation_report if not is_valid else None  # Includi solo se ci sono problemi
         })
         
     except json.JSONDecodeError as e:
-        print(f"ERRORE parsing JSON: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("ERRORE parsing JSON: %s", e)
         raise HTTPException(status_code=500, detail=f"Errore parsing JSON: {str(e)}")
     except HTTPException:
         # Rilancia le HTTPException così come sono
@@ -606,10 +823,7 @@ async def generate_business_plan(request: BusinessPlanRequest):
     except Exception as e:
         end_time = datetime.datetime.now()
         elapsed = (end_time - start_time).total_seconds()
-        print(f"ERRORE GENERALE dopo {elapsed:.2f} secondi: {str(e)}")
-        print(f"Tipo errore: {type(e).__name__}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("ERRORE GENERALE dopo %.2f secondi: %s: %s", elapsed, type(e).__name__, e)
         raise HTTPException(status_code=500, detail=f"Errore interno: {str(e)}")
 
 @app.post("/api/generate-market-analysis")
@@ -617,10 +831,9 @@ async def generate_market_analysis(request: MarketAnalysisRequest):
     """Genera analisi di mercato con deep research usando web search"""
     import datetime
     start_time = datetime.datetime.now()
-    print(f"=== INIZIO ANALISI DI MERCATO ===")
-    print(f"Timestamp: {start_time.isoformat()}")
-    print(f"Tipo analisi: {request.analysisType}")
-    print(f"Dati ricevuti: {len(str(request.formData))} caratteri")
+    logger.info("=== INIZIO ANALISI DI MERCATO ===", tipo_analisi=request.analysisType)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Dati ricevuti: %d caratteri", len(str(request.formData)))
     
     try:
         # Carica il prompt template per analisi di mercato
@@ -628,12 +841,12 @@ async def generate_market_analysis(request: MarketAnalysisRequest):
         if not prompt_path.exists():
             raise HTTPException(status_code=500, detail="File prompt_analisi.json non trovato")
         
-        print(f"Caricamento prompt da: {prompt_path}")
+        logger.debug("Caricamento prompt da: %s", prompt_path)
         with open(prompt_path, "r", encoding="utf-8") as f:
             prompt_config = json.load(f)
         
         model_name = prompt_config.get('model', 'gpt-4o')
-        print(f"Modello configurato: {model_name}")
+        logger.debug("Modello configurato: %s", model_name)
         
         # Prepara i dati utente per l'analisi
         user_data = {
@@ -689,9 +902,7 @@ async def generate_market_analysis(request: MarketAnalysisRequest):
         
         # Chiama OpenAI
         openai_start = datetime.datetime.now()
-        print(f"Chiamata OpenAI con modello {model_name} per analisi di mercato...")
-        print(f"Timestamp inizio OpenAI: {openai_start.isoformat()}")
-        print(f"Request body keys: {list(request_body.keys())}")
+        logger.info("Chiamata OpenAI con modello %s per analisi di mercato", model_name)
         
         try:
             # Chiamata OpenAI sincrona
@@ -712,21 +923,17 @@ async def generate_market_analysis(request: MarketAnalysisRequest):
                     )
             openai_end = datetime.datetime.now()
             openai_elapsed = (openai_end - openai_start).total_seconds()
-            print(f"Timestamp fine OpenAI: {openai_end.isoformat()}")
-            print(f"Tempo chiamata OpenAI: {openai_elapsed:.2f} secondi ({openai_elapsed/60:.2f} minuti)")
             if response.choices and len(response.choices) > 0:
                 content = response.choices[0].message.content
-                print(f"Risposta ricevuta, lunghezza: {len(str(content)) if content else 0}")
+                logger.info("Risposta OpenAI ricevuta in %.2f secondi", openai_elapsed,
+                            lunghezza=len(str(content)) if content else 0)
             else:
-                print("ATTENZIONE: Risposta OpenAI senza choices")
+                logger.warning("ATTENZIONE: Risposta OpenAI senza choices (%.2f secondi)", openai_elapsed)
         except Exception as openai_error:
             openai_end = datetime.datetime.now()
             openai_elapsed = (openai_end - openai_start).total_seconds()
-            print(f"ERRORE OpenAI dopo {openai_elapsed:.2f} secondi")
-            print(f"Tipo errore: {type(openai_error).__name__}")
-            print(f"Messaggio errore: {str(openai_error)}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("ERRORE OpenAI dopo %.2f secondi: %s: %s",
+                             openai_elapsed, type(openai_error).__name__, openai_error)
             error_detail = f"Errore OpenAI: {str(openai_error)}"
             if "model" in str(openai_error).lower() or "invalid" in str(openai_error).lower():
                 error_detail += f" (Verifica che il modello '{model_name}' sia valido)"
@@ -742,40 +949,34 @@ async def generate_market_analysis(request: MarketAnalysisRequest):
         # Valida i requisiti minimi di parole
         is_valid, validation_report = utils.validate_market_analysis_word_count(market_analysis_json)
         if not is_valid:
-            print("⚠️ ATTENZIONE: L'analisi non rispetta tutti i requisiti minimi di parole")
-            print(f"Avvisi: {len(validation_report['warnings'])}")
-            for warning in validation_report['warnings']:
-                print(f"  - {warning}")
+            logger.warning("⚠️ ATTENZIONE: L'analisi non rispetta tutti i requisiti minimi di parole: %s",
+                           "; ".join(validation_report['warnings']), avvisi=len(validation_report['warnings']))
         else:
-            print("✅ Validazione parole: tutti i requisiti minimi rispettati")
+            logger.info("✅ Validazione parole: tutti i requisiti minimi rispettati")
         
         end_time = datetime.datetime.now()
         elapsed = (end_time - start_time).total_seconds()
-        print(f"=== FINE ANALISI DI MERCATO ===")
-        print(f"Tempo totale: {elapsed:.2f} secondi ({elapsed/60:.2f} minuti)")
-        print(f"Timestamp fine: {end_time.isoformat()}")
+        logger.info("=== FINE ANALISI DI MERCATO === Tempo totale: %.2f secondi", elapsed)
+        
+        document_id = await asyncio.to_thread(document_store.save, market_analysis_json)
         
         return JSONResponse(content={
             "success": True,
             "json": market_analysis_json,
+            "documentId": document_id,
             "generation_time_seconds": elapsed,
             "validation": validation_report if not is_valid else None  # Includi solo se ci sono problemi
         })
         
     except json.JSONDecodeError as e:
-        print(f"ERRORE parsing JSON: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("ERRORE parsing JSON: %s", e)
         raise HTTPException(status_code=500, detail=f"Errore parsing JSON: {str(e)}")
     except HTTPException:
         raise
     except Exception as e:
         end_time = datetime.datetime.now()
         elapsed = (end_time - start_time).total_seconds()
-        print(f"ERRORE GENERALE dopo {elapsed:.2f} secondi: {str(e)}")
-        print(f"Tipo errore: {type(e).__name__}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("ERRORE GENERALE dopo %.2f secondi: %s: %s", elapsed, type(e).__name__, e)
         raise HTTPException(status_code=500, detail=f"Errore interno: {str(e)}")
 
 @app.post("/api/create-checkout-session")
@@ -790,7 +991,7 @@ async def create_checkout_session(
     # L'utente è autenticato (verificato da verify_firebase_token)
     user_email = user.get('email', 'unknown')
     user_id = user.get('uid', 'unknown')
-    print(f"✅ Checkout session richiesta da utente autenticato: {user_email} (UID: {user_id})")
+    logger.info("✅ Checkout session richiesta da utente autenticato", uid=user_id)
     
     try:
         # Determina il prezzo in base al tipo di documento
@@ -878,20 +1079,17 @@ async def create_checkout_session(
                         'quantity': 1,
                     })
         elif request.documentType == "validate-idea":
-            print(f"💰 Creazione checkout per validazione idea")
-            print(f"   STRIPE_PRICE_VALIDATE_IDEA: {STRIPE_PRICE_VALIDATE_IDEA if STRIPE_PRICE_VALIDATE_IDEA else 'NON CONFIGURATO'}")
-            print(f"   PRICE_VALIDATE_IDEA (fallback): {PRICE_VALIDATE_IDEA} centesimi")
+            logger.debug("💰 Creazione checkout per validazione idea",
+                         price_id=STRIPE_PRICE_VALIDATE_IDEA or 'NON CONFIGURATO', prezzo_centesimi=PRICE_VALIDATE_IDEA)
             
             # Usa Price ID se configurato, altrimenti usa price_data
             if STRIPE_PRICE_VALIDATE_IDEA:
-                print(f"   Usando Price ID Stripe: {STRIPE_PRICE_VALIDATE_IDEA}")
                 line_items.append({
                     'price': STRIPE_PRICE_VALIDATE_IDEA,
                     'quantity': 1,
                 })
             else:
                 # Fallback a price_data se Price ID non configurato
-                print(f"   Usando price_data con prezzo: {PRICE_VALIDATE_IDEA} centesimi")
                 line_items.append({
                     'price_data': {
                         'currency': 'eur',
@@ -903,7 +1101,7 @@ async def create_checkout_session(
                     'quantity': 1,
                 })
         else:
-            print(f"❌ Tipo documento non valido: {request.documentType}")
+            logger.warning("❌ Tipo documento non valido: %s", request.documentType)
             raise HTTPException(status_code=400, detail=f"Tipo documento non valido: {request.documentType}")
         
         # Crea la sessione di checkout
@@ -932,9 +1130,7 @@ async def create_checkout_session(
             "url": checkout_session.url
         })
     except Exception as e:
-        print(f"Errore creazione checkout session: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Errore creazione checkout session: %s", e)
         raise HTTPException(status_code=500, detail=f"Errore creazione checkout: {str(e)}")
 
 @app.post("/api/verify-payment")
@@ -944,11 +1140,11 @@ async def verify_payment(request: VerifyPaymentRequest):
         raise HTTPException(status_code=500, detail="Stripe non configurato")
     
     try:
-        # Recupera la sessione di checkout
-        session = stripe.checkout.Session.retrieve(request.sessionId)
+        # Recupera la sessione pagata (dalla cache locale se già verificata)
+        paid_session = await get_paid_session(request.sessionId)
         
         # Verifica che il pagamento sia completato
-        if session.payment_status != 'paid':
+        if paid_session is None:
             return JSONResponse(content={
                 "success": False,
                 "paid": False,
@@ -956,7 +1152,7 @@ async def verify_payment(request: VerifyPaymentRequest):
             })
         
         # Verifica che il tipo di documento corrisponda
-        if session.metadata.get('document_type') != request.documentType:
+        if paid_session['document_type'] != request.documentType:
             return JSONResponse(content={
                 "success": False,
                 "paid": False,
@@ -964,8 +1160,8 @@ async def verify_payment(request: VerifyPaymentRequest):
             })
         
         # Verifica se include upsell
-        include_upsell = session.metadata.get('include_upsell') == 'true'
-        upsell_type = session.metadata.get('upsell_type') if include_upsell else None
+        include_upsell = paid_session['include_upsell']
+        upsell_type = paid_session['upsell_type']
         
         return JSONResponse(content={
             "success": True,
@@ -975,145 +1171,239 @@ async def verify_payment(request: VerifyPaymentRequest):
             "upsellType": upsell_type
         })
     except stripe.error.StripeError as e:
-        print(f"Errore Stripe: {str(e)}")
+        logger.warning("Errore Stripe: %s", e)
         raise HTTPException(status_code=400, detail=f"Errore verifica pagamento: {str(e)}")
     except Exception as e:
-        print(f"Errore verifica pagamento: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Errore verifica pagamento: %s", e)
         raise HTTPException(status_code=500, detail=f"Errore interno: {str(e)}")
 
+# Eventi Stripe che confermano un pagamento completato
+STRIPE_PAYMENT_EVENTS = ("checkout.session.completed", "checkout.session.async_payment_succeeded")
+
+@app.post("/api/stripe/webhook")
+async def stripe_webhook(request: Request, stripe_signature: Optional[str] = Header(None)):
+    """Riceve i webhook Stripe e registra le sessioni pagate nel ledger locale"""
+    if not STRIPE_WEBHOOK_SECRET:
+        raise HTTPException(status_code=500, detail="Webhook Stripe non configurato")
+    
+    payload = await request.body()
+    try:
+        event = stripe.Webhook.construct_event(payload, stripe_signature, STRIPE_WEBHOOK_SECRET)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Payload webhook non valido")
+    except stripe.error.SignatureVerificationError:
+        raise HTTPException(status_code=400, detail="Firma webhook non valida")
+    
+    # Stripe può consegnare lo stesso evento più volte
+    if await asyncio.to_thread(payment_cache.has_event, event["id"]):
+        return {"received": True, "duplicate": True}
+    
+    if event["type"] in STRIPE_PAYMENT_EVENTS:
+        session = event["data"]["object"]
+        if await asyncio.to_thread(payment_cache.record_stripe_session, session):
+            logger.info("✅ Webhook: sessione registrata come pagata", session_id=session['id'])
+    
+    await asyncio.to_thread(payment_cache.record_event, event["id"], event["type"])
+    return {"received": True}
+
 @app.post("/api/generate-pdf")
 async def generate_pdf(request: PDFRequest, user: dict = Depends(verify_firebase_token)):
     """Genera il PDF dal JSON del business plan (richiede autenticazione e pagamento verificato)"""
     try:
-        # Verifica che ci sia sessionId nel request (opzionale per retrocompatibilità)
+        # Documento dallo store (documentId) o dal JSON inviato; sessionId opzionale per retrocompatibilità
         # In produzione, dovresti sempre richiedere la verifica del pagamento
-        session_id = request.businessPlanJson.get('_payment_session_id')
-        
-        if session_id and STRIPE_SECRET_KEY:
-            # Verifica il pagamento
-            try:
-                session = stripe.checkout.Session.retrieve(session_id)
-                if session.payment_status != 'paid':
-                    raise HTTPException(status_code=402, detail="Pagamento non completato")
-            except stripe.error.StripeError as e:
-                raise HTTPException(status_code=402, detail=f"Errore verifica pagamento: {str(e)}")
-        
-        # Rimuovi il campo temporaneo dal JSON prima di generare il PDF
-        pdf_json = {k: v for k, v in request.businessPlanJson.items() if k != '_payment_session_id'}
-        
-        pdf_path = await pdf_generator.create_pdf_from_json(pdf_json)
+        pdf_json, json_digest, session_id = await resolve_pdf_document(
+            request.businessPlanJson, request.documentId, request.paymentSessionId
+        )
         
-        if not os.path.exists(pdf_path):
-            raise HTTPException(status_code=500, detail="PDF non generato correttamente")
+        await require_paid_session(session_id)
+        profile = resolve_pdf_profile(request.profile)
         
-        # Estrai nome file dal path
-        pdf_filename = os.path.basename(pdf_path)
+        # Nome file univoco per documento, per evitare cache del browser
+        pdf_filename = f"business-plan-{json_digest[:16]}.pdf"
         
         # Aggiungi header per evitare cache
         headers = {
-            "Content-Disposition": f'attachment; filename="{pdf_filename}"',
             "Cache-Control": "no-cache, no-store, must-revalidate",
             "Pragma": "no-cache",
             "Expires": "0"
         }
         
-        response = FileResponse(
-            pdf_path,
-            media_type="application/pdf",
-            filename=pdf_filename,
-            headers=headers
+        return await serve_pdf(
+            "business-plan", pdf_json, json_digest, session_id, user,
+            pdf_generator.render_pdf_from_json, pdf_filename, headers, profile
         )
-        
-        # Pulisci file temporaneo dopo l'invio (opzionale, in background)
-        # Nota: FileResponse gestisce la cancellazione automaticamente dopo l'invio
-        
-        return response
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Errore generazione PDF: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Errore generazione PDF: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
+def html_preview_response(document: dict, json_digest: str, if_none_match: Optional[str] = None) -> Response:
+    """Anteprima HTML trasmessa sezione per sezione (304 se il client ha già questa versione)"""
+    etag = f'"{json_digest}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "private, no-cache",
+        # Contenuto generato dall'AI: la pagina gira in un'origine isolata, senza accesso a cookie e storage
+        "Content-Security-Policy": "sandbox allow-scripts",
+    }
+    if if_none_match == etag:
+        return Response(status_code=304, headers=headers)
+    return StreamingResponse(html_preview.stream(document, json_digest),
+                             media_type="text/html", headers=headers)
+
+@app.post("/api/preview-html")
+async def preview_html(request: PreviewRequest, if_none_match: Optional[str] = Header(None)):
+    """Anteprima HTML del business plan (nessun pagamento richiesto, nessun rendering PDF)"""
+    preview_json, json_digest, _ = await resolve_pdf_document(request.businessPlanJson, request.documentId, None)
+    return html_preview_response(preview_json, json_digest, if_none_match)
+
+@app.get("/api/preview-html/{document_id}")
+async def preview_html_document(document_id: str, if_none_match: Optional[str] = Header(None)):
+    """Anteprima HTML di un documento salvato, apribile direttamente in un iframe o in una nuova scheda"""
+    preview_json, json_digest, _ = await resolve_pdf_document(None, document_id, None)
+    return html_preview_response(preview_json, json_digest, if_none_match)
+
+@app.post("/api/preview-pdf")
+async def preview_pdf(request: PDFPreviewRequest):
+    """Anteprima PDF delle prime pagine con watermark (nessun pagamento richiesto).
+    Solo documenti già generati (documentId): il JSON arbitrario di un client anonimo non arriva al render pool"""
+    render = PDF_PREVIEW_RENDERERS.get(request.documentType)
+    if render is None:
+        raise HTTPException(status_code=400, detail=f"Tipo di documento non valido: {request.documentType}")
+    if not request.documentId:
+        raise HTTPException(status_code=400, detail="Specifica il documentId restituito dalla generazione del documento")
+    preview_json, json_digest, _ = await resolve_pdf_document(None, request.documentId, None)
+    
+    try:
+        pdf = await get_or_render_preview(f"{request.documentType}-preview", preview_json, json_digest, render)
+    except Exception as e:
+        logger.exception("Errore generazione anteprima PDF: %s", e)
+        raise HTTPException(status_code=500, detail=f"Errore generazione anteprima PDF: {str(e)}")
+    filename = PDF_FILENAMES[request.documentType].replace(".pdf", "-anteprima.pdf")
+    return pdf_response(pdf, filename, disposition="inline")
+
 @app.post("/api/generate-pdf-analysis")
 async def generate_pdf_analysis(request: PDFAnalysisRequest, user: dict = Depends(verify_firebase_token)):
     """Genera PDF dall'analisi di mercato (richiede autenticazione e pagamento verificato)"""
     try:
-        # Verifica che ci sia sessionId nel request (opzionale per retrocompatibilità)
-        session_id = request.marketAnalysisJson.get('_payment_session_id')
-        
-        if session_id and STRIPE_SECRET_KEY:
-            # Verifica il pagamento
-            try:
-                session = stripe.checkout.Session.retrieve(session_id)
-                if session.payment_status != 'paid':
-                    raise HTTPException(status_code=402, detail="Pagamento non completato")
-            except stripe.error.StripeError as e:
-                raise HTTPException(status_code=402, detail=f"Errore verifica pagamento: {str(e)}")
-        
-        # Rimuovi il campo temporaneo dal JSON prima di generare il PDF
-        pdf_json = {k: v for k, v in request.marketAnalysisJson.items() if k != '_payment_session_id'}
-        
-        print("=== INIZIO GENERAZIONE PDF ANALISI DI MERCATO ===")
-        output_path = await pdf_generator_analysis.create_pdf_from_market_analysis(pdf_json)
+        # Documento dallo store (documentId) o dal JSON inviato; sessionId opzionale per retrocompatibilità
+        pdf_json, json_digest, session_id = await resolve_pdf_document(
+            request.marketAnalysisJson, request.documentId, request.paymentSessionId
+        )
         
-        if not Path(output_path).exists():
-            raise HTTPException(status_code=500, detail="File PDF non generato correttamente")
+        await require_paid_session(session_id)
+        profile = resolve_pdf_profile(request.profile)
         
-        return FileResponse(
-            path=output_path,
-            media_type="application/pdf",
-            filename="analisi-mercato.pdf"
+        return await serve_pdf(
+            "market-analysis", pdf_json, json_digest, session_id, user,
+            pdf_generator_analysis.render_pdf_from_market_analysis, PDF_FILENAMES["market-analysis"],
+            profile=profile
         )
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Errore nella generazione PDF analisi: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Errore nella generazione PDF analisi: %s", e)
         raise HTTPException(status_code=500, detail=f"Errore generazione PDF: {str(e)}")
 
 @app.post("/api/generate-pdf-validation")
 async def generate_pdf_validation(request: PDFValidationRequest, user: dict = Depends(verify_firebase_token)):
     """Genera PDF dalla validazione idea (richiede autenticazione e pagamento verificato)"""
     try:
-        # Verifica che ci sia sessionId nel request (opzionale per retrocompatibilità)
-        session_id = request.validationJson.get('_payment_session_id')
-        
-        if session_id and STRIPE_SECRET_KEY:
-            # Verifica il pagamento
-            try:
-                session = stripe.checkout.Session.retrieve(session_id)
-                if session.payment_status != 'paid':
-                    raise HTTPException(status_code=402, detail="Pagamento non completato")
-            except stripe.error.StripeError as e:
-                raise HTTPException(status_code=402, detail=f"Errore verifica pagamento: {str(e)}")
-        
-        # Rimuovi il campo temporaneo dal JSON prima di generare il PDF
-        pdf_json = {k: v for k, v in request.validationJson.items() if k != '_payment_session_id'}
-        
-        print("=== INIZIO GENERAZIONE PDF VALIDAZIONE IDEA ===")
-        output_path = await pdf_generator_validation.create_pdf_from_validation(pdf_json)
+        # Documento dallo store (documentId) o dal JSON inviato; sessionId opzionale per retrocompatibilità
+        pdf_json, json_digest, session_id = await resolve_pdf_document(
+            request.validationJson, request.documentId, request.paymentSessionId
+        )
         
-        if not Path(output_path).exists():
-            raise HTTPException(status_code=500, detail="File PDF non generato correttamente")
+        await require_paid_session(session_id)
+        profile = resolve_pdf_profile(request.profile)
         
-        return FileResponse(
-            path=output_path,
-            media_type="application/pdf",
-            filename="validazione-idea.pdf"
+        return await serve_pdf(
+            "validate-idea", pdf_json, json_digest, session_id, user,
+            pdf_generator_validation.render_pdf_from_validation, PDF_FILENAMES["validate-idea"],
+            profile=profile
         )
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Errore nella generazione PDF validazione: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Errore nella generazione PDF validazione: %s", e)
         raise HTTPException(status_code=500, detail=f"Errore generazione PDF: {str(e)}")
 
+def list_user_entitlements(uid: Optional[str]) -> List[dict]:
+    """Acquisti dell'utente nel formato della dashboard (ledger SQLite e artifact su disco)"""
+    return [
+        {
+            "sessionId": e["session_id"],
+            "documentType": e["document_type"],
+            "jsonDigest": e["json_digest"],
+            "pdfAvailable": entitlements.artifact_path(e["pdf_digest"]) is not None,
+            "updatedAt": e["updated_at"]
+        }
+        for e in entitlements.list_for_user(uid)
+    ]
+
+@app.get("/api/entitlements")
+async def list_entitlements(user: dict = Depends(verify_firebase_token)):
+    """Elenca i documenti acquistati dall'utente (per dashboard e altri dispositivi)"""
+    return {
+        "success": True,
+        "entitlements": await asyncio.to_thread(list_user_entitlements, user.get('uid'))
+    }
+
+@app.get("/api/entitlements/{session_id}/{document_type}/pdf")
+async def download_entitled_pdf(session_id: str, document_type: str, user: dict = Depends(verify_firebase_token)):
+    """Scarica il PDF già renderizzato di un acquisto, senza ricaricare né rigenerare il JSON"""
+    entitlement = await asyncio.to_thread(entitlements.get, session_id, document_type)
+    if entitlement is None or entitlement.get('uid') != user.get('uid'):
+        raise HTTPException(status_code=404, detail="Documento non trovato")
+    
+    pdf_path = await asyncio.to_thread(entitlements.artifact_path, entitlement['pdf_digest'])
+    if pdf_path is None:
+        raise HTTPException(status_code=404, detail="PDF non ancora generato per questo acquisto")
+    
+    return pdf_response(pdf_path, PDF_FILENAMES.get(document_type, "documento.pdf"))
+
+def entitled_bundle_parts(session_ids: List[str], user: dict) -> List[Tuple[str, str, str]]:
+    """[(tipo documento, digest del PDF, path del PDF)] degli acquisti dell'utente da includere nel pacchetto"""
+    parts = []
+    for session_id in dict.fromkeys(session_ids):
+        for document_type in pdf_generator_bundle.BUNDLE_TITLES:
+            entitlement = entitlements.get(session_id, document_type)
+            if entitlement is None:
+                continue
+            if entitlement.get('uid') != user.get('uid'):
+                raise HTTPException(status_code=404, detail="Documento non trovato")
+            pdf_path = entitlements.artifact_path(entitlement['pdf_digest'])
+            if pdf_path is None:
+                raise HTTPException(status_code=404, detail="PDF non ancora generato per questo acquisto")
+            parts.append((document_type, entitlement['pdf_digest'], str(pdf_path)))
+    return parts
+
+@app.post("/api/entitlements/bundle/pdf")
+async def download_pdf_bundle(request: PDFBundleRequest, user: dict = Depends(verify_firebase_token)):
+    """Scarica in un unico PDF i documenti già renderizzati degli acquisti indicati (unione delle pagine, nessun rendering)"""
+    parts = await asyncio.to_thread(entitled_bundle_parts, request.sessionIds, user)
+    if not parts:
+        raise HTTPException(status_code=404, detail="Nessun documento acquistato da includere")
+    
+    # Ordine fisso per tipo di documento (business plan, analisi, validazione), anche tra sessioni diverse
+    order = list(pdf_generator_bundle.BUNDLE_TITLES)
+    parts.sort(key=lambda part: order.index(part[0]))
+    # La copertina riporta la data di generazione: un pacchetto in cache vale solo per quel giorno
+    data_gen = pdf_generator_bundle.generation_date()
+    bundle_digest = entitlements.json_digest([data_gen, *(pdf_digest for _, pdf_digest, _ in parts)])
+    
+    try:
+        pdf, pinned_key = await get_or_render_pdf(
+            "bundle", [(document_type, path) for document_type, _, path in parts], bundle_digest,
+            lambda bundle_parts, profile: pdf_generator_bundle.render_pdf_bundle(bundle_parts, data_gen)
+        )
+    except Exception as e:
+        logger.exception("Errore nella creazione del pacchetto PDF: %s", e)
+        raise HTTPException(status_code=500, detail=f"Errore creazione pacchetto PDF: {str(e)}")
+    return pdf_response(pdf, PDF_FILENAMES["bundle"], pinned_key=pinned_key)
+
 @app.post("/api/generate-full")
 async def generate_full(request: BusinessPlanRequest):
     """Genera sia il JSON che il PDF in un'unica chiamata"""
@@ -1126,20 +1416,13 @@ async def generate_full(request: BusinessPlanRequest):
             raise HTTPException(status_code=500, detail="Errore nella generazione del business plan")
         
         # Genera il PDF
-        pdf_path = await pdf_generator.create_pdf_from_json(bp_data["json"])
-        
-        if not os.path.exists(pdf_path):
-            raise HTTPException(status_code=500, detail="PDF non generato correttamente")
-        
-        return FileResponse(
-            pdf_path,
-            media_type="application/pdf",
-            filename="business-plan.pdf"
+        pdf, pinned_key = await get_or_render_pdf(
+            "business-plan", bp_data["json"], bp_data["documentId"], pdf_generator.render_pdf_from_json
         )
+        
+        return pdf_response(pdf, PDF_FILENAMES["business-plan"], pinned_key=pinned_key)
     except Exception as e:
-        print(f"Errore: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Errore: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/get-suggestions")
@@ -1232,9 +1515,7 @@ Rispondi SOLO con un JSON array di stringhe, esempio:
         })
         
     except Exception as e:
-        print(f"Errore generazione suggerimenti: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Errore generazione suggerimenti: %s", e)
         return JSONResponse(content={
             "success": False,
             "suggestions": [],
@@ -1246,22 +1527,15 @@ async def validate_idea(request: ValidateIdeaRequest, user: dict = Depends(verif
     """Valida un'idea di business e fornisce un report di validazione (richiede autenticazione e pagamento verificato)"""
     import datetime
     start_time = datetime.datetime.now()
-    print(f"=== INIZIO VALIDAZIONE IDEA ===")
-    print(f"Timestamp: {start_time.isoformat()}")
-    print(f"Dati ricevuti: {len(str(request.formData))} caratteri")
+    logger.info("=== INIZIO VALIDAZIONE IDEA ===")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Dati ricevuti: %d caratteri", len(str(request.formData)))
     
     try:
         # Verifica che ci sia sessionId nel request (opzionale per retrocompatibilità)
         session_id = request.formData.get('_payment_session_id')
         
-        if session_id and STRIPE_SECRET_KEY:
-            # Verifica il pagamento
-            try:
-                session = stripe.checkout.Session.retrieve(session_id)
-                if session.payment_status != 'paid':
-                    raise HTTPException(status_code=402, detail="Pagamento non completato")
-            except stripe.error.StripeError as e:
-                raise HTTPException(status_code=402, detail=f"Errore verifica pagamento: {str(e)}")
+        await require_paid_session(session_id)
         
         # Rimuovi il campo temporaneo dal formData prima di processare
         form_data_clean = {k: v for k, v in request.formData.items() if k != '_payment_session_id'}
@@ -1271,12 +1545,12 @@ async def validate_idea(request: ValidateIdeaRequest, user: dict = Depends(verif
         if not prompt_path.exists():
             raise HTTPException(status_code=500, detail="File prompt_validation.json non trovato")
         
-        print(f"Caricamento prompt da: {prompt_path}")
+        logger.debug("Caricamento prompt da: %s", prompt_path)
         with open(prompt_path, "r", encoding="utf-8") as f:
             prompt_config = json.load(f)
         
         model_name = prompt_config.get('model', 'gpt-4o-mini')
-        print(f"Modello configurato: {model_name}")
+        logger.debug("Modello configurato: %s", model_name)
         
         # Prepara i dati utente per la validazione
         idea_data = {
@@ -1321,7 +1595,7 @@ async def validate_idea(request: ValidateIdeaRequest, user: dict = Depends(verif
             # Per modelli che supportano solo temperature=1, usa 1 invece del valore configurato
             if "gpt-5" in model_name.lower() or "nano" in model_name.lower():
                 request_body["temperature"] = 1
-                print(f"⚠️ Modello {model_name} supporta solo temperature=1, usando valore default")
+                logger.debug("⚠️ Modello %s supporta solo temperature=1, usando valore default", model_name)
             else:
                 request_body["temperature"] = prompt_config.get("temperature", 0.7)
         
@@ -1343,18 +1617,17 @@ async def validate_idea(request: ValidateIdeaRequest, user: dict = Depends(verif
         
         # Chiamata a OpenAI
         openai_start = datetime.datetime.now()
-        print(f"Timestamp inizio OpenAI: {openai_start.isoformat()}")
+        logger.info("Chiamata OpenAI con modello %s per validazione idea", model_name)
         
         try:
             response = client.chat.completions.create(**request_body)
         except Exception as e:
-            print(f"Errore chiamata OpenAI: {str(e)}")
+            logger.error("Errore chiamata OpenAI: %s", e)
             raise HTTPException(status_code=500, detail=f"Errore nella chiamata a OpenAI: {str(e)}")
         
         openai_end = datetime.datetime.now()
         openai_elapsed = (openai_end - openai_start).total_seconds()
-        print(f"Timestamp fine OpenAI: {openai_end.isoformat()}")
-        print(f"Tempo chiamata OpenAI: {openai_elapsed:.2f} secondi ({openai_elapsed/60:.2f} minuti)")
+        logger.info("Risposta OpenAI ricevuta in %.2f secondi", openai_elapsed)
         
         if not response.choices or len(response.choices) == 0:
             raise HTTPException(status_code=500, detail="Nessuna risposta da OpenAI")
@@ -1373,8 +1646,7 @@ async def validate_idea(request: ValidateIdeaRequest, user: dict = Depends(verif
         try:
             validation_report = json.loads(content)
         except json.JSONDecodeError as e:
-            print(f"Errore parsing JSON: {e}")
-            print(f"Contenuto ricevuto (primi 500 caratteri): {content[:500]}")
+            logger.error("Errore parsing JSON: %s", e, contenuto=content[:500])
             raise HTTPException(status_code=500, detail="Errore nella generazione del report di validazione: formato JSON non valido")
         
         # Aggiungi metadata
@@ -1383,17 +1655,24 @@ async def validate_idea(request: ValidateIdeaRequest, user: dict = Depends(verif
             "processing_time_seconds": (datetime.datetime.now() - start_time).total_seconds()
         }
         
-        print(f"✅ Validazione completata in {(datetime.datetime.now() - start_time).total_seconds():.2f} secondi")
+        logger.info("✅ Validazione completata in %.2f secondi", validation_report["_metadata"]["processing_time_seconds"])
+        
+        document_id = await asyncio.to_thread(document_store.save, validation_report)
+        if session_id:
+            await asyncio.to_thread(
+                entitlements.record, session_id, "validate-idea",
+                uid=user.get('uid'),
+                json_digest=document_id
+            )
         
         return JSONResponse(content={
             "success": True,
-            "json": validation_report
+            "json": validation_report,
+            "documentId": document_id
         })
         
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Errore nella validazione dell'idea: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Errore nella validazione dell'idea: %s", e)
         raise HTTPException(status_code=500, detail=f"Errore interno: {str(e)}")
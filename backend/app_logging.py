@@ -0,0 +1,92 @@
+import atexit
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from typing import Optional
+
+# Logging del backend: livelli, formattazione lazy ("%s" con argomenti), campi strutturati
+# e scrittura su stdout da un thread dedicato (la richiesta accoda il record e non fa I/O).
+#
+#   logger = get_logger(__name__)
+#   logger.info("PDF generato in %.2fs", elapsed, documento="business_plan", byte=len(pdf))
+#   if logger.isEnabledFor(logging.DEBUG):
+#       ...  # calcoli usati solo dai messaggi di debug
+
+LOGGER_NAME = "businessplan"
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").strip().upper()
+# "text" (riga leggibile con campi chiave=valore) o "json" (un oggetto per riga)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").strip().lower()
+
+# Argomenti standard di Logger.log: tutti gli altri keyword diventano campi strutturati
+_LOGGING_KWARGS = ("exc_info", "stack_info", "stacklevel", "extra")
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class StructuredLogger(logging.LoggerAdapter):
+    """Logger che accetta campi strutturati come keyword: logger.info("msg", chiave=valore)"""
+
+    def process(self, msg, kwargs):
+        fields = {key: kwargs.pop(key) for key in list(kwargs) if key not in _LOGGING_KWARGS}
+        if fields:
+            kwargs["extra"] = {**(kwargs.get("extra") or {}), "fields": fields}
+        return msg, kwargs
+
+
+class TextFormatter(logging.Formatter):
+    """Riga di testo con i campi strutturati in coda (prima dell'eventuale traceback)"""
+
+    def formatMessage(self, record):
+        line = super().formatMessage(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    """Un oggetto JSON per riga, con i campi strutturati al primo livello"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def setup():
+    """Configura una sola volta per processo il logger del backend con handler a coda"""
+    global _listener
+    if _listener is not None:
+        return
+    formatter = JsonFormatter() if LOG_FORMAT == "json" else TextFormatter(
+        "%(asctime)s %(levelname)s %(name)s: %(message)s")
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger(LOGGER_NAME)
+    root.setLevel(LOG_LEVEL)
+    root.propagate = False
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    _listener.start()
+    # Svuota la coda all'uscita del processo
+    atexit.register(_listener.stop)
+
+
+def get_logger(name: str) -> StructuredLogger:
+    """Logger del modulo (figlio del logger del backend)"""
+    setup()
+    return StructuredLogger(logging.getLogger(f"{LOGGER_NAME}.{name}"), {})
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""Benchmark della pipeline PDF sul business plan di esempio
+
+Uso: python benchmark.py [percorso/business-plan.json]
+"""
+
+import contextlib
+import copy
+import io
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+from reportlab.lib.units import cm
+from reportlab.platypus import Paragraph, Spacer
+
+import document_builder
+import generate_html
+import markdown_cache
+import markdown_flowables
+import pdf_generator
+from pdf_styles import STYLES
+
+DEFAULT_SAMPLE = Path(__file__).resolve().parent.parent / "business-plan-TechStarts.json"
+
+
+def timed(fn, rounds: int) -> float:
+    """Millisecondi medi per chiamata (stdout soppresso: i generatori loggano molto)"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        fn()  # riscaldamento
+        start = time.perf_counter()
+        for _ in range(rounds):
+            fn()
+    return (time.perf_counter() - start) * 1000 / rounds
+
+
+def markdown_texts(business_plan: dict) -> list:
+    """Testi markdown convertiti per il PDF: sintesi e contenuto dei capitoli"""
+    texts = [business_plan.get("executive_summary", {}).get("sintesi", "")]
+    narrative = business_plan.get("narrative", {})
+    chapters = narrative.get("chapters", []) if isinstance(narrative, dict) else []
+    texts += [chapter.get("contenuto_markdown", "") for chapter in chapters]
+    return [text for text in texts if text]
+
+
+def baseline_markdown_to_paragraphs(text, styles, markdown) -> list:
+    """Riferimento: la vecchia pipeline preprocess -> markdown.markdown -> regex sull'HTML -> Paragraph
+    (pdf_generator.markdown_to_paragraphs prima di markdown_flowables, stessi passi sullo stesso input)"""
+    elements = []
+    if not text:
+        return elements
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+    text = re.sub(r'[ \t]{2,}', ' ', text)
+    text = re.sub(r'\n{3,}', '\n\n', text)
+    text = re.sub(r'^[ \t]+(#+)', r'\1', text, flags=re.MULTILINE)
+    text = re.sub(r'^(#+)[ \t]+([^#\s])', r'\1 \2', text, flags=re.MULTILINE)
+    text = re.sub(r'^(#+)([^#\s])', r'\1 \2', text, flags=re.MULTILINE)
+    text = re.sub(r'[ \t]+\n', '\n', text).strip()
+
+    # Righe in maiuscolo come titoli (liste di caratteri ricostruite a ogni riga, come nell'originale)
+    processed_lines = []
+    for raw in text.split('\n'):
+        line = raw.strip()
+        if len(line) >= 3 and not line.startswith('#'):
+            text_only = ''.join([c for c in line if c.isalnum() or c.isspace()])
+            alpha_chars = [c for c in line if c.isalpha()]
+            upper_chars = [c for c in line if c.isupper() and c.isalpha()]
+            if len(text_only) >= 3 and len(alpha_chars) >= 3 and len(upper_chars) / len(alpha_chars) >= 0.8:
+                keywords = list(markdown_flowables.SUBSECTION_KEYWORDS)
+                level = 3 if any(k in ' '.join(line.split()).upper() for k in keywords) else 2
+                print(f"✅ Riconosciuto titolo in maiuscolo: '{line}'")
+                processed_lines.append(f"{'#' * level} {line}")
+                continue
+        processed_lines.append(raw)
+
+    html = markdown.Markdown(extensions=['fenced_code', 'tables', 'nl2br']).convert('\n'.join(processed_lines))
+
+    def clean(html_text):
+        html_text = re.sub(r'<strong>(.+?)</strong>', r'<b>\1</b>', html_text, flags=re.DOTALL)
+        html_text = re.sub(r'<em>(.+?)</em>', r'<i>\1</i>', html_text, flags=re.DOTALL)
+        html_text = re.sub(r'<code>(.+?)</code>', r'<font name="Courier">\1</font>', html_text, flags=re.DOTALL)
+        html_text = re.sub(r'<pre>(.+?)</pre>', r'<font name="Courier">\1</font>', html_text, flags=re.DOTALL)
+        html_text = re.sub(r'</?div[^>]*>', '', html_text)
+        return re.sub(r'</?span[^>]*>', '', html_text).strip()
+
+    parts = []
+    pos = 0
+    for match in re.finditer(r'<(h[1-6]|p|ul|ol|li)>(.+?)</\1>', html, re.DOTALL):
+        before = html[pos:match.start()].strip()
+        if before:
+            parts.append(('paragraph', re.sub(r'</?p[^>]*>', '', before)))
+        tag, content = match.group(1), match.group(2)
+        if tag.startswith('h'):
+            parts.append(('heading', int(tag[1]), content))
+        elif tag in ('ul', 'ol'):
+            parts += [('list_item', item) for item in re.findall(r'<li>(.+?)</li>', content, re.DOTALL)]
+        elif tag == 'li':
+            parts.append(('list_item', content))
+        else:
+            parts.append(('paragraph', content))
+        pos = match.end()
+    remaining = html[pos:].strip()
+    if remaining:
+        parts.append(('paragraph', re.sub(r'</?p[^>]*>', '', remaining)))
+
+    headings = {1: ('CustomHeading1', 0.4*cm), 2: ('CustomHeading2', 0.3*cm)}
+    for part in parts:
+        if part[0] == 'heading':
+            style_name, space = headings.get(part[1], ('Heading3', 0.2*cm))
+            elements += [Paragraph(clean(part[2]), styles[style_name]), Spacer(1, space)]
+        elif part[0] == 'list_item':
+            elements += [Paragraph(f"• {clean(part[1])}", styles['Normal']), Spacer(1, 0.15*cm)]
+        elif clean(part[1]):
+            elements += [Paragraph(clean(part[1]), styles['Normal']), Spacer(1, 0.3*cm)]
+    return elements
+
+
+def bench_markdown(business_plan: dict, rounds: int = 50):
+    texts = markdown_texts(business_plan)
+    size = sum(len(text) for text in texts)
+    print(f"📝 Markdown: {len(texts)} testi, {size} caratteri")
+
+    def convert():
+        for text in texts:
+            markdown_flowables.markdown_to_flowables(text, STYLES)
+
+    current = timed(convert, rounds)
+    print(f"   markdown_flowables (tokenize + flowable): {current:.2f} ms")
+
+    def cached_parse():
+        for text in texts:
+            markdown_cache.parse(text)
+
+    # Dopo il primo passaggio il testo è in cache: resta il solo digest del contenuto
+    print(f"   markdown_cache.parse (in cache):          {timed(cached_parse, rounds):.2f} ms")
+
+    # Riferimento: la vecchia pipeline basata sulla libreria markdown, non più tra le dipendenze
+    try:
+        import markdown
+    except ImportError:
+        print("   vecchia pipeline: installa 'markdown' per il confronto")
+        return
+
+    def baseline():
+        for text in texts:
+            baseline_markdown_to_paragraphs(text, STYLES, markdown)
+
+    reference = timed(baseline, rounds)
+    print(f"   vecchia pipeline (markdown + regex):      {reference:.2f} ms ({reference / current:.1f}x)")
+
+
+def with_synthetic_charts(business_plan: dict, months: int, series_count: int, charts_count: int = 6) -> dict:
+    """Copia del piano con grafici sintetici (months punti per serie) collegati a ogni capitolo"""
+    plan = copy.deepcopy(business_plan)
+    charts = [{
+        "id": f"bench_{k}",
+        "tipo": "line",
+        "titolo": f"Proiezione {k + 1}",
+        "series": [
+            {"name": f"Serie {j + 1}", "points": [{"x": f"M{m + 1}", "y": m * (j + 1) * 1250.5} for m in range(months)]}
+            for j in range(series_count)
+        ],
+    } for k in range(charts_count)]
+    plan["charts"] = list(plan.get("charts", [])) + charts
+    for idx, chapter in enumerate(plan.get("narrative", {}).get("chapters", [])):
+        chapter["chart_ids"] = list(chapter.get("chart_ids", [])) + [charts[idx % charts_count]["id"]]
+    return plan
+
+
+def bench_html(business_plan: dict, rounds: int = 10):
+    print("🌐 HTML (generate_html), grafici come tabelle (for_pdf=True) e anteprima browser")
+    for months, series_count in ((12, 1), (24, 4), (60, 4), (60, 12)):
+        plan = with_synthetic_charts(business_plan, months, series_count)
+        html_size = len(generate_html.build_html_from_json(plan))
+        table = timed(lambda: generate_html.build_html_from_json(plan), rounds)
+        preview = timed(lambda: generate_html.build_html_from_json(plan, for_pdf=False), rounds)
+        print(f"   {months:>3} mesi x {series_count:>2} serie: {table:7.2f} ms tabelle ({html_size // 1024} KB), "
+              f"{preview:5.2f} ms anteprima")
+
+
+def bench_toc(business_plan: dict, rounds: int = 5):
+    """Costo dei numeri di pagina esatti nell'indice rispetto ai numeri stimati (stesso documento, un passaggio)"""
+    ctx = pdf_generator._business_plan_context(business_plan, None)
+    sections = pdf_generator.business_plan_sections(ctx)
+    estimated_toc = document_builder.toc_entries(sections, business_plan, ctx)
+
+    def build(toc=None):
+        build_ctx = dict(ctx) if toc is None else {**ctx, "toc": toc}
+        document_builder.build_pdf("business-plan", sections, business_plan, build_ctx, encoding='utf-8')
+
+    estimated = timed(lambda: build(estimated_toc), rounds)
+    exact = timed(build, rounds)
+    print(f"📑 Indice del business plan ({len(estimated_toc)} voci, grafici già in cache)")
+    print(f"   numeri stimati (una pagina per voce):     {estimated:.2f} ms")
+    print(f"   numeri esatti (form risolti a fine doc):  {exact:.2f} ms ({(exact / estimated - 1) * 100:+.1f}%)")
+    print(f"   riferimento doppio passaggio di layout:   {estimated * 2:.2f} ms")
+
+
+if __name__ == "__main__":
+    sample = Path(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_SAMPLE
+    with open(sample, encoding="utf-8") as f:
+        business_plan = json.load(f)
+    print(f"⏱️  Benchmark su {sample.name}")
+    bench_markdown(business_plan)
+    bench_html(business_plan)
+    bench_toc(business_plan)
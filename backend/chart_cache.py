@@ -0,0 +1,83 @@
+import io
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from reportlab.lib.utils import ImageReader
+
+import output_manager
+from app_logging import get_logger
+
+logger = get_logger(__name__)
+
+# Limite della cache in memoria (byte PNG); oltre si eliminano i grafici usati meno di recente
+MAX_CACHE_BYTES = int(os.getenv("CHART_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Directory per la persistenza su disco (condivisa tra i worker); vuota = solo memoria
+CACHE_DIR = Path(os.environ["CHART_CACHE_DIR"]) if os.getenv("CHART_CACHE_DIR") else None
+
+_lock = threading.Lock()
+# key -> [png, ImageReader o None], dal meno al più recentemente usato
+_entries = OrderedDict()
+_total_bytes = 0
+
+
+def _disk_path(key: str) -> Path:
+    return CACHE_DIR / key[:2] / f"{key}.png"
+
+
+def get(key: str) -> Optional[bytes]:
+    """PNG del grafico in cache (memoria, poi disco) o None"""
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None:
+            _entries.move_to_end(key)
+            return entry[0]
+    if CACHE_DIR is None:
+        return None
+    try:
+        png = _disk_path(key).read_bytes()
+    except OSError:
+        return None
+    _remember(key, png)
+    return png
+
+
+def put(key: str, png: bytes):
+    """Aggiunge un grafico renderizzato alla cache (e su disco se configurato)"""
+    if not png:
+        return
+    _remember(key, png)
+    if CACHE_DIR is not None:
+        path = _disk_path(key)
+        if not path.exists():
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                output_manager.write_atomic(path, png)
+            except OSError as e:
+                logger.warning("⚠️  Errore salvataggio grafico in cache su disco: %s", e)
+
+
+def get_reader(key: str) -> Optional[ImageReader]:
+    """ImageReader ReportLab del grafico in cache: il PNG viene decodificato una sola volta"""
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] is None:
+            entry[1] = ImageReader(io.BytesIO(entry[0]))
+        return entry[1]
+
+
+def _remember(key: str, png: bytes):
+    global _total_bytes
+    with _lock:
+        if key in _entries:
+            _entries.move_to_end(key)
+            return
+        _entries[key] = [png, None]
+        _total_bytes += len(png)
+        while _total_bytes > MAX_CACHE_BYTES and len(_entries) > 1:
+            _, (old_png, _) = _entries.popitem(last=False)
+            _total_bytes -= len(old_png)
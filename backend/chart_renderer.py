@@ -0,0 +1,223 @@
+import io
+from functools import lru_cache
+from typing import Optional
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.font_manager import FontProperties, fontManager
+from PIL import Image as PILImage
+
+from app_logging import get_logger
+from chart_series import (
+    GRID_COLOR, SPINE_COLOR, TEXT_COLOR, TITLE_COLOR,
+    as_text, bar_data, bar_has_data, line_data, pie_data, series_color,
+)
+
+# Renderer dei grafici basato su Figure + canvas Agg: nessuno stato globale pyplot e nessuna
+# modifica a rcParams, quindi i grafici si possono renderizzare in parallelo in un thread pool.
+
+logger = get_logger(__name__)
+
+CM_PER_INCH = 2.54
+# Font con supporto dei caratteri italiani, in ordine di preferenza
+PREFERRED_FONTS = ('DejaVu Sans', 'Liberation Sans', 'Arial', 'Helvetica', 'Verdana')
+
+LEGEND_STYLE = {
+    'frameon': True,
+    'framealpha': 0.9,
+    'facecolor': 'white',
+    'edgecolor': '#CCCCCC',
+}
+SAVE_DPI = 150
+
+
+@lru_cache(maxsize=1)
+def resolve_font_family() -> str:
+    """Font per i grafici, risolto una sola volta per processo"""
+    available_fonts = {f.name for f in fontManager.ttflist}
+    for font_name in PREFERRED_FONTS:
+        if font_name in available_fonts:
+            return font_name
+    return 'sans-serif'
+
+
+@lru_cache(maxsize=None)
+def font(size: float = 10, weight: str = 'normal') -> FontProperties:
+    """FontProperties condivise (non vanno modificate: set_fontproperties ne fa una copia)"""
+    return FontProperties(family=[resolve_font_family(), 'DejaVu Sans', 'sans-serif'], size=size, weight=weight)
+
+
+def warm_up():
+    """Risolve il font e inizializza il canvas Agg una volta per processo"""
+    font()
+    fig = Figure(figsize=(1, 1))
+    FigureCanvasAgg(fig)
+    fig.canvas.draw()
+
+
+def _new_figure(width_cm: float, height_cm: float):
+    """Figura e assi con lo stile aziendale applicato direttamente agli artist"""
+    fig = Figure(figsize=(width_cm / CM_PER_INCH, height_cm / CM_PER_INCH), facecolor='white', edgecolor='none')
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.set_facecolor('white')
+    ax.set_axisbelow(True)
+
+    # Rimuovi bordi superflui per aspetto più pulito
+    ax.spines['top'].set_visible(False)
+    ax.spines['right'].set_visible(False)
+    for side in ('left', 'bottom'):
+        ax.spines[side].set_color(SPINE_COLOR)
+        ax.spines[side].set_linewidth(1.2)
+    ax.tick_params(colors=TEXT_COLOR, labelsize=10)
+    return fig, ax
+
+
+def _apply_tick_font(ax):
+    """Font dei tick: le etichette nuove ereditano le proprietà del primo tick"""
+    for label in ax.get_xticklabels() + ax.get_yticklabels():
+        label.set_fontproperties(font(10))
+
+
+def _legend(ax):
+    ax.legend(loc='best', prop=font(9), **LEGEND_STYLE)
+
+
+def _plot_line(ax, series) -> bool:
+    lines = line_data(series)
+    for idx, (name, x_values, y_values) in enumerate(lines):
+        color = series_color(idx)
+        ax.plot(x_values, y_values,
+                marker='o',
+                label=name,
+                color=color,
+                linewidth=2.5,
+                markersize=7,
+                markerfacecolor=color,
+                markeredgecolor='white',
+                markeredgewidth=1.5,
+                alpha=0.9)
+
+    _legend(ax)
+    ax.grid(True, color=GRID_COLOR, alpha=0.3, linestyle='--', linewidth=0.8)
+    return bool(lines)
+
+
+def _plot_bar(ax, series) -> bool:
+    x_values, y_data = bar_data(series)
+    if not x_values or not y_data:
+        return False
+
+    x_pos = range(len(x_values))
+    num_series = len(y_data)
+    bar_width = 0.8 / max(num_series, 1)  # Adatta la larghezza in base al numero di serie
+    offset = -bar_width * (num_series - 1) / 2
+
+    for idx, (name, values) in enumerate(y_data.items()):
+        positions = [x + offset for x in x_pos]
+        heights = [values.get(x_val, 0) for x_val in x_values]
+        ax.bar(positions, heights,
+               width=bar_width,
+               label=as_text(name),
+               color=series_color(idx),
+               alpha=0.85,
+               edgecolor='white',
+               linewidth=1.5)
+        offset += bar_width
+
+    ax.set_xticks(list(x_pos))
+    ax.set_xticklabels([as_text(x) for x in x_values], rotation=45, ha='right')
+    _legend(ax)
+    ax.grid(True, color=GRID_COLOR, alpha=0.3, axis='y', linestyle='--')
+    return bar_has_data(x_values, y_data)
+
+
+def _plot_pie(ax, series) -> bool:
+    # Prendi la prima serie per il pie chart
+    labels, values = pie_data(series)
+    if not labels:
+        return False
+
+    wedges, texts, autotexts = ax.pie(
+        values,
+        labels=labels,
+        autopct='%1.1f%%',
+        colors=[series_color(idx) for idx in range(len(labels))],
+        startangle=90,
+        textprops={'fontproperties': font(10, 'bold'), 'color': TEXT_COLOR},
+        wedgeprops={'edgecolor': 'white', 'linewidth': 2}
+    )
+    # Migliora leggibilità percentuali
+    for autotext in autotexts:
+        autotext.set_color('white')
+    return True
+
+
+PLOTTERS = {
+    'line': _plot_line,
+    'bar': _plot_bar,
+    'pie': _plot_pie,
+}
+
+
+def _quantize_png(png: bytes, palette_colors: int) -> bytes:
+    """PNG a colori indicizzati: i grafici usano pochi colori, lo stream nel PDF si comprime molto meglio"""
+    with PILImage.open(io.BytesIO(png)) as im:
+        indexed = im.convert('RGB').quantize(colors=palette_colors, method=PILImage.Quantize.FASTOCTREE)
+    buf = io.BytesIO()
+    indexed.save(buf, format='PNG', optimize=True)
+    return buf.getvalue()
+
+
+def render_chart(chart_data, width_cm: float = 15, height_cm: float = 10,
+                 dpi: int = SAVE_DPI, palette_colors: Optional[int] = None) -> Optional[bytes]:
+    """PNG del grafico (stile aziendale, alta qualità) o None se non ci sono dati validi.
+    palette_colors: quantizza l'immagine a una palette di N colori."""
+    chart_id = chart_data.get('id', 'N/A')
+    titolo = chart_data.get('titolo', '')
+    try:
+        tipo = chart_data.get('tipo', 'line')
+        x_label = chart_data.get('x_label', '')
+        y_label = chart_data.get('y_label', '')
+        series = chart_data.get('series', [])
+
+        # Validazione dati in ingresso
+        if not series:
+            logger.warning("⚠️  Grafico '%s' (ID: %s) non ha serie di dati", titolo, chart_id)
+            return None
+
+        plotter = PLOTTERS.get(tipo)
+        if plotter is None:
+            logger.warning("⚠️  Tipo grafico non valido: %s per grafico %s", tipo, chart_id)
+            return None
+
+        logger.debug("📊 Creando grafico %s", chart_id, tipo=tipo, serie=len(series))
+
+        fig, ax = _new_figure(width_cm, height_cm)
+        if not plotter(ax, series):
+            logger.warning("⚠️  Grafico '%s' (ID: %s) non ha dati validi", titolo, chart_id)
+            return None
+
+        # Titolo e labels (assicura encoding UTF-8)
+        if titolo:
+            ax.set_title(as_text(titolo), fontproperties=font(14, 'bold'), pad=15, color=TITLE_COLOR)
+        if x_label:
+            ax.set_xlabel(as_text(x_label), fontproperties=font(11, 'medium'), color=TEXT_COLOR)
+        if y_label:
+            ax.set_ylabel(as_text(y_label), fontproperties=font(11, 'medium'), color=TEXT_COLOR)
+        _apply_tick_font(ax)
+
+        fig.tight_layout(pad=1.5)
+
+        # Salva con alta qualità
+        buf = io.BytesIO()
+        fig.savefig(buf, format='png', dpi=dpi, bbox_inches='tight',
+                    facecolor='white', edgecolor='none', pad_inches=0.1)
+        png = buf.getvalue()
+        if png and palette_colors:
+            png = _quantize_png(png, palette_colors)
+        return png or None
+    except Exception as e:
+        # Cattura qualsiasi errore durante la creazione del grafico
+        logger.exception("⚠️  Errore nella creazione del grafico '%s' (ID: %s): %s", titolo, chart_id, e)
+        return None
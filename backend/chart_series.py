@@ -0,0 +1,115 @@
+import os
+from typing import List, Tuple
+
+# Dati e palette comuni ai backend dei grafici (matplotlib e vettoriale ReportLab), senza dipendenze
+
+# Backend dei grafici per deployment: "matplotlib" (PNG) o "vector" (disegni ReportLab nativi)
+CHART_BACKEND = os.getenv("CHART_BACKEND", "matplotlib").strip().lower()
+VECTOR_BACKEND = "vector"
+
+CHART_TYPES = ('line', 'bar', 'pie')
+
+# Palette colori professionale (blu/grigio aziendale)
+PROFESSIONAL_COLORS = (
+    '#1e3a8a',  # Blu scuro
+    '#3b82f6',  # Blu medio
+    '#10b981',  # Verde
+    '#f59e0b',  # Arancione
+    '#8b5cf6',  # Viola
+    '#ef4444',  # Rosso
+    '#64748b',  # Grigio
+    '#06b6d4',  # Ciano
+)
+
+TEXT_COLOR = '#333333'
+TITLE_COLOR = '#1a1a1a'
+SPINE_COLOR = '#CCCCCC'
+GRID_COLOR = '#E0E0E0'
+
+
+def as_text(value) -> str:
+    """Stringa UTF-8 valida per etichette, titoli e nomi serie"""
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    return str(value)
+
+
+def series_color(idx: int) -> str:
+    return PROFESSIONAL_COLORS[idx % len(PROFESSIONAL_COLORS)]
+
+
+def line_data(series) -> List[Tuple[str, List[str], List[float]]]:
+    """[(nome, x, y)] delle serie con punti validi (x non vuoto e y presente)"""
+    result = []
+    for idx, serie in enumerate(series):
+        name = serie.get('name', f'Serie {idx+1}')
+        points = serie.get('points', [])
+        valid_points = [(p.get('x', ''), p.get('y')) for p in points
+                        if p.get('x') and str(p.get('x', '')).strip() != ''
+                        and p.get('y') is not None]
+        x_values = [str(x) for x, y in valid_points]
+        y_values = [float(y) for x, y in valid_points]
+        if x_values:
+            result.append((as_text(name), x_values, y_values))
+    return result
+
+
+def bar_data(series):
+    """Valori x e {serie: {x: y}} per il grafico a barre raggruppate"""
+    # Gestisce anche il caso in cui ogni serie ha lo stesso valore x (come scenari)
+    x_values = []
+    y_data = {}
+
+    for idx, serie in enumerate(series):
+        name = serie.get('name', f'Serie {idx+1}')
+        points = serie.get('points', [])
+
+        unique_x_values = set()
+        for p in points:
+            x_val = str(p.get('x', '')).strip()
+            if x_val:
+                unique_x_values.add(x_val)
+
+        # Se c'è un solo valore x unico per questa serie, prendi il primo y
+        if len(unique_x_values) == 1:
+            x_val = next(iter(unique_x_values))
+            for p in points:
+                y_val = p.get('y')
+                if y_val is not None:
+                    try:
+                        y_val = float(y_val)
+                    except (ValueError, TypeError):
+                        continue
+                    if x_val not in x_values:
+                        x_values.append(x_val)
+                    y_data.setdefault(name, {})[x_val] = y_val
+                    break  # Prendi solo il primo valore
+        else:
+            # Caso normale: più valori x diversi (per x ripetuti vince l'ultimo)
+            for p in points:
+                x_val = str(p.get('x', '')).strip()
+                y_val = p.get('y')
+                if y_val is None or not x_val:
+                    continue
+                try:
+                    y_val = float(y_val)
+                except (ValueError, TypeError):
+                    continue
+                if x_val not in x_values:
+                    x_values.append(x_val)
+                y_data.setdefault(name, {})[x_val] = y_val
+    return x_values, y_data
+
+
+def bar_has_data(x_values, y_data) -> bool:
+    """Almeno un valore y diverso da zero"""
+    return bool(x_values) and any(v != 0 for values in y_data.values() for v in values.values())
+
+
+def pie_data(series) -> Tuple[List[str], List[float]]:
+    """Etichette e valori positivi della prima serie"""
+    points = series[0].get('points', [])
+    valid_points = [(p.get('x', ''), p.get('y')) for p in points
+                    if p.get('x') and str(p.get('x', '')).strip() != ''
+                    and p.get('y') is not None and float(p.get('y', 0)) > 0]
+    return [as_text(x) for x, y in valid_points], [float(y) for x, y in valid_points]
@@ -0,0 +1,229 @@
+from typing import Optional
+
+from reportlab.graphics.charts.barcharts import VerticalBarChart
+from reportlab.graphics.charts.legends import Legend
+from reportlab.graphics.charts.linecharts import HorizontalLineChart
+from reportlab.graphics.charts.piecharts import Pie
+from reportlab.graphics.shapes import Drawing, Group, String
+from reportlab.graphics.widgets.markers import makeMarker
+from reportlab.lib import colors
+
+from app_logging import get_logger
+from chart_series import (
+    CHART_TYPES, GRID_COLOR, SPINE_COLOR, TEXT_COLOR, TITLE_COLOR,
+    as_text, bar_data, bar_has_data, line_data, pie_data, series_color,
+)
+
+# Backend vettoriale dei grafici: disegni ReportLab nativi (nitidi a qualsiasi zoom, senza matplotlib)
+
+logger = get_logger(__name__)
+
+FONT = 'Helvetica'
+FONT_BOLD = 'Helvetica-Bold'
+TITLE_SIZE = 12
+LABEL_SIZE = 9
+TICK_SIZE = 8
+LEGEND_SIZE = 8
+MARGIN = 8
+
+
+def _color(hex_color: str):
+    return colors.HexColor(hex_color)
+
+
+def _format_value(value) -> str:
+    """Etichette dell'asse y: separatore delle migliaia italiano, niente decimali inutili"""
+    if abs(value) >= 1000 or float(value).is_integer():
+        return f"{value:,.0f}".replace(',', '.')
+    return f"{value:.2f}".rstrip('0').rstrip('.').replace('.', ',')
+
+
+def _style_axes(chart, rotate_labels: bool):
+    """Stile aziendale comune: assi grigi, griglia orizzontale tratteggiata, font dei tick"""
+    value_axis = chart.valueAxis
+    value_axis.strokeColor = _color(SPINE_COLOR)
+    value_axis.strokeWidth = 1
+    value_axis.visibleGrid = 1
+    value_axis.gridStrokeColor = _color(GRID_COLOR)
+    value_axis.gridStrokeDashArray = (2, 2)
+    value_axis.gridStrokeWidth = 0.5
+    value_axis.labels.fontName = FONT
+    value_axis.labels.fontSize = TICK_SIZE
+    value_axis.labels.fillColor = _color(TEXT_COLOR)
+    value_axis.labelTextFormat = _format_value
+    value_axis.forceZero = 1
+
+    category_axis = chart.categoryAxis
+    category_axis.strokeColor = _color(SPINE_COLOR)
+    category_axis.strokeWidth = 1
+    category_axis.labels.fontName = FONT
+    category_axis.labels.fontSize = TICK_SIZE
+    category_axis.labels.fillColor = _color(TEXT_COLOR)
+    if rotate_labels:
+        category_axis.labels.angle = 45
+        category_axis.labels.boxAnchor = 'ne'
+        category_axis.labels.dx = 2
+        category_axis.labels.dy = -2
+    else:
+        category_axis.labels.boxAnchor = 'n'
+        category_axis.labels.dy = -3
+
+
+def _legend(names, x: float, y: float, width: float) -> Legend:
+    """Legenda su una riga sotto il titolo"""
+    legend = Legend()
+    legend.colorNamePairs = [(_color(series_color(idx)), name) for idx, name in enumerate(names)]
+    legend.fontName = FONT
+    legend.fontSize = LEGEND_SIZE
+    legend.fillColor = _color(TEXT_COLOR)
+    legend.alignment = 'right'
+    legend.boxAnchor = 'nw'
+    legend.x = x
+    legend.y = y
+    legend.columnMaximum = 1
+    legend.dx = 8
+    legend.dy = 8
+    legend.dxTextSpace = 4
+    legend.deltay = 10
+    longest = max((len(name) for name in names), default=0)
+    legend.deltax = min(width / max(len(names), 1), 20 + longest * LEGEND_SIZE * 0.55)
+    legend.autoXPadding = 6
+    legend.strokeWidth = 0
+    return legend
+
+
+def _line_chart(series, x: float, y: float, width: float, height: float):
+    lines = line_data(series)
+    if not lines:
+        return None, []
+
+    # Categorie nell'ordine di prima comparsa; i punti mancanti restano vuoti
+    categories = []
+    for _, x_values, _ in lines:
+        for x_val in x_values:
+            if x_val not in categories:
+                categories.append(x_val)
+    data = []
+    for _, x_values, y_values in lines:
+        by_x = dict(zip(x_values, y_values))
+        data.append([by_x.get(category) for category in categories])
+
+    chart = HorizontalLineChart()
+    chart.x, chart.y, chart.width, chart.height = x, y, width, height
+    chart.data = data
+    chart.categoryAxis.categoryNames = categories
+    chart.joinedLines = 1
+    _style_axes(chart, rotate_labels=len(categories) > 8)
+    for idx in range(len(lines)):
+        color = _color(series_color(idx))
+        chart.lines[idx].strokeColor = color
+        chart.lines[idx].strokeWidth = 2
+        chart.lines[idx].symbol = makeMarker('FilledCircle', size=5, fillColor=color, strokeColor=colors.white, strokeWidth=1)
+    return chart, [name for name, _, _ in lines]
+
+
+def _bar_chart(series, x: float, y: float, width: float, height: float):
+    x_values, y_data = bar_data(series)
+    if not bar_has_data(x_values, y_data):
+        return None, []
+
+    chart = VerticalBarChart()
+    chart.x, chart.y, chart.width, chart.height = x, y, width, height
+    chart.data = [[values.get(x_val, 0) for x_val in x_values] for values in y_data.values()]
+    chart.categoryAxis.categoryNames = [as_text(x_val) for x_val in x_values]
+    chart.groupSpacing = 6
+    chart.barSpacing = 1
+    chart.bars.strokeColor = colors.white
+    chart.bars.strokeWidth = 1
+    _style_axes(chart, rotate_labels=True)
+    for idx in range(len(y_data)):
+        chart.bars[idx].fillColor = _color(series_color(idx))
+    return chart, [as_text(name) for name in y_data]
+
+
+def _pie_chart(series, x: float, y: float, width: float, height: float):
+    labels, values = pie_data(series)
+    if not labels:
+        return None
+
+    total = sum(values)
+    size = min(width * 0.6, height)
+    pie = Pie()
+    pie.width = pie.height = size
+    pie.x = x + (width - size) / 2
+    pie.y = y + (height - size) / 2
+    pie.data = values
+    pie.labels = [f"{label} ({value / total * 100:.1f}%)" for label, value in zip(labels, values)]
+    pie.startAngle = 90
+    pie.direction = 'anticlockwise'
+    pie.simpleLabels = 0
+    pie.slices.strokeColor = colors.white
+    pie.slices.strokeWidth = 2
+    pie.slices.fontName = FONT_BOLD
+    pie.slices.fontSize = LABEL_SIZE
+    pie.slices.fontColor = _color(TEXT_COLOR)
+    pie.slices.labelRadius = 1.08
+    for idx in range(len(values)):
+        pie.slices[idx].fillColor = _color(series_color(idx))
+    return pie
+
+
+def chart_drawing(chart_data, width: float, height: float) -> Optional[Drawing]:
+    """Disegno vettoriale del grafico (flowable ReportLab) o None se non ci sono dati validi"""
+    chart_id = chart_data.get('id', 'N/A')
+    titolo = as_text(chart_data.get('titolo', '') or '')
+    tipo = chart_data.get('tipo', 'line')
+    series = chart_data.get('series', [])
+
+    if not series:
+        logger.warning("⚠️  Grafico '%s' (ID: %s) non ha serie di dati", titolo, chart_id)
+        return None
+    if tipo not in CHART_TYPES:
+        logger.warning("⚠️  Tipo grafico non valido: %s per grafico %s", tipo, chart_id)
+        return None
+
+    try:
+        x_label = as_text(chart_data.get('x_label', '') or '')
+        y_label = as_text(chart_data.get('y_label', '') or '')
+
+        drawing = Drawing(width, height)
+        top = height - MARGIN
+        if titolo:
+            drawing.add(String(width / 2, top - TITLE_SIZE, titolo, fontName=FONT_BOLD,
+                               fontSize=TITLE_SIZE, fillColor=_color(TITLE_COLOR), textAnchor='middle'))
+            top -= TITLE_SIZE + 8
+
+        if tipo == 'pie':
+            pie = _pie_chart(series, MARGIN, MARGIN, width - 2 * MARGIN, top - 2 * MARGIN)
+            if pie is None:
+                logger.warning("⚠️  Grafico '%s' (ID: %s) non ha dati validi", titolo, chart_id)
+                return None
+            drawing.add(pie)
+            return drawing
+
+        # Area del grafico: spazio a sinistra per l'asse y, in basso per le categorie (ruotate nei bar)
+        left = MARGIN + (LABEL_SIZE + 6 if y_label else 0) + 36
+        bottom = MARGIN + (LABEL_SIZE + 6 if x_label else 0) + (40 if tipo == 'bar' else 16)
+        plot_top = top - LEGEND_SIZE - 14
+        plot_width = width - left - MARGIN
+        builder = _bar_chart if tipo == 'bar' else _line_chart
+        chart, names = builder(series, left, bottom, plot_width, plot_top - bottom)
+        if chart is None:
+            logger.warning("⚠️  Grafico '%s' (ID: %s) non ha dati validi", titolo, chart_id)
+            return None
+        drawing.add(chart)
+        drawing.add(_legend(names, left, top, plot_width))
+
+        if x_label:
+            drawing.add(String(left + plot_width / 2, MARGIN, x_label, fontName=FONT,
+                               fontSize=LABEL_SIZE, fillColor=_color(TEXT_COLOR), textAnchor='middle'))
+        if y_label:
+            # Etichetta dell'asse y ruotata di 90°
+            label = Group(String(0, 0, y_label, fontName=FONT, fontSize=LABEL_SIZE,
+                                 fillColor=_color(TEXT_COLOR), textAnchor='middle'))
+            label.transform = (0, 1, -1, 0, MARGIN + LABEL_SIZE, bottom + (plot_top - bottom) / 2)
+            drawing.add(label)
+        return drawing
+    except Exception as e:
+        logger.warning("⚠️  Errore nella creazione del grafico vettoriale '%s' (ID: %s): %s", titolo, chart_id, e)
+        return None
@@ -0,0 +1,71 @@
+"""Fixture comuni dei test: configurazione minima e dati persistenti isolati per ogni test"""
+
+import os
+import tempfile
+from collections import OrderedDict
+
+import pytest
+
+# Configurazione minima prima di importare app (legge le variabili all'import)
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+os.environ["STRIPE_SECRET_KEY"] = "sk_test_webhook"
+os.environ["STRIPE_WEBHOOK_SECRET"] = "whsec_test_secret"
+os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="gbp-test-")
+# Rendering nel processo dei test: niente pool di processi da avviare e chiudere
+os.environ["PDF_RENDER_WORKERS"] = "0"
+
+# Script da lanciare a mano (python test_pdf.py): async def senza plugin asyncio, non è un test pytest
+collect_ignore = ["test_pdf.py"]
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """DATA_DIR e cache dei PDF in tmp_path, con ledger e cache in memoria vuoti per il singolo test"""
+    import document_store
+    import entitlements
+    import html_preview
+    import payment_cache
+    import pdf_cache
+    import pdf_preview_cache
+
+    monkeypatch.setattr(payment_cache, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(payment_cache, "DB_PATH", tmp_path / "payments.sqlite3")
+    monkeypatch.setattr(payment_cache, "_conn", None)
+    monkeypatch.setattr(payment_cache, "_paid_sessions", {})
+    monkeypatch.setattr(entitlements, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(entitlements, "DB_PATH", tmp_path / "entitlements.sqlite3")
+    monkeypatch.setattr(entitlements, "ARTIFACTS_DIR", tmp_path / "artifacts")
+    monkeypatch.setattr(entitlements, "_conn", None)
+    monkeypatch.setattr(document_store, "DOCUMENTS_DIR", tmp_path / "documents")
+    monkeypatch.setattr(pdf_cache, "CACHE_DIR", tmp_path / "pdf-cache")
+    monkeypatch.setattr(pdf_cache, "_entries", None)
+    monkeypatch.setattr(pdf_cache, "_total_bytes", 0)
+    monkeypatch.setattr(pdf_cache, "_pins", {})
+    monkeypatch.setattr(html_preview, "_entries", OrderedDict())
+    monkeypatch.setattr(html_preview, "_total_bytes", 0)
+    monkeypatch.setattr(pdf_preview_cache, "_entries", OrderedDict())
+    monkeypatch.setattr(pdf_preview_cache, "_total_bytes", 0)
+    yield tmp_path
+
+    for module in (payment_cache, entitlements):
+        if module._conn is not None:
+            module._conn.close()
+
+
+@pytest.fixture
+def client(data_dir):
+    """TestClient dell'app sui dati isolati del test"""
+    from fastapi.testclient import TestClient
+    import app
+
+    return TestClient(app.app)
+
+
+@pytest.fixture
+def login(client, monkeypatch):
+    """login(uid): le richieste del client risultano autenticate come quell'utente (senza Firebase)"""
+    import app
+
+    def as_user(uid):
+        monkeypatch.setitem(app.app.dependency_overrides, app.verify_firebase_token, lambda: {"uid": uid})
+    return as_user
@@ -0,0 +1,435 @@
+import copy
+import io
+import threading
+from typing import Optional
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import cm
+from reportlab.pdfgen import canvas
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak, Table, Flowable
+
+import pdf_profiles
+import pdf_styles
+
+# Costruttore dichiarativo dei PDF: ogni tipo di documento descrive le sue sezioni in ordine
+# (contenuto, voce dell'indice, condizione di presenza) e build_pdf le compila nella story.
+# Le sezioni statiche (disclaimer fisso, note legali, chiusura, tabella firme) si costruiscono
+# una volta per processo: a ogni rendering se ne usano copie superficiali, che hanno uno stato
+# di layout proprio (le tabelle statiche devono contenere solo stringhe).
+# I numeri di pagina dell'indice sono esatti con un solo passaggio di layout: ogni numero è un form
+# XObject referenziato dall'indice e definito a fine documento con la pagina in cui la sezione è
+# effettivamente iniziata (vedi PageNumberRef, PageAnchor e PageRefCanvas).
+# build_fragment compila un sottoinsieme delle sezioni senza header/footer, come frammento da unire
+# (vedi pdf_merge): l'inizio di ogni sezione con voce d'indice è registrato nell'outline del frammento.
+# build_preview compila solo le prime sezioni (copertina, indice completo, executive summary) con
+# il watermark di anteprima: nessun grafico da renderizzare, una frazione del tempo del documento.
+
+# Prima pagina di contenuto, dopo copertina e indice
+FIRST_CONTENT_PAGE = 3
+
+# Sezioni incluse nell'anteprima (se presenti nel documento) e testo del watermark
+PREVIEW_SECTION_IDS = ("cover", "toc", "executive_summary", "executiveSummary")
+PREVIEW_WATERMARK = "ANTEPRIMA"
+PREVIEW_NOTE = ("<b>Fine dell'anteprima.</b> Il documento completo comprende tutte le sezioni "
+                "elencate nell'indice, con tabelle e grafici.")
+
+_lock = threading.Lock()
+# (tipo documento, id sezione) -> flowable compilati
+_static_sections = {}
+
+
+def section(section_id: str, build, toc=None, when=None, static: bool = False) -> dict:
+    """Specifica di una sezione:
+    build(doc_json, ctx) -> lista di flowable
+    toc: titolo nell'indice, oppure funzione (doc_json, ctx) -> lista di titoli
+    when(doc_json, ctx): la sezione è presente (default sempre; vale anche per l'indice)
+    static: il contenuto non dipende dal documento, compilato una volta per processo"""
+    return {"id": section_id, "build": build, "toc": toc, "when": when, "static": static}
+
+
+def section_present(spec: dict, doc_json: dict, ctx: dict) -> bool:
+    """La sezione compare nel documento (condizione when)"""
+    return spec["when"] is None or bool(spec["when"](doc_json, ctx))
+
+
+def static_flowables(document_type: str, spec: dict, doc_json: dict, ctx: dict) -> list:
+    """Copie dei flowable di una sezione statica, compilata alla prima richiesta"""
+    key = (document_type, spec["id"])
+    with _lock:
+        compiled = _static_sections.get(key)
+    if compiled is None:
+        compiled = spec["build"](doc_json, ctx)
+        with _lock:
+            compiled = _static_sections.setdefault(key, compiled)
+    return [copy.copy(flowable) for flowable in compiled]
+
+
+def toc_titles(spec: dict, doc_json: dict, ctx: dict) -> list:
+    """Voci dell'indice di una sezione ([] se non ha voci o non è presente)"""
+    toc = spec["toc"]
+    if toc is None or not section_present(spec, doc_json, ctx):
+        return []
+    return toc(doc_json, ctx) if callable(toc) else [toc]
+
+
+def toc_entries(sections: list, doc_json: dict, ctx: dict, first_page: int = FIRST_CONTENT_PAGE) -> list:
+    """[(titolo, pagina)] delle sezioni presenti, una pagina per voce"""
+    entries = []
+    page = first_page
+    for spec in sections:
+        for title in toc_titles(spec, doc_json, ctx):
+            entries.append((title, page))
+            page += 1
+    return entries
+
+
+def toc_page_references(sections: list, doc_json: dict, ctx: dict) -> list:
+    """[(titolo, PageNumberRef)] delle sezioni presenti: il numero è quello della pagina in cui la sezione
+    inizia nel documento (tutte le voci di una stessa sezione puntano al suo inizio)"""
+    entries = []
+    page = FIRST_CONTENT_PAGE
+    for spec in sections:
+        for title in toc_titles(spec, doc_json, ctx):
+            entries.append((title, PageNumberRef(spec["id"], estimate=page)))
+            page += 1
+    return entries
+
+
+class PageNumberRef(Flowable):
+    """Numero di pagina di una sezione, allineato a destra (cella dell'indice): disegna il form della sezione,
+    definito da PageRefCanvas a fine documento"""
+
+    def __init__(self, key: str, estimate: int, font_name: str = 'Times-Roman', font_size: float = 11,
+                 leading: float = 12):
+        super().__init__()
+        self.key = key
+        self.estimate = estimate
+        self.font_name = font_name
+        self.font_size = font_size
+        # Leading di default delle celle di tabella: stessa altezza e baseline di una cella di testo
+        self.leading = leading
+
+    def wrap(self, available_width, available_height):
+        self.width, self.height = available_width, self.leading
+        return self.width, self.height
+
+    def draw(self):
+        self.canv.page_refs.setdefault(self.key, self)
+        self.canv.saveState()
+        self.canv.translate(self.width, self.leading - self.font_size)
+        self.canv.doForm(_page_form_name(self.key))
+        self.canv.restoreState()
+
+
+class PageAnchor(Flowable):
+    """Flowable vuoto che registra la pagina in cui inizia la sezione (per PageNumberRef)"""
+
+    def __init__(self, key: str):
+        super().__init__()
+        self.key = key
+        self.width = self.height = 0
+
+    def wrap(self, available_width, available_height):
+        return 0, 0
+
+    def draw(self):
+        self.canv.anchor_pages.setdefault(self.key, self.canv.getPageNumber())
+
+
+def _page_form_name(key: str) -> str:
+    return f"page_ref_{key}"
+
+
+class PageRefCanvas(canvas.Canvas):
+    """Canvas che a fine documento definisce i numeri di pagina referenziati (pagina reale della sezione,
+    oppure la stima se la sezione non è stata disegnata)"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.page_refs = {}
+        self.anchor_pages = {}
+
+    def save(self):
+        for key, ref in self.page_refs.items():
+            # Il numero è disegnato a sinistra dell'origine: bbox del form su quel lato
+            box = ref.font_size * 10
+            self.beginForm(_page_form_name(key), lowerx=-box, lowery=-ref.font_size, upperx=0, uppery=ref.font_size * 2)
+            self.setFont(ref.font_name, ref.font_size)
+            self.drawRightString(0, 0, str(self.anchor_pages.get(key, ref.estimate)))
+            self.endForm()
+        super().save()
+
+
+class SectionMark(Flowable):
+    """Flowable vuoto che registra la pagina corrente come voce di outline con il nome della sezione
+    (ReportLab scrive solo le destinazioni referenziate da outline o link)"""
+
+    def __init__(self, name: str):
+        super().__init__()
+        self.name = name
+        self.width = self.height = 0
+
+    def wrap(self, available_width, available_height):
+        return 0, 0
+
+    def draw(self):
+        self.canv.bookmarkPage(self.name)
+        self.canv.addOutlineEntry(self.name, self.name, level=0)
+
+
+def _marked(mark: Flowable, flowables: list) -> list:
+    """Segna l'inizio della sezione dopo gli eventuali PageBreak iniziali (sulla prima pagina del contenuto)"""
+    start = 0
+    while start < len(flowables) and isinstance(flowables[start], PageBreak):
+        start += 1
+    return flowables[:start] + [mark] + flowables[start:]
+
+
+def build_story(document_type: str, sections: list, doc_json: dict, ctx: dict, marks: bool = False) -> list:
+    """Story del documento: sezioni presenti in ordine, quelle statiche dalla cache
+    (ctx["toc"] già presente: indice calcolato dal chiamante, altrimenti numeri di pagina risolti durante
+    il layout, da compilare con PageRefCanvas; marks: destinazioni per le sezioni nell'indice)"""
+    anchors = "toc" not in ctx and not marks
+    if "toc" not in ctx:
+        ctx["toc"] = toc_page_references(sections, doc_json, ctx) if anchors else toc_entries(sections, doc_json, ctx)
+    story = []
+    for spec in sections:
+        if not section_present(spec, doc_json, ctx):
+            continue
+        if spec["static"]:
+            flowables = static_flowables(document_type, spec, doc_json, ctx)
+        else:
+            flowables = spec["build"](doc_json, ctx)
+        if marks and spec["toc"] is not None:
+            flowables = _marked(SectionMark(spec["id"]), flowables)
+        elif anchors and spec["toc"] is not None:
+            flowables = _marked(PageAnchor(spec["id"]), flowables)
+        story.extend(flowables)
+    return story
+
+
+def create_numbered_canvas(header_left, header_right, footer_left, footer_center, footer_right, confidenzialita):
+    """Crea funzioni callback per header/footer e numerazione pagine"""
+
+    def on_first_page(canvas_obj, doc):
+        # Prima pagina (copertina) senza header/footer
+        pass
+
+    def on_later_pages(canvas_obj, doc):
+        page_num = canvas_obj.getPageNumber()
+        canvas_obj.saveState()
+        canvas_obj.setFont("Times-Roman", 8)
+        canvas_obj.setFillColor(colors.HexColor('#666666'))
+
+        # Header (solo dalla seconda pagina in poi)
+        if page_num > 1:
+            if header_left:
+                canvas_obj.drawString(2*cm, A4[1] - 1.5*cm, header_left)
+            if header_right:
+                canvas_obj.drawRightString(A4[0] - 2*cm, A4[1] - 1.5*cm, header_right)
+
+            # Linea sotto header
+            canvas_obj.setStrokeColor(colors.HexColor('#cccccc'))
+            canvas_obj.setLineWidth(0.5)
+            canvas_obj.line(2*cm, A4[1] - 1.8*cm, A4[0] - 2*cm, A4[1] - 1.8*cm)
+
+        # Footer
+        if footer_left:
+            canvas_obj.drawString(2*cm, 1.2*cm, footer_left)
+        if footer_center:
+            width = canvas_obj.stringWidth(footer_center, "Times-Roman", 8)
+            canvas_obj.drawString((A4[0] - width) / 2, 1.2*cm, footer_center)
+
+        # Numerazione pagine
+        canvas_obj.setFont("Times-Roman", 9)
+        page_text = f"Pagina {page_num}"
+        canvas_obj.drawRightString(A4[0] - 2*cm, 1.5*cm, page_text)
+
+        # Linea sopra footer
+        canvas_obj.setStrokeColor(colors.HexColor('#cccccc'))
+        canvas_obj.setLineWidth(0.5)
+        canvas_obj.line(2*cm, 1.5*cm, A4[0] - 2*cm, 1.5*cm)
+
+        # Watermark confidenzialità se presente
+        if confidenzialita and confidenzialita != 'pubblico' and page_num > 1:
+            canvas_obj.setFont("Times-Bold", 10)
+            canvas_obj.setFillColor(colors.HexColor('#cccccc'))
+            conf_text = "CONFIDENZIALE" if confidenzialita == 'confidenziale' else "USO INTERNO"
+            width = canvas_obj.stringWidth(conf_text, "Times-Bold", 10)
+            canvas_obj.drawString((A4[0] - width) / 2, A4[1] - 1.5*cm, conf_text)
+
+        canvas_obj.restoreState()
+
+    return on_first_page, on_later_pages
+
+
+def with_watermark(on_page, text: str):
+    """Callback di pagina che disegna anche il watermark diagonale (sotto il contenuto della pagina)"""
+    def draw(canvas_obj, doc):
+        canvas_obj.saveState()
+        canvas_obj.setFont("Times-Bold", 96)
+        # Colore chiaro pieno invece della trasparenza (non ammessa dal profilo archive)
+        canvas_obj.setFillColor(colors.HexColor('#e2e8f0'))
+        canvas_obj.translate(A4[0] / 2, A4[1] / 2)
+        canvas_obj.rotate(45)
+        canvas_obj.drawCentredString(0, -32, text)
+        canvas_obj.restoreState()
+        on_page(canvas_obj, doc)
+    return draw
+
+
+def _context(document_type: str, ctx: Optional[dict], profile: str) -> dict:
+    return {**(ctx or {}), "styles": pdf_styles.STYLES, "theme": pdf_styles.get_theme(document_type), "profile": profile}
+
+
+def _template(buffer, profile: str, doc_options: dict) -> SimpleDocTemplate:
+    """Documento A4 con i margini comuni e le opzioni del profilo di output"""
+    return SimpleDocTemplate(
+        buffer,
+        pagesize=A4,
+        rightMargin=2*cm,
+        leftMargin=2*cm,
+        topMargin=3*cm,
+        bottomMargin=2.5*cm,
+        **doc_options,
+        **pdf_profiles.doc_options(profile)
+    )
+
+
+def build_pdf(document_type: str, sections: list, doc_json: dict, ctx: Optional[dict] = None,
+              profile: str = None, header: Optional[dict] = None, footer: Optional[dict] = None,
+              confidenzialita: str = 'pubblico', watermark: Optional[str] = None, **doc_options) -> bytes:
+    """Compila le sezioni e restituisce i byte del PDF (A4, margini e header/footer comuni).
+    ctx: valori calcolati dal generatore e condivisi tra le sezioni (riceve anche styles, theme, profile e toc)
+    watermark: testo diagonale su ogni pagina"""
+    header = header or {}
+    footer = footer or {}
+    ctx = _context(document_type, ctx, profile)
+
+    # Rendering in memoria: la persistenza su disco è a carico del chiamante
+    buffer = io.BytesIO()
+    doc = _template(buffer, profile, doc_options)
+    doc.onFirstPage, doc.onLaterPages = create_numbered_canvas(
+        header.get('left', ''),
+        header.get('right', ''),
+        footer.get('left', ''),
+        footer.get('center', ''),
+        footer.get('right', ''),
+        confidenzialita
+    )
+    if watermark:
+        doc.onFirstPage = with_watermark(doc.onFirstPage, watermark)
+        doc.onLaterPages = with_watermark(doc.onLaterPages, watermark)
+    doc.build(build_story(document_type, sections, doc_json, ctx), canvasmaker=PageRefCanvas)
+    return buffer.getvalue()
+
+
+def build_preview(document_type: str, sections: list, doc_json: dict, ctx: Optional[dict] = None,
+                  profile: str = None, **options) -> bytes:
+    """Anteprima del documento: solo le sezioni in PREVIEW_SECTION_IDS, con l'indice di tutte le sezioni,
+    una nota finale e il watermark (options: come build_pdf)"""
+    ctx = dict(ctx or {})
+    # Le pagine delle sezioni escluse non sono note: l'indice dell'anteprima elenca solo i titoli
+    ctx["toc"] = [(title, "") for title, _ in toc_entries(sections, doc_json, ctx)]
+    preview = [spec for spec in sections
+               if spec["id"] in PREVIEW_SECTION_IDS and section_present(spec, doc_json, ctx)]
+    last = preview[-1]
+
+    def build_last(doc_json, ctx):
+        # Nota in coda all'ultima sezione, senza l'eventuale salto pagina finale
+        flowables = (static_flowables(document_type, last, doc_json, ctx) if last["static"]
+                     else last["build"](doc_json, ctx))
+        while flowables and isinstance(flowables[-1], PageBreak):
+            flowables.pop()
+        return flowables + [Spacer(1, 0.5*cm), Paragraph(PREVIEW_NOTE, ctx["styles"]['Normal'])]
+
+    preview[-1] = {**last, "build": build_last, "static": False}
+    return build_pdf(document_type, preview, doc_json, ctx, profile=profile, watermark=PREVIEW_WATERMARK, **options)
+
+
+def build_fragment(document_type: str, sections: list, doc_json: dict, ctx: Optional[dict] = None,
+                   profile: str = None, **doc_options) -> bytes:
+    """Compila un sottoinsieme delle sezioni come frammento: stesse pagine di build_pdf ma senza
+    header/footer (aggiunti dopo l'unione) e con una voce di outline all'inizio di ogni voce d'indice"""
+    ctx = _context(document_type, ctx, profile)
+    buffer = io.BytesIO()
+    _template(buffer, profile, doc_options).build(build_story(document_type, sections, doc_json, ctx, marks=True))
+    return buffer.getvalue()
+
+
+# === BLOCCHI COMUNI ===
+
+def heading(title: str, space: float = 0.3*cm) -> list:
+    """Titolo di sezione (CustomHeading1) con spazio sotto"""
+    return [Paragraph(title, pdf_styles.STYLES['CustomHeading1']), Spacer(1, space)]
+
+
+def color_band(theme: dict, height: float, style: str = "band") -> Table:
+    """Box colorato a tutta larghezza (copertina, chiusura, footer decorativo)"""
+    band = Table([['']], colWidths=[A4[0] - 4*cm], rowHeights=[height])
+    band.setStyle(theme[style])
+    return band
+
+
+def cover_title(theme: dict, title: str) -> list:
+    """Box colorato superiore, titolo della copertina e linea decorativa"""
+    decor_line = Table([['']], colWidths=[8*cm], rowHeights=[0.2*cm])
+    decor_line.setStyle(theme["decor_line"])
+    return [
+        color_band(theme, 3*cm),
+        Spacer(1, 2*cm),
+        Paragraph(title, theme["cover_title"]),
+        decor_line,
+    ]
+
+
+def info_box(rows: list, table_style) -> Table:
+    """Box informativo: una riga per voce (Paragraph per rendere <b> correttamente)"""
+    normal = pdf_styles.STYLES['Normal']
+    table = Table([[Paragraph(row, normal)] for row in rows], colWidths=[12*cm])
+    table.setStyle(table_style)
+    return table
+
+
+def toc_section() -> dict:
+    """Pagina dell'indice, con le voci calcolate dalle sezioni del documento"""
+    def build(doc_json, ctx):
+        elements = [Paragraph("INDICE", ctx["styles"]['CustomTitle']), Spacer(1, 0.5*cm)]
+        for entry_title, entry_page in ctx["toc"]:
+            # Tabella per allineare titolo e numero pagina (numero noto o PageNumberRef)
+            page_cell = entry_page if isinstance(entry_page, Flowable) else str(entry_page)
+            toc_table = Table([[entry_title, page_cell]], colWidths=[14*cm, 2*cm])
+            toc_table.setStyle(pdf_styles.TOC_ENTRY_TABLE)
+            elements.append(toc_table)
+        elements.append(PageBreak())
+        return elements
+    return section("toc", build)
+
+
+def closing_section(message: str) -> dict:
+    """Pagina finale di chiusura (statica): box colorato, ringraziamento e messaggio"""
+    def build(doc_json, ctx):
+        return [
+            PageBreak(),
+            color_band(ctx["theme"], 2*cm),
+            Spacer(1, 3*cm),
+            Paragraph("Grazie per l'attenzione", ctx["theme"]["closing_title"]),
+            Spacer(1, 1.5*cm),
+            # Senza <p>: ReportLab usa l'allineamento dello stile
+            Paragraph(message, ctx["styles"]['ClosingMessage']),
+        ]
+    return section("closing", build, static=True)
+
+
+def closing_info_section(rows) -> dict:
+    """Box informativo finale e footer decorativo (rows(doc_json, ctx) -> righe del box)"""
+    def build(doc_json, ctx):
+        theme = ctx["theme"]
+        return [
+            Spacer(1, 2*cm),
+            info_box(rows(doc_json, ctx), theme["final_info"]),
+            Spacer(1, 4*cm),
+            color_band(theme, 0.3*cm, "footer_band"),
+        ]
+    return section("closing_info", build)
@@ -0,0 +1,50 @@
+import gzip
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Optional
+
+from payment_cache import DATA_DIR
+from entitlements import json_digest
+
+# Documenti generati, compressi e indirizzati per digest SHA-256 del JSON canonico
+DOCUMENTS_DIR = DATA_DIR / "documents"
+
+_DOCUMENT_ID_RE = re.compile(r"[0-9a-f]{64}")
+
+
+def is_valid_id(document_id: str) -> bool:
+    """True se la stringa ha la forma di un id documento (evita path traversal)"""
+    return bool(document_id) and bool(_DOCUMENT_ID_RE.fullmatch(document_id))
+
+
+def _path_for(document_id: str) -> Path:
+    return DOCUMENTS_DIR / document_id[:2] / f"{document_id}.json.gz"
+
+
+def save(document: dict) -> str:
+    """Salva il documento (se non già presente) e ne restituisce l'id"""
+    document_id = json_digest(document)
+    path = _path_for(document_id)
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        payload = json.dumps(document, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(gzip.compress(payload, compresslevel=6))
+        os.replace(tmp_path, path)
+    return document_id
+
+
+def load(document_id: str) -> Optional[dict]:
+    """Carica il documento con l'id indicato, o None se non esiste"""
+    if not is_valid_id(document_id):
+        return None
+    path = _path_for(document_id)
+    try:
+        with open(path, "rb") as f:
+            return json.loads(gzip.decompress(f.read()))
+    except FileNotFoundError:
+        return None
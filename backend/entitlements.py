@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from payment_cache import DATA_DIR
+
+DB_PATH = DATA_DIR / "entitlements.sqlite3"
+# PDF già renderizzati, indirizzati per digest SHA-256 del contenuto
+ARTIFACTS_DIR = DATA_DIR / "artifacts"
+
+_lock = threading.Lock()
+_conn = None
+
+_COLUMNS = ("session_id", "uid", "document_type", "json_digest", "pdf_digest", "created_at", "updated_at")
+
+
+def _get_conn() -> sqlite3.Connection:
+    """Apre (una sola volta) il ledger SQLite delle entitlement"""
+    global _conn
+    if _conn is None:
+        DATA_DIR.mkdir(parents=True, exist_ok=True)
+        _conn = sqlite3.connect(str(DB_PATH), check_same_thread=False, isolation_level=None)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute(
+            """CREATE TABLE IF NOT EXISTS entitlements (
+                session_id TEXT NOT NULL,
+                document_type TEXT NOT NULL,
+                uid TEXT,
+                json_digest TEXT,
+                pdf_digest TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (session_id, document_type)
+            )"""
+        )
+        _conn.execute("CREATE INDEX IF NOT EXISTS idx_entitlements_uid ON entitlements (uid)")
+    return _conn
+
+
+def json_digest(data) -> str:
+    """Digest SHA-256 della forma canonica di un documento JSON"""
+    canonical = json.dumps(data, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def get(session_id: str, document_type: str) -> Optional[dict]:
+    """Restituisce l'entitlement della sessione per il tipo di documento o None.
+    Una sessione con upsell copre due documenti, quindi la chiave è (session_id, document_type)."""
+    if not session_id:
+        return None
+    with _lock:
+        row = _get_conn().execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM entitlements WHERE session_id = ? AND document_type = ?",
+            (session_id, document_type)
+        ).fetchone()
+    return dict(zip(_COLUMNS, row)) if row else None
+
+
+def list_for_user(uid: str) -> List[dict]:
+    """Tutte le entitlement di un utente, dalla più recente"""
+    with _lock:
+        rows = _get_conn().execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM entitlements WHERE uid = ? ORDER BY updated_at DESC", (uid,)
+        ).fetchall()
+    return [dict(zip(_COLUMNS, row)) for row in rows]
+
+
+def record(session_id: str, document_type: str, uid: Optional[str] = None,
+           json_digest: Optional[str] = None, pdf_digest: Optional[str] = None) -> dict:
+    """Crea o aggiorna l'entitlement; i campi None non sovrascrivono i valori già registrati.
+    Un nuovo json_digest senza pdf_digest scollega l'artifact, che apparteneva al JSON precedente"""
+    now = time.time()
+    with _lock:
+        _get_conn().execute(
+            """INSERT INTO entitlements (session_id, uid, document_type, json_digest, pdf_digest, created_at, updated_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT(session_id, document_type) DO UPDATE SET
+                   uid = COALESCE(excluded.uid, uid),
+                   json_digest = COALESCE(excluded.json_digest, json_digest),
+                   pdf_digest = CASE
+                       WHEN excluded.pdf_digest IS NOT NULL THEN excluded.pdf_digest
+                       WHEN excluded.json_digest IS NOT NULL AND excluded.json_digest IS NOT json_digest THEN NULL
+                       ELSE pdf_digest
+                   END,
+                   updated_at = excluded.updated_at""",
+            (session_id, uid, document_type, json_digest, pdf_digest, now, now)
+        )
+    return get(session_id, document_type)
+
+
+def is_owned_by_other(entitlement: Optional[dict], uid: Optional[str]) -> bool:
+    """True se l'entitlement appartiene già a un utente diverso"""
+    return bool(entitlement and entitlement.get("uid") and uid and entitlement["uid"] != uid)
+
+
+def artifact_path(pdf_digest: Optional[str]) -> Optional[Path]:
+    """Path del PDF renderizzato con il digest indicato, se presente su disco"""
+    if not pdf_digest:
+        return None
+    path = ARTIFACTS_DIR / f"{pdf_digest}.pdf"
+    return path if path.exists() else None
+
+
+def store_artifact(pdf_bytes: bytes) -> str:
+    """Salva un PDF renderizzato nello store degli artifact e ne restituisce il digest"""
+    digest = hashlib.sha256(pdf_bytes).hexdigest()
+    target = ARTIFACTS_DIR / f"{digest}.pdf"
+    if not target.exists():
+        ARTIFACTS_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path = target.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(pdf_bytes)
+        os.replace(tmp_path, target)
+    return digest
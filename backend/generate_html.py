@@ -1,28 +1,58 @@
+import html
 import json
 import re
-from typing import Dict, List, Any
+
+import markdown_cache
+import markdown_flowables
+
+# Link nel markup dei blocchi: l'escape del PDF non basta per l'HTML dell'anteprima, l'href si rivalida qui
+_LINK_RE = re.compile(r'<a href="([^"]*)">')
+
+def _link_html(match):
+    """Apertura del link in HTML: URL decodificato, schema ammesso e attributo con escape HTML"""
+    url = html.unescape(match.group(1))
+    if markdown_flowables.safe_url(url) is None:
+        return '<a>'
+    return f'<a href="{html.escape(url, quote=True)}">'
+
+def _markup_html(markup):
+    """Markup inline dei blocchi (quello di ReportLab Paragraph) in HTML: codice inline e link"""
+    markup = markup.replace('<font name="Courier">', '<code>').replace('</font>', '</code>')
+    return _LINK_RE.sub(_link_html, markup) if '<a ' in markup else markup
 
 def simple_markdown_to_html(md_text):
-    """Converte markdown in HTML senza dipendenze esterne"""
-    html = md_text
-    # Headers
-    html = re.sub(r'^###\s+(.+)$', r'<h3>\1</h3>', html, flags=re.MULTILINE)
-    html = re.sub(r'^##\s+(.+)$', r'<h2>\1</h2>', html, flags=re.MULTILINE)
-    html = re.sub(r'^#\s+(.+)$', r'<h1>\1</h1>', html, flags=re.MULTILINE)
-    # Bold/Italic
-    html = re.sub(r'\*\*(.+?)\*\*', r'<strong>\1</strong>', html)
-    html = re.sub(r'\*(.+?)\*', r'<em>\1</em>', html)
-    # Liste
-    html = re.sub(r'^[-*]\s+(.+)$', r'<li>\1</li>', html, flags=re.MULTILINE)
-    # Paragrafi
-    paragraphs = html.split('\n\n')
+    """Converte markdown in HTML dai blocchi analizzati una volta in markdown_cache (gli stessi del PDF)"""
     result = []
-    for para in paragraphs:
-        para = para.strip()
-        if para and not para.startswith('<'):
-            result.append(f'<p>{para}</p>')
-        else:
-            result.append(para)
+    open_list = None
+    for token in markdown_cache.tokens(md_text):
+        kind = token[0]
+        list_tag = ('ol' if token[1] else 'ul') if kind == 'list_item' else None
+        if open_list and open_list != list_tag:
+            result.append(f'</{open_list}>')
+            open_list = None
+        if kind == 'list_item':
+            if open_list is None:
+                result.append(f'<{list_tag}>')
+                open_list = list_tag
+            result.append(f'<li>{_markup_html(token[2])}</li>')
+        elif kind == 'heading':
+            result.append(f'<h{token[1]}>{_markup_html(token[2])}</h{token[1]}>')
+        elif kind == 'paragraph':
+            if token[1]:
+                result.append(f'<p>{_markup_html(token[1])}</p>')
+        elif kind == 'code':
+            result.append(f'<pre><code>{token[1]}</code></pre>')
+        elif kind == 'table':
+            header, *body = token[1]
+            head_html = "".join(f'<th>{_markup_html(cell)}</th>' for cell in header)
+            body_html = "".join(
+                '<tr>' + "".join(f'<td>{_markup_html(cell)}</td>' for cell in row) + '</tr>' for row in body
+            )
+            result.append(f'<table class="table"><thead><tr>{head_html}</tr></thead><tbody>{body_html}</tbody></table>')
+        elif kind == 'rule':
+            result.append('<hr/>')
+    if open_list:
+        result.append(f'</{open_list}>')
     return '\n'.join(result)
 
 def safe_array(v):
@@ -34,6 +64,15 @@ def escape_html(s):
     s = str(s)
     return s.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace('"', "&quot;").replace("'", "&#039;")
 
+# Caratteri da non lasciare letterali nel JSON dentro <script>: "</script>", "<!--" e i separatori di riga JS
+_SCRIPT_JSON_ESCAPES = str.maketrans({
+    "<": "\\u003c", ">": "\\u003e", "&": "\\u0026", "\u2028": "\\u2028", "\u2029": "\\u2029",
+})
+
+def script_json(value):
+    """JSON da incorporare in un blocco <script>: stesso valore per JavaScript, nessuna chiusura del tag"""
+    return json.dumps(value, ensure_ascii=False).translate(_SCRIPT_JSON_ESCAPES)
+
 def format_eur(n):
     try:
         n = float(n)
@@ -43,123 +82,41 @@ def format_eur(n):
         return "—"
     return f"{n:,.0f} €".replace(",", ".")
 
+def format_kpi_value(k):
+    """Valore del KPI secondo l'unità (EUR, percentuale o valore grezzo)"""
+    if k.get("unita") == "EUR":
+        return format_eur(k["valore"])
+    if k.get("unita") == "%":
+        return f'{k["valore"]}%'
+    return str(k.get("valore", "—"))
+
 def chunk_by(arr, size):
     return [arr[i:i+size] for i in range(0, len(arr), size)]
 
-def build_html_from_json(model: dict, for_pdf: bool = True) -> str:
-    """Genera HTML dal JSON (equivalente a buildHtml in generate.js)"""
-    meta = model.get("meta", {})
-    layout = model.get("pdf_layout", {})
-    narrative_chapters = safe_array(model.get("narrative", {}).get("chapters", []))
-    charts = safe_array(model.get("charts", []))
-    
-    chart_by_id = {c["id"]: c for c in charts}
-    chapters_in_order = safe_array(layout.get("chapter_order", []))
-    
-    narrative_by_id = {ch["id"]: ch for ch in narrative_chapters}
-    ordered_chapter_ids = [
-        *[id for id in chapters_in_order if id in narrative_by_id],
-        *[ch["id"] for ch in narrative_chapters if ch["id"] not in chapters_in_order]
-    ]
-    
-    # TOC
-    toc_items = "".join([
-        f'<div class="toc-row"><div class="toc-left"><span class="toc-num">{idx+1}.</span> <a href="#{escape_html(id)}">{escape_html(narrative_by_id[id]["titolo"])}</a></div><div class="toc-right"></div></div>'
-        for idx, id in enumerate(ordered_chapter_ids) if id in narrative_by_id
-    ])
-    
-    include_toc = layout.get("style_hints", {}).get("include_table_of_contents", False)
-    max_charts_per_page = layout.get("style_hints", {}).get("max_charts_per_page", 2) or 2
-    
-    # Executive Summary
-    exec = model.get("executive_summary", {})
-    kpis = safe_array(exec.get("kpi_principali", []))
-    recs = safe_array(exec.get("raccomandazioni_30_60_90", []))
-    
-    kpi_table = ""
-    if kpis:
-        kpi_rows = "".join([
-            f'<tr><td>{escape_html(k["nome"])}</td><td class="num">{escape_html(format_eur(k["valore"]) if k.get("unita") == "EUR" else (f\'{k["valore"]}%\' if k.get("unita") == "%" else str(k.get("valore", "—"))))}</td><td>{escape_html(k.get("scenario", ""))}</td></tr>'
-            for k in kpis
-        ])
-        kpi_table = f'<table class="table"><thead><tr><th>KPI</th><th>Valore</th><th>Scenario</th></tr></thead><tbody>{kpi_rows}</tbody></table>'
-    else:
-        kpi_table = '<div class="muted">Nessun KPI fornito.</div>'
-    
-    rec_table = ""
-    if recs:
-        rec_rows = "".join([
-            f'<tr><td>{escape_html(str(r.get("orizzonte_giorni", "")))} gg</td><td>{escape_html(r.get("azione", ""))}</td><td>{escape_html(r.get("motivazione", ""))}</td><td>{escape_html(r.get("priorita", ""))}</td></tr>'
-            for r in recs
-        ])
-        rec_table = f'<table class="table"><thead><tr><th>Orizzonte</th><th>Azione</th><th>Motivazione</th><th>Priorità</th></tr></thead><tbody>{rec_rows}</tbody></table>'
-    else:
-        rec_table = '<div class="muted">Nessuna raccomandazione fornita.</div>'
-    
-    # Capitoli (per PDF, i grafici saranno mostrati come tabelle)
-    chapters_html = "".join([
-        _build_chapter_html(narrative_by_id[id], idx, chart_by_id, max_charts_per_page, for_pdf=True)
-        for idx, id in enumerate(ordered_chapter_ids) if id in narrative_by_id
-    ])
-    
-    # Executive Summary HTML
-    punti_chiave = safe_array(exec.get("punti_chiave", []))
-    punti_chiave_html = ""
-    if punti_chiave:
-        punti_chiave_html = f'<h2>Punti chiave</h2><ul>{"".join([f"<li>{escape_html(x)}</li>" for x in punti_chiave])}</ul>'
-    
-    exec_html = f'''
-    <section class="chapter" id="EXEC_SUMMARY">
-      <div class="chapter-kicker">Sezione iniziale</div>
-      <h1 class="chapter-title">Executive Summary</h1>
-      <div class="chapter-body">
-        <p>{escape_html(exec.get("sintesi", ""))}</p>
-        {punti_chiave_html}
-        <h2>KPI principali</h2>
-        {kpi_table}
-        <h2>Raccomandazioni 30/60/90</h2>
-        {rec_table}
-      </div>
-    </section>
-    '''
-    
-    # HTML completo
-    title = layout.get("titolo_documento", "Business Plan")
-    subtitle = layout.get("sottotitolo", "")
-    confidentiality = layout.get("confidenzialita", "uso_interno")
-    
-    # Charts JSON per JavaScript
-    charts_json = json.dumps(charts, ensure_ascii=False)
-    
-    html = f'''<!doctype html>
-<html lang="{escape_html(meta.get("lingua", "it-IT"))}">
-<head>
-  <meta charset="utf-8" />
-  <meta name="viewport" content="width=device-width,initial-scale=1" />
-  <title>{escape_html(title)}</title>
-  {f'<script src="https://cdn.jsdelivr.net/npm/chart.js@4.4.1/dist/chart.umd.min.js"></script>' if not for_pdf else ''}
-  <style>
-    :root{{
+# Chart.js per i grafici dell'anteprima nel browser
+CHART_JS_URL = "https://cdn.jsdelivr.net/npm/chart.js@4.4.1/dist/chart.umd.min.js"
+
+PAGE_CSS = """    :root{
       --text:#111;
       --muted:#666;
       --border:#e6e6e6;
       --bg:#fff;
       --soft:#f7f7f8;
       --accent:#111;
-    }}
-    *{{ box-sizing:border-box; }}
-    body{{
+    }
+    *{ box-sizing:border-box; }
+    body{
       margin:0;
       font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, Inter, Arial, sans-serif;
       color:var(--text);
       background:var(--bg);
       line-height:1.35;
-    }}
-    .cover{{
+    }
+    .cover{
       padding: 70px 52px 56px;
       border-bottom: 1px solid var(--border);
-    }}
-    .cover .badge{{
+    }
+    .cover .badge{
       display:inline-block;
       padding:6px 10px;
       border:1px solid var(--border);
@@ -168,131 +125,163 @@ def build_html_from_json(model: dict, for_pdf: bool = True) -> str:
       color:var(--muted);
       background:var(--soft);
       letter-spacing:.02em;
-    }}
-    .cover h1{{
+    }
+    .cover h1{
       margin: 14px 0 8px;
       font-size: 30px;
       letter-spacing: -0.02em;
-    }}
-    .cover h2{{
+    }
+    .cover h2{
       margin:0 0 18px;
       font-weight:500;
       color:var(--muted);
       font-size:16px;
-    }}
-    .cover .meta{{
+    }
+    .cover .meta{
       margin-top:24px;
       display:grid;
       grid-template-columns: 1fr 1fr;
       gap:10px 24px;
       font-size:12px;
       color:var(--muted);
-    }}
-    .toc{{
+    }
+    .toc{
       padding: 42px 52px 0;
-    }}
-    .toc h1{{
+    }
+    .toc h1{
       font-size: 18px;
       margin: 0 0 14px;
-    }}
-    .toc-row{{
+    }
+    .toc-row{
       display:flex;
       align-items:baseline;
       justify-content:space-between;
       padding: 7px 0;
       border-bottom: 1px dashed var(--border);
       font-size: 13px;
-    }}
-    .toc-left a{{ color: var(--text); text-decoration:none; }}
-    .toc-left a:hover{{ text-decoration:underline; }}
-    .toc-num{{ color:var(--muted); margin-right:6px; }}
-    .chapter{{
+    }
+    .toc-left a{ color: var(--text); text-decoration:none; }
+    .toc-left a:hover{ text-decoration:underline; }
+    .toc-num{ color:var(--muted); margin-right:6px; }
+    .chapter{
       padding: 36px 52px 0;
-    }}
-    .chapter-kicker{{
+    }
+    .chapter-kicker{
       color: var(--muted);
       font-size: 12px;
       letter-spacing: .06em;
       text-transform: uppercase;
       margin-bottom: 8px;
-    }}
-    .chapter-title{{
+    }
+    .chapter-title{
       margin: 0 0 14px;
       font-size: 22px;
       letter-spacing: -0.01em;
-    }}
-    .chapter-body{{
+    }
+    .chapter-body{
       font-size: 13.2px;
       color: var(--text);
-    }}
-    .chapter-body h2{{
+    }
+    .chapter-body h2{
       font-size: 15px;
       margin-top: 14px;
       margin-bottom: 8px;
       letter-spacing: -0.01em;
-    }}
-    .chapter-body ul{{
+    }
+    .chapter-body ul{
       margin: 8px 0 12px 18px;
-    }}
-    .muted{{ color: var(--muted); }}
-    .table{{
+    }
+    .muted{ color: var(--muted); }
+    .table{
       width:100%;
       border-collapse: collapse;
       font-size: 12.6px;
       margin: 8px 0 14px;
-    }}
-    .table th, .table td{{
+    }
+    .table th, .table td{
       border:1px solid var(--border);
       padding: 8px 10px;
       vertical-align: top;
-    }}
-    .table th{{
+    }
+    .table th{
       background: var(--soft);
       text-align:left;
       font-weight: 650;
-    }}
-    .table .num{{ text-align:right; white-space:nowrap; }}
-    .charts-page{{
+    }
+    .table .num{ text-align:right; white-space:nowrap; }
+    .charts-page{
       display:grid;
       grid-template-columns: 1fr;
       gap: 12px;
       margin-top: 16px;
-    }}
-    .chart-card{{
+    }
+    .chart-card{
       border: 1px solid var(--border);
       background: #fff;
       border-radius: 12px;
       padding: 12px 14px 10px;
-    }}
-    .chart-title{{
+    }
+    .chart-title{
       font-size: 12.5px;
       font-weight: 650;
       margin-bottom: 8px;
-    }}
-    .chart-caption{{
+    }
+    .chart-caption{
       margin-top: 6px;
       font-size: 11.5px;
       color: var(--muted);
-    }}
-    canvas.chart{{
+    }
+    canvas.chart{
       width: 100% !important;
       height: 320px !important;
       display:block;
-    }}
-    .page-break{{
+    }
+    .page-break{
       break-before: page;
       page-break-before: always;
-    }}
-    pre{{
+    }
+    pre{
       background: var(--soft);
       border: 1px solid var(--border);
       padding: 10px 12px;
       border-radius: 10px;
       overflow:auto;
       font-size: 12px;
-    }}
-    code{{ font-family: ui-monospace, SFMono-Regular, Menlo, Monaco, Consolas, "Liberation Mono", "Courier New", monospace; }}
-  </style>
+    }
+    code{ font-family: ui-monospace, SFMono-Regular, Menlo, Monaco, Consolas, "Liberation Mono", "Courier New", monospace; }
+"""
+
+def _ordered_chapters(model: dict):
+    """Capitoli per id e id nell'ordine di chapter_order (poi i capitoli non elencati)"""
+    layout = model.get("pdf_layout", {})
+    narrative_chapters = safe_array(model.get("narrative", {}).get("chapters", []))
+    chapters_in_order = safe_array(layout.get("chapter_order", []))
+    
+    narrative_by_id = {ch["id"]: ch for ch in narrative_chapters}
+    ordered_chapter_ids = [
+        *[id for id in chapters_in_order if id in narrative_by_id],
+        *[ch["id"] for ch in narrative_chapters if ch["id"] not in chapters_in_order]
+    ]
+    return narrative_by_id, ordered_chapter_ids
+
+def _head_html(model: dict, for_pdf: bool) -> str:
+    """Apertura del documento: head con gli stili e copertina"""
+    meta = model.get("meta", {})
+    layout = model.get("pdf_layout", {})
+    title = layout.get("titolo_documento", "Business Plan")
+    subtitle = layout.get("sottotitolo", "")
+    confidentiality = layout.get("confidenzialita", "uso_interno")
+    chart_js = '' if for_pdf else f'<script src="{CHART_JS_URL}"></script>'
+    
+    return f'''<!doctype html>
+<html lang="{escape_html(meta.get("lingua", "it-IT"))}">
+<head>
+  <meta charset="utf-8" />
+  <meta name="viewport" content="width=device-width,initial-scale=1" />
+  <title>{escape_html(title)}</title>
+  {chart_js}
+  <style>
+{PAGE_CSS}  </style>
 </head>
 <body>
   <div class="cover">
@@ -307,31 +296,87 @@ def build_html_from_json(model: dict, for_pdf: bool = True) -> str:
       <div><strong>Versione</strong>: {escape_html(meta.get("versione", "1.0"))}</div>
     </div>
   </div>
+'''
 
-  {f'<div class="toc page-break"><h1>Indice</h1><div class="toc-row"><div class="toc-left"><span class="toc-num">0.</span> <a href="#EXEC_SUMMARY">Executive Summary</a></div><div class="toc-right"></div></div>{toc_items}</div>' if include_toc else ""}
+def _toc_html(model: dict) -> str:
+    """Indice con link alle sezioni (solo se richiesto dagli style_hints)"""
+    narrative_by_id, ordered_chapter_ids = _ordered_chapters(model)
+    toc_items = "".join([
+        f'<div class="toc-row"><div class="toc-left"><span class="toc-num">{idx+1}.</span> <a href="#{escape_html(id)}">{escape_html(narrative_by_id[id]["titolo"])}</a></div><div class="toc-right"></div></div>'
+        for idx, id in enumerate(ordered_chapter_ids) if id in narrative_by_id
+    ])
+    return f'<div class="toc page-break"><h1>Indice</h1><div class="toc-row"><div class="toc-left"><span class="toc-num">0.</span> <a href="#EXEC_SUMMARY">Executive Summary</a></div><div class="toc-right"></div></div>{toc_items}</div>'
 
-  {exec_html}
-  {chapters_html}
+def _exec_summary_html(model: dict) -> str:
+    """Executive summary: sintesi, punti chiave, KPI e raccomandazioni 30/60/90"""
+    exec = model.get("executive_summary", {})
+    kpis = safe_array(exec.get("kpi_principali", []))
+    recs = safe_array(exec.get("raccomandazioni_30_60_90", []))
+    
+    kpi_table = ""
+    if kpis:
+        kpi_rows = "".join([
+            f'<tr><td>{escape_html(k["nome"])}</td><td class="num">{escape_html(format_kpi_value(k))}</td><td>{escape_html(k.get("scenario", ""))}</td></tr>'
+            for k in kpis
+        ])
+        kpi_table = f'<table class="table"><thead><tr><th>KPI</th><th>Valore</th><th>Scenario</th></tr></thead><tbody>{kpi_rows}</tbody></table>'
+    else:
+        kpi_table = '<div class="muted">Nessun KPI fornito.</div>'
+    
+    rec_table = ""
+    if recs:
+        rec_rows = "".join([
+            f'<tr><td>{escape_html(str(r.get("orizzonte_giorni", "")))} gg</td><td>{escape_html(r.get("azione", ""))}</td><td>{escape_html(r.get("motivazione", ""))}</td><td>{escape_html(r.get("priorita", ""))}</td></tr>'
+            for r in recs
+        ])
+        rec_table = f'<table class="table"><thead><tr><th>Orizzonte</th><th>Azione</th><th>Motivazione</th><th>Priorità</th></tr></thead><tbody>{rec_rows}</tbody></table>'
+    else:
+        rec_table = '<div class="muted">Nessuna raccomandazione fornita.</div>'
+    
+    # Executive Summary HTML
+    punti_chiave = safe_array(exec.get("punti_chiave", []))
+    punti_chiave_html = ""
+    if punti_chiave:
+        punti_chiave_html = f'<h2>Punti chiave</h2><ul>{"".join([f"<li>{escape_html(x)}</li>" for x in punti_chiave])}</ul>'
+    
+    exec_html = f'''
+    <section class="chapter" id="EXEC_SUMMARY">
+      <div class="chapter-kicker">Sezione iniziale</div>
+      <h1 class="chapter-title">Executive Summary</h1>
+      <div class="chapter-body">
+        <p>{escape_html(exec.get("sintesi", ""))}</p>
+        {punti_chiave_html}
+        <h2>KPI principali</h2>
+        {kpi_table}
+        <h2>Raccomandazioni 30/60/90</h2>
+        {rec_table}
+      </div>
+    </section>
+    '''
+    
+    return exec_html
 
-  {f'''<script src="https://cdn.jsdelivr.net/npm/chart.js@4.4.1/dist/chart.umd.min.js"></script>
-  <script>
-    (function(){{
-      const charts = {charts_json};
-      function toXY(points){{
-        return points.map(p => ({{ x: p.x, y: p.y }}));
-      }}
-      function buildDataset(series, type){{
-        return series.map((s, idx) => {{
+def _charts_script_html(charts: list) -> str:
+    """Script che disegna i grafici con Chart.js (solo anteprima nel browser)"""
+    return (
+        '''  <script>
+    (function(){
+      const charts = ''' + script_json(charts) + ''';
+      function toXY(points){
+        return points.map(p => ({ x: p.x, y: p.y }));
+      }
+      function buildDataset(series, type){
+        return series.map((s, idx) => {
           const data = toXY(s.points || []);
-          return {{
+          return {
             label: (s.name || ("Serie " + (idx+1))).trim(),
             data,
-            parsing: {{ xAxisKey: "x", yAxisKey: "y" }},
+            parsing: { xAxisKey: "x", yAxisKey: "y" },
             tension: type === "line" ? 0.25 : 0,
-          }};
-        }});
-      }}
-      function makeChart(cfg){{
+          };
+        });
+      }
+      function makeChart(cfg){
         const canvas = document.getElementById("chart_" + cfg.id);
         if(!canvas) return;
         const ctx = canvas.getContext("2d");
@@ -339,125 +384,161 @@ def build_html_from_json(model: dict, for_pdf: bool = True) -> str:
         let chartType = type;
         if(type === "pie") chartType = "pie";
         const datasets = buildDataset(cfg.series || [], type);
-        const commonOptions = {{
+        const commonOptions = {
           responsive: true,
           maintainAspectRatio: false,
-          plugins: {{
-            legend: {{ display: true, position: "bottom", labels: {{ boxWidth: 10 }} }},
-            title: {{ display: false }},
-            tooltip: {{ enabled: true }}
-          }},
+          plugins: {
+            legend: { display: true, position: "bottom", labels: { boxWidth: 10 } },
+            title: { display: false },
+            tooltip: { enabled: true }
+          },
           animation: false
-        }};
-        if(chartType === "pie"){{
+        };
+        if(chartType === "pie"){
           const pieData = (cfg.series?.[0]?.points || []).map(p => p.y);
           const pieLabels = (cfg.series?.[0]?.points || []).map(p => p.x);
-          new Chart(ctx, {{
+          new Chart(ctx, {
             type: "pie",
-            data: {{
+            data: {
               labels: pieLabels,
-              datasets: [{{ label: cfg.titolo || cfg.id, data: pieData }}]
-            }},
+              datasets: [{ label: cfg.titolo || cfg.id, data: pieData }]
+            },
             options: commonOptions
-          }});
+          });
           return;
-        }}
-        new Chart(ctx, {{
+        }
+        new Chart(ctx, {
           type: chartType,
-          data: {{ datasets }},
-          options: {{
+          data: { datasets },
+          options: {
             ...commonOptions,
-            scales: {{
-              x: {{
+            scales: {
+              x: {
                 type: "category",
-                title: {{ display: !!cfg.x_label, text: cfg.x_label || "" }},
-                grid: {{ display: false }}
-              }},
-              y: {{
-                title: {{ display: !!cfg.y_label, text: cfg.y_label || "" }},
-                ticks: {{ callback: (v) => {{
+                title: { display: !!cfg.x_label, text: cfg.x_label || "" },
+                grid: { display: false }
+              },
+              y: {
+                title: { display: !!cfg.y_label, text: cfg.y_label || "" },
+                ticks: { callback: (v) => {
                   if (typeof v === "number") return new Intl.NumberFormat("it-IT").format(v);
                   return v;
-                }}}}
-              }}
-            }}
-          }}
-        }});
-      }}
+                }}
+              }
+            }
+          }
+        });
+      }
       charts.forEach(makeChart);
       window.__CHARTS_RENDERED__ = true;
-    }})();
-  </script>''' if not for_pdf else ''}
-</body>
-</html>'''
+    })();
+  </script>'''
+    )
+
+def iter_html_sections(model: dict, for_pdf: bool = True):
+    """Genera l'HTML del documento una sezione alla volta (apertura, indice, executive summary,
+    un capitolo per volta, chiusura): concatenati danno build_html_from_json"""
+    layout = model.get("pdf_layout", {})
+    charts = safe_array(model.get("charts", []))
+    chart_by_id = {c["id"]: c for c in charts}
+    narrative_by_id, ordered_chapter_ids = _ordered_chapters(model)
+    style_hints = layout.get("style_hints", {})
+    max_charts_per_page = style_hints.get("max_charts_per_page", 2) or 2
     
-    return html
+    yield _head_html(model, for_pdf)
+    if style_hints.get("include_table_of_contents", False):
+        yield "\n  " + _toc_html(model) + "\n"
+    yield "\n  " + _exec_summary_html(model) + "\n"
+    # Capitoli (per PDF i grafici sono mostrati come tabelle)
+    for idx, id in enumerate(ordered_chapter_ids):
+        yield _build_chapter_html(narrative_by_id[id], idx, chart_by_id, max_charts_per_page, for_pdf=for_pdf)
+    if not for_pdf:
+        yield "\n  " + _charts_script_html(charts) + "\n"
+    yield "</body>\n</html>"
+
+def build_html_from_json(model: dict, for_pdf: bool = True) -> str:
+    """Genera HTML dal JSON (equivalente a buildHtml in generate.js)"""
+    return "".join(iter_html_sections(model, for_pdf))
+
+# Template di capitolo e grafici: il testo è fisso, i campi arrivano già escapati
+CHAPTER_TEMPLATE = '''
+        <section class="chapter" id="{id}">
+          <div class="chapter-kicker">Capitolo {number}</div>
+          <h1 class="chapter-title">{title}</h1>
+          <div class="chapter-body">{body}</div>
+          '''
+
+CHAPTER_END = '''
+        </section>
+      '''
+
+CHART_TABLE_CARD_TEMPLATE = '''<div class="chart-card">
+                      <div class="chart-title">{title}</div>
+                      <div style="padding: 10px; background: #f7f7f8; border-radius: 8px; margin: 10px 0;">
+                        <p style="margin: 0; color: #666; font-size: 12px;"><em>Grafico: {kind}</em></p>
+                        {table}
+                      </div>
+                      {caption}
+                    </div>'''
+
+CHART_CANVAS_CARD_TEMPLATE = '''<div class="chart-card">
+                      <div class="chart-title">{title}</div>
+                      <canvas class="chart" id="chart_{id}" width="900" height="420"></canvas>
+                      {caption}
+                    </div>'''
 
 def _build_chapter_html(ch, idx, chart_by_id, max_charts_per_page, for_pdf=False):
     """Costruisce HTML per un singolo capitolo"""
-    body_html = simple_markdown_to_html(ch.get("contenuto_markdown", ""))
-    
-    chart_ids = safe_array(ch.get("chart_ids", []))
-    chart_ids = [cid for cid in chart_ids if cid in chart_by_id]
+    out = [CHAPTER_TEMPLATE.format(
+        id=escape_html(ch["id"]),
+        number=idx + 1,
+        title=escape_html(ch.get("titolo", "")),
+        body=simple_markdown_to_html(ch.get("contenuto_markdown", "")),
+    )]
     
-    chart_blocks = ""
-    if chart_ids:
-        chart_groups = chunk_by(chart_ids, max_charts_per_page)
-        chart_blocks = "".join([
-            f'<div class="charts-page page-break">{"".join([_build_chart_html(chart_by_id[cid], for_pdf=for_pdf) for cid in group])}</div>'
-            for group in chart_groups
-        ])
-    
-    return f'''
-        <section class="chapter" id="{escape_html(ch["id"])}">
-          <div class="chapter-kicker">Capitolo {idx + 1}</div>
-          <h1 class="chapter-title">{escape_html(ch.get("titolo", ""))}</h1>
-          <div class="chapter-body">{body_html}</div>
-          {chart_blocks}
-        </section>
-      '''
+    chart_ids = [cid for cid in safe_array(ch.get("chart_ids", [])) if cid in chart_by_id]
+    for group in chunk_by(chart_ids, max_charts_per_page):
+        out.append('<div class="charts-page page-break">')
+        out.extend(_build_chart_html(chart_by_id[cid], for_pdf=for_pdf) for cid in group)
+        out.append('</div>')
+    out.append(CHAPTER_END)
+    return "".join(out)
 
 def _build_chart_html(c, for_pdf=False):
     """Costruisce HTML per un singolo grafico"""
     caption_html = f'<div class="chart-caption">{escape_html(c.get("caption", ""))}</div>' if c.get("caption") else ""
+    title = escape_html(c.get("titolo", c.get("id", "")))
     
     if for_pdf:
         # Per PDF: mostra i dati in formato tabella (WeasyPrint non supporta JavaScript)
-        chart_data = ""
-        if c.get("series"):
-            chart_data = "<table class='table' style='margin-top:10px;'><thead><tr><th>Punto</th>"
-            for series in c.get("series", []):
-                chart_data += f"<th>{escape_html(series.get('name', 'Serie'))}</th>"
-            chart_data += "</tr></thead><tbody>"
-            
-            # Raggruppa i punti
-            max_points = max([len(s.get("points", [])) for s in c.get("series", [])], default=0)
-            for i in range(max_points):
-                chart_data += "<tr>"
-                if i < len(c.get("series", [{}])[0].get("points", [])):
-                    chart_data += f"<td>{escape_html(str(c['series'][0]['points'][i].get('x', '')))}</td>"
-                else:
-                    chart_data += "<td></td>"
-                for series in c.get("series", []):
-                    if i < len(series.get("points", [])):
-                        chart_data += f"<td>{escape_html(str(series['points'][i].get('y', '')))}</td>"
-                    else:
-                        chart_data += "<td></td>"
-                chart_data += "</tr>"
-            chart_data += "</tbody></table>"
-        
-        return f'''<div class="chart-card">
-                      <div class="chart-title">{escape_html(c.get("titolo", c.get("id", "")))}</div>
-                      <div style="padding: 10px; background: #f7f7f8; border-radius: 8px; margin: 10px 0;">
-                        <p style="margin: 0; color: #666; font-size: 12px;"><em>Grafico: {escape_html(c.get("tipo", "line").upper())}</em></p>
-                        {chart_data}
-                      </div>
-                      {caption_html}
-                    </div>'''
-    else:
-        # Per visualizzazione browser: usa canvas con Chart.js
-        return f'''<div class="chart-card">
-                      <div class="chart-title">{escape_html(c.get("titolo", c.get("id", "")))}</div>
-                      <canvas class="chart" id="chart_{escape_html(c["id"])}" width="900" height="420"></canvas>
-                      {caption_html}
-                    </div>'''
+        series = c.get("series")
+        return CHART_TABLE_CARD_TEMPLATE.format(
+            title=title,
+            kind=escape_html(c.get("tipo", "line").upper()),
+            table=_chart_table_html(series) if series else "",
+            caption=caption_html,
+        )
+    # Per visualizzazione browser: usa canvas con Chart.js
+    return CHART_CANVAS_CARD_TEMPLATE.format(title=title, id=escape_html(c["id"]), caption=caption_html)
+
+def _chart_table_html(series):
+    """Tabella dei dati del grafico: una riga per punto (x della prima serie), una colonna per serie.
+    Le celle si costruiscono per colonna e si uniscono una volta sola (lineare in punti x serie)"""
+    points = [s.get("points", []) for s in series]
+    max_points = max(map(len, points), default=0)
+    empty = "<td></td>"
+    
+    columns = [[f"<td>{escape_html(str(p.get('x', '')))}</td>" for p in points[0]]]
+    columns += [[f"<td>{escape_html(str(p.get('y', '')))}</td>" for p in series_points] for series_points in points]
+    for column in columns:
+        column.extend([empty] * (max_points - len(column)))
+    
+    out = ["<table class='table' style='margin-top:10px;'><thead><tr><th>Punto</th>"]
+    out.extend(f"<th>{escape_html(s.get('name', 'Serie'))}</th>" for s in series)
+    out.append("</tr></thead><tbody>")
+    for row in zip(*columns):
+        out.append("<tr>")
+        out.extend(row)
+        out.append("</tr>")
+    out.append("</tbody></table>")
+    return "".join(out)
@@ -0,0 +1,61 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Iterator, Optional
+
+import generate_html
+from app_logging import get_logger
+
+logger = get_logger(__name__)
+
+# Anteprima HTML del business plan, disponibile prima del pagamento: generata sezione per sezione
+# da generate_html (millisecondi, nessun grafico renderizzato lato server) e tenuta in memoria per
+# digest del documento. Il rendering ReportLab resta riservato al PDF a pagamento.
+
+# Limite della cache in memoria (byte HTML); oltre si eliminano le anteprime usate meno di recente
+MAX_CACHE_BYTES = int(os.getenv("HTML_PREVIEW_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+
+_lock = threading.Lock()
+# digest -> [sezioni codificate UTF-8], dal meno al più recentemente usato
+_entries = OrderedDict()
+_total_bytes = 0
+
+
+def get(digest: str) -> Optional[list]:
+    """Sezioni dell'anteprima in cache o None"""
+    with _lock:
+        sections = _entries.get(digest)
+        if sections is not None:
+            _entries.move_to_end(digest)
+        return sections
+
+
+def _remember(digest: str, sections: list):
+    global _total_bytes
+    with _lock:
+        if digest in _entries:
+            _entries.move_to_end(digest)
+            return
+        _entries[digest] = sections
+        _total_bytes += sum(len(chunk) for chunk in sections)
+        while _total_bytes > MAX_CACHE_BYTES and len(_entries) > 1:
+            _, old_sections = _entries.popitem(last=False)
+            _total_bytes -= sum(len(chunk) for chunk in old_sections)
+
+
+def stream(document: dict, digest: str) -> Iterator[bytes]:
+    """Sezioni dell'anteprima dalla cache, oppure generate, inviate man mano e poi salvate"""
+    cached = get(digest)
+    if cached is not None:
+        yield from cached
+        return
+
+    sections = []
+    for html in generate_html.iter_html_sections(document, for_pdf=False):
+        chunk = html.encode("utf-8")
+        sections.append(chunk)
+        yield chunk
+    # Si arriva qui solo se l'anteprima è stata inviata per intero (client non disconnesso)
+    _remember(digest, sections)
+    logger.debug("Anteprima HTML generata", digest=digest[:16], sezioni=len(sections),
+                 byte=sum(len(chunk) for chunk in sections))
@@ -0,0 +1,66 @@
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import markdown_flowables
+
+# Markdown analizzato una sola volta per versione del testo: i blocchi di markdown_flowables.tokenize
+# e le statistiche usate dai controlli di qualità, in cache per digest del contenuto.
+# Li consumano il PDF (flowable), l'anteprima HTML (generate_html) e la validazione (utils).
+# La cache è per processo: i worker del render pool ne hanno una propria.
+
+# Numero massimo di testi in cache; oltre si eliminano quelli usati meno di recente
+MAX_ENTRIES = int(os.getenv("MARKDOWN_CACHE_MAX_ENTRIES", "1024"))
+
+_TAG_RE = re.compile(r'<[^>]+>')
+_WORD_RE = re.compile(r'\b\w+\b')
+
+_lock = threading.Lock()
+# digest -> testo analizzato, dal meno al più recentemente usato
+_entries = OrderedDict()
+
+
+def count_words(text: str) -> int:
+    """Conta le parole in un testo (i tag HTML eventualmente presenti non contano)"""
+    if not text or not isinstance(text, str):
+        return 0
+    return len(_WORD_RE.findall(_TAG_RE.sub('', text)))
+
+
+def _analyze(text: str) -> dict:
+    tokens = markdown_flowables.tokenize(text)
+    return {
+        "tokens": tokens,
+        "words": count_words(text),
+        # Struttura come appare nel documento (anche i titoli in maiuscolo contano come sottosezioni)
+        "has_subsection": any(token[0] == 'heading' and token[1] >= 2 for token in tokens),
+        "has_list": any(token[0] == 'list_item' for token in tokens),
+    }
+
+
+def parse(text) -> dict:
+    """Testo markdown analizzato: {"tokens", "words", "has_subsection", "has_list"}.
+    I token sono condivisi tra i chiamanti e non vanno modificati"""
+    if isinstance(text, bytes):
+        text = text.decode('utf-8', errors='replace')
+    text = str(text) if text else ""
+    key = hashlib.sha256(text.encode('utf-8')).hexdigest()
+    with _lock:
+        parsed = _entries.get(key)
+        if parsed is not None:
+            _entries.move_to_end(key)
+            return parsed
+
+    parsed = _analyze(text)
+    with _lock:
+        _entries[key] = parsed
+        while len(_entries) > MAX_ENTRIES:
+            _entries.popitem(last=False)
+    return parsed
+
+
+def tokens(text) -> list:
+    """Blocchi del markdown (vedi markdown_flowables.tokenize), dalla cache"""
+    return parse(text)["tokens"]
@@ -0,0 +1,368 @@
+import html
+import re
+from typing import List, Optional
+
+from reportlab.lib.units import cm
+from reportlab.platypus import Paragraph, Spacer, Table
+
+import pdf_styles
+from app_logging import get_logger
+
+logger = get_logger(__name__)
+
+# Convertitore markdown -> flowable ReportLab in un solo passaggio sulle righe.
+# Copre il sottoinsieme prodotto dai prompt (titoli #, titoli in maiuscolo, elenchi, grassetto,
+# corsivo, codice, link, tabelle) con lo stesso risultato della vecchia pipeline
+# markdown -> HTML -> regex, senza passare dalla libreria markdown.
+
+# === NORMALIZZAZIONE (come preprocess_content_for_pdf) ===
+
+_MULTI_SPACE_RE = re.compile(r'[ \t]{2,}')
+_MULTI_NEWLINE_RE = re.compile(r'\n{3,}')
+_HEADING_INDENT_RE = re.compile(r'^[ \t]+(#+)', re.MULTILINE)
+_HEADING_SPACE_RE = re.compile(r'^(#+)[ \t]*([^#\s])', re.MULTILINE)
+_TRAILING_SPACE_RE = re.compile(r'[ \t]+\n')
+
+
+def normalize(content: str) -> str:
+    """Normalizza newline e spazi del markdown prima del parsing"""
+    if not content:
+        return ""
+    content = content.replace('\r\n', '\n').replace('\r', '\n')
+    content = _MULTI_SPACE_RE.sub(' ', content)
+    content = _MULTI_NEWLINE_RE.sub('\n\n', content)
+    content = _HEADING_INDENT_RE.sub(r'\1', content)
+    content = _HEADING_SPACE_RE.sub(r'\1 \2', content)
+    content = _TRAILING_SPACE_RE.sub('\n', content)
+    return content.strip()
+
+
+# === INLINE ===
+
+_INLINE_RE = re.compile(
+    # Il lookahead iniziale fa scartare subito le posizioni che non possono aprire un elemento inline
+    r'(?=[`\\!\[<&*_])(?:'
+    r'(?P<code>`+)(?P<code_text>.+?)(?P=code)'
+    r'|\\(?P<escaped>[\\`*_{}\[\]()>#+\-.!])'
+    # URL con al più un livello di parentesi bilanciate (es. pagine di Wikipedia)
+    r'|!?\[(?P<link_text>[^\]]*)\]\((?P<link_url>(?:[^()\s]|\([^()\s]*\))+)(?:\s+"[^"]*")?\)'
+    r'|<(?P<autolink>(?:https?|ftp)://[^>\s]+)>'
+    r'|(?P<html></?[a-zA-Z][^<>@]*?/?>)'
+    r'|(?P<entity>&(?:\#[0-9]+|\#x[0-9a-fA-F]+|[a-zA-Z0-9]+);)'
+    # Asterischi e underscore isolati (circondati da spazi) restano testo
+    r'|(?:(?<=\s)|^)(?P<not_strong>\*{1,3}|_{1,3})(?=\s|$)'
+    r'|\*\*\*(?P<strong_em>.+?)\*\*\*'
+    r'|\*\*(?P<strong>.+?)\*\*'
+    r'|\*(?P<em>[^*]+)\*'
+    r'|(?<!\w)___(?P<u_strong_em>[^_].*?)___(?!\w)'
+    r'|(?<!\w)__(?P<u_strong>[^_].*?)__(?!\w)'
+    r'|(?<!\w)_(?P<u_em>[^_].*?)_(?!\w)'
+    r')',
+    re.DOTALL
+)
+_HTML_TAG_RE = re.compile(r'<(/?)([a-zA-Z][a-zA-Z0-9]*)')
+# Tag HTML inline riportati in ReportLab; gli altri vengono scartati (come faceva ReportLab stesso)
+_HTML_TAGS = {'b': 'b', 'strong': 'b', 'i': 'i', 'em': 'i', 'u': 'u', 'sup': 'sup', 'sub': 'sub'}
+
+
+# Schemi ammessi nei link; gli altri (javascript:, data:, file:, URL relativi) restano testo
+SAFE_URL_SCHEMES = ('http', 'https', 'mailto')
+_URL_SCHEME_RE = re.compile(r'^([a-zA-Z][a-zA-Z0-9+.-]*):')
+
+
+def escape(text: str) -> str:
+    """Escape per il markup di ReportLab Paragraph"""
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def escape_attribute(text: str) -> str:
+    """Escape per i valori degli attributi (tra virgolette) nel markup di ReportLab Paragraph"""
+    return escape(text).replace('"', '&quot;').replace("'", '&#39;')
+
+
+def safe_url(url: str) -> Optional[str]:
+    """L'URL se il suo schema è tra quelli ammessi, altrimenti None"""
+    match = _URL_SCHEME_RE.match(url)
+    return url if match and match.group(1).lower() in SAFE_URL_SCHEMES else None
+
+
+def _link(url: str, label: str) -> str:
+    """Link ReportLab, o la sola etichetta se l'URL non è ammesso"""
+    if safe_url(url) is None:
+        return label
+    return f'<a href="{escape_attribute(url)}">{label}</a>'
+
+
+def _html_tag(tag: str) -> str:
+    match = _HTML_TAG_RE.match(tag)
+    name = match.group(2).lower()
+    if name == 'br':
+        return '<br/>'
+    mapped = _HTML_TAGS.get(name)
+    return f"<{match.group(1)}{mapped}>" if mapped else ''
+
+
+def inline(text: str) -> str:
+    """Markup ReportLab di un testo markdown inline (grassetto, corsivo, codice, link)"""
+    out = []
+    pos = 0
+    for match in _INLINE_RE.finditer(text):
+        out.append(escape(text[pos:match.start()]))
+        pos = match.end()
+        kind = match.lastgroup
+        if kind == 'code_text':
+            out.append(f'<font name="Courier">{escape(match.group("code_text").strip())}</font>')
+        elif kind == 'escaped':
+            out.append(escape(match.group('escaped')))
+        elif kind in ('link_url', 'link_text'):
+            out.append(_link(match.group('link_url'), inline(match.group('link_text'))))
+        elif kind == 'autolink':
+            out.append(_link(match.group('autolink'), escape(match.group('autolink'))))
+        elif kind == 'html':
+            out.append(_html_tag(match.group('html')))
+        elif kind == 'entity':
+            out.append(match.group('entity'))
+        elif kind == 'not_strong':
+            out.append(match.group('not_strong'))
+        elif kind in ('strong_em', 'u_strong_em'):
+            out.append(f'<b><i>{inline(match.group(kind))}</i></b>')
+        elif kind in ('strong', 'u_strong'):
+            out.append(f'<b>{inline(match.group(kind))}</b>')
+        else:
+            out.append(f'<i>{inline(match.group(kind))}</i>')
+    out.append(escape(text[pos:]))
+    return ''.join(out)
+
+
+def _inline_lines(lines: List[str]) -> str:
+    """Righe di un blocco: l'inline attraversa le righe, gli a capo diventano <br/> (nl2br)"""
+    return inline('\n'.join(lines)).strip().replace('\n', '<br/>')
+
+
+# === BLOCCHI ===
+
+_HEADING_RE = re.compile(r'^(#{1,6})(.*?)#*$')
+_LIST_ITEM_RE = re.compile(r'^[ ]{0,3}(?:[*+-]|\d+\.)[ ]+(.*)$')
+_FENCE_RE = re.compile(r'^(`{3,}|~{3,})')
+_SETEXT_RE = re.compile(r'^(=+|-+)[ ]*$')
+_HR_RE = re.compile(r'^[ ]{0,3}(?:(?:-[ ]{0,2}){3,}|(?:_[ ]{0,2}){3,}|(?:\*[ ]{0,2}){3,})$')
+_QUOTE_RE = re.compile(r'^[ ]{0,3}>[ ]?(.*)$')
+_TABLE_SEPARATOR_RE = re.compile(r'^\|?\s*:?-+:?\s*(?:\|\s*:?-+:?\s*)*\|?$')
+
+# Righe in maiuscolo trattate come sottoparagrafi (H3) invece che come titoli (H2)
+SUBSECTION_KEYWORDS = (
+    'PUNTI CHIAVE',
+    'PUNTO CHIAVE',
+    'PIANO OPERATIVO',
+    'ROADMAP',
+    'PIANO OPERATIVO E ROADMAP',
+    'ANALISI DEI RISCHI',
+    'ANALISI RISCHI',
+)
+
+
+def uppercase_heading_level(line: str) -> int:
+    """Livello (2 o 3) di una riga in maiuscolo da trattare come titolo, 0 se è testo normale"""
+    if len(line) < 3 or line.startswith('#'):
+        return 0
+    # Scarto rapido delle righe di testo normale: oltre il 20% di minuscole non può essere un titolo
+    if sum(map(str.islower, line)) * 5 > len(line):
+        return 0
+    alpha = upper = alnum = 0
+    for c in line:
+        if c.isalpha():
+            alpha += 1
+            if c.isupper():
+                upper += 1
+        if c.isalnum() or c.isspace():
+            alnum += 1
+    # Almeno 3 lettere e almeno l'80% in maiuscolo
+    if alnum < 3 or alpha < 3 or upper / alpha < 0.8:
+        return 0
+    normalized = ' '.join(line.split()).upper()
+    return 3 if any(keyword in normalized for keyword in SUBSECTION_KEYWORDS) else 2
+
+
+def _split_row(line: str) -> List[str]:
+    line = line.strip()
+    if line.startswith('|'):
+        line = line[1:]
+    if line.endswith('|'):
+        line = line[:-1]
+    return [cell.strip() for cell in line.split('|')]
+
+
+def _code_markup(lines: List[str]) -> str:
+    """Righe di codice letterali, con l'indentazione preservata"""
+    return '<br/>'.join('&nbsp;' * (len(line) - len(line.lstrip(' '))) + escape(line.lstrip(' ')) for line in lines)
+
+
+def tokenize(text: str) -> List[tuple]:
+    """Blocchi del markdown in un solo passaggio:
+    ('heading', livello, markup), ('paragraph', markup), ('list_item', ordinato, markup),
+    ('code', markup), ('table', [[markup]]), ('rule',)"""
+    tokens = []
+    lines = normalize(text).split('\n')
+    paragraph = []
+    item = None
+    quote = False
+    fence = None
+    code = []
+    i = 0
+
+    def flush():
+        nonlocal paragraph, item, quote
+        if paragraph:
+            tokens.append(('paragraph', _inline_lines(paragraph)))
+            paragraph = []
+        if item is not None:
+            tokens.append(('list_item', item[0], _inline_lines(item[1])))
+            item = None
+        quote = False
+
+    while i < len(lines):
+        raw = lines[i]
+        i += 1
+
+        # Blocchi di codice recintati: contenuto letterale
+        if fence is not None:
+            if raw.strip().startswith(fence):
+                tokens.append(('code', _code_markup(code)))
+                fence, code = None, []
+            else:
+                code.append(raw)
+            continue
+        fence_match = _FENCE_RE.match(raw.strip())
+        if fence_match:
+            flush()
+            fence = fence_match.group(1)
+            continue
+
+        line = raw.strip()
+        if not line:
+            flush()
+            continue
+
+        level = uppercase_heading_level(line)
+        if level:
+            logger.debug("✅ Riconosciuto %s in maiuscolo: '%s'", 'sottoparagrafo' if level == 3 else 'titolo', line)
+            line = f"{'#' * level} {line}"
+
+        heading = _HEADING_RE.match(line)
+        if heading:
+            flush()
+            tokens.append(('heading', len(heading.group(1)), inline(heading.group(2).strip())))
+            continue
+
+        # Titolo setext: riga singola seguita da === o ---
+        if _SETEXT_RE.match(line) and len(paragraph) == 1 and not quote:
+            tokens.append(('heading', 1 if line[0] == '=' else 2, inline(paragraph[0])))
+            paragraph = []
+            continue
+
+        if _HR_RE.match(line):
+            flush()
+            tokens.append(('rule',))
+            continue
+
+        # Tabella: riga di intestazione seguita dal separatore |---|---|
+        if ('|' in line and not paragraph and item is None
+                and i < len(lines) and _TABLE_SEPARATOR_RE.match(lines[i].strip())):
+            flush()
+            rows = [[inline(cell) for cell in _split_row(line)]]
+            i += 1
+            while i < len(lines) and lines[i].strip():
+                rows.append([inline(cell) for cell in _split_row(lines[i])])
+                i += 1
+            tokens.append(('table', rows))
+            continue
+
+        quote_match = _QUOTE_RE.match(line)
+        if quote_match:
+            if not quote:
+                flush()
+                quote = True
+            paragraph.append(quote_match.group(1))
+            continue
+
+        list_match = _LIST_ITEM_RE.match(line)
+        # Un elenco non interrompe un paragrafo senza riga vuota (come Python-Markdown)
+        if list_match and not paragraph:
+            if item is not None:
+                tokens.append(('list_item', item[0], _inline_lines(item[1])))
+            item = (line[0].isdigit(), [list_match.group(1)])
+            continue
+
+        if item is not None:
+            # Continuazione dell'elemento di elenco
+            item[1].append(line)
+        else:
+            paragraph.append(line)
+
+    if fence is not None and code:
+        tokens.append(('code', _code_markup(code)))
+    flush()
+    return tokens
+
+
+# === FLOWABLE ===
+
+_HEADING_STYLES = {1: ('CustomHeading1', 0.4*cm), 2: ('CustomHeading2', 0.3*cm)}
+_DEFAULT_HEADING = ('Heading3', 0.2*cm)
+_MARKUP_TAG_RE = re.compile(r'<[^>]*>')
+
+
+def _paragraph(markup: str, style) -> Paragraph:
+    """Paragraph dal markup; se ReportLab non lo interpreta si ripiega sul testo semplice,
+    così un blocco malformato non fa fallire l'intero documento"""
+    try:
+        return Paragraph(markup, style)
+    except ValueError as e:
+        logger.warning("⚠️ Markup non interpretabile, blocco reso come testo semplice: %s", e)
+        return Paragraph(escape(html.unescape(_MARKUP_TAG_RE.sub('', markup))), style)
+
+
+def to_flowables(tokens: List[tuple], styles) -> list:
+    """Flowable ReportLab dei blocchi prodotti da tokenize"""
+    elements = []
+    normal = styles['Normal']
+    for token in tokens:
+        kind = token[0]
+        if kind == 'heading':
+            style_name, space = _HEADING_STYLES.get(token[1], _DEFAULT_HEADING)
+            elements.append(_paragraph(token[2], styles[style_name]))
+            elements.append(Spacer(1, space))
+        elif kind == 'list_item':
+            # Elenchi puntati e numerati usano lo stesso bullet
+            elements.append(_paragraph(f"• {token[2]}", normal))
+            elements.append(Spacer(1, 0.15*cm))
+        elif kind == 'paragraph':
+            if token[1]:
+                elements.append(_paragraph(token[1], normal))
+                elements.append(Spacer(1, 0.3*cm))
+        elif kind == 'code':
+            elements.append(_paragraph(f'<font name="Courier">{token[1]}</font>', normal))
+            elements.append(Spacer(1, 0.3*cm))
+        elif kind == 'table':
+            header, *body = token[1]
+            width = max(len(row) for row in token[1])
+            data = [[_paragraph(f'<font color="white"><b>{cell}</b></font>', normal) for cell in header]]
+            data += [[_paragraph(cell, normal) for cell in row] for row in body]
+            for row in data:
+                row.extend([''] * (width - len(row)))
+            table = Table(data, repeatRows=1)
+            table.setStyle(pdf_styles.MARKDOWN_TABLE)
+            elements.append(table)
+            elements.append(Spacer(1, 0.3*cm))
+        elif kind == 'rule':
+            elements.append(Spacer(1, 0.3*cm))
+    return elements
+
+
+def markdown_to_flowables(text, styles) -> list:
+    """Converte il markdown in flowable ReportLab"""
+    if not text:
+        return []
+    if isinstance(text, bytes):
+        text = text.decode('utf-8', errors='replace')
+    return to_flowables(tokenize(str(text)), styles)
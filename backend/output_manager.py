@@ -0,0 +1,23 @@
+import os
+import threading
+import uuid
+from pathlib import Path
+
+# Directory dei PDF renderizzati, condivisa dai tre generatori
+OUTPUT_DIR = Path(__file__).parent / "output"
+
+
+def _tmp_path_for(path: Path) -> Path:
+    return path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.{uuid.uuid4().hex[:8]}.tmp")
+
+
+def write_atomic(path: Path, data: bytes):
+    """Scrive data su un file temporaneo e lo rinomina atomicamente su path"""
+    tmp_path = _tmp_path_for(path)
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
@@ -0,0 +1,121 @@
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+# Directory dati persistenti del backend (configurabile su Render con un disco montato)
+DATA_DIR = Path(os.getenv("DATA_DIR", str(Path(__file__).parent / "data")))
+DB_PATH = DATA_DIR / "payments.sqlite3"
+
+# Mappa in-process: session_id -> info sessione pagata.
+# payment_status == 'paid' è uno stato terminale, quindi le voci non scadono mai.
+_paid_sessions = {}
+_lock = threading.Lock()
+_conn = None
+
+
+def _get_conn() -> sqlite3.Connection:
+    """Apre (una sola volta) la connessione SQLite e crea la tabella se manca"""
+    global _conn
+    if _conn is None:
+        DATA_DIR.mkdir(parents=True, exist_ok=True)
+        _conn = sqlite3.connect(str(DB_PATH), check_same_thread=False, isolation_level=None)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute(
+            """CREATE TABLE IF NOT EXISTS paid_sessions (
+                session_id TEXT PRIMARY KEY,
+                document_type TEXT,
+                include_upsell INTEGER NOT NULL DEFAULT 0,
+                upsell_type TEXT,
+                verified_at REAL NOT NULL
+            )"""
+        )
+        _conn.execute(
+            """CREATE TABLE IF NOT EXISTS stripe_events (
+                event_id TEXT PRIMARY KEY,
+                event_type TEXT NOT NULL,
+                received_at REAL NOT NULL
+            )"""
+        )
+    return _conn
+
+
+def _row_to_info(row) -> dict:
+    return {
+        "session_id": row[0],
+        "document_type": row[1],
+        "include_upsell": bool(row[2]),
+        "upsell_type": row[3],
+    }
+
+
+def get_paid_session(session_id: str) -> Optional[dict]:
+    """Restituisce le info della sessione se già verificata come pagata, altrimenti None"""
+    if not session_id:
+        return None
+    info = _paid_sessions.get(session_id)
+    if info is not None:
+        return info
+    with _lock:
+        row = _get_conn().execute(
+            "SELECT session_id, document_type, include_upsell, upsell_type FROM paid_sessions WHERE session_id = ?",
+            (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        info = _row_to_info(row)
+        _paid_sessions[session_id] = info
+        return info
+
+
+def record_paid_session(session_id: str, document_type: Optional[str], include_upsell: bool = False,
+                        upsell_type: Optional[str] = None) -> dict:
+    """Registra una sessione pagata nella mappa in memoria e nello store persistente"""
+    info = {
+        "session_id": session_id,
+        "document_type": document_type,
+        "include_upsell": bool(include_upsell),
+        "upsell_type": upsell_type if include_upsell else None,
+    }
+    with _lock:
+        _get_conn().execute(
+            "INSERT OR REPLACE INTO paid_sessions (session_id, document_type, include_upsell, upsell_type, verified_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (session_id, document_type, int(info["include_upsell"]), info["upsell_type"], time.time())
+        )
+        _paid_sessions[session_id] = info
+    return info
+
+
+def record_stripe_session(session) -> Optional[dict]:
+    """Registra una checkout session Stripe se risulta pagata; restituisce None altrimenti"""
+    if session.get("payment_status") != "paid":
+        return None
+    metadata = session.get("metadata") or {}
+    include_upsell = metadata.get("include_upsell") == "true"
+    return record_paid_session(
+        session["id"],
+        metadata.get("document_type"),
+        include_upsell,
+        metadata.get("upsell_type")
+    )
+
+
+def has_event(event_id: str) -> bool:
+    """True se l'evento webhook è già stato elaborato (idempotenza sugli id evento Stripe)"""
+    with _lock:
+        row = _get_conn().execute(
+            "SELECT 1 FROM stripe_events WHERE event_id = ?", (event_id,)
+        ).fetchone()
+    return row is not None
+
+
+def record_event(event_id: str, event_type: str):
+    """Segna un evento webhook come elaborato"""
+    with _lock:
+        _get_conn().execute(
+            "INSERT OR IGNORE INTO stripe_events (event_id, event_type, received_at) VALUES (?, ?, ?)",
+            (event_id, event_type, time.time())
+        )
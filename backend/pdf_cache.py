@@ -0,0 +1,154 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+import output_manager
+import pdf_profiles
+from chart_series import CHART_BACKEND
+from app_logging import get_logger
+from entitlements import json_digest
+
+logger = get_logger(__name__)
+
+# Versione del renderer: incrementarla quando cambia il layout dei PDF invalida tutta la cache
+RENDERER_VERSION = "4"
+# Dimensione massima della cache su disco; oltre si eliminano i PDF usati meno di recente
+MAX_CACHE_BYTES = int(os.getenv("PDF_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+CACHE_DIR = output_manager.OUTPUT_DIR / "cache"
+
+_lock = threading.Lock()
+# key -> dimensione in byte, dal meno al più recentemente usato
+_entries = None
+_total_bytes = 0
+# key -> numero di risposte in corso che stanno servendo il file (mai rimossi)
+_pins = {}
+
+
+def cache_key(document_type: str, json_digest: str, *variant: str) -> str:
+    """Chiave di cache: tipo documento, digest del JSON, versione renderer, backend dei grafici ed eventuali varianti"""
+    raw = ":".join((RENDERER_VERSION, CHART_BACKEND, document_type, json_digest) + variant)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _path_for(key: str) -> Path:
+    return CACHE_DIR / f"{key}.pdf"
+
+
+def _load_index():
+    """Ricostruisce l'indice LRU dai file presenti (ordinati per ultimo accesso)"""
+    global _entries, _total_bytes
+    _entries = OrderedDict()
+    _total_bytes = 0
+    if not CACHE_DIR.exists():
+        return
+    files = []
+    for path in CACHE_DIR.glob("*.pdf"):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        files.append((stat.st_mtime, path.stem, stat.st_size))
+    for _, key, size in sorted(files):
+        _entries[key] = size
+        _total_bytes += size
+
+
+def _ensure_index():
+    if _entries is None:
+        _load_index()
+
+
+def acquire(key: str) -> Optional[Path]:
+    """Path del PDF in cache (pinnato finché non si chiama release) o None se assente"""
+    with _lock:
+        _ensure_index()
+        if key not in _entries:
+            return None
+        path = _path_for(key)
+        if not path.exists():
+            _forget(key)
+            return None
+        _entries.move_to_end(key)
+        _pins[key] = _pins.get(key, 0) + 1
+    try:
+        # mtime come "ultimo accesso": l'ordine LRU sopravvive ai riavvii
+        os.utime(path)
+    except OSError:
+        pass
+    return path
+
+
+def release(key: str):
+    """Rilascia un PDF pinnato da acquire, una volta inviata la risposta"""
+    with _lock:
+        count = _pins.get(key, 0) - 1
+        if count > 0:
+            _pins[key] = count
+        else:
+            _pins.pop(key, None)
+        _evict()
+
+
+def put(key: str, pdf_bytes: bytes) -> Path:
+    """Salva un PDF renderizzato nella cache ed evita i meno recenti oltre il limite di dimensione"""
+    path = _path_for(key)
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    output_manager.write_atomic(path, pdf_bytes)
+    global _total_bytes
+    with _lock:
+        _ensure_index()
+        _total_bytes -= _entries.pop(key, 0)
+        _entries[key] = len(pdf_bytes)
+        _total_bytes += len(pdf_bytes)
+        # Il PDF appena scritto resta: il path restituito deve esistere
+        _evict(keep=key)
+    return path
+
+
+def read(key: str) -> Optional[bytes]:
+    """Byte di un PDF in cache (frammenti del rendering incrementale) o None se assente"""
+    path = acquire(key)
+    if path is None:
+        return None
+    try:
+        return path.read_bytes()
+    except FileNotFoundError:
+        return None
+    finally:
+        release(key)
+
+
+def save_document(document_type: str, document_json: dict, pdf_bytes: bytes, content_hash: str = None,
+                  profile: str = None) -> str:
+    """Salva in cache il PDF di un documento e ne restituisce il path (content_hash: digest già noto;
+    profile: profilo di output, parte della chiave)"""
+    key = cache_key(document_type, content_hash or json_digest(document_json), pdf_profiles.resolve(profile))
+    return str(put(key, pdf_bytes))
+
+
+def _forget(key: str):
+    global _total_bytes
+    _total_bytes -= _entries.pop(key, 0)
+
+
+def _evict(keep: Optional[str] = None):
+    """Elimina i PDF meno usati finché la cache non rientra nel limite (chiamare con _lock);
+    i PDF pinnati e keep restano e verranno valutati alle prossime chiamate"""
+    if _total_bytes <= MAX_CACHE_BYTES:
+        return
+    for key in list(_entries):
+        if _total_bytes <= MAX_CACHE_BYTES:
+            break
+        if _pins.get(key) or key == keep:
+            continue
+        try:
+            _path_for(key).unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning("⚠️  Errore rimozione PDF dalla cache %s: %s", key[:16], e)
+            continue
+        _forget(key)
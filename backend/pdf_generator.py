@@ -1,29 +1,38 @@
+import asyncio
+import hashlib
 import json
-import re
 import io
+import logging
 import os
 import sys
 from datetime import datetime
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import cm
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak, Table, TableStyle, Image, KeepTogether
-from reportlab.lib.enums import TA_JUSTIFY, TA_CENTER, TA_LEFT
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from pathlib import Path
-import matplotlib
-matplotlib.use('Agg')  # Backend non interattivo per server
-import matplotlib.pyplot as plt
-import matplotlib.font_manager as fm
-import markdown
-from markdown.extensions import fenced_code, tables, nl2br
+from reportlab.lib.utils import ImageReader
+from reportlab.graphics.shapes import Drawing
+from reportlab.platypus import Paragraph, Spacer, PageBreak, Table, Image
+from typing import Optional
+from app_logging import get_logger
+import render_pool
+import chart_cache
+import chart_vector
+import markdown_cache
+import markdown_flowables
+from chart_series import CHART_BACKEND, VECTOR_BACKEND
+from entitlements import json_digest
+import pdf_cache
+import pdf_merge
+import pdf_profiles
+import pdf_styles
+import document_builder
+# Re-export: usato anche dai generatori di analisi di mercato e validazione
+from document_builder import create_numbered_canvas  # noqa: F401
 
 # Configura encoding UTF-8
 if sys.stdout.encoding != 'utf-8':
     sys.stdout.reconfigure(encoding='utf-8')
 
+logger = get_logger(__name__)
+
 
 def escape_for_pdf(s):
     """Escape caratteri speciali per uso in Paragraph/HTML di ReportLab, preservando UTF-8."""
@@ -37,1072 +46,285 @@ def escape_for_pdf(s):
     return s.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
 
 
-def preprocess_content_for_pdf(content):
-    """Preprocessa e normalizza il contenuto markdown prima della generazione PDF"""
-    if not content:
-        return ""
-    
-    # Normalizza newline (gestisce Windows, Unix, Mac)
-    content = content.replace('\r\n', '\n').replace('\r', '\n')
-    
-    # Rimuovi spazi eccessivi ma mantieni struttura markdown
-    # NON sostituire spazi multipli in una riga, solo normalizza
-    content = re.sub(r'[ \t]{2,}', ' ', content)  # Spazi multipli -> singolo spazio
-    
-    # Normalizza newline multiple (mantieni max 2 consecutive)
-    content = re.sub(r'\n{3,}', '\n\n', content)
-    
-    # Assicurati che i titoli inizino con # (rimuovi spazi prima)
-    content = re.sub(r'^[ \t]+(#+)', r'\1', content, flags=re.MULTILINE)
-    
-    # Normalizza spazi dopo # - gestisce vari casi:
-    # ##Titolo -> ## Titolo
-    # ## Titolo -> ## Titolo (già corretto)
-    # ##  Titolo -> ## Titolo (rimuovi spazi multipli)
-    content = re.sub(r'^(#+)[ \t]+([^#\s])', r'\1 \2', content, flags=re.MULTILINE)
-    content = re.sub(r'^(#+)([^#\s])', r'\1 \2', content, flags=re.MULTILINE)
-    
-    # Rimuovi spazi alla fine delle righe
-    content = re.sub(r'[ \t]+\n', '\n', content)
-    
-    return content.strip()
-
-
 def markdown_to_paragraphs(text, styles):
-    """Converte markdown in paragrafi ReportLab usando libreria markdown standard"""
-    elements = []
-    
+    """Converte markdown in paragrafi ReportLab (blocchi analizzati una volta, da markdown_cache)"""
     if not text:
-        return elements
-    
-    # Normalizza il testo prima del parsing
-    text = preprocess_content_for_pdf(text)
-    
-    # PRIMA: Identifica righe completamente in maiuscolo come titoli
-    # Processa riga per riga per identificare titoli in maiuscolo
-    lines = text.split('\n')
-    processed_lines = []
-    i = 0
-    
-    while i < len(lines):
-        line = lines[i].strip()
-        
-        if not line:
-            processed_lines.append('')
-            i += 1
-            continue
-        
-        # Controlla se la riga è completamente in maiuscolo (titolo)
-        # Pattern: righe come "PUNTO CHIAVE 1", "ANALISI DEL MERCATO", "SEZIONE 2", etc.
-        # Deve avere almeno 3 caratteri e essere principalmente maiuscolo
-        # Esclude righe che iniziano con # (già markdown), sono troppo corte, o sono solo numeri/punteggiatura
-        if len(line) >= 3 and not line.startswith('#'):
-            # Rimuovi spazi e punteggiatura per analisi
-            text_only = ''.join([c for c in line if c.isalnum() or c.isspace()])
-            
-            if len(text_only) >= 3:
-                # Conta caratteri alfabetici maiuscoli vs totali alfabetici
-                alpha_chars = [c for c in line if c.isalpha()]
-                upper_chars = [c for c in line if c.isupper() and c.isalpha()]
-                
-                # Se ci sono caratteri alfabetici
-                if len(alpha_chars) >= 3:
-                    upper_ratio = len(upper_chars) / len(alpha_chars) if alpha_chars else 0
-                    
-                    # Se almeno l'80% dei caratteri alfabetici è maiuscolo
-                    # E la riga non è solo numeri/punteggiatura
-                    if upper_ratio >= 0.8:
-                        # Sezioni che devono essere trattate come sottoparagrafi (H3)
-                        # invece di titoli principali (H2)
-                        sottoparagrafi_keywords = [
-                            'PUNTI CHIAVE',
-                            'PUNTO CHIAVE',
-                            'PIANO OPERATIVO',
-                            'ROADMAP',
-                            'PIANO OPERATIVO E ROADMAP',
-                            'ANALISI DEI RISCHI',
-                            'ANALISI RISCHI'
-                        ]
-                        
-                        # Normalizza la riga per il confronto (rimuovi spazi extra, punteggiatura)
-                        line_normalized = ' '.join(line.split()).upper()
-                        
-                        # Controlla se contiene una delle keyword dei sottoparagrafi
-                        is_sottoparagrafo = any(keyword in line_normalized for keyword in sottoparagrafi_keywords)
-                        
-                        if is_sottoparagrafo:
-                            # Tratta come sottoparagrafo: aggiungi markdown H3
-                            print(f"✅ Riconosciuto sottoparagrafo in maiuscolo: '{line}'")
-                            processed_lines.append(f'### {line}')
-                        else:
-                            # Pattern comuni per titoli in maiuscolo:
-                            # - "ANALISI DEL MERCATO"
-                            # - "SEZIONE 1", "SEZIONE 2"
-                            # - "CONCLUSIONI"
-                            # Tratta come titolo: aggiungi markdown H2
-                            print(f"✅ Riconosciuto titolo in maiuscolo: '{line}'")
-                            processed_lines.append(f'## {line}')
-                        i += 1
-                        continue
-        
-        # Altrimenti mantieni la riga originale
-        processed_lines.append(lines[i])
-        i += 1
-    
-    # Ricostruisci il testo con i titoli in maiuscolo convertiti
-    text = '\n'.join(processed_lines)
-    
-    # Configura markdown con estensioni utili
-    md = markdown.Markdown(extensions=['fenced_code', 'tables', 'nl2br'])
-    
-    # Converti markdown in HTML
-    html = md.convert(text)
-    
-    # Funzione per convertire tag HTML in formato ReportLab con supporto UTF-8
-    def clean_html_for_reportlab(html_text):
-        """Converte HTML in formato compatibile con ReportLab Paragraph, preservando UTF-8"""
-        if not html_text:
-            return ""
-        # Assicura encoding UTF-8
-        if isinstance(html_text, bytes):
-            html_text = html_text.decode('utf-8', errors='replace')
-        html_text = str(html_text)
-        # ReportLab supporta: <b>, <i>, <u>, <font>, <br/>, <a>, <sup>, <sub>
-        html_text = re.sub(r'<strong>(.+?)</strong>', r'<b>\1</b>', html_text, flags=re.DOTALL)
-        html_text = re.sub(r'<em>(.+?)</em>', r'<i>\1</i>', html_text, flags=re.DOTALL)
-        html_text = re.sub(r'<code>(.+?)</code>', r'<font name="Courier">\1</font>', html_text, flags=re.DOTALL)
-        html_text = re.sub(r'<pre>(.+?)</pre>', r'<font name="Courier">\1</font>', html_text, flags=re.DOTALL)
-        # Rimuovi tag non supportati
-        html_text = re.sub(r'</?div[^>]*>', '', html_text)
-        html_text = re.sub(r'</?span[^>]*>', '', html_text)
-        return html_text.strip()
-    
-    # Processa l'HTML sequenzialmente mantenendo l'ordine
-    # Dividi per blocchi HTML principali
-    parts = []
-    current_pos = 0
-    
-    # Trova tutti i tag principali nell'ordine
-    for match in re.finditer(r'<(h[1-6]|p|ul|ol|li)>(.+?)</\1>', html, re.DOTALL):
-        # Aggiungi testo prima del match come paragrafo se presente
-        before = html[current_pos:match.start()].strip()
-        if before:
-            parts.append(('text', before))
-        
-        tag_type = match.group(1)
-        content = match.group(2)
-        
-        if tag_type.startswith('h'):
-            level = int(tag_type[1])
-            parts.append(('heading', level, content))
-        elif tag_type in ('ul', 'ol'):
-            # Processa lista
-            items = re.findall(r'<li>(.+?)</li>', content, re.DOTALL)
-            for idx, item in enumerate(items, 1):
-                parts.append(('list_item', tag_type == 'ol', item))
-        elif tag_type == 'li':
-            parts.append(('list_item', False, content))
-        elif tag_type == 'p':
-            parts.append(('paragraph', content))
-        
-        current_pos = match.end()
-    
-    # Aggiungi testo rimanente
-    remaining = html[current_pos:].strip()
-    if remaining:
-        parts.append(('text', remaining))
-    
-    # Se non abbiamo trovato tag, processa tutto come testo
-    if not parts:
-        parts = [('text', html)]
-    
-    # Converti in elementi ReportLab
-    for part in parts:
-        part_type = part[0]
-        
-        if part_type == 'heading':
-            level, content = part[1], part[2]
-            content_html = clean_html_for_reportlab(content)
-            if level == 1:
-                elements.append(Paragraph(content_html, styles['CustomHeading1']))
-                elements.append(Spacer(1, 0.4*cm))
-            elif level == 2:
-                elements.append(Paragraph(content_html, styles['CustomHeading2']))
-                elements.append(Spacer(1, 0.3*cm))
-            else:
-                elements.append(Paragraph(content_html, styles['Heading3']))
-                elements.append(Spacer(1, 0.2*cm))
-        
-        elif part_type == 'list_item':
-            is_ordered, content = part[1], part[2]
-            content_html = clean_html_for_reportlab(content)
-            # Per liste ordinate, usa un contatore (semplificato)
-            if is_ordered:
-                # Non possiamo sapere il numero esatto senza contesto, usiamo bullet
-                elements.append(Paragraph(f"• {content_html}", styles['Normal']))
-            else:
-                elements.append(Paragraph(f"• {content_html}", styles['Normal']))
-            elements.append(Spacer(1, 0.15*cm))
-        
-        elif part_type == 'paragraph':
-            content = part[1]
-            content_html = clean_html_for_reportlab(content)
-            if content_html:
-                elements.append(Paragraph(content_html, styles['Normal']))
-                elements.append(Spacer(1, 0.3*cm))
-        
-        elif part_type == 'text':
-            content = part[1]
-            # Rimuovi tag <p> se presenti
-            content = re.sub(r'</?p[^>]*>', '', content)
-            content_html = clean_html_for_reportlab(content)
-            if content_html:
-                elements.append(Paragraph(content_html, styles['Normal']))
-                elements.append(Spacer(1, 0.3*cm))
-    
-    return elements
-
-def create_chart_image(chart_data, width=15*cm, height=10*cm):
-    """Crea un grafico professionale con stile aziendale e alta qualità"""
-    try:
-        chart_id = chart_data.get('id', 'N/A')
-        tipo = chart_data.get('tipo', 'line')
-        titolo = chart_data.get('titolo', '')
-        x_label = chart_data.get('x_label', '')
-        y_label = chart_data.get('y_label', '')
-        series = chart_data.get('series', [])
-        
-        
-        # Validazione dati in ingresso
-        if not series:
-            print(f"⚠️  Grafico '{titolo}' (ID: {chart_id}) non ha serie di dati")
-            return None
-        
-        if tipo not in ['line', 'bar', 'pie']:
-            print(f"⚠️  Tipo grafico non valido: {tipo} per grafico {chart_id}")
-            return None
-        
-        print(f"   📊 Creando grafico {chart_id}: tipo={tipo}, serie={len(series)}")
-        
-        # Configurazione stile professionale con supporto UTF-8
-        # Trova un font che supporta caratteri italiani
-        available_fonts = [f.name for f in fm.fontManager.ttflist]
-        italian_font = None
-        for font_name in ['DejaVu Sans', 'Liberation Sans', 'Arial', 'Helvetica', 'Verdana']:
-            if font_name in available_fonts:
-                italian_font = font_name
-                break
-        
-        if not italian_font:
-            italian_font = 'sans-serif'
-        
-        plt.rcParams.update({
-            'figure.facecolor': 'white',
-            'axes.facecolor': 'white',
-            'axes.edgecolor': '#333333',
-            'axes.linewidth': 1.2,
-            'axes.grid': True,
-            'axes.grid.alpha': 0.3,
-            'axes.grid.color': '#E0E0E0',
-            'axes.labelcolor': '#333333',
-            'axes.labelsize': 11,
-            'axes.titlesize': 13,
-            'axes.titleweight': 'bold',
-            'xtick.color': '#333333',
-            'ytick.color': '#333333',
-            'text.color': '#333333',
-            'font.family': 'sans-serif',
-            'font.sans-serif': [italian_font, 'DejaVu Sans', 'Liberation Sans', 'Arial', 'Helvetica'],
-            'font.size': 10,
-            'legend.frameon': True,
-            'legend.framealpha': 0.9,
-            'legend.facecolor': 'white',
-            'legend.edgecolor': '#CCCCCC',
-            'legend.fontsize': 9,
-            'figure.dpi': 300,
-            'savefig.dpi': 300,
-            'savefig.bbox': 'tight',
-            'savefig.pad_inches': 0.1
-        })
-        
-        # Imposta encoding UTF-8 per matplotlib
-        plt.rcParams['axes.unicode_minus'] = False
-        
-        # Palette colori professionale (blu/grigio aziendale)
-        professional_colors = [
-        '#1e3a8a',  # Blu scuro
-        '#3b82f6',  # Blu medio
-        '#10b981',  # Verde
-        '#f59e0b',  # Arancione
-        '#8b5cf6',  # Viola
-        '#ef4444',  # Rosso
-        '#64748b',  # Grigio
-            '#06b6d4',  # Ciano
-        ]
-        
-        # Crea figura con dimensioni precise
-        fig, ax = plt.subplots(figsize=(width/cm, height/cm), 
-                              facecolor='white',
-                              edgecolor='none')
-        
-        # Rimuovi bordi superflui per aspetto più pulito
-        ax.spines['top'].set_visible(False)
-        ax.spines['right'].set_visible(False)
-        ax.spines['left'].set_color('#CCCCCC')
-        ax.spines['bottom'].set_color('#CCCCCC')
-        
-        if tipo == 'line':
-            for idx, serie in enumerate(series):
-                name = serie.get('name', f'Serie {idx+1}')
-                points = serie.get('points', [])
-                # Filtra punti validi (con x non vuoto e y valido)
-                valid_points = [(p.get('x', ''), p.get('y')) for p in points 
-                               if p.get('x') and str(p.get('x', '')).strip() != '' 
-                               and p.get('y') is not None]
-                x_values = [str(x) for x, y in valid_points]
-                y_values = [float(y) for x, y in valid_points]
-                
-                if x_values and y_values and len(x_values) == len(y_values):
-                    color = professional_colors[idx % len(professional_colors)]
-                    # Assicura che il nome della serie sia UTF-8
-                    label_name = str(name)
-                    if isinstance(name, bytes):
-                        label_name = name.decode('utf-8', errors='replace')
-                    ax.plot(x_values, y_values, 
-                           marker='o', 
-                           label=label_name,
-                           color=color,
-                           linewidth=2.5,
-                           markersize=7,
-                           markerfacecolor=color,
-                           markeredgecolor='white',
-                           markeredgewidth=1.5,
-                           alpha=0.9)
-            
-            ax.legend(loc='best', frameon=True, fancybox=True, shadow=False)
-            ax.grid(True, alpha=0.3, linestyle='--', linewidth=0.8)
-            ax.set_axisbelow(True)
-            
-        elif tipo == 'bar':
-            # Raccogli dati da tutte le serie per grafico a barre raggruppate
-            # Gestisce anche il caso in cui ogni serie ha lo stesso valore x (come scenari)
-            x_values = []
-            y_data = {}
-            
-            for idx, serie in enumerate(series):
-                name = serie.get('name', f'Serie {idx+1}')
-                points = serie.get('points', [])
-                
-                # Se tutti i punti hanno lo stesso x, usa il primo valore y (caso scenari)
-                unique_x_values = set()
-                for p in points:
-                    x_val = str(p.get('x', '')).strip()
-                    if x_val and x_val != '':
-                        unique_x_values.add(x_val)
-                
-                # Se c'è un solo valore x unico per questa serie, prendi il primo y
-                if len(unique_x_values) == 1:
-                    x_val = list(unique_x_values)[0]
-                    # Prendi il primo valore y valido
-                    for p in points:
-                        y_val = p.get('y')
-                        if y_val is not None:
-                            try:
-                                y_val = float(y_val)
-                                if x_val not in x_values:
-                                    x_values.append(x_val)
-                                if name not in y_data:
-                                    y_data[name] = {}
-                                y_data[name][x_val] = y_val
-                                break  # Prendi solo il primo valore
-                            except (ValueError, TypeError):
-                                continue
-                else:
-                    # Caso normale: più valori x diversi
-                    for p in points:
-                        x_val = str(p.get('x', '')).strip()
-                        y_val = p.get('y')
-                        if y_val is not None:
-                            try:
-                                y_val = float(y_val)
-                                # Ignora punti con x vuoto o solo spazi
-                                if x_val and x_val != '':
-                                    if x_val not in x_values:
-                                        x_values.append(x_val)
-                                    if name not in y_data:
-                                        y_data[name] = {}
-                                    # Se ci sono più valori per lo stesso x, prendi l'ultimo (o potresti fare la media)
-                                    y_data[name][x_val] = y_val
-                            except (ValueError, TypeError):
-                                continue
-            
-            # Crea grafico a barre raggruppate
-            if x_values and y_data:
-                x_pos = range(len(x_values))
-                num_series = len(y_data)
-                bar_width = 0.8 / max(num_series, 1)  # Adatta la larghezza in base al numero di serie
-                offset = -bar_width * (num_series - 1) / 2
-                
-                for idx, (name, values) in enumerate(y_data.items()):
-                    positions = [x + offset for x in x_pos]
-                    heights = [values.get(x_val, 0) for x_val in x_values]
-                    
-                    color = professional_colors[idx % len(professional_colors)]
-                    # Assicura che il nome della serie sia UTF-8
-                    label_name = str(name)
-                    if isinstance(name, bytes):
-                        label_name = name.decode('utf-8', errors='replace')
-                    ax.bar(positions, heights, 
-                          width=bar_width,
-                          label=label_name,
-                          color=color,
-                          alpha=0.85,
-                          edgecolor='white',
-                          linewidth=1.5)
-                    offset += bar_width
-                
-                ax.set_xticks(x_pos)
-                # Assicura che le etichette siano UTF-8
-                x_labels_utf8 = [str(x) if not isinstance(x, bytes) else x.decode('utf-8', errors='replace') for x in x_values]
-                ax.set_xticklabels(x_labels_utf8, rotation=45, ha='right')
-                ax.legend(loc='best', frameon=True)
-                ax.grid(True, alpha=0.3, axis='y', linestyle='--')
-                ax.set_axisbelow(True)
-            
-        elif tipo == 'pie':
-            # Prendi la prima serie per il pie chart
-            if series:
-                serie = series[0]
-                points = serie.get('points', [])
-                # Filtra punti validi
-                valid_points = [(p.get('x', ''), p.get('y')) for p in points 
-                               if p.get('x') and str(p.get('x', '')).strip() != '' 
-                               and p.get('y') is not None and float(p.get('y', 0)) > 0]
-                labels = [str(x) for x, y in valid_points]
-                values = [float(y) for x, y in valid_points]
-                
-                if labels and values and len(labels) == len(values):
-                    colors_pie = professional_colors[:len(labels)]
-                    # Assicura che le etichette siano UTF-8
-                    labels_utf8 = [str(l) if not isinstance(l, bytes) else l.decode('utf-8', errors='replace') for l in labels]
-                    wedges, texts, autotexts = ax.pie(
-                        values, 
-                        labels=labels_utf8,
-                        autopct='%1.1f%%',
-                        colors=colors_pie,
-                        startangle=90,
-                        textprops={'fontsize': 10, 'fontweight': 'bold'},
-                        wedgeprops={'edgecolor': 'white', 'linewidth': 2}
-                    )
-                    # Migliora leggibilità percentuali
-                    for autotext in autotexts:
-                        autotext.set_color('white')
-                        autotext.set_fontweight('bold')
-        
-        # Verifica che ci siano dati da visualizzare
-        has_data = False
-        data_info = {}
-        
-        if tipo == 'line':
-            # Per line chart, verifica che ci sia almeno una serie con punti validi
-            has_data = False
-            for serie in series:
-                points = serie.get('points', [])
-                valid_points = [p for p in points if p.get('x') and p.get('y') is not None]
-                if len(valid_points) > 0:
-                    has_data = True
-                    break
-            data_info = {
-                'serie_count': len(series),
-                'points_per_serie': [len(s.get('points', [])) for s in series]
-            }
-        elif tipo == 'bar':
-            # Per bar chart, verifica che x_values e y_data siano stati definiti e non vuoti
-            if 'x_values' in locals() and 'y_data' in locals():
-                has_data = len(x_values) > 0 and len(y_data) > 0
-                # Verifica anche che ci sia almeno un valore y non zero
-                if has_data:
-                    has_non_zero = False
-                    for values_dict in y_data.values():
-                        if any(v != 0 for v in values_dict.values()):
-                            has_non_zero = True
-                            break
-                    has_data = has_non_zero
-                data_info = {
-                    'x_values_count': len(x_values),
-                    'y_data_series': len(y_data),
-                    'x_values': x_values[:3] if x_values else []
-                }
-            else:
-                has_data = False
-                data_info = {'error': 'x_values o y_data non definiti'}
-        elif tipo == 'pie':
-            # Per pie chart, verifica che labels e values siano stati definiti e non vuoti
-            if 'labels' in locals() and 'values' in locals():
-                has_data = len(labels) > 0 and len(values) > 0 and len(labels) == len(values)
-                # Verifica anche che ci sia almeno un valore > 0
-                if has_data:
-                    has_data = any(v > 0 for v in values)
-                data_info = {
-                    'labels_count': len(labels),
-                    'values_count': len(values)
-                }
+        return []
+    return markdown_flowables.to_flowables(markdown_cache.tokens(text), styles)
+
+
+def create_chart_image(chart_data, width=15*cm, height=10*cm, profile: str = None):
+    """Crea un grafico professionale con stile aziendale e alta qualità (BytesIO PNG o None)"""
+    png = render_chart_png(chart_data, width=width, height=height, profile=profile)
+    return io.BytesIO(png) if png else None
+
+# Campi che determinano l'immagine di un grafico (id e caption non influiscono sul rendering)
+CHART_SPEC_FIELDS = ('tipo', 'titolo', 'x_label', 'y_label', 'series')
+# Versione dello stile dei grafici: incrementarla quando cambia l'aspetto invalida la cache dei grafici
+CHART_THEME_VERSION = "2"
+
+def chart_spec_key(chart_data, width=15*cm, height=10*cm, profile: str = None) -> str:
+    """Hash della specifica canonica del grafico, delle dimensioni e della qualità del profilo:
+    grafici identici condividono l'immagine"""
+    settings = pdf_profiles.get(profile)
+    spec = {field: chart_data.get(field) for field in CHART_SPEC_FIELDS}
+    spec['size'] = [round(width, 2), round(height, 2)]
+    spec['theme'] = CHART_THEME_VERSION
+    spec['dpi'] = settings['chart_dpi']
+    spec['colors'] = settings['chart_colors']
+    canonical = json.dumps(spec, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+def render_chart_png(chart_data, width=15*cm, height=10*cm, profile: str = None) -> Optional[bytes]:
+    """Rendering di un grafico in PNG (bytes, serializzabili da e verso il render pool) o None"""
+    # Import ritardato: con il backend vettoriale matplotlib non viene mai caricato
+    import chart_renderer
+    settings = pdf_profiles.get(profile)
+    return chart_renderer.render_chart(chart_data, width_cm=width/cm, height_cm=height/cm,
+                                       dpi=settings['chart_dpi'], palette_colors=settings['chart_colors'])
+
+async def prerender_charts(charts, profile: str = None) -> dict:
+    """Renderizza in parallelo nel render pool (processi o thread) tutti i grafici di un documento,
+    prima della story. Restituisce {chart_spec_key: png o None}."""
+    if CHART_BACKEND == VECTOR_BACKEND:
+        # I disegni vettoriali costano pochissimo: vengono creati durante la composizione
+        return {}
+    specs = {}
+    chart_images = {}
+    for chart in charts if isinstance(charts, list) else []:
+        if isinstance(chart, dict):
+            key = chart_spec_key(chart, profile=profile)
+            if key in specs or key in chart_images:
+                continue
+            # Grafici già renderizzati (stesso documento o specifica riusata) non tornano in matplotlib
+            png = chart_cache.get(key)
+            if png is not None:
+                chart_images[key] = png
             else:
-                has_data = False
-                data_info = {'error': 'labels o values non definiti'}
-        
-        print(f"   🔍 Verifica dati: has_data={has_data}, info={data_info}")
-        
-        if not has_data:
-            plt.close(fig)
-            print(f"⚠️  Grafico '{titolo}' (ID: {chart_id}) non ha dati validi: {data_info}")
-            return None
-        
-        # Titolo e labels (assicura encoding UTF-8)
-        if titolo:
-            # Assicura che il titolo sia una stringa UTF-8 valida
-            if isinstance(titolo, bytes):
-                titolo = titolo.decode('utf-8', errors='replace')
-            ax.set_title(str(titolo), fontsize=14, fontweight='bold', 
-                       pad=15, color='#1a1a1a')
-        if x_label:
-            if isinstance(x_label, bytes):
-                x_label = x_label.decode('utf-8', errors='replace')
-            ax.set_xlabel(str(x_label), fontsize=11, fontweight='medium', color='#333333')
-        if y_label:
-            if isinstance(y_label, bytes):
-                y_label = y_label.decode('utf-8', errors='replace')
-            ax.set_ylabel(str(y_label), fontsize=11, fontweight='medium', color='#333333')
-        
-        plt.tight_layout(pad=1.5)
-        
-        # Salva con alta qualità
-        buf = io.BytesIO()
-        try:
-            plt.savefig(buf, format='png', dpi=150, bbox_inches='tight', 
-                       facecolor='white', edgecolor='none', pad_inches=0.1)
-            buf.seek(0)
-            buf_size = len(buf.getvalue())
-            if buf_size == 0:
-                plt.close(fig)
-                return None
-            plt.close(fig)
-            return buf
-        except Exception as save_error:
-            print(f"❌ Errore nel salvare il grafico {chart_id}: {str(save_error)}")
-            plt.close(fig)
-            return None
-    except Exception as e:
-        # Cattura qualsiasi errore durante la creazione del grafico
-        chart_id = chart_data.get('id', 'N/A') if 'chart_data' in locals() else 'N/A'
-        titolo = chart_data.get('titolo', 'N/A') if 'chart_data' in locals() else 'N/A'
-        print(f"⚠️  Errore nella creazione del grafico '{titolo}' (ID: {chart_id}): {str(e)}")
-        import traceback
-        print(traceback.format_exc())
-        try:
-            if 'fig' in locals():
-                plt.close(fig)
-        except:
-            pass
-        return None
-
-def create_numbered_canvas(header_left, header_right, footer_left, footer_center, footer_right, confidenzialita):
-    """Crea funzioni callback per header/footer e numerazione pagine"""
-    
-    def on_first_page(canvas_obj, doc):
-        # Prima pagina (copertina) senza header/footer
-        pass
-    
-    def on_later_pages(canvas_obj, doc):
-        page_num = canvas_obj.getPageNumber()
-        canvas_obj.saveState()
-        canvas_obj.setFont("Times-Roman", 8)
-        canvas_obj.setFillColor(colors.HexColor('#666666'))
-        
-        # Header (solo dalla seconda pagina in poi)
-        if page_num > 1:
-            if header_left:
-                canvas_obj.drawString(2*cm, A4[1] - 1.5*cm, header_left)
-            if header_right:
-                canvas_obj.drawRightString(A4[0] - 2*cm, A4[1] - 1.5*cm, header_right)
-            
-            # Linea sotto header
-            canvas_obj.setStrokeColor(colors.HexColor('#cccccc'))
-            canvas_obj.setLineWidth(0.5)
-            canvas_obj.line(2*cm, A4[1] - 1.8*cm, A4[0] - 2*cm, A4[1] - 1.8*cm)
-        
-        # Footer
-        if footer_left:
-            canvas_obj.drawString(2*cm, 1.2*cm, footer_left)
-        if footer_center:
-            width = canvas_obj.stringWidth(footer_center, "Times-Roman", 8)
-            canvas_obj.drawString((A4[0] - width) / 2, 1.2*cm, footer_center)
-        
-        # Numerazione pagine
-        canvas_obj.setFont("Times-Roman", 9)
-        page_text = f"Pagina {page_num}"
-        canvas_obj.drawRightString(A4[0] - 2*cm, 1.5*cm, page_text)
-        
-        # Linea sopra footer
-        canvas_obj.setStrokeColor(colors.HexColor('#cccccc'))
-        canvas_obj.setLineWidth(0.5)
-        canvas_obj.line(2*cm, 1.5*cm, A4[0] - 2*cm, 1.5*cm)
-        
-        # Watermark confidenzialità se presente
-        if confidenzialita and confidenzialita != 'pubblico' and page_num > 1:
-            canvas_obj.setFont("Times-Bold", 10)
-            canvas_obj.setFillColor(colors.HexColor('#cccccc'))
-            conf_text = "CONFIDENZIALE" if confidenzialita == 'confidenziale' else "USO INTERNO"
-            width = canvas_obj.stringWidth(conf_text, "Times-Bold", 10)
-            canvas_obj.drawString((A4[0] - width) / 2, A4[1] - 1.5*cm, conf_text)
-        
-        canvas_obj.restoreState()
-    
-    return on_first_page, on_later_pages
+                specs[key] = chart
+    if not specs:
+        return chart_images
+    
+    # Senza processi dedicati i grafici vanno nel thread pool: il renderer non usa lo stato globale pyplot
+    run = render_pool.run if render_pool.uses_processes() else asyncio.to_thread
+    results = await asyncio.gather(
+        *(run(render_chart_png, chart, 15*cm, 10*cm, profile) for chart in specs.values()),
+        return_exceptions=True
+    )
+    for key, result in zip(specs, results):
+        if isinstance(result, BaseException):
+            # Non registrato: il grafico verrà ritentato durante la composizione
+            logger.warning("⚠️  Errore nel pre-rendering del grafico %s: %s", specs[key].get('id', 'N/A'), result)
+            continue
+        chart_images[key] = result
+        chart_cache.put(key, result)
+    logger.info("📊 Pre-rendering grafici completato", renderizzati=len(specs), disponibili=len(chart_images))
+    return chart_images
 
-async def create_pdf_from_json(business_plan_json: dict) -> str:
-    """Crea il PDF professionale dal JSON"""
-    
-    # Crea directory output se non esiste
-    output_dir = Path(__file__).parent / "output"
-    output_dir.mkdir(exist_ok=True)
-    
-    # Genera nome file univoco con timestamp per evitare cache
-    import hashlib
-    import time
-    timestamp = int(time.time() * 1000)  # millisecondi
-    # Aggiungi hash del contenuto per garantire unicità
-    content_hash = hashlib.md5(json.dumps(business_plan_json, sort_keys=True).encode()).hexdigest()[:8]
-    output_path = output_dir / f"business-plan-{timestamp}-{content_hash}.pdf"
-    
-    # Estrai informazioni per header/footer
+def get_chart_image(chart_data, chart_images: Optional[dict] = None, width=15*cm, height=10*cm, profile: str = None):
+    """Immagine del grafico (BytesIO) dal pre-rendering o dalla cache, altrimenti la crea ora.
+    Con il backend vettoriale restituisce direttamente il Drawing ReportLab."""
+    if CHART_BACKEND == VECTOR_BACKEND:
+        return chart_vector.chart_drawing(chart_data, width, height)
+    key = chart_spec_key(chart_data, width, height, profile)
+    if chart_images is not None and key in chart_images:
+        png = chart_images[key]
+        chart_cache.put(key, png)
+    else:
+        png = chart_cache.get(key)
+        if png is None:
+            png = render_chart_png(chart_data, width=width, height=height, profile=profile)
+            chart_cache.put(key, png)
+    return io.BytesIO(png) if png else None
+
+def chart_flowable(chart_data, chart_img, width=15*cm, height=10*cm, profile: str = None):
+    """Flowable Image del grafico; riusa l'ImageReader in cache così il PNG viene decodificato una volta"""
+    if isinstance(chart_img, Drawing):
+        return chart_img
+    img = Image(chart_img, width=width, height=height)
+    reader = chart_cache.get_reader(chart_spec_key(chart_data, width, height, profile))
+    if reader is not None:
+        img._img = ImageReader(reader)
+    return img
+
+def warm_up():
+    """Precarica font matplotlib, backend Agg e stili ReportLab (usato dai worker del render pool)"""
+    if CHART_BACKEND != VECTOR_BACKEND:
+        import chart_renderer
+        chart_renderer.warm_up()
+    for document_type in pdf_styles.THEME_COLORS:
+        pdf_styles.get_theme(document_type)
+
+
+async def render_pdf_from_json(business_plan_json: dict, profile: str = None) -> bytes:
+    """Crea il PDF in memoria in un worker del render pool senza bloccare l'event loop"""
+    if INCREMENTAL_RENDER:
+        return await render_pdf_incremental(business_plan_json, profile)
+    # Prima tutti i grafici in parallelo, poi la composizione del documento
+    chart_images = await prerender_charts(business_plan_json.get('charts', []), profile)
+    return await render_pool.run(build_pdf_from_json, business_plan_json, chart_images, profile)
+
+
+async def create_pdf_from_json(business_plan_json: dict, content_hash: str = None, profile: str = None) -> str:
+    """Crea il PDF e lo salva nella cache dei PDF (content_hash: digest già noto del documento, evita di ricalcolarlo)"""
+    pdf_bytes = await render_pdf_from_json(business_plan_json, profile)
+    return await asyncio.to_thread(pdf_cache.save_document, "business-plan", business_plan_json, pdf_bytes, content_hash, profile)
+
+
+def _business_plan_context(business_plan_json: dict, chart_images: Optional[dict]) -> dict:
+    """Valori condivisi dalle sezioni del business plan: metadati e capitoli nell'ordine di chapter_order"""
     pdf_layout = business_plan_json.get('pdf_layout', {})
-    header_info = pdf_layout.get('header', {})
-    footer_info = pdf_layout.get('footer', {})
-    confidenzialita = pdf_layout.get('confidenzialita', 'pubblico')
-    
-    # Crea il documento PDF con encoding UTF-8
-    doc = SimpleDocTemplate(
-        str(output_path),
-        pagesize=A4,
-        rightMargin=2*cm,
-        leftMargin=2*cm,
-        topMargin=3*cm,
-        bottomMargin=2.5*cm,
-        encoding='utf-8'
-    )
-    
-    # Crea le funzioni callback per header/footer
-    on_first_page, on_later_pages = create_numbered_canvas(
-        header_info.get('left', ''),
-        header_info.get('right', ''),
-        footer_info.get('left', ''),
-        footer_info.get('center', ''),
-        footer_info.get('right', ''),
-        confidenzialita
-    )
-    
-    # Assegna i callback
-    doc.onFirstPage = on_first_page
-    doc.onLaterPages = on_later_pages
-    
-    # Stili con font professionali (Times New Roman) con supporto UTF-8
-    styles = getSampleStyleSheet()
-    
-    # Configura encoding per ReportLab Paragraph (supporta UTF-8 nativamente)
-    # Times-Roman e Times-Bold supportano caratteri latini estesi (accenti italiani)
-    
-    # Stili personalizzati con Times-Roman per aspetto formale
-    styles.add(ParagraphStyle(
-        name='CoverTitle',
-        parent=styles['Heading1'],
-        fontName='Times-Bold',
-        fontSize=28,
-        textColor=colors.HexColor('#000000'),
-        spaceAfter=20,
-        alignment=TA_CENTER,
-        leading=34,
-        encoding='utf-8'
-    ))
-    
-    styles.add(ParagraphStyle(
-        name='CoverSubtitle',
-        parent=styles['Heading2'],
-        fontName='Times-Roman',
-        fontSize=16,
-        textColor=colors.HexColor('#333333'),
-        spaceAfter=30,
-        alignment=TA_CENTER,
-        leading=20
-    ))
-    
-    styles.add(ParagraphStyle(
-        name='CustomTitle',
-        parent=styles['Heading1'],
-        fontName='Times-Bold',
-        fontSize=24,
-        textColor=colors.HexColor('#000000'),
-        spaceAfter=30,
-        alignment=TA_CENTER
-    ))
-    
-    styles.add(ParagraphStyle(
-        name='CustomHeading1',
-        parent=styles['Heading1'],
-        fontName='Times-Bold',
-        fontSize=18,
-        textColor=colors.HexColor('#000000'),
-        spaceAfter=12,
-        spaceBefore=16,
-        leading=22
-    ))
-    
-    styles.add(ParagraphStyle(
-        name='CustomHeading2',
-        parent=styles['Heading2'],
-        fontName='Times-Bold',
-        fontSize=14,
-        textColor=colors.HexColor('#1a1a1a'),
-        spaceAfter=8,
-        spaceBefore=12,
-        leading=18
-    ))
-    
-    # Modifica lo stile Normal esistente invece di aggiungerne uno nuovo
-    # Times-Roman supporta caratteri latini estesi (UTF-8)
-    styles['Normal'].fontName = 'Times-Roman'
-    styles['Normal'].fontSize = 11
-    styles['Normal'].textColor = colors.HexColor('#000000')
-    styles['Normal'].leading = 14
-    styles['Normal'].alignment = TA_JUSTIFY
-    styles['Normal'].encoding = 'utf-8'
-    
-    styles.add(ParagraphStyle(
-        name='TOCEntry',
-        parent=styles['Normal'],
-        fontName='Times-Roman',
-        fontSize=11,
-        leftIndent=0,
-        spaceAfter=6
-    ))
-    
-    styles.add(ParagraphStyle(
-        name='TOCHeading',
-        parent=styles['Heading1'],
-        fontName='Times-Bold',
-        fontSize=16,
-        textColor=colors.HexColor('#000000'),
-        spaceAfter=20,
-        alignment=TA_CENTER
-    ))
-    
-    # Story (contenuto del PDF)
-    story = []
-    
-    # === COPERTINA PROFESSIONALE COLORATA ===
-    titolo = pdf_layout.get('titolo_documento', 'Business Plan')
-    sottotitolo = pdf_layout.get('sottotitolo', '')
     meta = business_plan_json.get('meta', {})
     data = business_plan_json.get('data', {})
-    company_name = data.get('company_name', '')
-    data_gen = meta.get('data_generazione', datetime.now().strftime('%d/%m/%Y'))
-    versione = meta.get('versione', '1.0')
-    
-    # Colori professionali per la copertina
-    primary_color = colors.HexColor('#1e3a8a')  # Blu scuro professionale
-    accent_color = colors.HexColor('#3b82f6')   # Blu medio
-    light_bg = colors.HexColor('#f0f4ff')        # Sfondo chiaro
-    
-    # Box colorato superiore
-    cover_header = Table([
-        ['']  # Spazio per il box colorato
-    ], colWidths=[A4[0] - 4*cm], rowHeights=[3*cm])
-    cover_header.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, -1), primary_color),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-    ]))
-    story.append(cover_header)
-    
-    # Spazio e contenuto principale
-    story.append(Spacer(1, 2*cm))
-    
-    # Titolo principale con stile elegante
-    title_style = ParagraphStyle(
-        name='CoverTitleColored',
-        parent=styles['CoverTitle'],
-        fontName='Times-Bold',
-        fontSize=32,
-        textColor=primary_color,
-        spaceAfter=15,
-        alignment=TA_CENTER,
-        leading=38
-    )
-    story.append(Paragraph(titolo, title_style))
-    
-    # Linea decorativa sotto il titolo
-    decor_line = Table([['']], colWidths=[8*cm], rowHeights=[0.2*cm])
-    decor_line.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, -1), accent_color),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-    ]))
-    story.append(decor_line)
-    
-    if sottotitolo:
-        story.append(Spacer(1, 0.8*cm))
-        subtitle_style = ParagraphStyle(
-            name='CoverSubtitleColored',
-            parent=styles['CoverSubtitle'],
-            fontName='Times-Roman',
-            fontSize=14,
-            textColor=colors.HexColor('#4b5563'),
-            spaceAfter=20,
-            alignment=TA_CENTER,
-            leading=18
-        )
-        story.append(Paragraph(sottotitolo, subtitle_style))
-    
-    story.append(Spacer(1, 2.5*cm))
-    
-    # Box informativo con sfondo colorato (Paragraph per rendere <b> correttamente)
-    info_data = []
-    if company_name:
-        info_data.append([Paragraph(f"<b>Azienda:</b> {escape_for_pdf(company_name)}", styles['Normal'])])
-    info_data.append([Paragraph(f"<b>Data:</b> {escape_for_pdf(data_gen)}", styles['Normal'])])
-    info_data.append([Paragraph(f"<b>Versione:</b> {escape_for_pdf(versione)}", styles['Normal'])])
-    
-    if info_data:
-        info_table = Table(info_data, colWidths=[12*cm])
-        info_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, -1), light_bg),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('LEFTPADDING', (0, 0), (-1, -1), 24),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 24),
-            ('TOPPADDING', (0, 0), (-1, -1), 14),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 14),
-            ('BOX', (0, 0), (-1, -1), 0.5, colors.HexColor('#d1d5db')),
-            ('INNERGRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e5e7eb')),
-        ]))
-        story.append(info_table)
-        story.append(Spacer(1, 1.5*cm))
-    
-    # Badge confidenzialità se presente
-    if confidenzialita and confidenzialita != 'pubblico':
-        conf_text = "CONFIDENZIALE" if confidenzialita == 'confidenziale' else "USO INTERNO"
-        conf_color = colors.HexColor('#dc2626') if confidenzialita == 'confidenziale' else colors.HexColor('#f59e0b')
-        conf_table = Table([[conf_text]], colWidths=[6*cm], rowHeights=[1*cm])
-        conf_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, -1), conf_color),
-            ('TEXTCOLOR', (0, 0), (-1, -1), colors.white),
-            ('FONTNAME', (0, 0), (-1, -1), 'Times-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 12),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ]))
-        story.append(conf_table)
-    
-    story.append(PageBreak())
-    
-    # === INDICE ===
-    story.append(Paragraph("INDICE", styles['CustomTitle']))
-    story.append(Spacer(1, 0.5*cm))
-    
-    # Costruisci l'indice dai capitoli
+    # I riepiloghi di debug (liste di ID, dettagli delle serie) si calcolano solo se servono
+    debug = logger.isEnabledFor(logging.DEBUG)
+
     narrative = business_plan_json.get('narrative', {})
-    print(f"\n🔍 ===== ESTRAZIONE CAPITOLI =====")
-    print(f"📖 narrative presente: {narrative is not None}")
-    print(f"📖 narrative tipo: {type(narrative)}")
-    
     chapters = narrative.get('chapters', []) if isinstance(narrative, dict) else []
-    print(f"📖 chapters estratto: {len(chapters)} capitoli")
-    print(f"📖 chapters tipo: {type(chapters)}")
-    
-    # Log ID dei capitoli
-    if chapters:
-        print(f"📖 ID capitoli trovati: {[ch.get('id', 'N/A') for ch in chapters]}")
-        # Verifica se CH7_CHARTS è presente
-        ch7_found = any(ch.get('id') == 'CH7_CHARTS' for ch in chapters)
-        print(f"📖 CH7_CHARTS presente: {ch7_found}")
-        if ch7_found:
-            ch7 = next((ch for ch in chapters if ch.get('id') == 'CH7_CHARTS'), None)
-            if ch7:
-                ch7_chart_ids = ch7.get('chart_ids', [])
-                print(f"📖 CH7_CHARTS chart_ids: {ch7_chart_ids} (tipo: {type(ch7_chart_ids)})")
-    
+
+    # Log ID dei capitoli (liste costruite solo se il debug è attivo)
+    if chapters and debug:
+        ch7 = next((ch for ch in chapters if ch.get('id') == 'CH7_CHARTS'), None)
+        logger.debug("📖 Capitoli estratti: %s", [ch.get('id', 'N/A') for ch in chapters],
+                     ch7_presente=ch7 is not None, ch7_chart_ids=ch7.get('chart_ids', []) if ch7 else None)
+
     chapter_order = pdf_layout.get('chapter_order', [])
-    print(f"📖 chapter_order: {chapter_order}")
-    
+
     if chapter_order:
         chapters_dict = {ch['id']: ch for ch in chapters if ch.get('id')}
-        print(f"📖 chapters_dict creato: {len(chapters_dict)} capitoli")
         ordered_chapters = [chapters_dict.get(ch_id) for ch_id in chapter_order if ch_id in chapters_dict]
-        print(f"📖 ordered_chapters (da chapter_order): {len(ordered_chapters)}")
         for ch in chapters:
             if ch.get('id') and ch['id'] not in chapter_order:
                 ordered_chapters.append(ch)
         chapters = ordered_chapters
-        print(f"📖 Capitoli finali dopo ordinamento: {len(chapters)}")
-        print(f"📖 ID capitoli ordinati: {[ch.get('id', 'N/A') for ch in chapters]}")
-    
-    toc_entries = []
-    page_num = 3  # Inizia dopo copertina e indice
-    
-    # Executive Summary
-    exec_summary = business_plan_json.get('executive_summary', {})
-    if exec_summary:
-        toc_entries.append(("Executive Summary", page_num))
-        page_num += 1
-    
-    # Capitoli
-    for chapter in chapters:
-        titolo_ch = chapter.get('titolo', '')
-        if titolo_ch:
-            toc_entries.append((titolo_ch, page_num))
-            page_num += 1
-    
-    # Assunzioni
-    assumptions = business_plan_json.get('assumptions', [])
-    if assumptions:
-        toc_entries.append(("Assunzioni", page_num))
-        page_num += 1
-    
-    # Dati Mancanti
-    dati_mancanti = business_plan_json.get('dati_mancanti', [])
-    if dati_mancanti:
-        toc_entries.append(("Dati Mancanti", page_num))
-        page_num += 1
-    
-    # Disclaimer
-    disclaimer = business_plan_json.get('disclaimer', '')
-    if disclaimer:
-        toc_entries.append(("Disclaimer", page_num))
-    
-    # Aggiungi voci indice
-    for entry_title, entry_page in toc_entries:
-        # Crea una tabella per allineare titolo e numero pagina
-        toc_table = Table([[entry_title, str(entry_page)]], colWidths=[14*cm, 2*cm])
-        toc_table.setStyle(TableStyle([
-            ('FONTNAME', (0, 0), (0, 0), 'Times-Roman'),
-            ('FONTSIZE', (0, 0), (-1, -1), 11),
-            ('ALIGN', (0, 0), (0, 0), 'LEFT'),
-            ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-            ('TOPPADDING', (0, 0), (-1, -1), 4),
-        ]))
-        story.append(toc_table)
-    
+        if debug:
+            logger.debug("📖 Capitoli ordinati da chapter_order: %s", [ch.get('id', 'N/A') for ch in chapters])
+
+    charts_dict = _charts_by_id(business_plan_json)
+    if debug:
+        logger.debug("📊 Grafici per capitolo: %s",
+                     {chart_id: chart.get('chapter_id', 'N/A') for chart_id, chart in charts_dict.items()})
+
+    return {
+        "titolo": pdf_layout.get('titolo_documento', 'Business Plan'),
+        "company_name": data.get('company_name', ''),
+        "data_gen": meta.get('data_generazione', datetime.now().strftime('%d/%m/%Y')),
+        "versione": meta.get('versione', '1.0'),
+        "confidenzialita": pdf_layout.get('confidenzialita', 'pubblico'),
+        "chapters": chapters,
+        "charts_dict": charts_dict,
+        "chart_images": chart_images,
+        "debug": debug,
+    }
+
+
+def _cover(business_plan_json: dict, ctx: dict) -> list:
+    """Copertina colorata: titolo, sottotitolo, box informativo e badge di confidenzialità"""
+    sottotitolo = business_plan_json.get('pdf_layout', {}).get('sottotitolo', '')
+    story = document_builder.cover_title(ctx["theme"], ctx["titolo"])
+
+    if sottotitolo:
+        story.append(Spacer(1, 0.8*cm))
+        story.append(Paragraph(sottotitolo, ctx["styles"]['CoverSubtitleColored']))
+
+    story.append(Spacer(1, 2.5*cm))
+
+    info_rows = []
+    if ctx["company_name"]:
+        info_rows.append(f"<b>Azienda:</b> {escape_for_pdf(ctx['company_name'])}")
+    info_rows.append(f"<b>Data:</b> {escape_for_pdf(ctx['data_gen'])}")
+    info_rows.append(f"<b>Versione:</b> {escape_for_pdf(ctx['versione'])}")
+    story.append(document_builder.info_box(info_rows, ctx["theme"]["cover_info"]))
+    story.append(Spacer(1, 1.5*cm))
+
+    # Badge confidenzialità se presente
+    confidenzialita = ctx["confidenzialita"]
+    if confidenzialita and confidenzialita != 'pubblico':
+        conf_text = "CONFIDENZIALE" if confidenzialita == 'confidenziale' else "USO INTERNO"
+        conf_table = Table([[conf_text]], colWidths=[6*cm], rowHeights=[1*cm])
+        conf_table.setStyle(pdf_styles.confidentiality_badge(confidenzialita))
+        story.append(conf_table)
+
     story.append(PageBreak())
-    
-    # Executive Summary
+    return story
+
+
+def _executive_summary(business_plan_json: dict, ctx: dict) -> list:
+    """Executive summary: sintesi, punti chiave e tabella dei KPI principali"""
+    styles = ctx["styles"]
     exec_summary = business_plan_json.get('executive_summary', {})
-    if exec_summary:
-        story.append(Paragraph("EXECUTIVE SUMMARY", styles['CustomHeading1']))
+    story = []
+    story.append(Paragraph("EXECUTIVE SUMMARY", styles['CustomHeading1']))
+    story.append(Spacer(1, 0.3*cm))
+
+    sintesi = exec_summary.get('sintesi', '')
+    if sintesi:
+        story.extend(markdown_to_paragraphs(sintesi, styles))
         story.append(Spacer(1, 0.3*cm))
-        
-        sintesi = exec_summary.get('sintesi', '')
-        if sintesi:
-            # Preprocessa e normalizza
-            sintesi = preprocess_content_for_pdf(sintesi)
-            # Dividi in paragrafi se contiene doppie newline
-            paragraphs = sintesi.split('\n\n')
-            for para in paragraphs:
-                if para.strip():
-                    # Usa markdown_to_paragraphs per supportare formattazione
-                    para_elements = markdown_to_paragraphs(para.strip(), styles)
-                    story.extend(para_elements)
-            story.append(Spacer(1, 0.3*cm))
-        
-        punti_chiave = exec_summary.get('punti_chiave', [])
-        if punti_chiave:
-            story.append(Paragraph("<b>Punti Chiave:</b>", styles['Heading3']))
-            story.append(Spacer(1, 0.2*cm))
-            
-            # Box colorato per punti chiave
-            key_points_data = []
-            for i, punto in enumerate(punti_chiave):
-                punto_clean = escape_for_pdf(punto)
-                key_points_data.append([Paragraph(f"<b>{i+1}.</b> {punto_clean}", styles['Normal'])])
-            
-            if key_points_data:
-                key_points_table = Table(key_points_data, colWidths=[16*cm])
-                key_points_table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f0f4ff')),
-                    ('LEFTPADDING', (0, 0), (-1, -1), 12),
-                    ('RIGHTPADDING', (0, 0), (-1, -1), 12),
-                    ('TOPPADDING', (0, 0), (-1, -1), 8),
-                    ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-                    ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#3b82f6')),
-                    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-                ]))
-                story.append(key_points_table)
-                story.append(Spacer(1, 0.3*cm))
-        
-        # KPI principali come tabella
-        kpis = exec_summary.get('kpi_principali', [])
-        if kpis:
+
+    punti_chiave = exec_summary.get('punti_chiave', [])
+    if punti_chiave:
+        story.append(Paragraph("<b>Punti Chiave:</b>", styles['Heading3']))
+        story.append(Spacer(1, 0.2*cm))
+
+        # Box colorato per punti chiave
+        key_points_data = []
+        for i, punto in enumerate(punti_chiave):
+            punto_clean = escape_for_pdf(punto)
+            key_points_data.append([Paragraph(f"<b>{i+1}.</b> {punto_clean}", styles['Normal'])])
+
+        if key_points_data:
+            key_points_table = Table(key_points_data, colWidths=[16*cm])
+            key_points_table.setStyle(pdf_styles.KEY_POINTS_TABLE)
+            story.append(key_points_table)
             story.append(Spacer(1, 0.3*cm))
-            story.append(Paragraph("<b>KPI Principali:</b>", styles['Heading3']))
-            story.append(Spacer(1, 0.2*cm))
-            
-            kpi_data = [["KPI", "Valore", "Scenario"]]
-            for kpi in kpis:
-                nome = kpi.get('nome', '')
-                valore = kpi.get('valore', '')
-                unita = kpi.get('unita', '')
-                scenario = kpi.get('scenario', '')
-                
-                # Formatta il valore
-                if unita == 'EUR':
-                    try:
-                        val_num = float(valore) if isinstance(valore, str) else valore
-                        valore_str = f"{val_num:,.0f} €"
-                    except:
-                        valore_str = str(valore)
-                elif unita == '%':
-                    valore_str = f"{valore}%"
-                else:
+
+    # KPI principali come tabella
+    kpis = exec_summary.get('kpi_principali', [])
+    if kpis:
+        story.append(Spacer(1, 0.3*cm))
+        story.append(Paragraph("<b>KPI Principali:</b>", styles['Heading3']))
+        story.append(Spacer(1, 0.2*cm))
+
+        kpi_data = [["KPI", "Valore", "Scenario"]]
+        for kpi in kpis:
+            nome = kpi.get('nome', '')
+            valore = kpi.get('valore', '')
+            unita = kpi.get('unita', '')
+            scenario = kpi.get('scenario', '')
+
+            # Formatta il valore
+            if unita == 'EUR':
+                try:
+                    val_num = float(valore) if isinstance(valore, str) else valore
+                    valore_str = f"{val_num:,.0f} €"
+                except:
                     valore_str = str(valore)
-                
-                kpi_data.append([nome, valore_str, scenario])
-            
-            if len(kpi_data) > 1:  # Se ci sono KPI oltre l'header
-                kpi_table = Table(kpi_data, colWidths=[6*cm, 4*cm, 4*cm])
-                kpi_table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2c3e50')),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-                    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                    ('ALIGN', (1, 0), (2, -1), 'RIGHT'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Times-Bold'),
-                    ('FONTNAME', (0, 1), (-1, -1), 'Times-Roman'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 11),
-                    ('FONTSIZE', (0, 1), (-1, -1), 10),
-                    ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
-                    ('TOPPADDING', (0, 0), (-1, 0), 10),
-                    ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
-                    ('TOPPADDING', (0, 1), (-1, -1), 6),
-                    ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#cccccc')),
-                    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f9f9f9')]),
-                ]))
-                story.append(kpi_table)
-                print(f"✅ Tabella KPI aggiunta al PDF", flush=True)
-        
-        story.append(Spacer(1, 0.5*cm))
-        story.append(PageBreak())
-    
-    # === CAPITOLI NARRATIVI ===
-    # (chapters già ordinati sopra)
-    
-    print(f"\n{'='*80}")
-    print(f"🔍 ===== INIZIO PROCESSAMENTO CAPITOLI =====")
-    print(f"📖 Totale capitoli da processare: {len(chapters)}")
-    
+            elif unita == '%':
+                valore_str = f"{valore}%"
+            else:
+                valore_str = str(valore)
+
+            kpi_data.append([nome, valore_str, scenario])
+
+        if len(kpi_data) > 1:  # Se ci sono KPI oltre l'header
+            kpi_table = Table(kpi_data, colWidths=[6*cm, 4*cm, 4*cm])
+            kpi_table.setStyle(pdf_styles.KPI_TABLE)
+            story.append(kpi_table)
+            logger.debug("✅ Tabella KPI aggiunta al PDF")
+
+    story.append(Spacer(1, 0.5*cm))
+    story.append(PageBreak())
+    return story
+
+
+def _charts_by_id(business_plan_json: dict) -> dict:
+    """Grafici del documento per id (ignorati quelli senza id valido)"""
     # Crea un dizionario dei grafici per accesso rapido
     charts_list = business_plan_json.get('charts', [])
     if not isinstance(charts_list, list):
         charts_list = []
-        print(f"⚠️  'charts' non è una lista, convertito a lista vuota")
+        logger.warning("⚠️  'charts' non è una lista, convertito a lista vuota")
     
     # Crea dizionario solo per grafici con 'id' valido
     charts_dict = {}
@@ -1111,345 +333,253 @@ async def create_pdf_from_json(business_plan_json: dict) -> str:
         if chart_id:
             charts_dict[chart_id] = chart
         else:
-            print(f"⚠️  Grafico senza 'id' valido ignorato: {chart}")
-    
-    print(f"📊 Totale grafici nel JSON: {len(charts_list)}")
-    print(f"📊 Grafici nel dizionario (con id valido): {len(charts_dict)}")
-    print(f"📊 ID grafici disponibili: {list(charts_dict.keys())}")
-    
-    # Log dettagliato dei grafici
-    for chart_id, chart in charts_dict.items():
-        chapter_id_chart = chart.get('chapter_id', 'N/A')
-        print(f"   📈 {chart_id} -> chapter_id: '{chapter_id_chart}'")
-    
+            logger.warning("⚠️  Grafico senza 'id' valido ignorato: %s", chart)
+    return charts_dict
+
+
+def _chapter(business_plan_json: dict, ctx: dict, idx: int, chapter: dict) -> list:
+    """Un capitolo narrativo: titolo, tabelle riassuntive, contenuto e (solo CH7_CHARTS) grafici"""
+    styles = ctx["styles"]
+    charts_dict = ctx["charts_dict"]
+    chart_images = ctx["chart_images"]
+    profile = ctx["profile"]
+    debug = ctx["debug"]
+    story = []
+
     # Dati per tabelle riassuntive
     data = business_plan_json.get('data', {})
-    
-    print(f"\n📖 ===== INIZIO CICLO CAPITOLI =====")
-    for idx, chapter in enumerate(chapters):
-        chapter_id = chapter.get('id', '')
-        titolo_ch = chapter.get('titolo', '')
-        contenuto = chapter.get('contenuto_markdown', '')
-        chart_ids = chapter.get('chart_ids', [])
-        # Assicurati che chart_ids sia una lista
-        if not isinstance(chart_ids, list):
-            print(f"⚠️  chart_ids non è una lista per capitolo {chapter_id}, tipo: {type(chart_ids)}, valore: {chart_ids}")
-            chart_ids = []
-        
-        print(f"\n📖 ===== CAPITOLO {idx+1}/{len(chapters)}: {chapter_id} =====")
-        print(f"📖 Titolo: {titolo_ch}")
-        print(f"📖 chart_ids: {chart_ids} (tipo: {type(chart_ids)}, lunghezza: {len(chart_ids)})")
-        print(f"📖 chapter_id == 'CH7_CHARTS': {chapter_id == 'CH7_CHARTS'}")
-        
-        if titolo_ch:
-            story.append(Paragraph(titolo_ch, styles['CustomHeading1']))
-            story.append(Spacer(1, 0.3*cm))
-        
-        # Aggiungi tabelle riassuntive per capitoli specifici
-        if chapter_id == "CH3_BUSINESS_MODEL":
-            business_model = data.get("business_model", {})
-            pricing = business_model.get("pricing", {})
-            
-            if pricing.get("piani"):
-                story.append(Paragraph("<b>Piani di Pricing:</b>", styles['Heading3']))
-                story.append(Spacer(1, 0.2*cm))
-                
-                pricing_table_data = [["Piano", "Prezzo", "Periodicità"]]
-                for piano in pricing["piani"]:
-                    prezzo_eur = piano.get('prezzo_eur', 0)
-                    try:
-                        prezzo = f"{float(prezzo_eur):,.0f} €"
-                    except:
-                        prezzo = str(prezzo_eur)
-                    periodicita = piano.get("periodicita", "").replace("_", " ").title()
-                    pricing_table_data.append([
-                        piano.get("nome", ""),
-                        prezzo,
-                        periodicita
-                    ])
-                
-                if len(pricing_table_data) > 1:
-                    pricing_table = Table(pricing_table_data, colWidths=[6*cm, 4*cm, 4*cm])
-                    pricing_table.setStyle(TableStyle([
-                        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2c3e50')),
-                        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-                        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                        ('ALIGN', (1, 0), (2, -1), 'RIGHT'),
-                        ('FONTNAME', (0, 0), (-1, 0), 'Times-Bold'),
-                        ('FONTNAME', (0, 1), (-1, -1), 'Times-Roman'),
-                        ('FONTSIZE', (0, 0), (-1, 0), 11),
-                        ('FONTSIZE', (0, 1), (-1, -1), 10),
-                        ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
-                        ('TOPPADDING', (0, 0), (-1, 0), 10),
-                        ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
-                        ('TOPPADDING', (0, 1), (-1, -1), 6),
-                        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#cccccc')),
-                        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f9f9f9')]),
-                    ]))
-                    story.append(pricing_table)
-                    print(f"✅ Tabella Pricing aggiunta al PDF", flush=True)
-                    story.append(Spacer(1, 0.3*cm))
-            
-            # Unit Economics
-            unit_econ = business_model.get("unit_economics", {})
-            if unit_econ:
-                story.append(Paragraph("<b>Unit Economics:</b>", styles['Heading3']))
-                story.append(Spacer(1, 0.2*cm))
-                
-                ue_data = []
-                if unit_econ.get("cac_eur"):
-                    ue_data.append(["CAC (Customer Acquisition Cost)", f"{unit_econ.get('cac_eur', 0):,.0f} €"])
-                if unit_econ.get("ltv_eur"):
-                    ue_data.append(["LTV (Lifetime Value)", f"{unit_econ.get('ltv_eur', 0):,.0f} €"])
-                if unit_econ.get("margine_lordo_percent"):
-                    ue_data.append(["Margine Lordo", f"{unit_econ.get('margine_lordo_percent', 0):.1f}%"])
-                if unit_econ.get("payback_mesi"):
-                    ue_data.append(["Payback Period", f"{unit_econ.get('payback_mesi', 0):.1f} mesi"])
-                
-                if ue_data:
-                    ue_table = Table(ue_data, colWidths=[10*cm, 6*cm])
-                    ue_table.setStyle(TableStyle([
-                        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f0f4ff')),
-                        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                        ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
-                        ('FONTNAME', (0, 0), (-1, -1), 'Times-Roman'),
-                        ('FONTSIZE', (0, 0), (-1, -1), 10),
-                        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-                        ('TOPPADDING', (0, 0), (-1, -1), 6),
-                        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#cccccc')),
-                        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                    ]))
-                    story.append(ue_table)
-                    print(f"✅ Tabella Unit Economics aggiunta al PDF", flush=True)
-                    story.append(Spacer(1, 0.3*cm))
-        
-        elif chapter_id == "CH2_MARKET":
-            market = data.get("market", {})
-            tam_sam_som = market.get("tam_sam_som", {})
-            
-            if tam_sam_som:
-                story.append(Paragraph("<b>Dimensioni del Mercato:</b>", styles['Heading3']))
-                story.append(Spacer(1, 0.2*cm))
-                
-                market_data = []
-                if tam_sam_som.get("tam_eur_annuo"):
-                    market_data.append(["TAM (Total Addressable Market)", f"{tam_sam_som.get('tam_eur_annuo', 0):,.0f} €"])
-                if tam_sam_som.get("sam_eur_annuo"):
-                    market_data.append(["SAM (Serviceable Addressable Market)", f"{tam_sam_som.get('sam_eur_annuo', 0):,.0f} €"])
-                if tam_sam_som.get("som_eur_annuo"):
-                    market_data.append(["SOM (Serviceable Obtainable Market)", f"{tam_sam_som.get('som_eur_annuo', 0):,.0f} €"])
-                
-                if market_data:
-                    market_table = Table(market_data, colWidths=[10*cm, 6*cm])
-                    market_table.setStyle(TableStyle([
-                        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f0f4ff')),
-                        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                        ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
-                        ('FONTNAME', (0, 0), (-1, -1), 'Times-Roman'),
-                        ('FONTSIZE', (0, 0), (-1, -1), 10),
-                        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-                        ('TOPPADDING', (0, 0), (-1, -1), 6),
-                        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#cccccc')),
-                        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                    ]))
-                    story.append(market_table)
-                    print(f"✅ Tabella Market aggiunta al PDF", flush=True)
-                    story.append(Spacer(1, 0.3*cm))
-        
-        elif chapter_id == "CH6_RISKS_ROADMAP":
-            risks = data.get("risks", [])
-            if risks:
-                story.append(Paragraph("<b>Rischi Principali:</b>", styles['Heading3']))
-                story.append(Spacer(1, 0.2*cm))
-                
-                risks_data = [["Categoria", "Probabilità", "Impatto"]]
-                for risk in risks[:5]:  # Mostra i primi 5 rischi
-                    risks_data.append([
-                        risk.get("categoria", "").replace("_", " ").title(),
-                        risk.get("probabilita", "").title(),
-                        risk.get("impatto", "").title()
-                    ])
-                
-                if len(risks_data) > 1:
-                    risks_table = Table(risks_data, colWidths=[6*cm, 4*cm, 4*cm])
-                    risks_table.setStyle(TableStyle([
-                        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2c3e50')),
-                        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-                        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                        ('FONTNAME', (0, 0), (-1, 0), 'Times-Bold'),
-                        ('FONTNAME', (0, 1), (-1, -1), 'Times-Roman'),
-                        ('FONTSIZE', (0, 0), (-1, 0), 11),
-                        ('FONTSIZE', (0, 1), (-1, -1), 10),
-                        ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
-                        ('TOPPADDING', (0, 0), (-1, 0), 10),
-                        ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
-                        ('TOPPADDING', (0, 1), (-1, -1), 6),
-                        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#cccccc')),
-                        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f9f9f9')]),
-                    ]))
-                    story.append(risks_table)
-                    print(f"✅ Tabella Risks aggiunta al PDF", flush=True)
-                    story.append(Spacer(1, 0.3*cm))
-        
-        # Aggiungi il contenuto del capitolo PRIMA dei grafici
-        if contenuto:
-            # Preprocessa il contenuto per normalizzazione
-            contenuto = preprocess_content_for_pdf(contenuto)
-            # Log per debug: verifica se ci sono titoli in maiuscolo
-            lines_with_uppercase = [line.strip() for line in contenuto.split('\n') 
-                                   if line.strip() and len(line.strip()) >= 3 
-                                   and not line.strip().startswith('#')
-                                   and sum(1 for c in line.strip() if c.isupper() and c.isalpha()) >= 3
-                                   and sum(1 for c in line.strip() if c.isupper() and c.isalpha()) / max(1, sum(1 for c in line.strip() if c.isalpha())) >= 0.8]
-            if lines_with_uppercase:
-                print(f"📌 Titoli in maiuscolo rilevati nel capitolo '{titolo_ch}': {lines_with_uppercase[:3]}")
-            elements = markdown_to_paragraphs(contenuto, styles)
-            story.extend(elements)
-        
-        # Aggiungi i grafici referenziati DOPO il contenuto
-        # IMPORTANTE: I grafici devono essere mostrati SOLO nel capitolo CH7_CHARTS
-        charts_added_count = 0
-        
-        # Processa i grafici SOLO per il capitolo CH7_CHARTS
-        if chapter_id == "CH7_CHARTS":
-            print(f"📊 ===== PROCESSANDO CAPITOLO CH7_CHARTS =====")
-            print(f"📊 chart_ids nel capitolo: {chart_ids}")
-            print(f"📊 Totale grafici disponibili: {len(charts_dict)}")
-            story.append(Spacer(1, 0.5*cm))
-            
-            # Strategia 1: Usa chart_ids se presenti e non vuoti
-            charts_to_process = []
-            if chart_ids and len(chart_ids) > 0:
-                print(f"📊 Strategia 1: Usando chart_ids ({len(chart_ids)} grafici referenziati)")
-                for chart_id in chart_ids:
-                    if chart_id in charts_dict:
-                        charts_to_process.append((chart_id, charts_dict[chart_id]))
-                        print(f"   ✅ Grafico {chart_id} trovato")
-                    else:
-                        print(f"   ⚠️  Grafico {chart_id} non trovato in charts_dict")
-                        print(f"   📋 Grafici disponibili: {list(charts_dict.keys())[:5]}...")
-            
-            # Strategia 2: Fallback - prendi tutti i grafici con chapter_id='CH7_CHARTS'
-            if len(charts_to_process) == 0:
-                print(f"📊 Strategia 2: Fallback - cercando tutti i grafici con chapter_id='CH7_CHARTS'")
-                for chart_id, chart in charts_dict.items():
-                    chart_chapter_id = chart.get('chapter_id', '')
-                    print(f"   🔍 Grafico {chart_id}: chapter_id='{chart_chapter_id}'")
-                    if chart_chapter_id == 'CH7_CHARTS':
-                        charts_to_process.append((chart_id, chart))
-                        print(f"   ✅ Aggiunto grafico {chart_id} al processamento")
-            
-            print(f"📊 Totale grafici da processare: {len(charts_to_process)}")
-            
-            # Processa tutti i grafici trovati
-            for chart_id, chart in charts_to_process:
-                print(f"📈 Processando grafico: {chart_id} - {chart.get('titolo', 'N/A')}")
+
+    chapter_id = chapter.get('id', '')
+    titolo_ch = chapter.get('titolo', '')
+    contenuto = chapter.get('contenuto_markdown', '')
+    chart_ids = chapter.get('chart_ids', [])
+    # Assicurati che chart_ids sia una lista
+    if not isinstance(chart_ids, list):
+        logger.warning("⚠️  chart_ids non è una lista per capitolo %s: %r", chapter_id, chart_ids)
+        chart_ids = []
+
+    logger.debug("📖 Capitolo %d: %s", idx + 1, chapter_id, titolo=titolo_ch, chart_ids=chart_ids)
+
+    if titolo_ch:
+        story.append(Paragraph(titolo_ch, styles['CustomHeading1']))
+        story.append(Spacer(1, 0.3*cm))
+
+    # Aggiungi tabelle riassuntive per capitoli specifici
+    if chapter_id == "CH3_BUSINESS_MODEL":
+        business_model = data.get("business_model", {})
+        pricing = business_model.get("pricing", {})
+
+        if pricing.get("piani"):
+            story.append(Paragraph("<b>Piani di Pricing:</b>", styles['Heading3']))
+            story.append(Spacer(1, 0.2*cm))
+
+            pricing_table_data = [["Piano", "Prezzo", "Periodicità"]]
+            for piano in pricing["piani"]:
+                prezzo_eur = piano.get('prezzo_eur', 0)
                 try:
-                    chart_img = create_chart_image(chart, width=15*cm, height=10*cm)
-                    
-                    if chart_img:
-                        print(f"   ✅ Immagine grafico generata per {chart_id}")
+                    prezzo = f"{float(prezzo_eur):,.0f} €"
+                except:
+                    prezzo = str(prezzo_eur)
+                periodicita = piano.get("periodicita", "").replace("_", " ").title()
+                pricing_table_data.append([
+                    piano.get("nome", ""),
+                    prezzo,
+                    periodicita
+                ])
+
+            if len(pricing_table_data) > 1:
+                pricing_table = Table(pricing_table_data, colWidths=[6*cm, 4*cm, 4*cm])
+                pricing_table.setStyle(pdf_styles.PRICING_TABLE)
+                story.append(pricing_table)
+                logger.debug("✅ Tabella Pricing aggiunta al PDF")
+                story.append(Spacer(1, 0.3*cm))
+
+        # Unit Economics
+        unit_econ = business_model.get("unit_economics", {})
+        if unit_econ:
+            story.append(Paragraph("<b>Unit Economics:</b>", styles['Heading3']))
+            story.append(Spacer(1, 0.2*cm))
+
+            ue_data = []
+            if unit_econ.get("cac_eur"):
+                ue_data.append(["CAC (Customer Acquisition Cost)", f"{unit_econ.get('cac_eur', 0):,.0f} €"])
+            if unit_econ.get("ltv_eur"):
+                ue_data.append(["LTV (Lifetime Value)", f"{unit_econ.get('ltv_eur', 0):,.0f} €"])
+            if unit_econ.get("margine_lordo_percent"):
+                ue_data.append(["Margine Lordo", f"{unit_econ.get('margine_lordo_percent', 0):.1f}%"])
+            if unit_econ.get("payback_mesi"):
+                ue_data.append(["Payback Period", f"{unit_econ.get('payback_mesi', 0):.1f} mesi"])
+
+            if ue_data:
+                ue_table = Table(ue_data, colWidths=[10*cm, 6*cm])
+                ue_table.setStyle(pdf_styles.UNIT_ECONOMICS_TABLE)
+                story.append(ue_table)
+                logger.debug("✅ Tabella Unit Economics aggiunta al PDF")
+                story.append(Spacer(1, 0.3*cm))
+
+    elif chapter_id == "CH2_MARKET":
+        market = data.get("market", {})
+        tam_sam_som = market.get("tam_sam_som", {})
+
+        if tam_sam_som:
+            story.append(Paragraph("<b>Dimensioni del Mercato:</b>", styles['Heading3']))
+            story.append(Spacer(1, 0.2*cm))
+
+            market_data = []
+            if tam_sam_som.get("tam_eur_annuo"):
+                market_data.append(["TAM (Total Addressable Market)", f"{tam_sam_som.get('tam_eur_annuo', 0):,.0f} €"])
+            if tam_sam_som.get("sam_eur_annuo"):
+                market_data.append(["SAM (Serviceable Addressable Market)", f"{tam_sam_som.get('sam_eur_annuo', 0):,.0f} €"])
+            if tam_sam_som.get("som_eur_annuo"):
+                market_data.append(["SOM (Serviceable Obtainable Market)", f"{tam_sam_som.get('som_eur_annuo', 0):,.0f} €"])
+
+            if market_data:
+                market_table = Table(market_data, colWidths=[10*cm, 6*cm])
+                market_table.setStyle(pdf_styles.MARKET_SIZE_TABLE)
+                story.append(market_table)
+                logger.debug("✅ Tabella Market aggiunta al PDF")
+                story.append(Spacer(1, 0.3*cm))
+
+    elif chapter_id == "CH6_RISKS_ROADMAP":
+        risks = data.get("risks", [])
+        if risks:
+            story.append(Paragraph("<b>Rischi Principali:</b>", styles['Heading3']))
+            story.append(Spacer(1, 0.2*cm))
+
+            risks_data = [["Categoria", "Probabilità", "Impatto"]]
+            for risk in risks[:5]:  # Mostra i primi 5 rischi
+                risks_data.append([
+                    risk.get("categoria", "").replace("_", " ").title(),
+                    risk.get("probabilita", "").title(),
+                    risk.get("impatto", "").title()
+                ])
+
+            if len(risks_data) > 1:
+                risks_table = Table(risks_data, colWidths=[6*cm, 4*cm, 4*cm])
+                risks_table.setStyle(pdf_styles.RISKS_TABLE)
+                story.append(risks_table)
+                logger.debug("✅ Tabella Risks aggiunta al PDF")
+                story.append(Spacer(1, 0.3*cm))
+
+    # Aggiungi il contenuto del capitolo PRIMA dei grafici
+    if contenuto:
+        story.extend(markdown_to_paragraphs(contenuto, styles))
+
+    # Aggiungi i grafici referenziati DOPO il contenuto
+    # IMPORTANTE: I grafici devono essere mostrati SOLO nel capitolo CH7_CHARTS
+    charts_added_count = 0
+
+    # Processa i grafici SOLO per il capitolo CH7_CHARTS
+    if chapter_id == "CH7_CHARTS":
+        logger.debug("📊 Capitolo CH7_CHARTS", chart_ids=chart_ids, disponibili=len(charts_dict))
+        story.append(Spacer(1, 0.5*cm))
+
+        # Strategia 1: Usa chart_ids se presenti e non vuoti
+        charts_to_process = []
+        if chart_ids and len(chart_ids) > 0:
+            for chart_id in chart_ids:
+                if chart_id in charts_dict:
+                    charts_to_process.append((chart_id, charts_dict[chart_id]))
+                else:
+                    logger.warning("⚠️  Grafico %s non trovato in charts_dict", chart_id)
+
+        # Strategia 2: Fallback - prendi tutti i grafici con chapter_id='CH7_CHARTS'
+        if len(charts_to_process) == 0:
+            logger.debug("📊 Fallback: grafici con chapter_id='CH7_CHARTS'")
+            for chart_id, chart in charts_dict.items():
+                if chart.get('chapter_id', '') == 'CH7_CHARTS':
+                    charts_to_process.append((chart_id, chart))
+
+        # Processa tutti i grafici trovati
+        for chart_id, chart in charts_to_process:
+            try:
+                chart_img = get_chart_image(chart, chart_images, profile=profile)
+
+                if chart_img:
+                    try:
+                        # Verifica che il buffer sia valido
+                        if hasattr(chart_img, 'read'):
+                            if chart_img.getbuffer().nbytes == 0:
+                                logger.warning("⚠️  Immagine vuota per %s", chart_id)
+                                continue
+                            chart_img.seek(0)  # Reset per Image()
+
+                        # Crea l'immagine con dimensioni appropriate
                         try:
-                            # Verifica che il buffer sia valido
-                            if hasattr(chart_img, 'read'):
-                                chart_img.seek(0)
-                                img_data = chart_img.read()
-                                print(f"   📏 Dimensione immagine: {len(img_data)} bytes")
-                                if len(img_data) == 0:
-                                    print(f"   ⚠️  Immagine vuota per {chart_id}")
-                                    continue
-                                chart_img.seek(0)  # Reset per Image()
-                            
-                            # Crea l'immagine con dimensioni appropriate
-                            chart_img.seek(0)
-                            try:
-                                img = Image(chart_img, width=15*cm, height=10*cm)
-                                print(f"   ✅ Immagine ReportLab creata per {chart_id}")
-                                story.append(Spacer(1, 0.3*cm))
-                                story.append(img)
-                                print(f"   ✅ Immagine aggiunta alla story per {chart_id}")
-                                story.append(Spacer(1, 0.2*cm))
-                                charts_added_count += 1
-                                print(f"   ✅✅✅ Grafico {chart_id} AGGIUNTO AL PDF (totale: {charts_added_count}) ✅✅✅")
-                            except Exception as img_error:
-                                print(f"   ❌❌❌ ERRORE nella creazione dell'immagine ReportLab per {chart_id}: {str(img_error)}")
-                                import traceback
-                                print(traceback.format_exc())
-                                raise  # Rilancia l'errore per vedere cosa succede
-                            
-                            # Aggiungi caption se presente
-                            caption = chart.get('caption', '')
-                            if caption:
-                                if isinstance(caption, bytes):
-                                    caption = caption.decode('utf-8', errors='replace')
-                                caption_clean = escape_for_pdf(caption)
-                                story.append(Paragraph(f"<i>{caption_clean}</i>", styles['Normal']))
-                                story.append(Spacer(1, 0.3*cm))
-                        except Exception as img_error:
-                            print(f"   ❌❌❌ ERRORE CRITICO nell'aggiungere immagine al PDF per {chart_id}: {str(img_error)}")
-                            import traceback
-                            print("=" * 80)
-                            print("TRACEBACK COMPLETO:")
-                            print(traceback.format_exc())
-                            print("=" * 80)
-                            continue
-                    else:
-                        print(f"   ⚠️⚠️⚠️  Grafico {chart_id} NON GENERATO (create_chart_image ha restituito None)")
-                        print(f"   📊 Dettagli grafico: tipo={chart.get('tipo')}, serie={len(chart.get('series', []))}")
-                        # Log dettagliato delle serie
-                        for idx, serie in enumerate(chart.get('series', [])):
+                            img = chart_flowable(chart, chart_img, profile=profile)
+                            story.append(Spacer(1, 0.3*cm))
+                            story.append(img)
+                            story.append(Spacer(1, 0.2*cm))
+                            charts_added_count += 1
+                            logger.debug("✅ Grafico %s aggiunto al PDF", chart_id, totale=charts_added_count)
+                        except Exception:
+                            logger.exception("❌ Errore nella creazione dell'immagine ReportLab per %s", chart_id)
+                            raise  # Rilancia l'errore per vedere cosa succede
+
+                        # Aggiungi caption se presente
+                        caption = chart.get('caption', '')
+                        if caption:
+                            if isinstance(caption, bytes):
+                                caption = caption.decode('utf-8', errors='replace')
+                            caption_clean = escape_for_pdf(caption)
+                            story.append(Paragraph(f"<i>{caption_clean}</i>", styles['Normal']))
+                            story.append(Spacer(1, 0.3*cm))
+                    except Exception:
+                        logger.exception("❌ Errore nell'aggiungere immagine al PDF per %s", chart_id)
+                        continue
+                else:
+                    logger.warning("⚠️  Grafico %s non generato", chart_id,
+                                   tipo=chart.get('tipo'), serie=len(chart.get('series', [])))
+                    # Log dettagliato delle serie
+                    if debug:
+                        for serie_idx, serie in enumerate(chart.get('series', [])):
                             points = serie.get('points', [])
-                            print(f"      Serie {idx+1} '{serie.get('name', 'N/A')}': {len(points)} punti")
-                            if points:
-                                print(f"         Primo punto: x={points[0].get('x')}, y={points[0].get('y')}")
-                except Exception as e:
-                    print(f"   ❌❌❌ ERRORE GENERALE nel generare il grafico {chart_id}: {str(e)}")
-                    import traceback
-                    print("=" * 80)
-                    print("TRACEBACK COMPLETO:")
-                    print(traceback.format_exc())
-                    print("=" * 80)
-                    continue
-            
-            print(f"📊 ===== RIEPILOGO FINALE CAPITOLO CH7_CHARTS =====")
-            print(f"📊 Grafici processati: {len(charts_to_process)}")
-            print(f"📊 Grafici aggiunti al PDF: {charts_added_count}")
-            if charts_added_count == 0:
-                print(f"⚠️⚠️⚠️  ATTENZIONE: NESSUN GRAFICO AGGIUNTO AL PDF! ⚠️⚠️⚠️")
-            print(f"📊 =================================================")
+                            logger.debug("Serie %d '%s': %d punti", serie_idx + 1, serie.get('name', 'N/A'), len(points),
+                                         primo_punto=points[0] if points else None)
+            except Exception:
+                logger.exception("❌ Errore nel generare il grafico %s", chart_id)
+                continue
+
+        if charts_added_count == 0:
+            logger.warning("⚠️  Nessun grafico aggiunto al PDF", grafici=len(charts_to_process))
         else:
-            # Se non siamo nel capitolo CH7_CHARTS, verifica se ci sono grafici non processati
-            # Questo è un fallback di sicurezza
-            if chapter_id != "CH7_CHARTS" and len(charts_dict) > 0:
-                # Conta quanti grafici con chapter_id='CH7_CHARTS' ci sono
-                unprocessed_charts = [c for c in charts_dict.values() if c.get('chapter_id') == 'CH7_CHARTS']
-                if len(unprocessed_charts) > 0:
-                    print(f"⚠️  Attenzione: trovati {len(unprocessed_charts)} grafici con chapter_id='CH7_CHARTS' ma il capitolo CH7_CHARTS non è stato ancora processato")
-        
-        story.append(Spacer(1, 0.5*cm))
-        story.append(PageBreak())
-    
+            logger.debug("📊 Grafici aggiunti al PDF", processati=len(charts_to_process), aggiunti=charts_added_count)
+    elif debug and charts_dict:
+        # Se non siamo nel capitolo CH7_CHARTS, verifica se ci sono grafici non processati
+        unprocessed_charts = [c for c in charts_dict.values() if c.get('chapter_id') == 'CH7_CHARTS']
+        if unprocessed_charts:
+            logger.debug("Grafici con chapter_id='CH7_CHARTS' in attesa del capitolo CH7_CHARTS", grafici=len(unprocessed_charts))
+
+    story.append(Spacer(1, 0.5*cm))
+    story.append(PageBreak())
+    return story
+
+
+def _fallback_charts(business_plan_json: dict, ctx: dict) -> list:
+    """Grafici di CH7_CHARTS in coda al documento, se il capitolo CH7_CHARTS non esiste"""
+    styles = ctx["styles"]
+    chapters = ctx["chapters"]
+    charts_dict = ctx["charts_dict"]
+    chart_images = ctx["chart_images"]
+    profile = ctx["profile"]
+    story = []
+
     # Fallback finale: se non abbiamo processato nessun grafico ma ci sono grafici con chapter_id='CH7_CHARTS',
     # aggiungili alla fine (caso in cui il capitolo CH7_CHARTS non esiste o non è stato trovato)
     total_charts_processed = sum(1 for chapter in chapters if chapter.get('id') == 'CH7_CHARTS')
     if total_charts_processed == 0:
-        print(f"⚠️  ===== FALLBACK FINALE: Capitolo CH7_CHARTS non trovato nei chapters =====")
         unprocessed_charts = [(c['id'], c) for c in charts_dict.values() if c.get('chapter_id') == 'CH7_CHARTS']
         if len(unprocessed_charts) > 0:
-            print(f"📊 Trovati {len(unprocessed_charts)} grafici non processati, aggiungendo alla fine del documento")
+            logger.warning("⚠️  Capitolo CH7_CHARTS assente: grafici aggiunti alla fine del documento", grafici=len(unprocessed_charts))
             story.append(Paragraph("GRAFICI", styles['CustomHeading1']))
             story.append(Spacer(1, 0.5*cm))
             
             for chart_id, chart in unprocessed_charts:
-                print(f"📈 Processando grafico (fallback finale): {chart_id} - {chart.get('titolo', 'N/A')}")
                 try:
-                    chart_img = create_chart_image(chart, width=15*cm, height=10*cm)
+                    chart_img = get_chart_image(chart, chart_images, profile=profile)
                     if chart_img:
                         try:
-                            chart_img.seek(0)
-                            img = Image(chart_img, width=15*cm, height=10*cm)
+                            img = chart_flowable(chart, chart_img, profile=profile)
                             story.append(Spacer(1, 0.3*cm))
                             story.append(img)
                             story.append(Spacer(1, 0.2*cm))
@@ -1461,155 +591,289 @@ async def create_pdf_from_json(business_plan_json: dict) -> str:
                                 caption_clean = escape_for_pdf(caption)
                                 story.append(Paragraph(f"<i>{caption_clean}</i>", styles['Normal']))
                                 story.append(Spacer(1, 0.3*cm))
-                            print(f"✅ Grafico {chart_id} aggiunto (fallback finale)")
+                            logger.debug("✅ Grafico %s aggiunto (fallback finale)", chart_id)
                         except Exception as img_error:
-                            print(f"❌ Errore nell'aggiungere immagine al PDF per {chart_id} (fallback): {str(img_error)}")
+                            logger.error("❌ Errore nell'aggiungere immagine al PDF per %s (fallback): %s", chart_id, img_error)
                             continue
                 except Exception as e:
-                    print(f"❌ Errore nel generare il grafico {chart_id} (fallback): {str(e)}")
+                    logger.error("❌ Errore nel generare il grafico %s (fallback): %s", chart_id, e)
                     continue
             
             story.append(PageBreak())
-    
-    # Assunzioni e Dati Mancanti
-    assumptions = business_plan_json.get('assumptions', [])
-    if assumptions:
-        story.append(Paragraph("ASSUNZIONI", styles['CustomHeading1']))
-        story.append(Spacer(1, 0.3*cm))
-        for ass in assumptions:
-            ass_clean = ass.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-            story.append(Paragraph(f"• {ass_clean}", styles['Normal']))
-            story.append(Spacer(1, 0.2*cm))
-        story.append(Spacer(1, 0.5*cm))
-    
-    dati_mancanti = business_plan_json.get('dati_mancanti', [])
-    if dati_mancanti:
-        story.append(Paragraph("DATI MANCANTI", styles['CustomHeading1']))
-        story.append(Spacer(1, 0.3*cm))
-        for dato in dati_mancanti:
-            dato_clean = dato.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-            story.append(Paragraph(f"• {dato_clean}", styles['Normal']))
-            story.append(Spacer(1, 0.2*cm))
-        story.append(Spacer(1, 0.5*cm))
-    
-    # Disclaimer
-    disclaimer = business_plan_json.get('disclaimer', '')
-    if disclaimer:
-        story.append(PageBreak())
-        story.append(Paragraph("DISCLAIMER E NOTE LEGALI", styles['CustomHeading1']))
-        story.append(Spacer(1, 0.3*cm))
-        disclaimer_clean = disclaimer.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-        story.append(Paragraph(disclaimer_clean, styles['Normal']))
-        story.append(Spacer(1, 0.5*cm))
-        
-        # Note legali aggiuntive
-        note_legali = """
-        <b>Note Legali:</b><br/><br/>
-        Questo documento è stato generato automaticamente mediante intelligenza artificiale. 
-        Le informazioni contenute sono basate sui dati forniti dall'utente e su assunzioni 
-        esplicitate nel documento. Si raccomanda di:<br/><br/>
-        • Verificare tutti i dati finanziari e le proiezioni con un consulente fiscale o commercialista abilitato<br/>
-        • Verificare la conformità normativa con un consulente legale specializzato<br/>
-        • Validare le assunzioni di mercato con ricerche di mercato approfondite<br/>
-        • Aggiornare regolarmente il documento con dati reali man mano che diventano disponibili<br/><br/>
-        Il presente documento non costituisce consulenza finanziaria, legale o fiscale. 
-        L'utilizzo delle informazioni contenute è a proprio rischio e pericolo.
-        """
-        story.append(Paragraph(note_legali, styles['Normal']))
-    
-    # === PAGINA FINALE DI CHIUSURA ===
-    story.append(PageBreak())
-    
-    # Box colorato superiore (come copertina)
-    closing_header = Table([['']], colWidths=[A4[0] - 4*cm], rowHeights=[2*cm])
-    closing_header.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, -1), primary_color),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-    ]))
-    story.append(closing_header)
-    
-    story.append(Spacer(1, 3*cm))
-    
-    # Messaggio di chiusura
-    closing_title_style = ParagraphStyle(
-        name='ClosingTitle',
-        parent=styles['CoverTitle'],
-        fontName='Times-Bold',
-        fontSize=24,
-        textColor=primary_color,
-        spaceAfter=20,
-        alignment=TA_CENTER,
-        leading=30
+    return story
+
+
+def _bullet_list(title: str, items: list) -> list:
+    """Elenco puntato con titolo (assunzioni, dati mancanti)"""
+    styles = pdf_styles.STYLES
+    story = [Paragraph(title, styles['CustomHeading1']), Spacer(1, 0.3*cm)]
+    for item in items:
+        item_clean = item.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+        story.append(Paragraph(f"• {item_clean}", styles['Normal']))
+        story.append(Spacer(1, 0.2*cm))
+    story.append(Spacer(1, 0.5*cm))
+    return story
+
+
+def _disclaimer(business_plan_json: dict, ctx: dict) -> list:
+    """Disclaimer del documento"""
+    disclaimer_clean = business_plan_json['disclaimer'].replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+    return [
+        PageBreak(),
+        Paragraph("DISCLAIMER E NOTE LEGALI", ctx["styles"]['CustomHeading1']),
+        Spacer(1, 0.3*cm),
+        Paragraph(disclaimer_clean, ctx["styles"]['Normal']),
+        Spacer(1, 0.5*cm),
+    ]
+
+
+# Note legali aggiuntive, in coda al disclaimer
+LEGAL_NOTES = """
+<b>Note Legali:</b><br/><br/>
+Questo documento è stato generato automaticamente mediante intelligenza artificiale. 
+Le informazioni contenute sono basate sui dati forniti dall'utente e su assunzioni 
+esplicitate nel documento. Si raccomanda di:<br/><br/>
+• Verificare tutti i dati finanziari e le proiezioni con un consulente fiscale o commercialista abilitato<br/>
+• Verificare la conformità normativa con un consulente legale specializzato<br/>
+• Validare le assunzioni di mercato con ricerche di mercato approfondite<br/>
+• Aggiornare regolarmente il documento con dati reali man mano che diventano disponibili<br/><br/>
+Il presente documento non costituisce consulenza finanziaria, legale o fiscale. 
+L'utilizzo delle informazioni contenute è a proprio rischio e pericolo.
+"""
+
+CLOSING_MESSAGE = """
+Questo Business Plan è stato redatto con cura e attenzione ai dettagli.<br/><br/>
+Per ulteriori informazioni o chiarimenti, non esitate a contattarci.<br/><br/>
+<i>Documento generato con GetBusinessPlan</i>
+"""
+
+
+def _closing_info(business_plan_json: dict, ctx: dict) -> list:
+    rows = [
+        f"<b>Documento:</b> {escape_for_pdf(ctx['titolo'])}",
+        f"<b>Data generazione:</b> {escape_for_pdf(ctx['data_gen'])}",
+        f"<b>Versione:</b> {escape_for_pdf(ctx['versione'])}",
+    ]
+    if ctx["company_name"]:
+        rows.insert(0, f"<b>Azienda:</b> {escape_for_pdf(ctx['company_name'])}")
+    return rows
+
+
+# Sezioni del business plan, nell'ordine del documento
+COVER_SECTION = document_builder.section("cover", _cover)
+TOC_SECTION = document_builder.toc_section()
+EXECUTIVE_SUMMARY_SECTION = document_builder.section("executive_summary", _executive_summary, toc="Executive Summary",
+                                                     when=lambda bp, ctx: bp.get('executive_summary', {}))
+# Grafici di CH7 quando il capitolo non è nel documento
+FALLBACK_CHARTS_SECTION = document_builder.section(
+    "fallback_charts", _fallback_charts,
+    when=lambda bp, ctx: (not any(ch.get('id') == 'CH7_CHARTS' for ch in ctx["chapters"])
+                          and any(c.get('chapter_id') == 'CH7_CHARTS' for c in ctx["charts_dict"].values())))
+# Sezioni dopo i capitoli: un unico frammento nel rendering incrementale
+APPENDIX_SECTIONS = [
+    document_builder.section("assumptions", lambda bp, ctx: _bullet_list("ASSUNZIONI", bp['assumptions']),
+                             toc="Assunzioni", when=lambda bp, ctx: bp.get('assumptions', [])),
+    document_builder.section("dati_mancanti", lambda bp, ctx: _bullet_list("DATI MANCANTI", bp['dati_mancanti']),
+                             toc="Dati Mancanti", when=lambda bp, ctx: bp.get('dati_mancanti', [])),
+    document_builder.section("disclaimer", _disclaimer, toc="Disclaimer",
+                             when=lambda bp, ctx: bp.get('disclaimer', '')),
+    document_builder.section("legal_notes", lambda bp, ctx: [Paragraph(LEGAL_NOTES, ctx["styles"]['Normal'])],
+                             when=lambda bp, ctx: bp.get('disclaimer', ''), static=True),
+    document_builder.closing_section(CLOSING_MESSAGE),
+    document_builder.closing_info_section(_closing_info),
+]
+
+
+def _chapter_section(idx: int, chapter: dict) -> dict:
+    return document_builder.section(f"chapter-{idx}", lambda bp, ctx: _chapter(bp, ctx, idx, chapter),
+                                    toc=chapter.get('titolo') or None)
+
+
+def business_plan_sections(ctx: dict) -> list:
+    """Sezioni del business plan nell'ordine del documento, una per capitolo (ogni voce dell'indice
+    ha la sua sezione e quindi il suo numero di pagina esatto)"""
+    return [
+        COVER_SECTION, TOC_SECTION, EXECUTIVE_SUMMARY_SECTION,
+        *(_chapter_section(idx, chapter) for idx, chapter in enumerate(ctx["chapters"])),
+        FALLBACK_CHARTS_SECTION, *APPENDIX_SECTIONS,
+    ]
+
+
+def build_pdf_from_json(business_plan_json: dict, chart_images: Optional[dict] = None, profile: str = None) -> bytes:
+    """Crea il PDF professionale dal JSON, restituendo i byte del PDF
+    (chart_images: grafici pre-renderizzati; profile: profilo di output, vedi pdf_profiles)"""
+    pdf_layout = business_plan_json.get('pdf_layout', {})
+    ctx = _business_plan_context(business_plan_json, chart_images)
+    logger.info("📖 Composizione capitoli", capitoli=len(ctx["chapters"]), grafici=len(ctx["charts_dict"]))
+    pdf_bytes = document_builder.build_pdf(
+        "business-plan", business_plan_sections(ctx), business_plan_json, ctx,
+        profile=profile,
+        header=pdf_layout.get('header', {}),
+        footer=pdf_layout.get('footer', {}),
+        confidenzialita=ctx["confidenzialita"],
+        encoding='utf-8'
     )
-    story.append(Paragraph("Grazie per l'attenzione", closing_title_style))
-    
-    story.append(Spacer(1, 1.5*cm))
-    
-    # Messaggio professionale (senza <p>; ReportLab usa alignment sullo stile)
-    closing_message = """
-    Questo Business Plan è stato redatto con cura e attenzione ai dettagli.<br/><br/>
-    Per ulteriori informazioni o chiarimenti, non esitate a contattarci.<br/><br/>
-    <i>Documento generato con GetBusinessPlan</i>
-    """
-    closing_style = ParagraphStyle(
-        name='ClosingMessage',
-        parent=styles['Normal'],
-        fontName='Times-Roman',
-        fontSize=12,
-        textColor=colors.HexColor('#4b5563'),
-        alignment=TA_CENTER,
-        leading=18
+    logger.info("✓ PDF generato con successo", byte=len(pdf_bytes), profilo=pdf_profiles.resolve(profile))
+    return pdf_bytes
+
+
+async def render_preview_from_json(business_plan_json: dict, profile: str = None) -> bytes:
+    """Crea l'anteprima PDF in un worker del render pool (nessun grafico da pre-renderizzare)"""
+    return await render_pool.run(build_preview_from_json, business_plan_json, profile)
+
+
+def build_preview_from_json(business_plan_json: dict, profile: str = None) -> bytes:
+    """Anteprima del business plan: copertina, indice completo ed executive summary, con watermark"""
+    pdf_layout = business_plan_json.get('pdf_layout', {})
+    ctx = _business_plan_context(business_plan_json, None)
+    pdf_bytes = document_builder.build_preview(
+        "business-plan", business_plan_sections(ctx), business_plan_json, ctx,
+        profile=profile,
+        header=pdf_layout.get('header', {}),
+        footer=pdf_layout.get('footer', {}),
+        confidenzialita=ctx["confidenzialita"],
+        encoding='utf-8'
     )
-    story.append(Paragraph(closing_message, closing_style))
-    
-    story.append(Spacer(1, 2*cm))
-    
-    # Box informativo finale (Paragraph per rendere <b> correttamente)
-    final_info = [
-        [Paragraph(f"<b>Documento:</b> {escape_for_pdf(titolo)}", styles['Normal'])],
-        [Paragraph(f"<b>Data generazione:</b> {escape_for_pdf(data_gen)}", styles['Normal'])],
-        [Paragraph(f"<b>Versione:</b> {escape_for_pdf(versione)}", styles['Normal'])]
+    logger.info("✓ Anteprima PDF generata", byte=len(pdf_bytes), profilo=pdf_profiles.resolve(profile))
+    return pdf_bytes
+
+
+# === RENDERING INCREMENTALE ===
+# Copertina, executive summary, ogni capitolo e appendice sono frammenti PDF in cache per digest
+# del loro contenuto: modificando un capitolo si renderizza di nuovo solo quel capitolo.
+# Il documento finale unisce i frammenti, con l'indice ricalcolato sulle pagine reali.
+
+INCREMENTAL_RENDER = os.getenv("PDF_INCREMENTAL_RENDER", "true").strip().lower() == "true"
+FRAGMENT_DOCUMENT_TYPE = "business-plan-fragment"
+# Campi di `data` usati dalle tabelle riassuntive dei capitoli (vedi _chapter)
+CHAPTER_SUMMARY_DATA = {"CH2_MARKET": "market", "CH3_BUSINESS_MODEL": "business_model", "CH6_RISKS_ROADMAP": "risks"}
+# Passate massime dell'indice: se il numero di pagine oscilla tra N e N+1 si tiene l'ultimo rendering
+TOC_MAX_PASSES = 3
+
+def business_plan_fragments(business_plan_json: dict, ctx: dict) -> list:
+    """Frammenti presenti nel documento, in ordine (indice escluso): [(id, sezioni, dati da cui dipende il contenuto)]"""
+    data = business_plan_json.get('data', {})
+    fragments = [
+        ("cover", [COVER_SECTION], {
+            "sottotitolo": business_plan_json.get('pdf_layout', {}).get('sottotitolo', ''),
+            **{field: ctx[field] for field in ("titolo", "company_name", "data_gen", "versione", "confidenzialita")},
+        }),
+        ("executive_summary", [EXECUTIVE_SUMMARY_SECTION], business_plan_json.get('executive_summary', {})),
     ]
-    if company_name:
-        final_info.insert(0, [Paragraph(f"<b>Azienda:</b> {escape_for_pdf(company_name)}", styles['Normal'])])
-    
-    final_info_table = Table(final_info, colWidths=[12*cm])
-    final_info_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, -1), light_bg),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('LEFTPADDING', (0, 0), (-1, -1), 24),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 24),
-        ('TOPPADDING', (0, 0), (-1, -1), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-        ('BOX', (0, 0), (-1, -1), 0.5, colors.HexColor('#d1d5db')),
-        ('INNERGRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e5e7eb')),
-    ]))
-    story.append(final_info_table)
-    
-    story.append(Spacer(1, 4*cm))
-    
-    # Footer decorativo
-    footer_decor = Table([['']], colWidths=[A4[0] - 4*cm], rowHeights=[0.3*cm])
-    footer_decor.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, -1), accent_color),
-    ]))
-    story.append(footer_decor)
-    
-    # Genera il PDF
-    doc.build(story)
-    print(f"✓ PDF generato con successo: {output_path}")
-    
-    # Pulisci file PDF vecchi (mantieni solo gli ultimi 10)
-    try:
-        pdf_files = sorted(output_dir.glob("business-plan-*.pdf"), key=os.path.getmtime, reverse=True)
-        for old_pdf in pdf_files[10:]:  # Mantieni solo gli ultimi 10
-            try:
-                old_pdf.unlink()
-                print(f"🗑️  Rimosso PDF vecchio: {old_pdf.name}")
-            except Exception as e:
-                print(f"⚠️  Errore rimozione PDF vecchio {old_pdf.name}: {e}")
-    except Exception as e:
-        print(f"⚠️  Errore pulizia PDF vecchi: {e}")
-    
-    return str(output_path)
+    for idx, chapter in enumerate(ctx["chapters"]):
+        inputs = {"chapter": chapter, "data": data.get(CHAPTER_SUMMARY_DATA.get(chapter.get('id', '')))}
+        if chapter.get('id') == 'CH7_CHARTS':
+            inputs["charts"] = list(ctx["charts_dict"].values())
+        fragments.append((f"chapter-{idx}", [_chapter_section(idx, chapter)], inputs))
+    fragments.append(("fallback_charts", [FALLBACK_CHARTS_SECTION], {"charts": list(ctx["charts_dict"].values())}))
+    fragments.append(("appendix", APPENDIX_SECTIONS, {
+        **{field: business_plan_json.get(field) for field in ("assumptions", "dati_mancanti", "disclaimer")},
+        **{field: ctx[field] for field in ("titolo", "company_name", "data_gen", "versione")},
+    }))
+    return [
+        fragment for fragment in fragments
+        if any(document_builder.section_present(spec, business_plan_json, ctx) for spec in fragment[1])
+    ]
+
+
+def _fragment_document(fragment_id: str, inputs: dict, chart_images: Optional[dict]) -> tuple:
+    """(documento, contesto, sezioni) di un frammento ricostruiti dai soli dati da cui dipende
+    (gli inputs di business_plan_fragments, gli stessi del digest della cache)"""
+    ctx = {
+        "titolo": inputs.get("titolo", ""),
+        "company_name": inputs.get("company_name", ""),
+        "data_gen": inputs.get("data_gen", ""),
+        "versione": inputs.get("versione", ""),
+        "confidenzialita": inputs.get("confidenzialita", "pubblico"),
+        "chapters": [],
+        "charts_dict": {chart["id"]: chart for chart in inputs.get("charts", [])},
+        "chart_images": chart_images,
+        "debug": logger.isEnabledFor(logging.DEBUG),
+    }
+    if fragment_id == "cover":
+        return {"pdf_layout": {"sottotitolo": inputs["sottotitolo"]}}, ctx, [COVER_SECTION]
+    if fragment_id == "executive_summary":
+        return {"executive_summary": inputs}, ctx, [EXECUTIVE_SUMMARY_SECTION]
+    if fragment_id == "fallback_charts":
+        return {}, ctx, [FALLBACK_CHARTS_SECTION]
+    if fragment_id == "appendix":
+        return {field: inputs[field] for field in ("assumptions", "dati_mancanti", "disclaimer")}, ctx, APPENDIX_SECTIONS
+
+    chapter = inputs["chapter"]
+    summary_field = CHAPTER_SUMMARY_DATA.get(chapter.get('id', ''))
+    document = {"data": {summary_field: inputs["data"]}} if summary_field and inputs["data"] is not None else {}
+    ctx["chapters"] = [chapter]
+    return document, ctx, [_chapter_section(int(fragment_id.rsplit("-", 1)[1]), chapter)]
+
+
+def build_fragment_from_inputs(fragment_id: str, inputs: dict, chart_images: Optional[dict] = None,
+                               profile: str = None) -> bytes:
+    """Renderizza un frammento del business plan dai suoi soli dati (eseguito nel render pool:
+    al worker non arriva l'intero documento)"""
+    document, ctx, sections = _fragment_document(fragment_id, inputs, chart_images)
+    return document_builder.build_fragment("business-plan", sections, document, ctx, profile=profile,
+                                           encoding='utf-8')
+
+
+def assemble_pdf_from_fragments(business_plan_json: dict, fragments: list, profile: str = None) -> bytes:
+    """Unisce i frammenti (byte PDF nell'ordine di business_plan_fragments) con indice, header e footer"""
+    ctx = _business_plan_context(business_plan_json, None)
+    plan = business_plan_fragments(business_plan_json, ctx)
+    layouts = [pdf_merge.fragment_layout(pdf) for pdf in fragments]
+
+    # L'indice segue la copertina: se occupa più pagine del previsto si ricalcola con l'offset corretto
+    toc_pages = 1
+    for _ in range(TOC_MAX_PASSES):
+        entries = []
+        page = layouts[0][0] + toc_pages + 1
+        for (_, sections, _), (page_count, marks) in zip(plan[1:], layouts[1:]):
+            for spec in sections:
+                for title in document_builder.toc_titles(spec, business_plan_json, ctx):
+                    entries.append((title, page + marks.get(spec["id"], 0)))
+            page += page_count
+        toc_pdf = document_builder.build_fragment("business-plan", [TOC_SECTION], business_plan_json,
+                                                  {**ctx, "toc": entries}, profile=profile, encoding='utf-8')
+        rendered_pages = pdf_merge.fragment_layout(toc_pdf)[0]
+        if rendered_pages == toc_pages:
+            break
+        toc_pages = rendered_pages
+    else:
+        logger.warning("⚠️  Numero di pagine dell'indice instabile: tenuto l'ultimo rendering",
+                       passate=TOC_MAX_PASSES, pagine=toc_pages)
+
+    pdf_layout = business_plan_json.get('pdf_layout', {})
+    pdf_bytes = pdf_merge.merge(
+        [fragments[0], toc_pdf, *fragments[1:]],
+        header=pdf_layout.get('header', {}),
+        footer=pdf_layout.get('footer', {}),
+        confidenzialita=ctx["confidenzialita"],
+        profile=profile
+    )
+    logger.info("✓ PDF generato con successo (incrementale)", byte=len(pdf_bytes), profilo=pdf_profiles.resolve(profile))
+    return pdf_bytes
+
+
+async def render_pdf_incremental(business_plan_json: dict, profile: str = None) -> bytes:
+    """Come render_pdf_from_json, ma renderizza solo i frammenti non ancora in cache"""
+    ctx = _business_plan_context(business_plan_json, None)
+    plan = business_plan_fragments(business_plan_json, ctx)
+    profile_name = pdf_profiles.resolve(profile)
+    keys = [pdf_cache.cache_key(FRAGMENT_DOCUMENT_TYPE, json_digest(inputs), profile_name) for _, _, inputs in plan]
+    fragments = list(await asyncio.gather(*(asyncio.to_thread(pdf_cache.read, key) for key in keys)))
+
+    missing = [i for i, pdf in enumerate(fragments) if pdf is None]
+    if missing:
+        # Solo i grafici dei frammenti da renderizzare
+        charts = [chart for i in missing for chart in plan[i][2].get("charts", [])]
+        chart_images = await prerender_charts(charts, profile)
+        rendered = await asyncio.gather(*(
+            render_pool.run(build_fragment_from_inputs, plan[i][0], plan[i][2],
+                            chart_images if plan[i][2].get("charts") else None, profile)
+            for i in missing
+        ))
+        for i, pdf in zip(missing, rendered):
+            fragments[i] = pdf
+            await asyncio.to_thread(pdf_cache.put, keys[i], pdf)
+    logger.info("🧩 Frammenti PDF", totali=len(plan), renderizzati=len(missing),
+                da_cache=len(plan) - len(missing))
+    return await render_pool.run(assemble_pdf_from_fragments, business_plan_json, fragments, profile)
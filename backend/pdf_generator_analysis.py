@@ -1,557 +1,374 @@
-import json
-import re
-import io
+import asyncio
 from datetime import datetime
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import cm
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak, Table, TableStyle, Image, KeepTogether
-from reportlab.lib.enums import TA_JUSTIFY, TA_CENTER, TA_LEFT
-from pathlib import Path
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-from pdf_generator import markdown_to_paragraphs, create_chart_image, create_numbered_canvas, escape_for_pdf
-
-async def create_pdf_from_market_analysis(market_analysis_json: dict) -> str:
-    """Crea il PDF professionale dall'analisi di mercato"""
-    
-    # Crea directory output se non esiste
-    output_dir = Path(__file__).parent / "output"
-    output_dir.mkdir(exist_ok=True)
-    
-    output_path = output_dir / "analisi-mercato.pdf"
-    
-    # Estrai informazioni per header/footer
-    header_info = {'left': '', 'right': ''}
-    footer_info = {'left': '', 'center': 'Analisi di Mercato', 'right': ''}
-    confidenzialita = 'pubblico'
-    
-    # Crea il documento PDF
-    doc = SimpleDocTemplate(
-        str(output_path),
-        pagesize=A4,
-        rightMargin=2*cm,
-        leftMargin=2*cm,
-        topMargin=3*cm,
-        bottomMargin=2.5*cm
-    )
-    
-    # Crea le funzioni callback per header/footer
-    on_first_page, on_later_pages = create_numbered_canvas(
-        header_info.get('left', ''),
-        header_info.get('right', ''),
-        footer_info.get('left', ''),
-        footer_info.get('center', ''),
-        footer_info.get('right', ''),
-        confidenzialita
-    )
-    
-    # Assegna i callback
-    doc.onFirstPage = on_first_page
-    doc.onLaterPages = on_later_pages
-    
-    # Stili con font professionali (Times New Roman)
-    styles = getSampleStyleSheet()
-    
-    # Stili personalizzati
-    styles.add(ParagraphStyle(
-        name='CoverTitle',
-        parent=styles['Heading1'],
-        fontName='Times-Bold',
-        fontSize=28,
-        textColor=colors.HexColor('#000000'),
-        spaceAfter=20,
-        alignment=TA_CENTER,
-        leading=34
-    ))
-    
-    styles.add(ParagraphStyle(
-        name='CoverSubtitle',
-        parent=styles['Heading2'],
-        fontName='Times-Roman',
-        fontSize=16,
-        textColor=colors.HexColor('#333333'),
-        spaceAfter=30,
-        alignment=TA_CENTER,
-        leading=20
-    ))
-    
-    styles.add(ParagraphStyle(
-        name='CustomTitle',
-        parent=styles['Heading1'],
-        fontName='Times-Bold',
-        fontSize=24,
-        textColor=colors.HexColor('#000000'),
-        spaceAfter=30,
-        alignment=TA_CENTER
-    ))
-    
-    styles.add(ParagraphStyle(
-        name='CustomHeading1',
-        parent=styles['Heading1'],
-        fontName='Times-Bold',
-        fontSize=18,
-        textColor=colors.HexColor('#000000'),
-        spaceAfter=12,
-        spaceBefore=16,
-        leading=22
-    ))
-    
-    styles.add(ParagraphStyle(
-        name='CustomHeading2',
-        parent=styles['Heading2'],
-        fontName='Times-Bold',
-        fontSize=14,
-        textColor=colors.HexColor('#1a1a1a'),
-        spaceAfter=8,
-        spaceBefore=12,
-        leading=18
-    ))
-    
-    # Modifica lo stile Normal esistente invece di aggiungerne uno nuovo
-    styles['Normal'].fontName = 'Times-Roman'
-    styles['Normal'].fontSize = 11
-    styles['Normal'].textColor = colors.HexColor('#000000')
-    styles['Normal'].leading = 14
-    styles['Normal'].alignment = TA_JUSTIFY
-    
-    # Story (contenuto del PDF)
-    story = []
-    
-    # === COPERTINA PROFESSIONALE COLORATA ===
+from reportlab.platypus import Paragraph, Spacer, PageBreak, Table
+from typing import Optional
+from pdf_generator import markdown_to_paragraphs, get_chart_image, chart_flowable, prerender_charts, escape_for_pdf
+import document_builder
+import render_pool
+import pdf_cache
+import pdf_profiles
+import pdf_styles
+from app_logging import get_logger
+
+logger = get_logger(__name__)
+
+async def render_pdf_from_market_analysis(market_analysis_json: dict, profile: str = None) -> bytes:
+    """Crea il PDF analisi di mercato in memoria in un worker del render pool senza bloccare l'event loop"""
+    # Prima tutti i grafici in parallelo, poi la composizione del documento
+    chart_images = await prerender_charts(market_analysis_json.get('charts', []), profile)
+    return await render_pool.run(build_pdf_from_market_analysis, market_analysis_json, chart_images, profile)
+
+
+async def create_pdf_from_market_analysis(market_analysis_json: dict, content_hash: str = None, profile: str = None) -> str:
+    """Crea il PDF analisi di mercato e lo salva nella cache dei PDF (content_hash: digest già noto del documento, evita di ricalcolarlo)"""
+    pdf_bytes = await render_pdf_from_market_analysis(market_analysis_json, profile)
+    return await asyncio.to_thread(pdf_cache.save_document, "market-analysis", market_analysis_json, pdf_bytes, content_hash, profile)
+
+
+def _market_analysis_context(market_analysis_json: dict, chart_images: Optional[dict]) -> dict:
+    """Valori condivisi dalle sezioni dell'analisi: titolo, settore, area e data di generazione"""
     meta = market_analysis_json.get('meta', {})
-    titolo = f"Analisi di Mercato {meta.get('tipo_analisi', '').upper() if meta.get('tipo_analisi') == 'deep' else ''}"
-    settore = meta.get('settore', '')
-    area_geografica = meta.get('area_geografica', '')
-    # Data di generazione esatta con ora
-    if meta.get('data_generazione'):
-        data_gen = meta.get('data_generazione')
-    else:
-        data_gen = datetime.now().strftime('%d/%m/%Y alle %H:%M')
-    
-    # Colori professionali per la copertina (verde per analisi di mercato)
-    primary_color = colors.HexColor('#065f46')  # Verde scuro professionale
-    accent_color = colors.HexColor('#10b981')   # Verde medio
-    light_bg = colors.HexColor('#f0fdf4')       # Sfondo chiaro verde
-    
-    # Box colorato superiore
-    cover_header = Table([
-        ['']  # Spazio per il box colorato
-    ], colWidths=[A4[0] - 4*cm], rowHeights=[3*cm])
-    cover_header.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, -1), primary_color),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-    ]))
-    story.append(cover_header)
-    
-    # Spazio e contenuto principale
-    story.append(Spacer(1, 2*cm))
-    
-    # Titolo principale con stile elegante
-    title_style = ParagraphStyle(
-        name='CoverTitleColored',
-        parent=styles['CoverTitle'],
-        fontName='Times-Bold',
-        fontSize=32,
-        textColor=primary_color,
-        spaceAfter=15,
-        alignment=TA_CENTER,
-        leading=38
-    )
-    story.append(Paragraph(titolo, title_style))
-    
-    # Linea decorativa sotto il titolo
-    decor_line = Table([['']], colWidths=[8*cm], rowHeights=[0.2*cm])
-    decor_line.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, -1), accent_color),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-    ]))
-    story.append(decor_line)
-    
-    # Definisci lo stile del sottotitolo
-    subtitle_style = ParagraphStyle(
-        name='CoverSubtitleColored',
-        parent=styles['CoverSubtitle'],
-        fontName='Times-Roman',
-        fontSize=14,
-        textColor=colors.HexColor('#4b5563'),
-        spaceAfter=10,
-        alignment=TA_CENTER,
-        leading=18
-    )
-    
+    return {
+        "titolo": f"Analisi di Mercato {meta.get('tipo_analisi', '').upper() if meta.get('tipo_analisi') == 'deep' else ''}",
+        "settore": meta.get('settore', ''),
+        "area_geografica": meta.get('area_geografica', ''),
+        # Data di generazione esatta con ora (la stessa in copertina, firma e chiusura)
+        "data_gen": meta.get('data_generazione') or datetime.now().strftime('%d/%m/%Y alle %H:%M'),
+        "chart_images": chart_images,
+    }
+
+
+def _cover(market_analysis_json: dict, ctx: dict) -> list:
+    """Copertina colorata: titolo, settore, area geografica e box informativo"""
+    settore = ctx["settore"]
+    area_geografica = ctx["area_geografica"]
+    story = document_builder.cover_title(ctx["theme"], ctx["titolo"])
+
+    # Stile del sottotitolo (più righe consecutive)
+    subtitle_style = ctx["styles"]['CoverSubtitleCompact']
+
     if settore:
         story.append(Spacer(1, 0.8*cm))
         story.append(Paragraph(settore, subtitle_style))
-    
+
     if area_geografica:
         story.append(Spacer(1, 0.3*cm))
         story.append(Paragraph(f"Area Geografica: {area_geografica}", subtitle_style))
-    
+
     story.append(Spacer(1, 2.5*cm))
-    
-    # Box informativo con sfondo colorato (Paragraph per rendere <b> correttamente)
-    info_data = []
-    info_data.append([Paragraph(f"<b>Data:</b> {escape_for_pdf(data_gen)}", styles['Normal'])])
+
+    info_rows = [f"<b>Data:</b> {escape_for_pdf(ctx['data_gen'])}"]
     if settore:
-        info_data.append([Paragraph(f"<b>Settore:</b> {escape_for_pdf(settore)}", styles['Normal'])])
+        info_rows.append(f"<b>Settore:</b> {escape_for_pdf(settore)}")
     if area_geografica:
-        info_data.append([Paragraph(f"<b>Area:</b> {escape_for_pdf(area_geografica)}", styles['Normal'])])
-    
-    if info_data:
-        info_table = Table(info_data, colWidths=[12*cm])
-        info_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, -1), light_bg),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('LEFTPADDING', (0, 0), (-1, -1), 24),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 24),
-            ('TOPPADDING', (0, 0), (-1, -1), 14),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 14),
-            ('BOX', (0, 0), (-1, -1), 0.5, colors.HexColor('#d1d5db')),
-            ('INNERGRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e5e7eb')),
-        ]))
-        story.append(info_table)
-    
-    story.append(PageBreak())
-    
-    # === INDICE ===
-    story.append(Paragraph("INDICE", styles['CustomTitle']))
-    story.append(Spacer(1, 0.5*cm))
-    
-    toc_entries = []
-    page_num = 3
-    
-    exec_summary = market_analysis_json.get('executive_summary', {})
-    if exec_summary:
-        toc_entries.append(("Executive Summary", page_num))
-        page_num += 1
-    
-    if market_analysis_json.get('market_size'):
-        toc_entries.append(("Dimensioni del Mercato", page_num))
-        page_num += 1
-    
-    if market_analysis_json.get('competitor_analysis'):
-        toc_entries.append(("Analisi Competitor", page_num))
-        page_num += 1
-    
-    if market_analysis_json.get('trends_opportunities'):
-        toc_entries.append(("Trend e Opportunità", page_num))
-        page_num += 1
-    
-    if market_analysis_json.get('swot_analysis'):
-        toc_entries.append(("Analisi SWOT", page_num))
-        page_num += 1
-    
-    if market_analysis_json.get('positioning_strategy'):
-        toc_entries.append(("Strategia di Posizionamento", page_num))
-        page_num += 1
-    
-    if market_analysis_json.get('charts'):
-        toc_entries.append(("Grafici", page_num))
-        page_num += 1
-    
-    if market_analysis_json.get('sources'):
-        toc_entries.append(("Fonti", page_num))
-        page_num += 1
-    
-    if market_analysis_json.get('assumptions'):
-        toc_entries.append(("Assunzioni", page_num))
-    
-    # Aggiungi voci indice
-    for entry_title, entry_page in toc_entries:
-        toc_table = Table([[entry_title, str(entry_page)]], colWidths=[14*cm, 2*cm])
-        toc_table.setStyle(TableStyle([
-            ('FONTNAME', (0, 0), (-1, -1), 'Times-Roman'),
-            ('FONTSIZE', (0, 0), (-1, -1), 11),
-            ('ALIGN', (0, 0), (0, 0), 'LEFT'),
-            ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-            ('TOPPADDING', (0, 0), (-1, -1), 4),
-        ]))
-        story.append(toc_table)
-    
+        info_rows.append(f"<b>Area:</b> {escape_for_pdf(area_geografica)}")
+    story.append(document_builder.info_box(info_rows, ctx["theme"]["cover_info"]))
+
     story.append(PageBreak())
-    
-    # Executive Summary
-    exec_summary = market_analysis_json.get('executive_summary', {})
-    if exec_summary:
-        story.append(Paragraph("EXECUTIVE SUMMARY", styles['CustomHeading1']))
-        story.append(Spacer(1, 0.3*cm))
-        
-        sintesi = exec_summary.get('sintesi', '')
-        if sintesi:
-            sintesi_clean = sintesi.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-            story.append(Paragraph(sintesi_clean, styles['Normal']))
-            story.append(Spacer(1, 0.5*cm))
-        
-        punti_chiave = exec_summary.get('punti_chiave', [])
-        if punti_chiave:
-            story.append(Paragraph("<b>Punti Chiave:</b>", styles['Heading3']))
-            for punto in punti_chiave:
-                punto_clean = punto.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-                story.append(Paragraph(f"• {punto_clean}", styles['Normal']))
-            story.append(Spacer(1, 0.3*cm))
-        
-        raccomandazioni = exec_summary.get('raccomandazioni', [])
-        if raccomandazioni:
-            story.append(Paragraph("<b>Raccomandazioni Principali:</b>", styles['Heading3']))
-            for rec in raccomandazioni:
-                rec_clean = rec.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-                story.append(Paragraph(f"• {rec_clean}", styles['Normal']))
-        
+    return story
+
+
+def _executive_summary(market_analysis_json: dict, ctx: dict) -> list:
+    """Executive summary: sintesi, punti chiave e raccomandazioni"""
+    styles = ctx["styles"]
+    exec_summary = market_analysis_json['executive_summary']
+    story = document_builder.heading("EXECUTIVE SUMMARY")
+
+    sintesi = exec_summary.get('sintesi', '')
+    if sintesi:
+        sintesi_clean = sintesi.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+        story.append(Paragraph(sintesi_clean, styles['Normal']))
         story.append(Spacer(1, 0.5*cm))
-        story.append(PageBreak())
-    
-    # Market Size
-    market_size = market_analysis_json.get('market_size', {})
-    if market_size:
-        story.append(Paragraph("DIMENSIONI DEL MERCATO", styles['CustomHeading1']))
-        story.append(Spacer(1, 0.3*cm))
-        
-        # TAM
-        if market_size.get('tam'):
-            tam = market_size['tam']
-            story.append(Paragraph("<b>TAM (Total Addressable Market)</b>", styles['Heading3']))
-            valore = tam.get('valore', 0)
-            unita = tam.get('unita', 'EUR')
-            if unita == 'EUR':
-                valore_str = f"{valore:,.0f} €"
-            else:
-                valore_str = f"{valore:,.0f} {unita}"
-            story.append(Paragraph(f"Valore: {valore_str}", styles['Normal']))
-            if tam.get('fonte'):
-                story.append(Paragraph(f"Fonte: {tam.get('fonte')} ({tam.get('anno', 'N/A')})", styles['Normal']))
-            if tam.get('descrizione'):
-                story.extend(markdown_to_paragraphs(tam.get('descrizione', ''), styles))
-            story.append(Spacer(1, 0.3*cm))
-        
-        # SAM
-        if market_size.get('sam'):
-            sam = market_size['sam']
-            story.append(Paragraph("<b>SAM (Serviceable Addressable Market)</b>", styles['Heading3']))
-            valore = sam.get('valore', 0)
-            unita = sam.get('unita', 'EUR')
-            if unita == 'EUR':
-                valore_str = f"{valore:,.0f} €"
-            else:
-                valore_str = f"{valore:,.0f} {unita}"
-            story.append(Paragraph(f"Valore: {valore_str}", styles['Normal']))
-            if sam.get('fonte'):
-                story.append(Paragraph(f"Fonte: {sam.get('fonte')} ({sam.get('anno', 'N/A')})", styles['Normal']))
-            if sam.get('descrizione'):
-                story.extend(markdown_to_paragraphs(sam.get('descrizione', ''), styles))
-            story.append(Spacer(1, 0.3*cm))
-        
-        # SOM
-        if market_size.get('som'):
-            som = market_size['som']
-            story.append(Paragraph("<b>SOM (Serviceable Obtainable Market)</b>", styles['Heading3']))
-            valore = som.get('valore', 0)
-            unita = som.get('unita', 'EUR')
-            if unita == 'EUR':
-                valore_str = f"{valore:,.0f} €"
-            else:
-                valore_str = f"{valore:,.0f} {unita}"
-            story.append(Paragraph(f"Valore: {valore_str}", styles['Normal']))
-            if som.get('fonte'):
-                story.append(Paragraph(f"Fonte: {som.get('fonte')} ({som.get('anno', 'N/A')})", styles['Normal']))
-            if som.get('descrizione'):
-                story.extend(markdown_to_paragraphs(som.get('descrizione', ''), styles))
-            story.append(Spacer(1, 0.3*cm))
-        
-        story.append(PageBreak())
-    
-    # Competitor Analysis
-    competitor_analysis = market_analysis_json.get('competitor_analysis', {})
-    if competitor_analysis:
-        story.append(Paragraph("ANALISI COMPETITOR", styles['CustomHeading1']))
-        story.append(Spacer(1, 0.3*cm))
-        
-        competitor_principali = competitor_analysis.get('competitor_principali', [])
-        for competitor in competitor_principali:
-            story.append(Paragraph(f"<b>{competitor.get('nome', '')}</b> ({competitor.get('tipo', '')})", styles['Heading3']))
-            if competitor.get('fatturato_stimato'):
-                story.append(Paragraph(f"Fatturato stimato: {competitor.get('fatturato_stimato')}", styles['Normal']))
-            if competitor.get('quote_mercato'):
-                story.append(Paragraph(f"Quota di mercato: {competitor.get('quote_mercato')}", styles['Normal']))
-            if competitor.get('posizionamento'):
-                story.append(Paragraph(f"Posizionamento: {competitor.get('posizionamento')}", styles['Normal']))
-            
-            if competitor.get('punti_forza'):
-                story.append(Paragraph("<b>Punti di Forza:</b>", styles['Normal']))
-                for pf in competitor.get('punti_forza', []):
-                    story.append(Paragraph(f"• {pf}", styles['Normal']))
-            
-            if competitor.get('punti_debolezza'):
-                story.append(Paragraph("<b>Punti di Debolezza:</b>", styles['Normal']))
-                for pd in competitor.get('punti_debolezza', []):
-                    story.append(Paragraph(f"• {pd}", styles['Normal']))
-            
-            story.append(Spacer(1, 0.3*cm))
-        
-        story.append(PageBreak())
-    
-    # Trends & Opportunities
-    trends_opp = market_analysis_json.get('trends_opportunities', {})
-    if trends_opp:
-        story.append(Paragraph("TREND E OPPORTUNITÀ", styles['CustomHeading1']))
+
+    punti_chiave = exec_summary.get('punti_chiave', [])
+    if punti_chiave:
+        story.append(Paragraph("<b>Punti Chiave:</b>", styles['Heading3']))
+        for punto in punti_chiave:
+            punto_clean = punto.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+            story.append(Paragraph(f"• {punto_clean}", styles['Normal']))
         story.append(Spacer(1, 0.3*cm))
-        
-        trend_emergenti = trends_opp.get('trend_emergenti', [])
-        if trend_emergenti:
-            story.append(Paragraph("<b>Trend Emergenti:</b>", styles['Heading3']))
-            for trend in trend_emergenti:
-                story.append(Paragraph(f"<b>{trend.get('titolo', '')}</b> (Impatto: {trend.get('impatto', '')})", styles['Normal']))
-                if trend.get('descrizione'):
-                    story.extend(markdown_to_paragraphs(trend.get('descrizione', ''), styles))
-                if trend.get('fonte'):
-                    story.append(Paragraph(f"<i>Fonte: {trend.get('fonte')}</i>", styles['Normal']))
-                story.append(Spacer(1, 0.2*cm))
-        
-        opportunita = trends_opp.get('opportunita', [])
-        if opportunita:
-            story.append(Paragraph("<b>Opportunità di Mercato:</b>", styles['Heading3']))
-            for opp in opportunita:
-                story.append(Paragraph(f"<b>{opp.get('titolo', '')}</b> (Potenziale: {opp.get('potenziale', '')})", styles['Normal']))
-                if opp.get('descrizione'):
-                    story.extend(markdown_to_paragraphs(opp.get('descrizione', ''), styles))
-                story.append(Spacer(1, 0.2*cm))
-        
-        story.append(PageBreak())
-    
-    # SWOT Analysis
-    swot = market_analysis_json.get('swot_analysis', {})
-    if swot:
-        story.append(Paragraph("ANALISI SWOT", styles['CustomHeading1']))
+
+    raccomandazioni = exec_summary.get('raccomandazioni', [])
+    if raccomandazioni:
+        story.append(Paragraph("<b>Raccomandazioni Principali:</b>", styles['Heading3']))
+        for rec in raccomandazioni:
+            rec_clean = rec.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+            story.append(Paragraph(f"• {rec_clean}", styles['Normal']))
+
+    story.append(Spacer(1, 0.5*cm))
+    story.append(PageBreak())
+    return story
+
+
+def _market_size(market_analysis_json: dict, ctx: dict) -> list:
+    """Dimensioni del mercato: TAM, SAM e SOM"""
+    styles = ctx["styles"]
+    market_size = market_analysis_json['market_size']
+    story = document_builder.heading("DIMENSIONI DEL MERCATO")
+
+    # TAM
+    if market_size.get('tam'):
+        tam = market_size['tam']
+        story.append(Paragraph("<b>TAM (Total Addressable Market)</b>", styles['Heading3']))
+        valore = tam.get('valore', 0)
+        unita = tam.get('unita', 'EUR')
+        if unita == 'EUR':
+            valore_str = f"{valore:,.0f} €"
+        else:
+            valore_str = f"{valore:,.0f} {unita}"
+        story.append(Paragraph(f"Valore: {valore_str}", styles['Normal']))
+        if tam.get('fonte'):
+            story.append(Paragraph(f"Fonte: {tam.get('fonte')} ({tam.get('anno', 'N/A')})", styles['Normal']))
+        if tam.get('descrizione'):
+            story.extend(markdown_to_paragraphs(tam.get('descrizione', ''), styles))
         story.append(Spacer(1, 0.3*cm))
-        
-        # Strengths
-        if swot.get('strengths'):
-            story.append(Paragraph("<b>Punti di Forza:</b>", styles['Heading3']))
-            for s in swot.get('strengths', []):
-                story.append(Paragraph(f"<b>{s.get('titolo', '')}</b>", styles['Normal']))
-                if s.get('descrizione'):
-                    story.extend(markdown_to_paragraphs(s.get('descrizione', ''), styles))
-                story.append(Spacer(1, 0.2*cm))
-        
-        # Weaknesses
-        if swot.get('weaknesses'):
-            story.append(Paragraph("<b>Debolezze:</b>", styles['Heading3']))
-            for w in swot.get('weaknesses', []):
-                story.append(Paragraph(f"<b>{w.get('titolo', '')}</b> (Impatto: {w.get('impatto', '')})", styles['Normal']))
-                if w.get('descrizione'):
-                    story.extend(markdown_to_paragraphs(w.get('descrizione', ''), styles))
-                story.append(Spacer(1, 0.2*cm))
-        
-        # Opportunities
-        if swot.get('opportunities'):
-            story.append(Paragraph("<b>Opportunità:</b>", styles['Heading3']))
-            for o in swot.get('opportunities', []):
-                story.append(Paragraph(f"<b>{o.get('titolo', '')}</b> (Potenziale: {o.get('potenziale', '')})", styles['Normal']))
-                if o.get('descrizione'):
-                    story.extend(markdown_to_paragraphs(o.get('descrizione', ''), styles))
-                if o.get('fonte'):
-                    story.append(Paragraph(f"<i>Fonte: {o.get('fonte')}</i>", styles['Normal']))
-                story.append(Spacer(1, 0.2*cm))
-        
-        # Threats
-        if swot.get('threats'):
-            story.append(Paragraph("<b>Minacce:</b>", styles['Heading3']))
-            for t in swot.get('threats', []):
-                story.append(Paragraph(f"<b>{t.get('titolo', '')}</b> (Probabilità: {t.get('probabilita', '')}, Impatto: {t.get('impatto', '')})", styles['Normal']))
-                if t.get('descrizione'):
-                    story.extend(markdown_to_paragraphs(t.get('descrizione', ''), styles))
-                story.append(Spacer(1, 0.2*cm))
-        
-        story.append(PageBreak())
-    
-    # Positioning Strategy
-    positioning = market_analysis_json.get('positioning_strategy', {})
-    if positioning:
-        story.append(Paragraph("STRATEGIA DI POSIZIONAMENTO", styles['CustomHeading1']))
+
+    # SAM
+    if market_size.get('sam'):
+        sam = market_size['sam']
+        story.append(Paragraph("<b>SAM (Serviceable Addressable Market)</b>", styles['Heading3']))
+        valore = sam.get('valore', 0)
+        unita = sam.get('unita', 'EUR')
+        if unita == 'EUR':
+            valore_str = f"{valore:,.0f} €"
+        else:
+            valore_str = f"{valore:,.0f} {unita}"
+        story.append(Paragraph(f"Valore: {valore_str}", styles['Normal']))
+        if sam.get('fonte'):
+            story.append(Paragraph(f"Fonte: {sam.get('fonte')} ({sam.get('anno', 'N/A')})", styles['Normal']))
+        if sam.get('descrizione'):
+            story.extend(markdown_to_paragraphs(sam.get('descrizione', ''), styles))
         story.append(Spacer(1, 0.3*cm))
-        
-        if positioning.get('posizionamento_raccomandato'):
-            story.append(Paragraph("<b>Posizionamento Raccomandato:</b>", styles['Heading3']))
-            story.extend(markdown_to_paragraphs(positioning.get('posizionamento_raccomandato', ''), styles))
-        
-        nicchie = positioning.get('nicchie_mercato', [])
-        if nicchie:
-            story.append(Paragraph("<b>Nicchie di Mercato:</b>", styles['Heading3']))
-            for nicchia in nicchie:
-                story.append(Paragraph(f"<b>{nicchia.get('nicchia', '')}</b> (Potenziale: {nicchia.get('potenziale', '')})", styles['Normal']))
-                if nicchia.get('descrizione'):
-                    story.extend(markdown_to_paragraphs(nicchia.get('descrizione', ''), styles))
-                story.append(Spacer(1, 0.2*cm))
-        
-        story.append(PageBreak())
-    
-    # Charts
-    charts = market_analysis_json.get('charts', [])
-    if charts:
-        story.append(Paragraph("GRAFICI", styles['CustomHeading1']))
+
+    # SOM
+    if market_size.get('som'):
+        som = market_size['som']
+        story.append(Paragraph("<b>SOM (Serviceable Obtainable Market)</b>", styles['Heading3']))
+        valore = som.get('valore', 0)
+        unita = som.get('unita', 'EUR')
+        if unita == 'EUR':
+            valore_str = f"{valore:,.0f} €"
+        else:
+            valore_str = f"{valore:,.0f} {unita}"
+        story.append(Paragraph(f"Valore: {valore_str}", styles['Normal']))
+        if som.get('fonte'):
+            story.append(Paragraph(f"Fonte: {som.get('fonte')} ({som.get('anno', 'N/A')})", styles['Normal']))
+        if som.get('descrizione'):
+            story.extend(markdown_to_paragraphs(som.get('descrizione', ''), styles))
         story.append(Spacer(1, 0.3*cm))
-        
-        for chart in charts:
-            try:
-                chart_img = create_chart_image(chart, width=15*cm, height=10*cm)
-                img = Image(chart_img, width=15*cm, height=10*cm)
-                story.append(img)
-                story.append(Spacer(1, 0.3*cm))
-                
-                if chart.get('caption'):
-                    caption_clean = chart.get('caption', '').replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-                    story.append(Paragraph(f"<i>{caption_clean}</i>", styles['Normal']))
-                    story.append(Spacer(1, 0.3*cm))
-            except Exception as e:
-                print(f"⚠️  Errore nel generare il grafico {chart.get('id', 'unknown')}: {str(e)}")
-        
-        story.append(PageBreak())
-    
-    # Sources
-    sources = market_analysis_json.get('sources', [])
-    if sources:
-        story.append(Paragraph("FONTI", styles['CustomHeading1']))
+
+    story.append(PageBreak())
+    return story
+
+
+def _competitor_analysis(market_analysis_json: dict, ctx: dict) -> list:
+    """Schede dei competitor principali"""
+    styles = ctx["styles"]
+    competitor_analysis = market_analysis_json['competitor_analysis']
+    story = document_builder.heading("ANALISI COMPETITOR")
+
+    competitor_principali = competitor_analysis.get('competitor_principali', [])
+    for competitor in competitor_principali:
+        story.append(Paragraph(f"<b>{competitor.get('nome', '')}</b> ({competitor.get('tipo', '')})", styles['Heading3']))
+        if competitor.get('fatturato_stimato'):
+            story.append(Paragraph(f"Fatturato stimato: {competitor.get('fatturato_stimato')}", styles['Normal']))
+        if competitor.get('quote_mercato'):
+            story.append(Paragraph(f"Quota di mercato: {competitor.get('quote_mercato')}", styles['Normal']))
+        if competitor.get('posizionamento'):
+            story.append(Paragraph(f"Posizionamento: {competitor.get('posizionamento')}", styles['Normal']))
+
+        if competitor.get('punti_forza'):
+            story.append(Paragraph("<b>Punti di Forza:</b>", styles['Normal']))
+            for pf in competitor.get('punti_forza', []):
+                story.append(Paragraph(f"• {pf}", styles['Normal']))
+
+        if competitor.get('punti_debolezza'):
+            story.append(Paragraph("<b>Punti di Debolezza:</b>", styles['Normal']))
+            for pd in competitor.get('punti_debolezza', []):
+                story.append(Paragraph(f"• {pd}", styles['Normal']))
+
         story.append(Spacer(1, 0.3*cm))
-        
-        for source in sources:
-            source_text = f"<b>{source.get('titolo', '')}</b> ({source.get('tipo', '')})"
-            if source.get('data_accesso'):
-                source_text += f" - Accesso: {source.get('data_accesso')}"
-            story.append(Paragraph(source_text, styles['Normal']))
+
+    story.append(PageBreak())
+    return story
+
+
+def _trends_opportunities(market_analysis_json: dict, ctx: dict) -> list:
+    """Trend emergenti e opportunità di mercato"""
+    styles = ctx["styles"]
+    trends_opp = market_analysis_json['trends_opportunities']
+    story = document_builder.heading("TREND E OPPORTUNITÀ")
+
+    trend_emergenti = trends_opp.get('trend_emergenti', [])
+    if trend_emergenti:
+        story.append(Paragraph("<b>Trend Emergenti:</b>", styles['Heading3']))
+        for trend in trend_emergenti:
+            story.append(Paragraph(f"<b>{trend.get('titolo', '')}</b> (Impatto: {trend.get('impatto', '')})", styles['Normal']))
+            if trend.get('descrizione'):
+                story.extend(markdown_to_paragraphs(trend.get('descrizione', ''), styles))
+            if trend.get('fonte'):
+                story.append(Paragraph(f"<i>Fonte: {trend.get('fonte')}</i>", styles['Normal']))
             story.append(Spacer(1, 0.2*cm))
-    
-    # Assumptions
-    assumptions = market_analysis_json.get('assumptions', [])
-    if assumptions:
-        story.append(PageBreak())
-        story.append(Paragraph("ASSUNZIONI", styles['CustomHeading1']))
-        story.append(Spacer(1, 0.3*cm))
-        for ass in assumptions:
-            ass_clean = ass.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-            story.append(Paragraph(f"• {ass_clean}", styles['Normal']))
+
+    opportunita = trends_opp.get('opportunita', [])
+    if opportunita:
+        story.append(Paragraph("<b>Opportunità di Mercato:</b>", styles['Heading3']))
+        for opp in opportunita:
+            story.append(Paragraph(f"<b>{opp.get('titolo', '')}</b> (Potenziale: {opp.get('potenziale', '')})", styles['Normal']))
+            if opp.get('descrizione'):
+                story.extend(markdown_to_paragraphs(opp.get('descrizione', ''), styles))
+            story.append(Spacer(1, 0.2*cm))
+
+    story.append(PageBreak())
+    return story
+
+
+def _swot_analysis(market_analysis_json: dict, ctx: dict) -> list:
+    """Analisi SWOT"""
+    styles = ctx["styles"]
+    swot = market_analysis_json['swot_analysis']
+    story = document_builder.heading("ANALISI SWOT")
+
+    # Strengths
+    if swot.get('strengths'):
+        story.append(Paragraph("<b>Punti di Forza:</b>", styles['Heading3']))
+        for s in swot.get('strengths', []):
+            story.append(Paragraph(f"<b>{s.get('titolo', '')}</b>", styles['Normal']))
+            if s.get('descrizione'):
+                story.extend(markdown_to_paragraphs(s.get('descrizione', ''), styles))
+            story.append(Spacer(1, 0.2*cm))
+
+    # Weaknesses
+    if swot.get('weaknesses'):
+        story.append(Paragraph("<b>Debolezze:</b>", styles['Heading3']))
+        for w in swot.get('weaknesses', []):
+            story.append(Paragraph(f"<b>{w.get('titolo', '')}</b> (Impatto: {w.get('impatto', '')})", styles['Normal']))
+            if w.get('descrizione'):
+                story.extend(markdown_to_paragraphs(w.get('descrizione', ''), styles))
+            story.append(Spacer(1, 0.2*cm))
+
+    # Opportunities
+    if swot.get('opportunities'):
+        story.append(Paragraph("<b>Opportunità:</b>", styles['Heading3']))
+        for o in swot.get('opportunities', []):
+            story.append(Paragraph(f"<b>{o.get('titolo', '')}</b> (Potenziale: {o.get('potenziale', '')})", styles['Normal']))
+            if o.get('descrizione'):
+                story.extend(markdown_to_paragraphs(o.get('descrizione', ''), styles))
+            if o.get('fonte'):
+                story.append(Paragraph(f"<i>Fonte: {o.get('fonte')}</i>", styles['Normal']))
+            story.append(Spacer(1, 0.2*cm))
+
+    # Threats
+    if swot.get('threats'):
+        story.append(Paragraph("<b>Minacce:</b>", styles['Heading3']))
+        for t in swot.get('threats', []):
+            story.append(Paragraph(f"<b>{t.get('titolo', '')}</b> (Probabilità: {t.get('probabilita', '')}, Impatto: {t.get('impatto', '')})", styles['Normal']))
+            if t.get('descrizione'):
+                story.extend(markdown_to_paragraphs(t.get('descrizione', ''), styles))
+            story.append(Spacer(1, 0.2*cm))
+
+    story.append(PageBreak())
+    return story
+
+
+def _positioning_strategy(market_analysis_json: dict, ctx: dict) -> list:
+    """Posizionamento raccomandato e nicchie di mercato"""
+    styles = ctx["styles"]
+    positioning = market_analysis_json['positioning_strategy']
+    story = document_builder.heading("STRATEGIA DI POSIZIONAMENTO")
+
+    if positioning.get('posizionamento_raccomandato'):
+        story.append(Paragraph("<b>Posizionamento Raccomandato:</b>", styles['Heading3']))
+        story.extend(markdown_to_paragraphs(positioning.get('posizionamento_raccomandato', ''), styles))
+
+    nicchie = positioning.get('nicchie_mercato', [])
+    if nicchie:
+        story.append(Paragraph("<b>Nicchie di Mercato:</b>", styles['Heading3']))
+        for nicchia in nicchie:
+            story.append(Paragraph(f"<b>{nicchia.get('nicchia', '')}</b> (Potenziale: {nicchia.get('potenziale', '')})", styles['Normal']))
+            if nicchia.get('descrizione'):
+                story.extend(markdown_to_paragraphs(nicchia.get('descrizione', ''), styles))
             story.append(Spacer(1, 0.2*cm))
-    
-    # Pagina di firma/approvazione
+
     story.append(PageBreak())
-    story.append(Spacer(1, 2*cm))
-    story.append(Paragraph("APPROVAZIONE E FIRMA", styles['CustomHeading1']))
-    story.append(Spacer(1, 1*cm))
-    
-    # Usa la stessa data della copertina (già formattata con ora se disponibile)
-    if not meta.get('data_generazione'):
-        data_gen = datetime.now().strftime('%d/%m/%Y alle %H:%M')
+    return story
+
+
+def _charts(market_analysis_json: dict, ctx: dict) -> list:
+    """Grafici con didascalia"""
+    styles = ctx["styles"]
+    chart_images = ctx["chart_images"]
+    profile = ctx["profile"]
+    charts = market_analysis_json['charts']
+    story = document_builder.heading("GRAFICI")
+
+    for chart in charts:
+        try:
+            chart_img = get_chart_image(chart, chart_images, profile=profile)
+            img = chart_flowable(chart, chart_img, profile=profile)
+            story.append(img)
+            story.append(Spacer(1, 0.3*cm))
+
+            if chart.get('caption'):
+                caption_clean = chart.get('caption', '').replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+                story.append(Paragraph(f"<i>{caption_clean}</i>", styles['Normal']))
+                story.append(Spacer(1, 0.3*cm))
+        except Exception as e:
+            logger.warning("⚠️  Errore nel generare il grafico %s: %s", chart.get('id', 'unknown'), e)
+
+    story.append(PageBreak())
+    return story
+
+
+def _sources(market_analysis_json: dict, ctx: dict) -> list:
+    """Elenco delle fonti"""
+    styles = ctx["styles"]
+    sources = market_analysis_json['sources']
+    story = document_builder.heading("FONTI")
+
+    for source in sources:
+        source_text = f"<b>{source.get('titolo', '')}</b> ({source.get('tipo', '')})"
+        if source.get('data_accesso'):
+            source_text += f" - Accesso: {source.get('data_accesso')}"
+        story.append(Paragraph(source_text, styles['Normal']))
+        story.append(Spacer(1, 0.2*cm))
+    return story
+
+
+def _assumptions(market_analysis_json: dict, ctx: dict) -> list:
+    """Assunzioni dell'analisi"""
+    styles = ctx["styles"]
+    assumptions = market_analysis_json['assumptions']
+    story = []
+    story.append(PageBreak())
+    story.append(Paragraph("ASSUNZIONI", styles['CustomHeading1']))
+    story.append(Spacer(1, 0.3*cm))
+    for ass in assumptions:
+        ass_clean = ass.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+        story.append(Paragraph(f"• {ass_clean}", styles['Normal']))
+        story.append(Spacer(1, 0.2*cm))
+    return story
+
+
+def _signature(market_analysis_json: dict, ctx: dict) -> list:
+    """Pagina di firma/approvazione con la data del documento"""
+    styles = ctx["styles"]
     firma_text = f"""
-    Il presente documento di Analisi di Mercato è stato redatto in data {data_gen} e approvato da:
+    Il presente documento di Analisi di Mercato è stato redatto in data {ctx['data_gen']} e approvato da:
     """
-    story.append(Paragraph(firma_text, styles['Normal']))
-    story.append(Spacer(1, 2*cm))
-    
-    # Tabella firme
+    return [
+        PageBreak(),
+        Spacer(1, 2*cm),
+        Paragraph("APPROVAZIONE E FIRMA", styles['CustomHeading1']),
+        Spacer(1, 1*cm),
+        Paragraph(firma_text, styles['Normal']),
+        Spacer(1, 2*cm),
+    ]
+
+
+def _signature_table(market_analysis_json: dict, ctx: dict) -> list:
+    """Tabella firme (statica)"""
     firma_table = Table([
         ['Preparato da:', ''],
         ['', ''],
@@ -564,100 +381,79 @@ async def create_pdf_from_market_analysis(market_analysis_json: dict) -> str:
         ['', ''],
         ['Firma:', ''],
     ], colWidths=[8*cm, 8*cm])
-    firma_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (-1, -1), 'Times-Roman'),
-        ('FONTSIZE', (0, 0), (-1, -1), 11),
-        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-        ('VALIGN', (0, 0), (-1, -1), 'BOTTOM'),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#cccccc')),
-        ('LINEBELOW', (0, 2), (1, 2), 1, colors.black),
-        ('LINEBELOW', (0, 5), (1, 5), 1, colors.black),
-        ('LINEBELOW', (0, 9), (1, 9), 1, colors.black),
-    ]))
-    story.append(firma_table)
-    
-    # === PAGINA FINALE DI CHIUSURA ===
-    story.append(PageBreak())
-    
-    # Box colorato superiore (come copertina)
-    closing_header = Table([['']], colWidths=[A4[0] - 4*cm], rowHeights=[2*cm])
-    closing_header.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, -1), primary_color),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-    ]))
-    story.append(closing_header)
-    
-    story.append(Spacer(1, 3*cm))
-    
-    # Messaggio di chiusura
-    closing_title_style = ParagraphStyle(
-        name='ClosingTitle',
-        parent=styles['CoverTitle'],
-        fontName='Times-Bold',
-        fontSize=24,
-        textColor=primary_color,
-        spaceAfter=20,
-        alignment=TA_CENTER,
-        leading=30
+    firma_table.setStyle(pdf_styles.SIGNATURE_TABLE)
+    return [firma_table]
+
+
+CLOSING_MESSAGE = """
+Questa Analisi di Mercato è stata redatta con cura e attenzione ai dettagli.<br/><br/>
+Per ulteriori informazioni o chiarimenti, non esitate a contattarci.<br/><br/>
+<i>Documento generato con SeedWise</i>
+"""
+
+
+def _closing_info(market_analysis_json: dict, ctx: dict) -> list:
+    rows = [
+        f"<b>Documento:</b> {escape_for_pdf(ctx['titolo'])}",
+        f"<b>Data generazione:</b> {escape_for_pdf(ctx['data_gen'])}",
+    ]
+    if ctx["settore"]:
+        rows.append(f"<b>Settore:</b> {escape_for_pdf(ctx['settore'])}")
+    if ctx["area_geografica"]:
+        rows.append(f"<b>Area Geografica:</b> {escape_for_pdf(ctx['area_geografica'])}")
+    return rows
+
+
+def _content(section_id: str, build, title: str) -> dict:
+    """Sezione presente se la chiave omonima del JSON è valorizzata, con una voce nell'indice"""
+    return document_builder.section(section_id, build, toc=title, when=lambda ma, ctx: ma.get(section_id))
+
+
+# Sezioni dell'analisi di mercato, nell'ordine del documento
+MARKET_ANALYSIS_SECTIONS = [
+    document_builder.section("cover", _cover),
+    document_builder.toc_section(),
+    _content("executive_summary", _executive_summary, "Executive Summary"),
+    _content("market_size", _market_size, "Dimensioni del Mercato"),
+    _content("competitor_analysis", _competitor_analysis, "Analisi Competitor"),
+    _content("trends_opportunities", _trends_opportunities, "Trend e Opportunità"),
+    _content("swot_analysis", _swot_analysis, "Analisi SWOT"),
+    _content("positioning_strategy", _positioning_strategy, "Strategia di Posizionamento"),
+    _content("charts", _charts, "Grafici"),
+    _content("sources", _sources, "Fonti"),
+    _content("assumptions", _assumptions, "Assunzioni"),
+    document_builder.section("signature", _signature),
+    document_builder.section("signature_table", _signature_table, static=True),
+    document_builder.closing_section(CLOSING_MESSAGE),
+    document_builder.closing_info_section(_closing_info),
+]
+
+
+def build_pdf_from_market_analysis(market_analysis_json: dict, chart_images: Optional[dict] = None, profile: str = None) -> bytes:
+    """Crea il PDF professionale dall'analisi di mercato, restituendo i byte del PDF
+    (chart_images: grafici pre-renderizzati; profile: profilo di output, vedi pdf_profiles)"""
+    pdf_bytes = document_builder.build_pdf(
+        "market-analysis", MARKET_ANALYSIS_SECTIONS, market_analysis_json,
+        _market_analysis_context(market_analysis_json, chart_images),
+        profile=profile,
+        footer={'center': 'Analisi di Mercato'}
     )
-    story.append(Paragraph("Grazie per l'attenzione", closing_title_style))
-    
-    story.append(Spacer(1, 1.5*cm))
-    
-    # Messaggio professionale (senza <p>; ReportLab usa alignment sullo stile)
-    closing_message = """
-    Questa Analisi di Mercato è stata redatta con cura e attenzione ai dettagli.<br/><br/>
-    Per ulteriori informazioni o chiarimenti, non esitate a contattarci.<br/><br/>
-    <i>Documento generato con SeedWise</i>
-    """
-    closing_style = ParagraphStyle(
-        name='ClosingMessage',
-        parent=styles['Normal'],
-        fontName='Times-Roman',
-        fontSize=12,
-        textColor=colors.HexColor('#4b5563'),
-        alignment=TA_CENTER,
-        leading=18
+    logger.info("✓ PDF analisi di mercato generato con successo", byte=len(pdf_bytes), profilo=pdf_profiles.resolve(profile))
+    return pdf_bytes
+
+
+async def render_preview_from_market_analysis(market_analysis_json: dict, profile: str = None) -> bytes:
+    """Crea l'anteprima PDF dell'analisi in un worker del render pool (nessun grafico da pre-renderizzare)"""
+    return await render_pool.run(build_preview_from_market_analysis, market_analysis_json, profile)
+
+
+def build_preview_from_market_analysis(market_analysis_json: dict, profile: str = None) -> bytes:
+    """Anteprima dell'analisi di mercato: copertina, indice completo ed executive summary, con watermark"""
+    pdf_bytes = document_builder.build_preview(
+        "market-analysis", MARKET_ANALYSIS_SECTIONS, market_analysis_json,
+        _market_analysis_context(market_analysis_json, None),
+        profile=profile,
+        footer={'center': 'Analisi di Mercato'}
     )
-    story.append(Paragraph(closing_message, closing_style))
-    
-    story.append(Spacer(1, 2*cm))
-    
-    # Box informativo finale (Paragraph per rendere <b> correttamente)
-    final_info = [
-        [Paragraph(f"<b>Documento:</b> {escape_for_pdf(titolo)}", styles['Normal'])],
-        [Paragraph(f"<b>Data generazione:</b> {escape_for_pdf(data_gen)}", styles['Normal'])]
-    ]
-    if settore:
-        final_info.append([Paragraph(f"<b>Settore:</b> {escape_for_pdf(settore)}", styles['Normal'])])
-    if area_geografica:
-        final_info.append([Paragraph(f"<b>Area Geografica:</b> {escape_for_pdf(area_geografica)}", styles['Normal'])])
-    
-    final_info_table = Table(final_info, colWidths=[12*cm])
-    final_info_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, -1), light_bg),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('LEFTPADDING', (0, 0), (-1, -1), 24),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 24),
-        ('TOPPADDING', (0, 0), (-1, -1), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-        ('BOX', (0, 0), (-1, -1), 0.5, colors.HexColor('#d1d5db')),
-        ('INNERGRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e5e7eb')),
-    ]))
-    story.append(final_info_table)
-    
-    story.append(Spacer(1, 4*cm))
-    
-    # Footer decorativo
-    footer_decor = Table([['']], colWidths=[A4[0] - 4*cm], rowHeights=[0.3*cm])
-    footer_decor.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, -1), accent_color),
-    ]))
-    story.append(footer_decor)
-    
-    # Genera il PDF
-    doc.build(story)
-    print(f"✓ PDF analisi di mercato generato con successo: {output_path}")
-    
-    return str(output_path)
+    logger.info("✓ Anteprima PDF analisi di mercato generata", byte=len(pdf_bytes), profilo=pdf_profiles.resolve(profile))
+    return pdf_bytes
@@ -0,0 +1,82 @@
+from datetime import datetime
+from typing import Optional
+from reportlab.lib.units import cm
+from reportlab.platypus import Spacer, PageBreak
+import document_builder
+import pdf_merge
+import render_pool
+from app_logging import get_logger
+
+logger = get_logger(__name__)
+
+# Pacchetto PDF di più documenti acquistati: copertina e indice comuni, seguiti dai PDF già
+# renderizzati copiati così come sono (ogni documento mantiene la propria numerazione delle pagine).
+
+# Titoli dei documenti, nell'ordine in cui compaiono nel pacchetto
+BUNDLE_TITLES = {
+    "business-plan": "Business Plan",
+    "market-analysis": "Analisi di Mercato",
+    "validate-idea": "Validazione Idea di Business",
+}
+# Passate massime di copertina e indice: se il numero di pagine oscilla si tiene l'ultimo rendering
+FRONT_MAX_PASSES = 3
+
+
+def _cover(bundle_json: dict, ctx: dict) -> list:
+    """Copertina: titolo, data ed elenco dei documenti inclusi"""
+    story = document_builder.cover_title(ctx["theme"], "Pacchetto Documenti")
+    story.append(Spacer(1, 2.5*cm))
+    rows = [f"<b>Data:</b> {ctx['data_gen']}"]
+    rows += [f"<b>{i}.</b> {title}" for i, (title, _) in enumerate(ctx["toc"], 1)]
+    story.append(document_builder.info_box(rows, ctx["theme"]["cover_info"]))
+    story.append(PageBreak())
+    return story
+
+
+BUNDLE_SECTIONS = [
+    document_builder.section("cover", _cover),
+    document_builder.toc_section(),
+]
+
+
+def generation_date() -> str:
+    """Data in copertina; fa parte anche della chiave di cache del pacchetto"""
+    return datetime.now().strftime('%d/%m/%Y')
+
+
+async def render_pdf_bundle(parts: list, data_gen: Optional[str] = None) -> bytes:
+    """Crea il pacchetto in un worker del render pool senza bloccare l'event loop"""
+    return await render_pool.run(build_pdf_bundle, parts, data_gen)
+
+
+def build_pdf_bundle(parts: list, data_gen: Optional[str] = None) -> bytes:
+    """Unisce i PDF già renderizzati (parts: [(tipo documento, path del PDF)] in ordine) dietro a
+    copertina e indice comuni; solo le pagine iniziali passano da ReportLab.
+    data_gen: data in copertina (default: oggi)"""
+    titles = [BUNDLE_TITLES[document_type] for document_type, _ in parts]
+    page_counts = [pdf_merge.page_count(path) for _, path in parts]
+    ctx = {"data_gen": data_gen or generation_date()}
+
+    # Copertina e indice: se l'indice occupa più pagine del previsto si ricalcola con l'offset corretto
+    front_pages = 2
+    for _ in range(FRONT_MAX_PASSES):
+        entries = []
+        page = front_pages + 1
+        for title, count in zip(titles, page_counts):
+            entries.append((title, page))
+            page += count
+        front = document_builder.build_fragment("bundle", BUNDLE_SECTIONS, {}, {**ctx, "toc": entries})
+        rendered_pages = pdf_merge.page_count(front)
+        if rendered_pages == front_pages:
+            break
+        front_pages = rendered_pages
+    else:
+        logger.warning("⚠️  Numero di pagine di copertina e indice instabile: tenuto l'ultimo rendering",
+                       passate=FRONT_MAX_PASSES, pagine=front_pages)
+
+    pdf_bytes = pdf_merge.concatenate(
+        [front, *(path for _, path in parts)],
+        outline=[(title, page - 1) for title, page in entries]
+    )
+    logger.info("✓ Pacchetto PDF generato con successo", documenti=len(parts), pagine=page - 1, byte=len(pdf_bytes))
+    return pdf_bytes
@@ -0,0 +1,92 @@
+import io
+from typing import Optional
+
+from pypdf import PdfReader, PdfWriter
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+import pdf_profiles
+from document_builder import create_numbered_canvas
+
+# Unione di PDF già renderizzati, copiando le pagine a livello di oggetti (senza ReportLab):
+# - merge: frammenti del rendering incrementale (vedi document_builder.build_fragment); header,
+#   footer e numeri di pagina dipendono dalla posizione nel documento finale e si disegnano dopo
+#   l'unione su un overlay pagina per pagina
+# - concatenate: documenti completi (pacchetti di più acquisti), con un segnalibro per documento
+
+
+def fragment_layout(pdf_bytes: bytes) -> tuple:
+    """(numero di pagine, {id sezione: indice della pagina d'inizio nel frammento})"""
+    reader = _source(pdf_bytes)
+    marks = {}
+    for entry in reader.outline:
+        # Solo voci di primo livello: i frammenti registrano una voce per sezione
+        if not isinstance(entry, list):
+            marks[entry.title] = reader.get_destination_page_number(entry)
+    return len(reader.pages), marks
+
+
+def _decorations(page_count: int, header: dict, footer: dict, confidenzialita: str, profile: Optional[str]) -> bytes:
+    """PDF con solo header, footer e numerazione, una pagina per ogni pagina del documento"""
+    on_first_page, on_later_pages = create_numbered_canvas(
+        header.get('left', ''),
+        header.get('right', ''),
+        footer.get('left', ''),
+        footer.get('center', ''),
+        footer.get('right', ''),
+        confidenzialita
+    )
+    buffer = io.BytesIO()
+    overlay = canvas.Canvas(buffer, pagesize=A4, **pdf_profiles.doc_options(profile))
+    for page_index in range(page_count):
+        (on_first_page if page_index == 0 else on_later_pages)(overlay, None)
+        overlay.showPage()
+    overlay.save()
+    return buffer.getvalue()
+
+
+def _source(pdf) -> PdfReader:
+    """Reader da byte PDF o da path su disco"""
+    return PdfReader(io.BytesIO(pdf) if isinstance(pdf, bytes) else pdf)
+
+
+def _write(writer: PdfWriter) -> bytes:
+    # Font e risorse ripetuti nei PDF uniti vengono scritti una volta sola
+    writer.compress_identical_objects()
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def page_count(pdf) -> int:
+    """Numero di pagine di un PDF (byte o path)"""
+    return len(_source(pdf).pages)
+
+
+def concatenate(pdfs: list, outline: Optional[list] = None) -> bytes:
+    """Concatena PDF completi (byte o path, in ordine) senza modificarne le pagine.
+    outline: [(titolo, indice della pagina)] segnalibri del PDF risultante"""
+    writer = PdfWriter()
+    for pdf in pdfs:
+        writer.append(_source(pdf), import_outline=False)
+    for title, page_index in outline or []:
+        writer.add_outline_item(title, page_index)
+    return _write(writer)
+
+
+def merge(fragments: list, header: Optional[dict] = None, footer: Optional[dict] = None,
+          confidenzialita: str = 'pubblico', profile: str = None) -> bytes:
+    """Concatena i frammenti (byte PDF, in ordine) e aggiunge header/footer con la numerazione finale"""
+    writer = PdfWriter()
+    for pdf_bytes in fragments:
+        # Le voci di outline servono solo a localizzare le sezioni nel frammento
+        writer.append(_source(pdf_bytes), import_outline=False)
+
+    decorations = PdfReader(io.BytesIO(_decorations(len(writer.pages), header or {}, footer or {},
+                                                    confidenzialita, profile)))
+    compress = pdf_profiles.doc_options(profile)["pageCompression"]
+    for page, decoration in zip(writer.pages, decorations.pages):
+        page.merge_page(decoration)
+        if compress:
+            page.compress_content_streams()
+    return _write(writer)
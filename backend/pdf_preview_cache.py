@@ -0,0 +1,41 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from app_logging import get_logger
+
+logger = get_logger(__name__)
+
+# Anteprime PDF con watermark, richiedibili senza login: tenute in memoria con un limite proprio,
+# separate dalla cache su disco dei PDF a pagamento (pdf_cache) che non devono essere espulsi dalle anteprime.
+
+# Limite della cache in memoria (byte PDF); oltre si eliminano le anteprime usate meno di recente
+MAX_CACHE_BYTES = int(os.getenv("PDF_PREVIEW_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+
+_lock = threading.Lock()
+# key -> byte del PDF, dal meno al più recentemente usato
+_entries = OrderedDict()
+_total_bytes = 0
+
+
+def get(key: str) -> Optional[bytes]:
+    """Anteprima in cache o None"""
+    with _lock:
+        pdf_bytes = _entries.get(key)
+        if pdf_bytes is not None:
+            _entries.move_to_end(key)
+        return pdf_bytes
+
+
+def put(key: str, pdf_bytes: bytes):
+    """Salva un'anteprima renderizzata ed elimina le meno recenti oltre il limite"""
+    global _total_bytes
+    with _lock:
+        _total_bytes -= len(_entries.pop(key, b""))
+        _entries[key] = pdf_bytes
+        _total_bytes += len(pdf_bytes)
+        while _total_bytes > MAX_CACHE_BYTES and len(_entries) > 1:
+            old_key, old_bytes = _entries.popitem(last=False)
+            _total_bytes -= len(old_bytes)
+            logger.debug("Anteprima PDF rimossa dalla cache", key=old_key[:16], byte=len(old_bytes))
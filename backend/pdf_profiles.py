@@ -0,0 +1,57 @@
+import os
+from typing import Optional
+
+from reportlab import rl_config
+
+from app_logging import get_logger
+
+logger = get_logger(__name__)
+
+# Stream binari per tutti i profili: la codifica ASCII85 di default aumenta del 25% ogni stream compresso
+rl_config.useA85 = 0
+
+# Profili di output dei PDF, scelti dal client per richiesta:
+#   chart_dpi: risoluzione dei grafici PNG
+#   chart_colors: grafici quantizzati a una palette di N colori (None = colori pieni)
+#   invariant: PDF riproducibile byte per byte (niente timestamp né ID casuali)
+PROFILES = {
+    # Lettura a schermo e download: grafici leggeri e palette ridotta
+    "screen": {"chart_dpi": 110, "chart_colors": 64, "invariant": False},
+    # Stampa: alta risoluzione, colori pieni
+    "print": {"chart_dpi": 300, "chart_colors": None, "invariant": False},
+    # Archiviazione: qualità originale e output deterministico
+    "archive": {"chart_dpi": 150, "chart_colors": None, "invariant": True},
+}
+FALLBACK_PROFILE = "screen"
+
+
+def _default_profile() -> str:
+    """Profilo di default da PDF_DEFAULT_PROFILE: un valore sconosciuto (errore nella configurazione)
+    ripiega su FALLBACK_PROFILE invece di far fallire con 400 ogni richiesta senza profile"""
+    profile = os.getenv("PDF_DEFAULT_PROFILE", FALLBACK_PROFILE).strip().lower()
+    if profile not in PROFILES:
+        logger.warning("⚠️  PDF_DEFAULT_PROFILE non valido: %r, uso %s (disponibili: %s)",
+                       profile, FALLBACK_PROFILE, ", ".join(PROFILES))
+        return FALLBACK_PROFILE
+    return profile
+
+
+DEFAULT_PROFILE = _default_profile()
+
+
+def resolve(name: Optional[str]) -> str:
+    """Nome del profilo richiesto (quello di default se vuoto); ValueError se sconosciuto"""
+    profile = (name or DEFAULT_PROFILE).strip().lower()
+    if profile not in PROFILES:
+        raise ValueError(f"Profilo PDF non valido: {name} (disponibili: {', '.join(PROFILES)})")
+    return profile
+
+
+def get(name: Optional[str] = None) -> dict:
+    """Impostazioni del profilo"""
+    return PROFILES[resolve(name)]
+
+
+def doc_options(name: Optional[str] = None) -> dict:
+    """Opzioni di SimpleDocTemplate per il profilo (stream delle pagine sempre compressi)"""
+    return {"pageCompression": 1, "invariant": int(get(name)["invariant"])}
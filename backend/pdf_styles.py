@@ -0,0 +1,368 @@
+from functools import lru_cache
+from typing import Optional
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.platypus import TableStyle
+
+# Registro degli stili PDF condiviso dai tre generatori.
+# Tutto viene costruito una sola volta per processo (all'import): gli stili non vanno modificati
+# dopo la creazione perché sono condivisi tra documenti.
+
+# === PALETTE ===
+BLACK = colors.HexColor('#000000')
+DARK_GRAY = colors.HexColor('#1a1a1a')
+SUBTITLE_GRAY = colors.HexColor('#333333')
+MUTED_GRAY = colors.HexColor('#4b5563')
+BORDER_GRAY = colors.HexColor('#d1d5db')
+INNER_GRID_GRAY = colors.HexColor('#e5e7eb')
+GRID_GRAY = colors.HexColor('#cccccc')
+TABLE_HEADER_BG = colors.HexColor('#2c3e50')
+ZEBRA_BG = colors.HexColor('#f9f9f9')
+HIGHLIGHT_BG = colors.HexColor('#f0f4ff')
+HIGHLIGHT_BORDER = colors.HexColor('#3b82f6')
+
+# Colori di copertina per tipo di documento
+THEME_COLORS = {
+    "business-plan": ('#1e3a8a', '#3b82f6', '#f0f4ff'),    # blu
+    "market-analysis": ('#065f46', '#10b981', '#f0fdf4'),  # verde
+    "validate-idea": ('#1e40af', '#3b82f6', '#eff6ff'),    # blu
+    "bundle": ('#1e293b', '#3b82f6', '#f1f5f9'),           # ardesia (pacchetto di più documenti)
+}
+
+# Colori del verdetto della validazione
+VERDICT_COLORS = {
+    'VALIDATA': '#10b981',
+    'DA MIGLIORARE': '#f59e0b',
+}
+VERDICT_DEFAULT_COLOR = '#ef4444'
+
+
+def _build_stylesheet():
+    """Foglio stili base (Times per aspetto formale; supporta i caratteri latini estesi)"""
+    styles = getSampleStyleSheet()
+
+    styles.add(ParagraphStyle(
+        name='CoverTitle',
+        parent=styles['Heading1'],
+        fontName='Times-Bold',
+        fontSize=28,
+        textColor=BLACK,
+        spaceAfter=20,
+        alignment=TA_CENTER,
+        leading=34
+    ))
+
+    styles.add(ParagraphStyle(
+        name='CoverSubtitle',
+        parent=styles['Heading2'],
+        fontName='Times-Roman',
+        fontSize=16,
+        textColor=SUBTITLE_GRAY,
+        spaceAfter=30,
+        alignment=TA_CENTER,
+        leading=20
+    ))
+
+    styles.add(ParagraphStyle(
+        name='CustomTitle',
+        parent=styles['Heading1'],
+        fontName='Times-Bold',
+        fontSize=24,
+        textColor=BLACK,
+        spaceAfter=30,
+        alignment=TA_CENTER
+    ))
+
+    styles.add(ParagraphStyle(
+        name='CustomHeading1',
+        parent=styles['Heading1'],
+        fontName='Times-Bold',
+        fontSize=18,
+        textColor=BLACK,
+        spaceAfter=12,
+        spaceBefore=16,
+        leading=22
+    ))
+
+    styles.add(ParagraphStyle(
+        name='CustomHeading2',
+        parent=styles['Heading2'],
+        fontName='Times-Bold',
+        fontSize=14,
+        textColor=DARK_GRAY,
+        spaceAfter=8,
+        spaceBefore=12,
+        leading=18
+    ))
+
+    # Modifica lo stile Normal esistente invece di aggiungerne uno nuovo
+    styles['Normal'].fontName = 'Times-Roman'
+    styles['Normal'].fontSize = 11
+    styles['Normal'].textColor = BLACK
+    styles['Normal'].leading = 14
+    styles['Normal'].alignment = TA_JUSTIFY
+
+    styles.add(ParagraphStyle(
+        name='TOCEntry',
+        parent=styles['Normal'],
+        fontName='Times-Roman',
+        fontSize=11,
+        leftIndent=0,
+        spaceAfter=6
+    ))
+
+    styles.add(ParagraphStyle(
+        name='TOCHeading',
+        parent=styles['Heading1'],
+        fontName='Times-Bold',
+        fontSize=16,
+        textColor=BLACK,
+        spaceAfter=20,
+        alignment=TA_CENTER
+    ))
+
+    styles.add(ParagraphStyle(
+        name='CoverSubtitleColored',
+        parent=styles['CoverSubtitle'],
+        fontName='Times-Roman',
+        fontSize=14,
+        textColor=MUTED_GRAY,
+        spaceAfter=20,
+        alignment=TA_CENTER,
+        leading=18
+    ))
+
+    # Variante con meno spazio, per più righe di sottotitolo consecutive
+    styles.add(ParagraphStyle(
+        name='CoverSubtitleCompact',
+        parent=styles['CoverSubtitleColored'],
+        spaceAfter=10
+    ))
+
+    styles.add(ParagraphStyle(
+        name='ClosingMessage',
+        parent=styles['Normal'],
+        fontName='Times-Roman',
+        fontSize=12,
+        textColor=MUTED_GRAY,
+        alignment=TA_CENTER,
+        leading=18
+    ))
+
+    return styles
+
+
+STYLES = _build_stylesheet()
+
+
+# === TABLE STYLE PRESET ===
+
+# Tabelle con intestazione scura e righe alternate (KPI, pricing)
+_HEADER_TABLE_COMMANDS = [
+    ('BACKGROUND', (0, 0), (-1, 0), TABLE_HEADER_BG),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Times-Bold'),
+    ('FONTNAME', (0, 1), (-1, -1), 'Times-Roman'),
+    ('FONTSIZE', (0, 0), (-1, 0), 11),
+    ('FONTSIZE', (0, 1), (-1, -1), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
+    ('TOPPADDING', (0, 0), (-1, 0), 10),
+    ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
+    ('TOPPADDING', (0, 1), (-1, -1), 6),
+    ('GRID', (0, 0), (-1, -1), 0.5, GRID_GRAY),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, ZEBRA_BG]),
+]
+
+KPI_TABLE = TableStyle(_HEADER_TABLE_COMMANDS + [('ALIGN', (1, 0), (2, -1), 'RIGHT')])
+PRICING_TABLE = KPI_TABLE
+RISKS_TABLE = TableStyle(_HEADER_TABLE_COMMANDS)
+# Tabelle markdown nel testo dei capitoli
+MARKDOWN_TABLE = RISKS_TABLE
+
+# Tabelle etichetta/valore su sfondo chiaro (unit economics, TAM/SAM/SOM)
+UNIT_ECONOMICS_TABLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, -1), HIGHLIGHT_BG),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+    ('FONTNAME', (0, 0), (-1, -1), 'Times-Roman'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+    ('TOPPADDING', (0, 0), (-1, -1), 6),
+    ('GRID', (0, 0), (-1, -1), 0.5, GRID_GRAY),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+])
+MARKET_SIZE_TABLE = UNIT_ECONOMICS_TABLE
+
+KEY_POINTS_TABLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, -1), HIGHLIGHT_BG),
+    ('LEFTPADDING', (0, 0), (-1, -1), 12),
+    ('RIGHTPADDING', (0, 0), (-1, -1), 12),
+    ('TOPPADDING', (0, 0), (-1, -1), 8),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+    ('BOX', (0, 0), (-1, -1), 1, HIGHLIGHT_BORDER),
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+])
+
+# Voce dell'indice: titolo a sinistra, numero di pagina a destra
+TOC_ENTRY_TABLE = TableStyle([
+    ('FONTNAME', (0, 0), (-1, -1), 'Times-Roman'),
+    ('FONTSIZE', (0, 0), (-1, -1), 11),
+    ('ALIGN', (0, 0), (0, 0), 'LEFT'),
+    ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+    ('TOPPADDING', (0, 0), (-1, -1), 4),
+])
+
+SIGNATURE_TABLE = TableStyle([
+    ('FONTNAME', (0, 0), (-1, -1), 'Times-Roman'),
+    ('FONTSIZE', (0, 0), (-1, -1), 11),
+    ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+    ('VALIGN', (0, 0), (-1, -1), 'BOTTOM'),
+    ('GRID', (0, 0), (-1, -1), 0.5, GRID_GRAY),
+    ('LINEBELOW', (0, 2), (1, 2), 1, colors.black),
+    ('LINEBELOW', (0, 5), (1, 5), 1, colors.black),
+    ('LINEBELOW', (0, 9), (1, 9), 1, colors.black),
+])
+
+CONFIDENTIALITY_COLORS = {
+    'confidenziale': colors.HexColor('#dc2626'),
+    'uso_interno': colors.HexColor('#f59e0b'),
+}
+
+
+def _known_key(value, keys, default):
+    """Chiave delle cache di stile: i testi liberi del documento si riducono alle chiavi note"""
+    return value if isinstance(value, str) and value in keys else default
+
+
+def confidentiality_badge(confidenzialita: str) -> TableStyle:
+    """Badge colorato di confidenzialità in copertina"""
+    return _confidentiality_badge(_known_key(confidenzialita, CONFIDENTIALITY_COLORS, 'uso_interno'))
+
+
+@lru_cache(maxsize=len(CONFIDENTIALITY_COLORS))
+def _confidentiality_badge(confidenzialita: str) -> TableStyle:
+    badge_color = CONFIDENTIALITY_COLORS[confidenzialita]
+    return TableStyle([
+        ('BACKGROUND', (0, 0), (-1, -1), badge_color),
+        ('TEXTCOLOR', (0, 0), (-1, -1), colors.white),
+        ('FONTNAME', (0, 0), (-1, -1), 'Times-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 12),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ])
+
+
+def _info_box(light_bg, padding: int) -> TableStyle:
+    return TableStyle([
+        ('BACKGROUND', (0, 0), (-1, -1), light_bg),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('LEFTPADDING', (0, 0), (-1, -1), 24),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 24),
+        ('TOPPADDING', (0, 0), (-1, -1), padding),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), padding),
+        ('BOX', (0, 0), (-1, -1), 0.5, BORDER_GRAY),
+        ('INNERGRID', (0, 0), (-1, -1), 0.5, INNER_GRID_GRAY),
+    ])
+
+
+# Tipi sconosciuti sollevano KeyError e non entrano in cache
+@lru_cache(maxsize=len(THEME_COLORS))
+def get_theme(document_type: str) -> dict:
+    """Colori, stili di paragrafo e preset di tabella colorati per un tipo di documento"""
+    primary_hex, accent_hex, light_bg_hex = THEME_COLORS[document_type]
+    primary_color = colors.HexColor(primary_hex)
+    accent_color = colors.HexColor(accent_hex)
+    light_bg = colors.HexColor(light_bg_hex)
+    return {
+        "primary": primary_color,
+        "accent": accent_color,
+        "light_bg": light_bg,
+        "cover_title": ParagraphStyle(
+            name='CoverTitleColored',
+            parent=STYLES['CoverTitle'],
+            fontName='Times-Bold',
+            fontSize=32,
+            textColor=primary_color,
+            spaceAfter=15,
+            alignment=TA_CENTER,
+            leading=38
+        ),
+        "closing_title": ParagraphStyle(
+            name='ClosingTitle',
+            parent=STYLES['CoverTitle'],
+            fontName='Times-Bold',
+            fontSize=24,
+            textColor=primary_color,
+            spaceAfter=20,
+            alignment=TA_CENTER,
+            leading=30
+        ),
+        # Fascia colorata in testa a copertina e pagina finale
+        "band": TableStyle([
+            ('BACKGROUND', (0, 0), (-1, -1), primary_color),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ]),
+        "decor_line": TableStyle([
+            ('BACKGROUND', (0, 0), (-1, -1), accent_color),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ]),
+        "footer_band": TableStyle([
+            ('BACKGROUND', (0, 0), (-1, -1), accent_color),
+        ]),
+        "cover_info": _info_box(light_bg, 14),
+        "final_info": _info_box(light_bg, 12),
+    }
+
+
+def get_verdict_styles(verdict: str) -> dict:
+    """Stili colorati in base al verdetto della validazione (score, verdetto, box finale)"""
+    return _verdict_styles(_known_key(verdict, VERDICT_COLORS, None))
+
+
+# Una voce per verdetto noto più quella del colore di default
+@lru_cache(maxsize=len(VERDICT_COLORS) + 1)
+def _verdict_styles(verdict: Optional[str]) -> dict:
+    verdict_hex = VERDICT_COLORS.get(verdict, VERDICT_DEFAULT_COLOR)
+    verdict_color = colors.HexColor(verdict_hex)
+    light_bg = get_theme("validate-idea")["light_bg"]
+    return {
+        "hex": verdict_hex,
+        "color": verdict_color,
+        "score": ParagraphStyle(
+            name='ScoreStyle',
+            parent=STYLES['CoverTitle'],
+            fontName='Times-Bold',
+            fontSize=72,
+            textColor=verdict_color,
+            spaceAfter=10,
+            alignment=TA_CENTER,
+            leading=80
+        ),
+        "verdict": ParagraphStyle(
+            name='VerdictStyle',
+            parent=STYLES['CoverSubtitle'],
+            fontName='Times-Bold',
+            fontSize=24,
+            textColor=verdict_color,
+            spaceAfter=20,
+            alignment=TA_CENTER,
+            leading=28
+        ),
+        "box": TableStyle([
+            ('BACKGROUND', (0, 0), (-1, -1), light_bg),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('LEFTPADDING', (0, 0), (-1, -1), 30),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 30),
+            ('TOPPADDING', (0, 0), (-1, -1), 20),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 20),
+            ('BOX', (0, 0), (-1, -1), 2, verdict_color),
+        ]),
+    }
@@ -0,0 +1,116 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Numero di processi dedicati al rendering PDF (0 = rendering in un thread del processo API)
+RENDER_WORKERS = int(os.getenv("PDF_RENDER_WORKERS", str(min(2, os.cpu_count() or 1))))
+# Job di rendering eseguiti al massimo in parallelo (gli altri attendono in coda)
+RENDER_MAX_CONCURRENT = int(os.getenv("PDF_RENDER_MAX_CONCURRENT", str(max(RENDER_WORKERS, 1))))
+# Dopo quanti job per worker il pool viene riciclato (contiene la crescita di memoria di matplotlib)
+RENDER_MAX_JOBS_PER_WORKER = int(os.getenv("PDF_RENDER_MAX_JOBS_PER_WORKER", "25"))
+
+_executor = None
+# Job di rendering inviati al pool corrente (i job di riscaldamento non contano)
+_executor_jobs = 0
+_executor_lock = threading.Lock()
+# Un asyncio.Semaphore è legato all'event loop in cui viene usato: uno per loop
+_semaphore = None
+_semaphore_loop = None
+
+
+def _warm_worker():
+    """Initializer dei worker: precarica ReportLab, matplotlib, font e stili una volta per processo"""
+    import pdf_generator
+    import pdf_generator_analysis  # noqa: F401
+    import pdf_generator_validation  # noqa: F401
+    import pdf_generator_bundle  # noqa: F401
+    pdf_generator.warm_up()
+
+
+def _noop():
+    return os.getpid()
+
+
+def _new_executor() -> ProcessPoolExecutor:
+    """Nuovo pool con tutti i worker avviati e scaldati subito.
+    Con "spawn" i worker non ereditano i thread dell'API (fork con thread attivi può bloccarsi).
+    Il riciclo è contato qui e non con max_tasks_per_child, che conterebbe anche i job di riscaldamento."""
+    executor = ProcessPoolExecutor(max_workers=RENDER_WORKERS, initializer=_warm_worker,
+                                   mp_context=multiprocessing.get_context("spawn"))
+    for _ in range(RENDER_WORKERS):
+        executor.submit(_noop)
+    return executor
+
+
+def _get_executor(count_job: bool = True) -> ProcessPoolExecutor:
+    """Pool corrente, sostituito dopo RENDER_MAX_JOBS_PER_WORKER job di rendering per worker"""
+    global _executor, _executor_jobs
+    with _executor_lock:
+        if (_executor is not None and RENDER_MAX_JOBS_PER_WORKER > 0
+                and _executor_jobs >= RENDER_MAX_JOBS_PER_WORKER * RENDER_WORKERS):
+            # I job già in corso terminano sul vecchio pool
+            _executor.shutdown(wait=False)
+            _executor = None
+        if _executor is None:
+            _executor = _new_executor()
+            _executor_jobs = 0
+        if count_job:
+            _executor_jobs += 1
+        return _executor
+
+
+def _discard_executor(executor: ProcessPoolExecutor):
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False)
+
+
+def uses_processes() -> bool:
+    """True se i job girano in processi separati (e quindi possono usare pyplot in parallelo)"""
+    return RENDER_WORKERS > 0
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    """Semaforo dei job di rendering dell'event loop corrente"""
+    global _semaphore, _semaphore_loop
+    loop = asyncio.get_running_loop()
+    if _semaphore is None or _semaphore_loop is not loop:
+        _semaphore = asyncio.Semaphore(RENDER_MAX_CONCURRENT)
+        _semaphore_loop = loop
+    return _semaphore
+
+
+def start():
+    """Avvia il pool e scalda i worker (da chiamare all'avvio dell'app, nel suo event loop)"""
+    _get_semaphore()
+    if RENDER_WORKERS <= 0:
+        _warm_worker()
+        return
+    _get_executor(count_job=False)
+
+
+def shutdown():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+async def run(func, *args):
+    """Esegue func(*args) in un worker del pool senza bloccare l'event loop"""
+    async with _get_semaphore():
+        if RENDER_WORKERS <= 0:
+            return await asyncio.to_thread(func, *args)
+        executor = _get_executor()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+        except BrokenProcessPool:
+            # Un worker è morto (es. OOM): il pool va ricreato alla prossima richiesta
+            _discard_executor(executor)
+            raise
@@ -0,0 +1,116 @@
+import json
+import os
+import zlib
+
+# Limite sul corpo decompresso: protegge da "zip bomb" nei body compressi
+MAX_DECOMPRESSED_BODY_BYTES = int(os.getenv("MAX_DECOMPRESSED_BODY_BYTES", str(20 * 1024 * 1024)))
+
+SUPPORTED_ENCODINGS = ("gzip", "x-gzip", "deflate")
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+def _new_decompressor(encoding: str, first_bytes: bytes):
+    """Decompressore zlib per l'encoding; 'deflate' può arrivare con header zlib o raw"""
+    if encoding in ("gzip", "x-gzip"):
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if len(first_bytes) >= 2 and (first_bytes[0] & 0x0F) == 8 and ((first_bytes[0] << 8) | first_bytes[1]) % 31 == 0:
+        return zlib.decompressobj(zlib.MAX_WBITS)
+    return zlib.decompressobj(-zlib.MAX_WBITS)
+
+
+def _inflate(decompressor, data: bytes, out: bytearray, max_size: int):
+    """Decomprime data in out a blocchi limitati, interrompendosi appena si supera max_size"""
+    while data:
+        out += decompressor.decompress(data, max_size + 1 - len(out))
+        if len(out) > max_size:
+            raise BodyTooLarge()
+        data = decompressor.unconsumed_tail
+
+
+class DecompressRequestMiddleware:
+    """Middleware ASGI che decomprime in modo trasparente i body gzip/deflate (Content-Encoding)"""
+
+    def __init__(self, app, max_body_size: int = MAX_DECOMPRESSED_BODY_BYTES):
+        self.app = app
+        self.max_body_size = max_body_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = None
+        for name, value in scope["headers"]:
+            if name == b"content-encoding":
+                encoding = value.decode("latin-1").strip().lower()
+                break
+
+        if not encoding or encoding == "identity":
+            await self.app(scope, receive, send)
+            return
+
+        if encoding not in SUPPORTED_ENCODINGS:
+            await _send_error(send, 415, f"Content-Encoding non supportato: {encoding}")
+            return
+
+        body = bytearray()
+        decompressor = None
+        try:
+            more_body = True
+            while more_body:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    return
+                chunk = message.get("body", b"")
+                more_body = message.get("more_body", False)
+                if not chunk:
+                    continue
+                if decompressor is None:
+                    decompressor = _new_decompressor(encoding, chunk)
+                _inflate(decompressor, chunk, body, self.max_body_size)
+            if decompressor is not None:
+                body += decompressor.flush()
+                if len(body) > self.max_body_size:
+                    raise BodyTooLarge()
+        except BodyTooLarge:
+            await _send_error(send, 413, "Corpo della richiesta troppo grande dopo la decompressione")
+            return
+        except zlib.error:
+            await _send_error(send, 400, f"Corpo della richiesta {encoding} non valido")
+            return
+
+        # La app vede una richiesta non compressa con il Content-Length corretto
+        headers = [
+            (name, value) for name, value in scope["headers"]
+            if name not in (b"content-encoding", b"content-length")
+        ]
+        headers.append((b"content-length", str(len(body)).encode("latin-1")))
+        scope = dict(scope, headers=headers)
+
+        body_sent = False
+
+        async def receive_decompressed():
+            nonlocal body_sent
+            if body_sent:
+                return await receive()
+            body_sent = True
+            return {"type": "http.request", "body": bytes(body), "more_body": False}
+
+        await self.app(scope, receive_decompressed, send)
+
+
+async def _send_error(send, status_code: int, detail: str):
+    """Risposta JSON nello stesso formato delle HTTPException di FastAPI"""
+    payload = json.dumps({"detail": detail}).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(payload)).encode("latin-1")),
+        ],
+    })
+    await send({"type": "http.response.body", "body": payload})
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""Test del document store e della risoluzione di documentId negli endpoint"""
+
+import asyncio
+import sys
+
+import pytest
+
+import document_store
+import entitlements
+
+DOCUMENT = {"titolo": "Caffè letterario", "capitoli": [{"titolo": "Mercato", "contenuto": "Testo"}]}
+
+
+def test_save_and_load_round_trip(data_dir):
+    document_id = document_store.save(DOCUMENT)
+    assert document_id == entitlements.json_digest(DOCUMENT)
+    # Stesso contenuto con chiavi in altro ordine: stesso id, nessun nuovo file
+    assert document_store.save(dict(reversed(list(DOCUMENT.items())))) == document_id
+    assert len(list(document_store.DOCUMENTS_DIR.rglob("*.json.gz"))) == 1
+    assert document_store.load(document_id) == DOCUMENT
+
+
+def test_load_rejects_unknown_and_malformed_ids(data_dir):
+    assert document_store.load("0" * 64) is None
+    assert document_store.load("../payments.sqlite3") is None
+    assert not document_store.is_valid_id("A" * 64)
+    # "$" di re.match accetterebbe anche un a capo finale
+    assert not document_store.is_valid_id("0" * 64 + "\n")
+    assert document_store.load("0" * 64 + "\n") is None
+
+
+def test_pdf_endpoints_resolve_document_id(client, login):
+    login("user-1")
+    response = client.post("/api/generate-pdf", json={"documentId": "0" * 64})
+    assert response.status_code == 404
+    response = client.post("/api/generate-pdf-validation", json={})
+    assert response.status_code == 400
+
+
+def test_documents_are_loaded_off_the_event_loop(client, monkeypatch):
+    loops = []
+    load = document_store.load
+
+    def recording_load(document_id):
+        try:
+            loops.append(asyncio.get_running_loop())
+        except RuntimeError:
+            loops.append(None)
+        return load(document_id)
+    monkeypatch.setattr(document_store, "load", recording_load)
+
+    document_id = document_store.save(DOCUMENT)
+    response = client.get(f"/api/preview-html/{document_id}")
+    assert response.status_code == 200, response.text
+    assert loops == [None]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
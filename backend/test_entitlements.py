@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""Test del ledger delle entitlement e del download degli acquisti già renderizzati"""
+
+import sys
+
+import pytest
+
+import entitlements
+
+PDF_A = b"%PDF-1.4 documento A"
+PDF_B = b"%PDF-1.4 documento B"
+
+
+def test_record_is_idempotent_and_keeps_known_fields(data_dir):
+    entitlements.record("cs_1", "business-plan", uid="user-1", json_digest="json-a",
+                        pdf_digest=entitlements.store_artifact(PDF_A))
+    entitlements.record("cs_1", "business-plan", uid="user-1", json_digest="json-a",
+                        pdf_digest=entitlements.store_artifact(PDF_A))
+    # Campi None: l'utente resta quello registrato
+    entry = entitlements.record("cs_1", "business-plan")
+
+    assert entry["uid"] == "user-1"
+    assert entry["json_digest"] == "json-a"
+    assert entitlements.artifact_path(entry["pdf_digest"]).read_bytes() == PDF_A
+    assert len(entitlements.list_for_user("user-1")) == 1
+
+
+def test_upsell_session_covers_two_documents(data_dir):
+    entitlements.record("cs_1", "business-plan", uid="user-1")
+    entitlements.record("cs_1", "market-analysis", uid="user-1")
+    entitlements.record("cs_2", "validate-idea", uid="user-2")
+
+    types = {e["document_type"] for e in entitlements.list_for_user("user-1")}
+    assert types == {"business-plan", "market-analysis"}
+    assert entitlements.get("cs_1", "validate-idea") is None
+
+
+def test_artifacts_are_content_addressed(data_dir):
+    digest = entitlements.store_artifact(PDF_A)
+    assert entitlements.store_artifact(PDF_A) == digest
+    assert entitlements.store_artifact(PDF_B) != digest
+    assert entitlements.artifact_path("0" * 64) is None
+    assert entitlements.artifact_path(None) is None
+
+
+def test_ownership_check():
+    entry = {"uid": "user-1"}
+    assert entitlements.is_owned_by_other(entry, "user-2")
+    assert not entitlements.is_owned_by_other(entry, "user-1")
+    assert not entitlements.is_owned_by_other({"uid": None}, "user-2")
+    assert not entitlements.is_owned_by_other(None, "user-2")
+
+
+def test_entitled_download_is_limited_to_the_owner(client, login):
+    entitlements.record("cs_1", "business-plan", uid="user-1", json_digest="json-a",
+                        pdf_digest=entitlements.store_artifact(PDF_A))
+
+    login("user-1")
+    response = client.get("/api/entitlements")
+    assert response.status_code == 200, response.text
+    [item] = response.json()["entitlements"]
+    assert item["sessionId"] == "cs_1" and item["pdfAvailable"] is True
+
+    response = client.get("/api/entitlements/cs_1/business-plan/pdf")
+    assert response.status_code == 200, response.text
+    assert response.content == PDF_A
+
+    login("user-2")
+    assert client.get("/api/entitlements/cs_1/business-plan/pdf").status_code == 404
+    assert client.get("/api/entitlements").json()["entitlements"] == []
+
+
+def test_new_json_without_pdf_drops_the_old_artifact(data_dir):
+    entitlements.record("cs_1", "validate-idea", uid="user-1", json_digest="json-a",
+                        pdf_digest=entitlements.store_artifact(PDF_A))
+    assert entitlements.record("cs_1", "validate-idea", json_digest="json-a")["pdf_digest"] is not None
+
+    entry = entitlements.record("cs_1", "validate-idea", json_digest="json-b")
+    assert entry["json_digest"] == "json-b"
+    assert entry["pdf_digest"] is None
+
+
+def test_other_profiles_do_not_hijack_the_entitled_pdf(client, login, monkeypatch):
+    """Download di default con JSON A, download 'print' con JSON B, download di default con JSON B:
+    l'ultimo PDF (e il re-download dell'acquisto) deve essere quello di B"""
+    import payment_cache
+    import pdf_generator
+
+    async def fake_render(business_plan_json, profile=None):
+        return f"%PDF-1.4 {business_plan_json['titolo']} {profile}".encode()
+
+    monkeypatch.setattr(pdf_generator, "render_pdf_from_json", fake_render)
+    payment_cache.record_paid_session("cs_1", "business-plan")
+    login("user-1")
+
+    def download(titolo, profile=None):
+        response = client.post("/api/generate-pdf", json={
+            "businessPlanJson": {"titolo": titolo}, "paymentSessionId": "cs_1", "profile": profile
+        })
+        assert response.status_code == 200, response.text
+        return response.content
+
+    assert download("A") == b"%PDF-1.4 A screen"
+    assert download("B", "print") == b"%PDF-1.4 B print"
+    assert download("B") == b"%PDF-1.4 B screen"
+    assert client.get("/api/entitlements/cs_1/business-plan/pdf").content == b"%PDF-1.4 B screen"
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Test dell'anteprima HTML: streaming, cache per digest ed ETag/304"""
+
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+import document_store
+import entitlements
+import generate_html
+import html_preview
+
+SAMPLE = Path(__file__).resolve().parent.parent / "business-plan-TechStarts.json"
+
+
+@pytest.fixture(scope="module")
+def business_plan():
+    with open(SAMPLE, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_preview_is_cached_and_revalidated(client, business_plan):
+    digest = entitlements.json_digest(business_plan)
+    response = client.post("/api/preview-html", json={"businessPlanJson": business_plan})
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"] == "text/html; charset=utf-8"
+    assert response.headers["etag"] == f'"{digest}"'
+    assert response.headers["content-security-policy"] == "sandbox allow-scripts"
+    assert response.text.lstrip().lower().startswith("<!doctype html")
+    assert business_plan["pdf_layout"]["titolo_documento"] in response.text
+    assert b"".join(html_preview.get(digest)) == response.content
+
+    cached = client.post("/api/preview-html", json={"businessPlanJson": business_plan})
+    assert cached.content == response.content
+
+    not_modified = client.post("/api/preview-html", json={"businessPlanJson": business_plan},
+                               headers={"If-None-Match": f'"{digest}"'})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    assert not_modified.headers["etag"] == f'"{digest}"'
+
+
+def test_saved_document_preview(client, business_plan):
+    document_id = document_store.save(business_plan)
+    response = client.get(f"/api/preview-html/{document_id}")
+    assert response.status_code == 200, response.text
+    assert response.headers["etag"] == f'"{document_id}"'
+    assert client.get(f"/api/preview-html/{document_id}",
+                      headers={"If-None-Match": f'"{document_id}"'}).status_code == 304
+    assert client.get(f"/api/preview-html/{'0' * 64}").status_code == 404
+
+
+def test_cache_is_bounded(data_dir, business_plan, monkeypatch):
+    monkeypatch.setattr(html_preview, "MAX_CACHE_BYTES", 1)
+    for version in range(3):
+        document = {**business_plan, "versione_test": version}
+        list(html_preview.stream(document, entitlements.json_digest(document)))
+    # Oltre il limite resta solo l'anteprima più recente
+    assert len(html_preview._entries) == 1
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('[x](http://a"onmouseover="alert(1))', '<p><a href="http://a&quot;onmouseover=&quot;alert(1)">x</a></p>'),
+    ("[x](javascript:alert(1))", "<p>x</p>"),
+    ("[x](https://a.it/?a=1&b=2)", '<p><a href="https://a.it/?a=1&amp;b=2">x</a></p>'),
+    ("`codice`", "<p><code>codice</code></p>"),
+])
+def test_markdown_links_are_safe_in_html(text, expected):
+    assert generate_html.simple_markdown_to_html(text) == expected
+
+
+def test_html_links_are_revalidated_on_the_block_markup():
+    # L'HTML non si affida all'escape del markup PDF: schema e attributo si ricontrollano qui
+    assert generate_html._markup_html('<a href="javascript:alert(1)">x</a>') == "<a>x</a>"
+    assert generate_html._markup_html('<a href="http://a&quot;b">x</a>') == '<a href="http://a&quot;b">x</a>'
+
+
+def test_preview_does_not_inject_attributes(client, business_plan):
+    chapters = [dict(ch) for ch in business_plan["narrative"]["chapters"]]
+    chapters[0]["contenuto_markdown"] = 'Vedi [x](http://a"onmouseover="alert(1)) e [y](javascript:alert(2)).'
+    document = {**business_plan, "narrative": {**business_plan["narrative"], "chapters": chapters}}
+    response = client.post("/api/preview-html", json={"businessPlanJson": document})
+    assert response.status_code == 200, response.text
+    assert 'onmouseover="' not in response.text
+    assert "javascript:" not in response.text
+
+
+def test_chart_data_does_not_close_the_script(client, business_plan):
+    payload = "</script><img src=x onerror=alert(1)>"
+    charts = [dict(chart) for chart in business_plan["charts"]]
+    charts[0]["titolo"] = payload
+    response = client.post("/api/preview-html", json={"businessPlanJson": {**business_plan, "charts": charts}})
+    assert response.status_code == 200, response.text
+    assert "</script><img" not in response.text
+    assert generate_html.script_json(payload) in response.text
+    assert json.loads(generate_html.script_json(payload)) == payload
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
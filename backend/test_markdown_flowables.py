@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""Test del convertitore markdown -> markup/flowable ReportLab"""
+
+import sys
+
+import pytest
+from reportlab.platypus import Paragraph
+
+import markdown_flowables
+from pdf_styles import STYLES
+
+
+def markup(text):
+    """Markup dell'unico paragrafo prodotto dal testo"""
+    [token] = markdown_flowables.tokenize(text)
+    assert token[0] == 'paragraph'
+    return token[1]
+
+
+def paragraphs(text):
+    return [f for f in markdown_flowables.markdown_to_flowables(text, STYLES) if isinstance(f, Paragraph)]
+
+
+def test_link_url_quotes_are_escaped():
+    assert markup('Vedi [sito](http://a"b\'c) per dettagli') == \
+        'Vedi <a href="http://a&quot;b&#39;c">sito</a> per dettagli'
+    # ReportLab rilegge l'attributo intatto invece di fallire sull'intero documento
+    [paragraph] = paragraphs('Vedi [sito](http://a"b) per dettagli')
+    assert any(getattr(frag, 'link', None) for frag in paragraph.frags)
+
+
+@pytest.mark.parametrize("url", [
+    "javascript:alert(1)", "JaVaScRiPt:alert(1)", "data:text/html;base64,PHNjcmlwdD4=",
+    "file:///etc/passwd", "vbscript:msgbox", "/percorso/relativo", "&#106;avascript:alert(1)",
+])
+def test_unsafe_link_schemes_become_text(url):
+    assert '<a ' not in markup(f'Clicca [qui]({url}) ora')
+    assert 'qui' in markup(f'Clicca [qui]({url}) ora')
+
+
+@pytest.mark.parametrize("text, href", [
+    ("[sito](https://example.com/a?b=1&c=2)", "https://example.com/a?b=1&amp;c=2"),
+    ("[sito](HTTP://EXAMPLE.COM)", "HTTP://EXAMPLE.COM"),
+    ("[scrivici](mailto:info@example.com)", "mailto:info@example.com"),
+    ("<https://example.com/x>", "https://example.com/x"),
+])
+def test_safe_links_are_kept(text, href):
+    assert f'<a href="{href}">' in markup(text)
+
+
+def test_ftp_autolink_becomes_text():
+    assert markup("<ftp://example.com/file>") == "ftp://example.com/file"
+
+
+@pytest.mark.parametrize("text", [
+    "testo <b>aperto e mai chiuso",
+    "chiuso</i> senza apertura",
+    "*corsivo <b>incrociato* col grassetto</b>",
+])
+def test_unparsable_markup_falls_back_to_plain_text(text):
+    [paragraph] = paragraphs(text)
+    assert '<' not in paragraph.text
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("[Caffè](https://it.wikipedia.org/wiki/Caffè_(bevanda)) e poi",
+     '<a href="https://it.wikipedia.org/wiki/Caffè_(bevanda)">Caffè</a> e poi'),
+    ("[a](http://x.it) (nota)", '<a href="http://x.it">a</a> (nota)'),
+    ('[t](http://x.it "titolo")', '<a href="http://x.it">t</a>'),
+    ("[**forte**](https://x.it)", '<a href="https://x.it"><b>forte</b></a>'),
+    ("[x](javascript:alert(1))", "x"),
+])
+def test_links(text, expected):
+    assert markup(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("**grassetto con *corsivo* dentro**", "<b>grassetto con <i>corsivo</i> dentro</b>"),
+    ("***entrambi***", "<b><i>entrambi</i></b>"),
+    ("__sotto *misto*__", "<b>sotto <i>misto</i></b>"),
+    ("a * b * c", "a * b * c"),
+    ("snake_case_name", "snake_case_name"),
+    ("`**non** formattato`", '<font name="Courier">**non** formattato</font>'),
+    ("1 < 2 & 3", "1 &lt; 2 &amp; 3"),
+])
+def test_emphasis(text, expected):
+    assert markup(text) == expected
+
+
+def test_table_rows_are_padded_when_rendered():
+    tokens = markdown_flowables.tokenize("| A | B |\n|---|:-:|\n| 1 | **2** |\n| 3 |")
+    assert tokens == [('table', [['A', 'B'], ['1', '<b>2</b>'], ['3']])]
+    [table, _] = markdown_flowables.to_flowables(tokens, STYLES)
+    assert len(table._cellvalues) == 3 and all(len(row) == 2 for row in table._cellvalues)
+
+
+def test_lists():
+    assert markdown_flowables.tokenize("- uno\n- due\n  continua\n\n1. primo\n2. secondo") == [
+        ('list_item', False, 'uno'),
+        ('list_item', False, 'due<br/>continua'),
+        ('list_item', True, 'primo'),
+        ('list_item', True, 'secondo'),
+    ]
+    # Senza riga vuota un elenco non interrompe il paragrafo
+    assert markdown_flowables.tokenize("Testo\n- non elenco") == [('paragraph', 'Testo<br/>- non elenco')]
+
+
+def test_headings_and_blocks():
+    assert markdown_flowables.tokenize("## Titolo ##\nPUNTI CHIAVE\nANALISI DI MERCATO\n\n---") == [
+        ('heading', 2, 'Titolo'),
+        ('heading', 3, 'PUNTI CHIAVE'),
+        ('heading', 2, 'ANALISI DI MERCATO'),
+        ('rule',),
+    ]
+    assert markdown_flowables.tokenize("```\nif a < b:\n```") == [('code', 'if a &lt; b:')]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""Test del pacchetto PDF degli acquisti già renderizzati"""
+
+import io
+import sys
+
+import pytest
+from pypdf import PdfReader
+from reportlab.pdfgen import canvas
+
+import entitlements
+import pdf_generator_bundle
+import pdf_merge
+
+
+def make_pdf(label, pages):
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer)
+    for page in range(pages):
+        pdf.drawString(100, 700, f"{label} pagina {page + 1}")
+        pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def purchases(data_dir):
+    """Upsell (business plan + analisi) e validazione di user-1, business plan di user-2"""
+    for session_id, document_type, uid, pages in (
+        ("cs_upsell", "market-analysis", "user-1", 2),
+        ("cs_upsell", "business-plan", "user-1", 3),
+        ("cs_validazione", "validate-idea", "user-1", 1),
+        ("cs_altro", "business-plan", "user-2", 1),
+    ):
+        pdf_digest = entitlements.store_artifact(make_pdf(f"{session_id} {document_type}", pages))
+        entitlements.record(session_id, document_type, uid=uid, json_digest=f"json-{session_id}",
+                            pdf_digest=pdf_digest)
+
+
+def download(client, session_ids):
+    return client.post("/api/entitlements/bundle/pdf", json={"sessionIds": session_ids})
+
+
+def test_bundle_merges_purchases_in_document_order(client, login, purchases):
+    login("user-1")
+    response = download(client, ["cs_validazione", "cs_upsell", "cs_upsell"])
+    assert response.status_code == 200, response.text
+
+    reader = PdfReader(io.BytesIO(response.content))
+    # Copertina e indice, poi 3 + 2 + 1 pagine dei documenti
+    assert len(reader.pages) == 2 + 6
+    assert [(item.title, reader.get_destination_page_number(item)) for item in reader.outline] == [
+        ("Business Plan", 2), ("Analisi di Mercato", 5), ("Validazione Idea di Business", 7),
+    ]
+    assert "cs_upsell business-plan pagina 1" in reader.pages[2].extract_text()
+
+
+def test_bundle_rejects_other_users_and_empty_requests(client, login, purchases):
+    login("user-1")
+    assert download(client, ["cs_upsell", "cs_altro"]).status_code == 404
+    assert download(client, ["cs_inesistente"]).status_code == 404
+
+
+def test_cached_bundle_is_not_reused_on_another_day(client, login, purchases, monkeypatch):
+    renders = []
+    render = pdf_generator_bundle.render_pdf_bundle
+
+    async def counting_render(parts, data_gen=None):
+        renders.append(data_gen)
+        return await render(parts, data_gen)
+
+    monkeypatch.setattr(pdf_generator_bundle, "render_pdf_bundle", counting_render)
+    login("user-1")
+
+    monkeypatch.setattr(pdf_generator_bundle, "generation_date", lambda: "01/03/2030")
+    first = download(client, ["cs_upsell"])
+    assert download(client, ["cs_upsell"]).content == first.content
+    assert renders == ["01/03/2030"]
+
+    monkeypatch.setattr(pdf_generator_bundle, "generation_date", lambda: "02/03/2030")
+    next_day = download(client, ["cs_upsell"])
+    assert renders == ["01/03/2030", "02/03/2030"]
+    assert "02/03/2030" in PdfReader(io.BytesIO(next_day.content)).pages[0].extract_text()
+
+
+def test_unstable_front_page_count_stops_after_a_few_passes(tmp_path, monkeypatch):
+    part = tmp_path / "business-plan.pdf"
+    part.write_bytes(make_pdf("business plan", 2))
+
+    # Copertina e indice risultano alternativamente di 3 e 2 pagine: senza limite il ciclo non finirebbe
+    fronts = []
+    page_count = pdf_merge.page_count
+
+    def flipping_count(pdf):
+        if pdf == part:
+            return page_count(pdf)
+        fronts.append(pdf)
+        return 2 + len(fronts) % 2
+    monkeypatch.setattr(pdf_merge, "page_count", flipping_count)
+
+    pdf_bytes = pdf_generator_bundle.build_pdf_bundle([("business-plan", part)], "01/01/2026")
+    assert len(fronts) == pdf_generator_bundle.FRONT_MAX_PASSES
+    assert PdfReader(io.BytesIO(pdf_bytes)).pages
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Test della cache dei PDF renderizzati: LRU per dimensione, pin e render condivisi"""
+
+import asyncio
+import sys
+
+import pytest
+
+import pdf_cache
+
+PDF = b"%PDF-1.4 " + b"x" * 991  # 1000 byte
+
+
+def test_put_and_acquire(data_dir):
+    key = pdf_cache.cache_key("business-plan", "json-a", "screen")
+    assert key != pdf_cache.cache_key("business-plan", "json-a", "print")
+    assert pdf_cache.acquire(key) is None
+
+    pdf_cache.put(key, PDF)
+    path = pdf_cache.acquire(key)
+    assert path.read_bytes() == PDF
+    pdf_cache.release(key)
+    assert pdf_cache.read(key) == PDF
+
+
+def test_least_recently_used_are_evicted(data_dir, monkeypatch):
+    monkeypatch.setattr(pdf_cache, "MAX_CACHE_BYTES", 2500)
+    pdf_cache.put("a", PDF)
+    pdf_cache.put("b", PDF)
+    pdf_cache.read("a")
+    pdf_cache.put("c", PDF)
+
+    assert pdf_cache.read("b") is None
+    assert pdf_cache.read("a") == PDF
+    assert pdf_cache.read("c") == PDF
+    assert pdf_cache._total_bytes == 2000
+
+
+def test_pinned_entries_survive_eviction_until_released(data_dir, monkeypatch):
+    monkeypatch.setattr(pdf_cache, "MAX_CACHE_BYTES", 1500)
+    pdf_cache.put("a", PDF)
+    path = pdf_cache.acquire("a")
+    pdf_cache.put("b", PDF)
+    assert path.exists()
+
+    pdf_cache.release("a")
+    assert not path.exists()
+    assert pdf_cache.read("b") == PDF
+
+
+def test_pin_is_released_when_sending_fails(data_dir, monkeypatch):
+    import app
+
+    monkeypatch.setattr(pdf_cache, "MAX_CACHE_BYTES", 1500)
+    pdf_cache.put("a", PDF)
+    response = app.pdf_response(pdf_cache.acquire("a"), "documento.pdf", pinned_key="a")
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def broken_send(message):
+        raise ConnectionResetError("client disconnesso")
+
+    scope = {"type": "http", "method": "GET", "headers": []}
+    with pytest.raises(ConnectionResetError):
+        asyncio.run(response(scope, receive, broken_send))
+    assert pdf_cache._pins == {}
+
+
+def test_concurrent_requests_share_one_render_and_one_cache_write(data_dir, monkeypatch):
+    import app
+
+    renders = []
+    writes = []
+    put = pdf_cache.put
+    monkeypatch.setattr(pdf_cache, "put", lambda key, pdf_bytes: writes.append(key) or put(key, pdf_bytes))
+
+    async def render(pdf_json, profile):
+        renders.append(profile)
+        await asyncio.sleep(0.05)
+        return PDF
+
+    async def three_requests():
+        return await asyncio.gather(*(
+            app.get_or_render_pdf("business-plan", {}, "json-a", render) for _ in range(3)
+        ))
+
+    results = asyncio.run(three_requests())
+    assert results == [(PDF, None)] * 3
+    assert len(renders) == 1 and len(writes) == 1
+
+    # Richiesta successiva: PDF dalla cache, pinnato
+    path, pinned_key = asyncio.run(app.get_or_render_pdf("business-plan", {}, "json-a", render))
+    assert path.read_bytes() == PDF and pinned_key == writes[0]
+    pdf_cache.release(pinned_key)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
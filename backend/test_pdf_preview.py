@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""Test dell'anteprima PDF con watermark (/api/preview-pdf)"""
+
+import asyncio
+import io
+import json
+import sys
+from pathlib import Path
+
+import pytest
+from pypdf import PdfReader
+
+import app
+import document_builder
+import document_store
+import pdf_cache
+import pdf_generator
+import pdf_preview_cache
+
+SAMPLE = Path(__file__).resolve().parent.parent / "business-plan-TechStarts.json"
+
+
+@pytest.fixture(scope="module")
+def business_plan():
+    with open(SAMPLE, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def preview(client, document, document_type="business-plan"):
+    """Anteprima di un documento salvato nello store, come dopo la generazione"""
+    document_id = document_store.save(document)
+    return client.post("/api/preview-pdf", json={"documentType": document_type, "documentId": document_id})
+
+
+@pytest.fixture
+def counted_renders(monkeypatch):
+    """Documenti passati al renderer delle anteprime del business plan"""
+    calls = []
+    render = app.PDF_PREVIEW_RENDERERS["business-plan"]
+
+    async def counting_render(document, profile=None):
+        calls.append(document)
+        return await render(document, profile)
+    monkeypatch.setitem(app.PDF_PREVIEW_RENDERERS, "business-plan", counting_render)
+    return calls
+
+
+@pytest.mark.parametrize("document_type", sorted(app.PDF_PREVIEW_RENDERERS))
+def test_preview_has_watermark(client, business_plan, document_type):
+    response = preview(client, business_plan, document_type)
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"] == "application/pdf"
+    assert response.headers["content-disposition"].startswith("inline")
+    assert "anteprima" in response.headers["content-disposition"]
+
+    pages = PdfReader(io.BytesIO(response.content)).pages
+    assert pages
+    for page in pages:
+        assert document_builder.PREVIEW_WATERMARK in page.extract_text()
+
+
+def test_preview_is_shorter_than_the_document(client, business_plan):
+    response = preview(client, business_plan)
+    assert response.status_code == 200, response.text
+    full = asyncio.run(pdf_generator.render_pdf_from_json(business_plan))
+    assert len(PdfReader(io.BytesIO(response.content)).pages) < len(PdfReader(io.BytesIO(full)).pages)
+
+
+def test_preview_is_served_from_cache(client, business_plan, counted_renders):
+    first = preview(client, business_plan)
+    second = preview(client, business_plan)
+    assert first.status_code == second.status_code == 200
+    assert second.content == first.content
+    assert len(counted_renders) == 1
+
+
+def test_inline_json_is_not_rendered(client, business_plan, counted_renders):
+    response = client.post("/api/preview-pdf", json={"documentType": "business-plan", "documentJson": business_plan})
+    assert response.status_code == 400
+    assert "documentId" in response.json()["detail"]
+    assert counted_renders == []
+
+
+def test_unknown_document_id(client, counted_renders):
+    response = client.post("/api/preview-pdf", json={"documentType": "business-plan", "documentId": "0" * 64})
+    assert response.status_code == 404
+    assert counted_renders == []
+
+
+def test_previews_do_not_use_the_paid_pdf_cache(client, business_plan, data_dir):
+    assert preview(client, business_plan).status_code == 200
+    assert not list((data_dir / "pdf-cache").glob("*.pdf"))
+    assert pdf_cache._total_bytes == 0
+
+
+def test_preview_cache_is_bounded(client, business_plan, monkeypatch):
+    monkeypatch.setattr(pdf_preview_cache, "MAX_CACHE_BYTES", 1)
+    for title in ("Uno", "Due", "Tre"):
+        document = {**business_plan, "meta": {**business_plan["meta"], "titolo": title}}
+        assert preview(client, document).status_code == 200
+    assert len(pdf_preview_cache._entries) == 1
+
+
+def test_unknown_document_type(client, business_plan):
+    response = preview(client, business_plan, "ricetta")
+    assert response.status_code == 400
+    assert "ricetta" in response.json()["detail"]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
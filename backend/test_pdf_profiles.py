@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""Test dei profili di output dei PDF"""
+
+import importlib
+import sys
+
+import pytest
+
+import pdf_profiles
+
+
+@pytest.fixture
+def reload_profiles(monkeypatch):
+    """reload_profiles(valore): modulo ricaricato con PDF_DEFAULT_PROFILE impostato (ripristinato dopo il test)"""
+    def reload(value):
+        monkeypatch.setenv("PDF_DEFAULT_PROFILE", value)
+        return importlib.reload(pdf_profiles)
+    yield reload
+    monkeypatch.undo()
+    importlib.reload(pdf_profiles)
+
+
+def test_default_profile_from_env(reload_profiles):
+    assert reload_profiles(" Print ").DEFAULT_PROFILE == "print"
+
+
+def test_unknown_default_profile_falls_back_to_screen(reload_profiles):
+    profiles = reload_profiles("prnt")
+    assert profiles.DEFAULT_PROFILE == "screen"
+    # Le richieste senza profile usano il default invece di fallire
+    assert profiles.resolve(None) == "screen"
+    with pytest.raises(ValueError):
+        profiles.resolve("prnt")
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
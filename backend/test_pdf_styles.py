@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""Test del registro stili: le cache restano limitate qualunque testo arrivi dal documento"""
+
+import sys
+
+import pytest
+
+import pdf_styles
+
+
+def test_free_text_verdicts_share_the_default_styles():
+    default = pdf_styles.get_verdict_styles("NON VALIDATA")
+    for i in range(200):
+        assert pdf_styles.get_verdict_styles(f"verdetto inventato {i}") is default
+    assert pdf_styles.get_verdict_styles(None) is default
+    assert pdf_styles.get_verdict_styles(["lista"]) is default
+    assert pdf_styles.get_verdict_styles("VALIDATA")["hex"] == pdf_styles.VERDICT_COLORS["VALIDATA"]
+    assert pdf_styles._verdict_styles.cache_info().currsize <= len(pdf_styles.VERDICT_COLORS) + 1
+
+
+def test_unknown_confidentiality_uses_the_internal_badge():
+    internal = pdf_styles.confidentiality_badge("uso_interno")
+    for i in range(200):
+        assert pdf_styles.confidentiality_badge(f"riservato {i}") is internal
+    assert pdf_styles.confidentiality_badge("confidenziale") is not internal
+    assert pdf_styles._confidentiality_badge.cache_info().currsize <= len(pdf_styles.CONFIDENTIALITY_COLORS)
+
+
+def test_unknown_document_type_is_not_cached():
+    with pytest.raises(KeyError):
+        pdf_styles.get_theme("documento-sconosciuto")
+    assert pdf_styles.get_theme("business-plan") is pdf_styles.get_theme("business-plan")
+    assert pdf_styles.get_theme.cache_info().currsize <= len(pdf_styles.THEME_COLORS)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""Test del pool di rendering: semaforo per event loop e conteggio dei job per il riciclo"""
+
+import asyncio
+import sys
+
+import pytest
+
+import render_pool
+
+
+class FakeExecutor:
+    """Executor sincrono al posto del pool di processi (niente worker da avviare)"""
+
+    def __init__(self):
+        self.warm_ups = 0
+        self.closed = False
+
+    def submit(self, func, *args):
+        self.warm_ups += 1
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.closed = True
+
+
+@pytest.fixture
+def fake_pool(monkeypatch):
+    executors = []
+
+    def new_executor():
+        executor = FakeExecutor()
+        executor.submit(render_pool._noop)
+        executors.append(executor)
+        return executor
+
+    monkeypatch.setattr(render_pool, "RENDER_WORKERS", 1)
+    monkeypatch.setattr(render_pool, "RENDER_MAX_JOBS_PER_WORKER", 2)
+    monkeypatch.setattr(render_pool, "_new_executor", new_executor)
+    monkeypatch.setattr(render_pool, "_executor", None)
+    monkeypatch.setattr(render_pool, "_executor_jobs", 0)
+    return executors
+
+
+def test_run_works_across_event_loops(monkeypatch):
+    monkeypatch.setattr(render_pool, "RENDER_WORKERS", 0)
+    monkeypatch.setattr(render_pool, "RENDER_MAX_CONCURRENT", 1)
+
+    async def render_twice():
+        return await asyncio.gather(render_pool.run(sum, [1, 2]), render_pool.run(sum, [3, 4]))
+
+    # Ogni asyncio.run crea un loop nuovo, come il TestClient o un reload
+    assert asyncio.run(render_twice()) == [3, 7]
+    assert asyncio.run(render_twice()) == [3, 7]
+
+
+def test_warm_up_does_not_count_towards_recycling(fake_pool):
+    async def start():
+        render_pool.start()
+    asyncio.run(start())
+
+    [executor] = fake_pool
+    assert executor.warm_ups == 1
+    assert render_pool._executor_jobs == 0
+
+    # Limite: 2 job per worker; il terzo job apre un nuovo pool
+    assert render_pool._get_executor() is executor
+    assert render_pool._get_executor() is executor
+    assert render_pool._get_executor() is not executor
+    assert executor.closed
+    assert len(fake_pool) == 2 and render_pool._executor_jobs == 1
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""Test del middleware che decomprime i body gzip/deflate"""
+
+import gzip
+import json
+import sys
+import zlib
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from request_decompression import DecompressRequestMiddleware
+
+MAX_BODY = 64 * 1024
+PAYLOAD = json.dumps({"formData": {"descrizione": "Caffè letterario " * 50}}).encode("utf-8")
+
+
+def make_client(max_body_size=MAX_BODY):
+    echo = FastAPI()
+
+    @echo.post("/echo")
+    async def echo_body(request: Request):
+        body = await request.body()
+        return {"length": len(body), "contentLength": request.headers.get("content-length"),
+                "json": json.loads(body)}
+
+    echo.add_middleware(DecompressRequestMiddleware, max_body_size=max_body_size)
+    return TestClient(echo)
+
+
+def post(client, body, encoding):
+    return client.post("/echo", content=body,
+                       headers={"Content-Encoding": encoding, "Content-Type": "application/json"})
+
+
+def raw_deflate(data):
+    compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+@pytest.mark.parametrize("encoding, body", [
+    ("gzip", gzip.compress(PAYLOAD)),
+    ("x-gzip", gzip.compress(PAYLOAD)),
+    ("deflate", zlib.compress(PAYLOAD)),
+    ("deflate", raw_deflate(PAYLOAD)),
+    ("identity", PAYLOAD),
+])
+def test_body_is_decompressed(encoding, body):
+    response = post(make_client(), body, encoding)
+    assert response.status_code == 200, response.text
+    echoed = response.json()
+    assert echoed["length"] == len(PAYLOAD)
+    assert echoed["contentLength"] == str(len(PAYLOAD))
+    assert echoed["json"] == json.loads(PAYLOAD)
+
+
+def test_decompression_bomb_is_rejected():
+    bomb = gzip.compress(b"{" + b" " * (MAX_BODY * 16) + b"}")
+    assert len(bomb) < MAX_BODY
+    response = post(make_client(), bomb, "gzip")
+    assert response.status_code == 413
+    assert "troppo grande" in response.json()["detail"]
+
+
+def test_body_just_under_the_limit_is_accepted():
+    body = json.dumps({"testo": "x" * (MAX_BODY - 20)}).encode("utf-8")
+    assert len(body) <= MAX_BODY
+    assert post(make_client(), gzip.compress(body), "gzip").status_code == 200
+
+
+def test_corrupt_body_is_rejected():
+    response = post(make_client(), b"questo non e gzip", "gzip")
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Corpo della richiesta gzip non valido"
+
+
+def test_unsupported_encoding_is_rejected():
+    response = post(make_client(), PAYLOAD, "br")
+    assert response.status_code == 415
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""Test del webhook Stripe sui payload registrati in fixtures/stripe"""
+
+import hashlib
+import hmac
+import json
+import sys
+import time
+from pathlib import Path
+
+import pytest
+import stripe
+
+import payment_cache
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures" / "stripe"
+
+
+def load_fixture(name):
+    return (FIXTURES_DIR / name).read_bytes()
+
+
+def sign(payload, secret="whsec_test_secret"):
+    """Costruisce l'header Stripe-Signature come fa Stripe"""
+    timestamp = int(time.time())
+    signed = f"{timestamp}.".encode() + payload
+    signature = hmac.new(secret.encode(), signed, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+def post_event(client, payload, signature=None):
+    return client.post(
+        "/api/stripe/webhook",
+        content=payload,
+        headers={"Stripe-Signature": signature or sign(payload), "Content-Type": "application/json"}
+    )
+
+
+def fail_on_stripe_call(*args, **kwargs):
+    raise AssertionError("Stripe non deve essere interrogato se la sessione è nel ledger")
+
+
+def test_completed_session_is_recorded(client, monkeypatch):
+    payload = load_fixture("checkout_session_completed.json")
+    response = post_event(client, payload)
+    assert response.status_code == 200, response.text
+    assert response.json() == {"received": True}
+
+    session_id = json.loads(payload)["data"]["object"]["id"]
+    monkeypatch.setattr(stripe.checkout.Session, "retrieve", fail_on_stripe_call)
+    response = client.post("/api/verify-payment", json={"sessionId": session_id, "documentType": "business-plan"})
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["paid"] is True
+    assert body["includeUpsell"] is True
+    assert body["upsellType"] == "market-analysis"
+
+
+def test_duplicate_event_is_ignored(client):
+    payload = load_fixture("checkout_session_completed.json")
+    post_event(client, payload)
+    response = post_event(client, payload)
+    assert response.status_code == 200, response.text
+    assert response.json() == {"received": True, "duplicate": True}
+
+
+def test_unpaid_session_is_not_recorded(client):
+    payload = load_fixture("checkout_session_completed_unpaid.json")
+    response = post_event(client, payload)
+    assert response.status_code == 200, response.text
+    session_id = json.loads(payload)["data"]["object"]["id"]
+    assert payment_cache.get_paid_session(session_id) is None
+
+
+def test_invalid_signature_is_rejected(client):
+    payload = load_fixture("checkout_session_completed.json")
+    response = post_event(client, payload, signature=sign(payload, secret="whsec_altro"))
+    assert response.status_code == 400
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""Test dei numeri di pagina dell'indice del business plan sul piano di esempio"""
+
+import asyncio
+import copy
+import io
+import json
+import re
+import sys
+from pathlib import Path
+
+import pytest
+from pypdf import PdfReader
+
+import document_builder
+import pdf_generator
+import pdf_merge
+import render_pool
+
+SAMPLE = Path(__file__).resolve().parent.parent / "business-plan-TechStarts.json"
+
+
+@pytest.fixture(scope="module")
+def business_plan():
+    with open(SAMPLE, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def page_texts(pdf_bytes):
+    return ['\n'.join(line.strip() for line in page.extract_text().split('\n'))
+            for page in PdfReader(io.BytesIO(pdf_bytes)).pages]
+
+
+def toc_entries(pages):
+    """(indice della pagina INDICE, [(titolo, numero di pagina)]) letti dal testo del PDF"""
+    toc_index = next(i for i, text in enumerate(pages) if 'INDICE' in text.split('\n'))
+    lines = [line for line in pages[toc_index].split('INDICE', 1)[1].split('\n') if line]
+    entries = [(title, int(number)) for title, number in zip(lines, lines[1:])
+               if number.isdigit() and not title.isdigit()]
+    return toc_index, entries
+
+
+def heading_pages(pages, toc_index, entries):
+    """Pagina (da 1) in cui inizia ogni voce: prima riga che comincia con il titolo, in ordine di documento"""
+    found = []
+    start = toc_index + 1
+    for title, _ in entries:
+        pattern = re.compile(r'(?:^|\n)' + r'\s+'.join(map(re.escape, title.split())), re.IGNORECASE)
+        page = next((i for i in range(start, len(pages)) if pattern.search(pages[i])), None)
+        found.append((title, None if page is None else page + 1))
+        start = page if page is not None else start
+    return found
+
+
+def assert_toc_matches_headings(pdf_bytes):
+    pages = page_texts(pdf_bytes)
+    toc_index, entries = toc_entries(pages)
+    assert len(entries) > 10
+    assert heading_pages(pages, toc_index, entries) == entries
+    return entries
+
+
+def render_incremental(business_plan):
+    return asyncio.run(pdf_generator.render_pdf_incremental(business_plan))
+
+
+def test_incremental_toc_points_to_section_pages(business_plan, data_dir):
+    assert_toc_matches_headings(render_incremental(business_plan))
+
+
+def test_incremental_render_reuses_unchanged_fragments(business_plan, data_dir, monkeypatch):
+    render_incremental(business_plan)
+
+    rendered = []
+    build_fragment = pdf_generator.build_fragment_from_inputs
+
+    def counting_build(fragment_id, *args):
+        rendered.append(fragment_id)
+        return build_fragment(fragment_id, *args)
+
+    monkeypatch.setattr(pdf_generator, "build_fragment_from_inputs", counting_build)
+    render_incremental(business_plan)
+    assert rendered == []
+
+    edited = copy.deepcopy(business_plan)
+    edited["narrative"]["chapters"][1]["contenuto_markdown"] += "\n\nParagrafo aggiunto dopo la revisione."
+    assert_toc_matches_headings(render_incremental(edited))
+    assert rendered == ["chapter-1"]
+
+
+def test_fragment_jobs_receive_only_their_inputs(business_plan, data_dir, monkeypatch):
+    jobs = []
+    run = render_pool.run
+
+    async def recording_run(fn, *args):
+        if fn is pdf_generator.build_fragment_from_inputs:
+            jobs.append(args)
+        return await run(fn, *args)
+    monkeypatch.setattr(render_pool, "run", recording_run)
+
+    render_incremental(business_plan)
+    ctx = pdf_generator._business_plan_context(business_plan, None)
+    plan = pdf_generator.business_plan_fragments(business_plan, ctx)
+    assert [(fragment_id, inputs) for fragment_id, inputs, _, _ in jobs] == [
+        (fragment_id, inputs) for fragment_id, _, inputs in plan
+    ]
+    assert all(business_plan not in args for args in jobs)
+
+
+def test_unstable_toc_page_count_stops_after_a_few_passes(business_plan, monkeypatch):
+    ctx = pdf_generator._business_plan_context(business_plan, None)
+    plan = pdf_generator.business_plan_fragments(business_plan, ctx)
+    fragments = [pdf_generator.build_fragment_from_inputs(fragment_id, inputs) for fragment_id, _, inputs in plan]
+
+    # L'indice risulta alternativamente di 2 e 1 pagine: senza limite il ciclo non finirebbe
+    toc_layouts = []
+    fragment_layout = pdf_merge.fragment_layout
+
+    def flipping_layout(pdf_bytes):
+        if pdf_bytes in fragments:
+            return fragment_layout(pdf_bytes)
+        toc_layouts.append(pdf_bytes)
+        return (1 + len(toc_layouts) % 2, {})
+    monkeypatch.setattr(pdf_merge, "fragment_layout", flipping_layout)
+
+    pdf_bytes = pdf_generator.assemble_pdf_from_fragments(business_plan, fragments)
+    assert len(toc_layouts) == pdf_generator.TOC_MAX_PASSES
+    assert page_texts(pdf_bytes)
+
+
+def test_single_pass_toc_matches_the_incremental_render(business_plan, data_dir):
+    single_pass = assert_toc_matches_headings(pdf_generator.build_pdf_from_json(business_plan))
+    assert single_pass == toc_entries(page_texts(render_incremental(business_plan)))[1]
+
+
+def test_estimated_page_numbers_would_be_caught(business_plan):
+    """Controllo del test stesso: con i numeri stimati (una pagina per voce) l'indice non corrisponde"""
+    ctx = pdf_generator._business_plan_context(business_plan, None)
+    sections = pdf_generator.business_plan_sections(ctx)
+    estimated = document_builder.toc_entries(sections, business_plan, ctx)
+    pdf_bytes = document_builder.build_pdf("business-plan", sections, business_plan,
+                                           {**ctx, "toc": estimated}, encoding='utf-8')
+    with pytest.raises(AssertionError):
+        assert_toc_matches_headings(pdf_bytes)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -1,7 +1,8 @@
 import json
-import re
 from typing import Dict, List, Any, Tuple
 
+import markdown_cache
+
 def prepare_user_input_json(form_data: dict) -> str:
     """Prepara i dati utente in formato JSON (equivalente a prepareUserInputJSON in script.js)"""
     user_data = {}
@@ -106,12 +107,7 @@ def sanitize_italia_regime_note(business_plan_json: dict):
 
 def count_words(text: str) -> int:
     """Conta le parole in un testo"""
-    if not text or not isinstance(text, str):
-        return 0
-    # Rimuove HTML tags se presenti e conta le parole
-    text_clean = re.sub(r'<[^>]+>', '', text)
-    words = re.findall(r'\b\w+\b', text_clean)
-    return len(words)
+    return markdown_cache.count_words(text)
 
 def validate_market_analysis_word_count(market_analysis_json: dict) -> Tuple[bool, Dict[str, Any]]:
     """
@@ -291,8 +287,9 @@ def validate_business_plan_quality(business_plan_json: dict) -> Tuple[bool, Dict
     chapters = business_plan_json.get("narrative", {}).get("chapters", [])
     for chapter in chapters:
         chapter_id = chapter.get("id", "")
-        content = chapter.get("contenuto_markdown", "")
-        words = count_words(content)
+        # Parole e struttura dal markdown analizzato (lo stesso usato poi da PDF e anteprima HTML)
+        parsed = markdown_cache.parse(chapter.get("contenuto_markdown", ""))
+        words = parsed["words"]
         
         min_words = min_words_per_chapter.get(chapter_id, 200)
         report["details"][f"chapter.{chapter_id}"] = {
@@ -307,13 +304,10 @@ def validate_business_plan_quality(business_plan_json: dict) -> Tuple[bool, Dict
                 f"Capitolo {chapter_id}: {words} parole (minimo {min_words})"
             )
         
-        # Verifica struttura: paragrafi, sottosezioni, liste
-        has_subsection = "##" in content or "###" in content
-        has_list = "- " in content or "* " in content or re.search(r'\d+\.\s', content)
-        
-        if not has_subsection:
+        # Verifica struttura: sottosezioni e liste riconosciute dal parser
+        if not parsed["has_subsection"]:
             report["warnings"].append(f"Capitolo {chapter_id}: manca sottosezione (## o ###)")
-        if not has_list:
+        if not parsed["has_list"]:
             report["warnings"].append(f"Capitolo {chapter_id}: manca elenco puntato")
     
     # Verifica coerenza finanziaria